@@ -0,0 +1,670 @@
+#!/usr/bin/env python3
+"""Write calibration parameters to an ECU through its UDS Dcm.
+
+Parameters come from a JSON list of ``{"name", "value", "did", "address"}``
+objects (``value`` in hex, ``did``/``address`` as numbers or "0x..."
+strings; a parameter needs at least one of the two).  With ``--platform``
+or ``--map``, a parameter without an address takes it from the compiled
+calibration map index by name, and its value must cover the whole
+parameter.
+
+``BulkWriter`` groups parameters whose addresses lie within ``--max-gap``
+bytes of each other into regions.  Each region is written either with one
+WriteDataByIdentifier (0x2E) per parameter or as a single
+RequestDownload/TransferData/RequestTransferExit (0x34/0x36/0x37),
+whichever the ``LinkModel`` predicts is faster.  The model starts from
+round-trip time and bandwidth measured on the link and is refined with
+every exchange.  TransferData blocks are sized from the
+maxNumberOfBlockLength the ECU returns for 0x34.  Gaps inside a region
+are filled by reading the current memory.  On ISO-TP the next block is
+segmented while the current one is on the bus.
+
+``SessionKeeper`` keeps the diagnostic sessions of any number of ECUs open
+from one event loop, independently of the work running on it.  A single
+timer sends TesterPresent with the positive response suppressed
+(0x3E 0x80) to each ECU ``--keep-alive`` seconds after its last request.
+An ECU whose S3 timer is already being restarted by real traffic gets no
+keep-alives at all.  ``write`` runs under a keeper; ``keep`` only holds
+sessions open.
+
+Example::
+
+    dcm_calib.py write params.json --doip 192.168.0.10 --target 0x1001
+    dcm_calib.py write params.json --can can0 --tx-id 0x7E0 --rx-id 0x7E8 --verify
+    dcm_calib.py write params.json --doip 192.168.0.10 --platform S32K344
+    dcm_calib.py keep --doip 192.168.0.10 --ecu 0x1001 --ecu 0x1002 --duration 600
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import statistics
+import sys
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence, Set, Tuple
+
+_CALIB_LIB = Path(__file__).resolve().parents[3] / "tools" / "calibration"
+if str(_CALIB_LIB) not in sys.path:
+    sys.path.insert(0, str(_CALIB_LIB))
+
+from uds_xcp_adapter import (  # noqa: E402
+    CLASSIC_DL,
+    DOIP_PORT,
+    FD_DL,
+    DoipConnection,
+    DoipError,
+    IsoTpConfig,
+    IsoTpConnection,
+    IsoTpError,
+    IsoTpUdsTransport,
+    SocketCanChannel,
+    UdsClient,
+    UdsError,
+)
+
+DEFAULT_MAX_GAP = 64
+DEFAULT_BANDWIDTH = 50e3      # bytes/s until measured (roughly classic CAN at 500 kbit/s)
+DEFAULT_BLOCK_LENGTH = 0xFFF  # maxNumberOfBlockLength assumed before the first 0x34
+RTT_SAMPLES = 5
+ALFID = 0x44                  # 4-byte address, 4-byte size
+METHODS = ("auto", "did", "block")
+DEFAULT_KEEP_ALIVE = 2.0      # TesterPresent period; S3server is 5 s
+DEFAULT_KEEP_ALIVE_WINDOW = 0.05
+KEEP_ALIVE = b"\x3E\x80"      # TesterPresent, suppressPosRspMsgIndicationBit set
+
+
+class CalibrationError(Exception):
+    """Raised for parameter files and writes that cannot be carried out."""
+
+
+@dataclass
+class CalParameter:
+    name: str
+    value: bytes
+    did: Optional[int] = None
+    address: Optional[int] = None
+
+    @property
+    def end(self) -> int:
+        return (self.address or 0) + len(self.value)
+
+
+def _number(value) -> Optional[int]:
+    if value is None or isinstance(value, int):
+        return value
+    return int(value, 0)
+
+
+def load_parameters(path: Path, platform: Optional[str] = None,
+                    maps: Sequence[Path] = ()) -> List[CalParameter]:
+    """Parameters from ``path``; addresses missing there are looked up by name
+    in the calibration map of ``maps`` (or ``platform``'s) when given."""
+    try:
+        entries = json.loads(path.read_text())
+        params = [CalParameter(e.get("name", f"#{i}"), bytes.fromhex(e["value"]),
+                               _number(e.get("did")), _number(e.get("address")))
+                  for i, e in enumerate(entries)]
+    except KeyError as exc:
+        raise CalibrationError(f"{path}: parameter without {exc}") from exc
+    except (OSError, ValueError, TypeError, AttributeError) as exc:
+        raise CalibrationError(f"{path}: {exc}") from exc
+    unresolved = [param for param in params if param.address is None]
+    if unresolved and (platform or maps):
+        resolve_addresses(unresolved, platform, maps)
+    for param in params:
+        if param.did is None and param.address is None:
+            hint = (" and is not in the calibration map" if platform or maps
+                    else " (or --platform/--map to resolve its name)")
+            raise CalibrationError(f"{param.name}: needs a did or an address{hint}")
+        if not param.value:
+            raise CalibrationError(f"{param.name}: empty value")
+    return params
+
+
+def resolve_addresses(params: Sequence[CalParameter], platform: Optional[str] = None,
+                      maps: Sequence[Path] = ()) -> None:
+    """Set the address of ``params`` found by name in the calibration map index.
+
+    Parameters the map does not know keep no address (a DID write still
+    works); a value that does not cover the whole parameter is an error.
+    """
+    from calibration_index import load_index, platform_index  # NumPy, loaded on first use
+    from calibration_map import MapError
+
+    try:
+        index = load_index(maps, platform=platform or "") if maps else platform_index(platform)
+    except (MapError, RuntimeError) as exc:
+        raise CalibrationError(str(exc)) from exc
+    for param in params:
+        entry = index.get(param.name)
+        if entry is None:
+            continue
+        if len(param.value) != entry.size:
+            raise CalibrationError(f"{param.name}: {len(param.value)} bytes given, "
+                                   f"the calibration map has {entry.size}")
+        param.address = entry.address
+
+
+# -- cost model ----------------------------------------------------------------
+
+
+@dataclass
+class LinkModel:
+    """Per-request latency and byte rate of one tester/ECU link."""
+
+    rtt: float
+    bandwidth: float = DEFAULT_BANDWIDTH
+    alpha: float = 0.3            # weight of a new observation
+
+    def cost(self, requests: int, size: int) -> float:
+        """Predicted seconds for ``requests`` exchanges carrying ``size`` bytes."""
+        return requests * self.rtt + size / self.bandwidth
+
+    def observe(self, size: int, elapsed: float) -> None:
+        """Fold one exchange of ``size`` bytes into the estimates.
+
+        Whichever term dominated the prediction is the one updated, so a
+        small request refines the round trip and a large one the bandwidth.
+        """
+        transfer = size / self.bandwidth
+        if transfer > self.rtt:
+            sample = size / max(elapsed - self.rtt, elapsed * 0.1)
+            self.bandwidth += self.alpha * (sample - self.bandwidth)
+        else:
+            sample = max(elapsed - transfer, 0.0)
+            self.rtt += self.alpha * (sample - self.rtt)
+
+
+async def measure_link(client: UdsClient, address: Optional[int] = None,
+                       size: int = 0) -> LinkModel:
+    """Round trip from TesterPresent, bandwidth from reading ``size`` bytes.
+
+    An ECU that refuses the ReadMemoryByAddress leaves ``DEFAULT_BANDWIDTH``.
+    """
+    samples = []
+    for _ in range(RTT_SAMPLES):
+        start = time.perf_counter()
+        await client.request(b"\x3E\x00")
+        samples.append(time.perf_counter() - start)
+    model = LinkModel(statistics.median(samples))
+    if address is not None and size:
+        start = time.perf_counter()
+        try:
+            await client.request(_read_request(address, size))
+        except UdsError:
+            return model
+        elapsed = time.perf_counter() - start
+        model.bandwidth = size / max(elapsed - model.rtt, elapsed * 0.1)
+    return model
+
+
+# -- planning ------------------------------------------------------------------
+
+
+@dataclass
+class Region:
+    """Parameters close enough in memory to go as one download."""
+
+    address: int
+    size: int
+    params: List[CalParameter] = field(default_factory=list)
+    method: str = ""
+    predicted: float = 0.0
+    elapsed: float = 0.0
+
+    @property
+    def gaps(self) -> int:
+        return self.size - sum(len(p.value) for p in self.params)
+
+
+def plan_regions(params: Sequence[CalParameter], max_gap: int = DEFAULT_MAX_GAP) -> List[Region]:
+    """Merge addressed parameters into regions; unaddressed ones stay alone."""
+    regions: List[Region] = []
+    addressed = sorted((p for p in params if p.address is not None), key=lambda p: p.address)
+    for param in addressed:
+        last = regions[-1] if regions else None
+        if last is not None and param.address < last.address + last.size:
+            raise CalibrationError(f"{param.name} overlaps {last.params[-1].name}")
+        if last is not None and param.address - (last.address + last.size) <= max_gap:
+            last.size = param.end - last.address
+            last.params.append(param)
+        else:
+            regions.append(Region(param.address, len(param.value), [param]))
+    for param in params:
+        if param.address is None:
+            regions.append(Region(0, len(param.value), [param], method="did"))
+    return regions
+
+
+# -- writer --------------------------------------------------------------------
+
+
+def _read_request(address: int, size: int) -> bytes:
+    return bytes((0x23, ALFID)) + address.to_bytes(4, "big") + size.to_bytes(4, "big")
+
+
+class BulkWriter:
+    """Writes parameters over ``client`` by the cheaper of 0x2E and 0x34/0x36/0x37.
+
+    The caller opens a session that allows RequestDownload (usually the
+    extended or programming session) and unlocks security access first.
+    """
+
+    def __init__(self, client: UdsClient, model: LinkModel, max_gap: int = DEFAULT_MAX_GAP,
+                 method: str = "auto",
+                 log: Optional[Callable[[str], None]] = None) -> None:
+        if method not in METHODS:
+            raise ValueError(f"method must be one of {', '.join(METHODS)}")
+        self.client = client
+        self.model = model
+        self.max_gap = max_gap
+        self.method = method
+        self.block_length = DEFAULT_BLOCK_LENGTH
+        self.log = log or (lambda message: None)
+
+    # -- costs -------------------------------------------------------------
+
+    def did_cost(self, region: Region) -> float:
+        return self.model.cost(len(region.params),
+                               sum(3 + len(p.value) for p in region.params))
+
+    def block_cost(self, region: Region) -> float:
+        blocks = -(-region.size // (self.block_length - 2))
+        cost = self.model.cost(blocks + 2, region.size + 2 * blocks + 11)
+        if region.gaps:
+            reads = -(-region.size // (self.client.max_response - 1))
+            cost += self.model.cost(reads, region.size)
+        return cost
+
+    def choose(self, region: Region) -> str:
+        """``did`` or ``block`` for ``region``, filling in its prediction."""
+        can_did = all(p.did is not None for p in region.params)
+        if region.method == "did" or (can_did and self.method == "did"):
+            region.method, region.predicted = "did", self.did_cost(region)
+        elif not can_did or self.method == "block":
+            region.method, region.predicted = "block", self.block_cost(region)
+        else:
+            did, block = self.did_cost(region), self.block_cost(region)
+            region.method, region.predicted = ("did", did) if did <= block else ("block", block)
+        return region.method
+
+    # -- transfers ---------------------------------------------------------
+
+    async def _timed(self, payload, size: int) -> bytes:
+        start = time.perf_counter()
+        response = await self.client.request(payload)
+        self.model.observe(size, time.perf_counter() - start)
+        return response
+
+    async def write_dids(self, params: Sequence[CalParameter]) -> None:
+        for param in params:
+            payload = b"\x2E" + param.did.to_bytes(2, "big") + param.value
+            await self._timed(payload, len(payload))
+
+    async def read_memory(self, address: int, size: int) -> bytes:
+        out = bytearray()
+        chunk = self.client.max_response - 1
+        for offset in range(0, size, chunk):
+            count = min(chunk, size - offset)
+            response = await self._timed(_read_request(address + offset, count), count)
+            if len(response) != count + 1:
+                raise CalibrationError(f"short read at 0x{address + offset:08X}")
+            out += response[1:]
+        return bytes(out)
+
+    async def download(self, address: int, data: bytes) -> int:
+        """0x34/0x36/0x37 ``data`` to ``address``; returns the TransferData count."""
+        response = await self._timed(bytes((0x34, 0x00, ALFID)) + address.to_bytes(4, "big")
+                                     + len(data).to_bytes(4, "big"), 11)
+        length_bytes = response[1] >> 4 if len(response) > 1 else 0
+        if not 1 <= length_bytes <= len(response) - 2:
+            raise CalibrationError(f"malformed RequestDownload response {response.hex()}")
+        self.block_length = int.from_bytes(response[2:2 + length_bytes], "big")
+        step = self.block_length - 2
+        if step <= 0:
+            raise CalibrationError(f"maxNumberOfBlockLength {self.block_length} too small")
+        view = memoryview(data)
+        offsets = range(0, len(data), step)
+
+        def payload(index: int):
+            offset = offsets[index]
+            return self.client.prepare(bytes((0x36, (index + 1) & 0xFF))
+                                       + view[offset:offset + step])
+
+        pending = payload(0)
+        for index in range(len(offsets)):
+            size = min(step, len(data) - offsets[index]) + 2
+            exchange = asyncio.ensure_future(self._timed(pending, size))
+            if index + 1 < len(offsets):
+                # let the exchange reach the transport, then segment the next block
+                await asyncio.sleep(0)
+                pending = payload(index + 1)
+            response = await exchange
+            if response[1:2] != bytes(((index + 1) & 0xFF,)):
+                raise CalibrationError(f"TransferData {index + 1}: unexpected response "
+                                       f"{response.hex()}")
+        await self._timed(b"\x37", 1)
+        return len(offsets)
+
+    async def write_region(self, region: Region) -> None:
+        start = time.perf_counter()
+        if region.method == "did":
+            await self.write_dids(region.params)
+        else:
+            if region.gaps:
+                image = bytearray(await self.read_memory(region.address, region.size))
+            else:
+                image = bytearray(region.size)
+            for param in region.params:
+                offset = param.address - region.address
+                image[offset:offset + len(param.value)] = param.value
+            await self.download(region.address, bytes(image))
+        region.elapsed = time.perf_counter() - start
+
+    async def write(self, params: Sequence[CalParameter]) -> List[Region]:
+        """Write every parameter; returns the regions as planned and timed."""
+        regions = plan_regions(params, self.max_gap)
+        for region in regions:
+            self.choose(region)
+            await self.write_region(region)
+            where = f"0x{region.address:08X}" if region.params[0].address is not None \
+                else f"DID 0x{region.params[0].did:04X}"
+            self.log(f"{where} {region.size:7d} B {len(region.params):5d} param(s) "
+                     f"{region.method:5s} predicted {region.predicted * 1e3:8.1f} ms, "
+                     f"took {region.elapsed * 1e3:8.1f} ms")
+        return regions
+
+    async def verify(self, params: Sequence[CalParameter]) -> List[str]:
+        """Names of parameters whose read-back differs from the written value."""
+        bad = []
+        for param in params:
+            if param.address is not None:
+                data = await self.read_memory(param.address, len(param.value))
+            else:
+                data = (await self.client.read_dids((param.did,)))[param.did]
+            if data != param.value:
+                bad.append(param.name)
+        return bad
+
+
+# -- session keeping -------------------------------------------------------------
+
+
+@dataclass
+class KeptSession:
+    client: UdsClient
+    name: str
+    interval: float
+    keep_alives: int = 0
+    coalesced: int = 0            # keep-alives made unnecessary by request traffic
+    failures: int = 0
+    last_error: str = ""
+    _planned: float = field(default=0.0, repr=False)
+    _attempt: float = field(default=0.0, repr=False)
+    _sending: bool = field(default=False, repr=False)
+
+    def due(self) -> float:
+        """When the next keep-alive is needed (``time.monotonic()``)."""
+        return max(self.client.last_activity, self._attempt) + self.interval
+
+
+class SessionKeeper:
+    """Keeps the UDS sessions of many ECUs open from one event loop.
+
+    One scheduler task sleeps until the earliest keep-alive is due.  An ECU
+    with a request in flight or answered within ``interval`` is skipped,
+    since that request restarted its S3 timer.  Keep-alives falling due
+    within ``window`` of each other go out in the same loop iteration (on
+    DoIP, in one TCP write).  A failed keep-alive is retried after
+    ``interval``.
+    """
+
+    def __init__(self, interval: float = DEFAULT_KEEP_ALIVE,
+                 window: float = DEFAULT_KEEP_ALIVE_WINDOW,
+                 log: Optional[Callable[[str], None]] = None) -> None:
+        self.interval = interval
+        self.window = window
+        self.log = log or (lambda message: None)
+        self.sessions: Dict[int, KeptSession] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._sends: Set[asyncio.Task] = set()
+        self._wake: Optional[asyncio.Event] = None
+
+    def add(self, client: UdsClient, name: Optional[str] = None,
+            interval: Optional[float] = None) -> KeptSession:
+        session = KeptSession(client, name or f"ECU {len(self.sessions) + 1}",
+                              interval or self.interval)
+        self.sessions[id(client)] = session
+        if self._wake is not None:
+            self._wake.set()
+        return session
+
+    def remove(self, client: UdsClient) -> None:
+        self.sessions.pop(id(client), None)
+
+    def start(self) -> None:
+        if self._task is None:
+            self._wake = asyncio.Event()
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        for task in self._sends:
+            task.cancel()
+        await asyncio.gather(self._task, *self._sends, return_exceptions=True)
+        self._task = None
+
+    async def __aenter__(self) -> "SessionKeeper":
+        self.start()
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.stop()
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            now = time.monotonic()
+            dues = [(session, now + session.interval if session.client.in_flight
+                     else session.due())
+                    for session in self.sessions.values() if not session._sending]
+            # only a keep-alive that is actually due takes others along early
+            horizon = now + self.window if any(due <= now for _, due in dues) else now
+            next_due = None
+            for session, due in dues:
+                if due <= horizon:
+                    session._sending = True
+                    task = loop.create_task(self._keep_alive(session))
+                    self._sends.add(task)
+                    task.add_done_callback(self._sends.discard)
+                    continue
+                if session._planned and session._planned <= now:
+                    session.coalesced += 1
+                session._planned = due
+                next_due = due if next_due is None else min(next_due, due)
+            self._wake.clear()
+            timeout = None if next_due is None else max(next_due - time.monotonic(), 0.0)
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _keep_alive(self, session: KeptSession) -> None:
+        session._attempt = time.monotonic()
+        session._planned = 0.0
+        try:
+            await session.client.send(KEEP_ALIVE)
+            session.keep_alives += 1
+        except (UdsError, IsoTpError, DoipError, OSError) as exc:
+            session.failures += 1
+            session.last_error = str(exc)
+            self.log(f"{session.name}: TesterPresent failed: {exc}")
+        finally:
+            session._sending = False
+            self._wake.set()
+
+
+# -- command line --------------------------------------------------------------
+
+
+def _host_port(value: str) -> Tuple[str, int]:
+    host, _, port = value.partition(":")
+    return host, int(port) if port else DOIP_PORT
+
+
+def _can_ids(value: str) -> Tuple[int, int]:
+    tx_id, sep, rx_id = value.partition(":")
+    if not sep:
+        raise ValueError(f"expected TX:RX, got {value!r}")
+    return int(tx_id, 0), int(rx_id, 0)
+
+
+async def open_clients(args: argparse.Namespace) -> Tuple[Dict[str, UdsClient], Callable]:
+    """``UdsClient``s by name for ``--doip``/``--can`` and a coroutine closing them.
+
+    ``--ecu`` (repeatable) names the ECUs: a logical address on DoIP,
+    ``TX:RX`` CAN IDs on CAN; without it ``--target`` or ``--tx-id``/``--rx-id``.
+    """
+    ecus = getattr(args, "ecu", None)
+    if args.doip:
+        host, port = _host_port(args.doip)
+        conn = await DoipConnection.open(host, port, timeout=args.timeout)
+        targets = [int(ecu, 0) for ecu in ecus] if ecus else [args.target]
+        return {f"0x{target:04X}": UdsClient(conn.session(target), max_request=0xFFFF,
+                                             max_response=0xFFFF)
+                for target in targets}, conn.close
+    pairs = [_can_ids(ecu) for ecu in ecus] if ecus else [(args.tx_id, args.rx_id)]
+    conns = []
+    clients = {}
+    for tx_id, rx_id in pairs:
+        channel = SocketCanChannel(args.can, args.fd, [rx_id])
+        conns.append(IsoTpConnection(channel, IsoTpConfig(
+            tx_id, rx_id, tx_dl=FD_DL if args.fd else CLASSIC_DL, timeout=args.timeout)))
+        clients[f"0x{tx_id:03X}"] = UdsClient(IsoTpUdsTransport(conns[-1]))
+
+    async def close() -> None:
+        for conn in conns:
+            conn.close()
+
+    return clients, close
+
+
+async def run_write(args: argparse.Namespace, params: List[CalParameter]) -> int:
+    clients, close = await open_clients(args)
+    client = next(iter(clients.values()))
+    keeper = SessionKeeper(args.keep_alive, log=lambda line: print(line, file=sys.stderr))
+    try:
+        if args.session:
+            await client.request(bytes((0x10, args.session)))
+            if args.keep_alive:
+                keeper.add(client)
+                keeper.start()
+        # Only regions with gaps read memory (0x23); probe the bandwidth
+        # there, over a full response, and leave other writes without it.
+        gapped = [r for r in plan_regions(params, args.max_gap) if r.gaps]
+        model = await measure_link(client, gapped[0].address if gapped else None,
+                                   min(client.max_response - 1, 0x400))
+        print(f"link: round trip {model.rtt * 1e3:.2f} ms, "
+              f"{model.bandwidth / 1e3:.1f} kB/s", file=sys.stderr)
+        writer = BulkWriter(client, model, args.max_gap, args.method,
+                            log=lambda line: print(line, file=sys.stderr))
+        start = time.perf_counter()
+        await writer.write(params)
+        print(f"wrote {len(params)} parameter(s), {sum(len(p.value) for p in params)} bytes "
+              f"in {time.perf_counter() - start:.3f} s", file=sys.stderr)
+        if args.verify:
+            bad = await writer.verify(params)
+            if bad:
+                print(f"error: read-back mismatch: {', '.join(bad)}", file=sys.stderr)
+                return 2
+    finally:
+        await keeper.stop()
+        await close()
+    return 0
+
+
+async def run_keep(args: argparse.Namespace) -> int:
+    clients, close = await open_clients(args)
+    keeper = SessionKeeper(args.keep_alive, log=lambda line: print(line, file=sys.stderr))
+    try:
+        for name, client in clients.items():
+            if args.session:
+                await client.request(bytes((0x10, args.session)))
+            keeper.add(client, name)
+        print(f"keeping {len(clients)} session(s) open, TesterPresent every "
+              f"{args.keep_alive:g} s", file=sys.stderr)
+        async with keeper:
+            if args.duration:
+                await asyncio.sleep(args.duration)
+            else:
+                await asyncio.Event().wait()
+    finally:
+        for session in keeper.sessions.values():
+            print(f"{session.name}: {session.keep_alives} keep-alive(s), "
+                  f"{session.failures} failure(s)"
+                  + (f", last error: {session.last_error}" if session.last_error else ""),
+                  file=sys.stderr)
+        await close()
+    return 0 if all(not s.failures for s in keeper.sessions.values()) else 2
+
+
+def _add_link_arguments(parser: argparse.ArgumentParser) -> None:
+    link = parser.add_mutually_exclusive_group(required=True)
+    link.add_argument("--doip", metavar="HOST[:PORT]", help="DoIP entity")
+    link.add_argument("--can", metavar="IFACE", help="SocketCAN interface (ISO-TP)")
+    parser.add_argument("--target", type=lambda v: int(v, 0), default=0x1001,
+                        help="DoIP logical address of the ECU")
+    parser.add_argument("--tx-id", type=lambda v: int(v, 0), default=0x7E0)
+    parser.add_argument("--rx-id", type=lambda v: int(v, 0), default=0x7E8)
+    parser.add_argument("--fd", action="store_true", help="CAN-FD frames (TX_DL 64)")
+    parser.add_argument("--timeout", type=float, default=2.0)
+    parser.add_argument("--session", type=lambda v: int(v, 0), default=0x03,
+                        help="DiagnosticSessionControl to enter first (0 to skip)")
+    parser.add_argument("--keep-alive", type=float, default=DEFAULT_KEEP_ALIVE,
+                        metavar="SECONDS", help="TesterPresent period (0 to disable)")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_write = sub.add_parser("write", help="write parameters from a JSON file")
+    p_write.add_argument("params", type=Path)
+    _add_link_arguments(p_write)
+    p_write.add_argument("--method", choices=METHODS, default="auto")
+    p_write.add_argument("--max-gap", type=int, default=DEFAULT_MAX_GAP,
+                         help="largest gap (bytes) read back to join two parameters")
+    p_write.add_argument("--verify", action="store_true", help="read every parameter back")
+    p_write.add_argument("--platform", choices=("S32K344", "S32K348"),
+                         help="platform whose calibration map resolves parameter names")
+    p_write.add_argument("--map", dest="maps", type=Path, action="append", default=[],
+                         help="calibration map YAML (repeatable; overrides --platform)")
+    p_keep = sub.add_parser("keep", help="hold diagnostic sessions open")
+    _add_link_arguments(p_keep)
+    p_keep.add_argument("--ecu", action="append",
+                        help="logical address (DoIP) or TX:RX (CAN); repeatable")
+    p_keep.add_argument("--duration", type=float, default=0.0,
+                        help="seconds to keep the sessions (default: until interrupted)")
+    args = parser.parse_args(argv)
+    if args.command == "keep" and not args.keep_alive:
+        parser.error("keep needs a --keep-alive period")
+
+    try:
+        if args.command == "keep":
+            return asyncio.run(run_keep(args))
+        params = load_parameters(args.params, args.platform, args.maps)
+        return asyncio.run(run_write(args, params))
+    except KeyboardInterrupt:
+        return 0
+    except (CalibrationError, UdsError, IsoTpError, DoipError, OSError, ValueError) as exc:
+        print(f"error: {exc}", file=sys.stderr)
+        return 2
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,625 @@
+#!/usr/bin/env python3
+"""Measure VCU signals over XCP-on-Ethernet.
+
+``poll`` reads every signal with SHORT_UPLOAD once per sample; it needs no
+DAQ support on the ECU but tops out at a few hundred samples per second.
+
+``daq`` configures one dynamic DAQ list (ALLOC_DAQ/ALLOC_ODT/
+ALLOC_ODT_ENTRY/WRITE_DAQ), starts it with START_STOP_SYNCH and lets the
+ECU push ODT packets on its own event channel.  A receiver thread decodes
+each ODT straight into a slot of a preallocated single-producer ring; a
+flusher thread drains the ring in bulk and appends one raw column file per
+signal (plus host and ECU timestamps) next to a ``recording.json``
+manifest.  Column files load with ``numpy.fromfile(path, dtype)``.
+
+Signals are given as ``NAME@ADDRESS:TYPE`` (``TYPE`` one of u8, i8, u16,
+i16, u32, i32, u64, i64, f32, f64), as CSV rows ``name,address,type``, or
+as calibration parameter names (``motor_Kp``, ``soc_table[10]``) resolved
+through the compiled calibration map index of ``--platform``.
+"""
+
+from __future__ import annotations
+
+import argparse
+import csv
+import json
+import re
+import struct
+import sys
+import threading
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+try:
+    import numpy as np
+except ImportError:  # Only the DAQ recorder needs NumPy.
+    np = None
+
+_CALIB_LIB = Path(__file__).resolve().parents[3] / "tools" / "calibration"
+if str(_CALIB_LIB) not in sys.path:
+    sys.path.insert(0, str(_CALIB_LIB))
+
+from ethernet_xcp_adapter import (  # noqa: E402
+    DAQ_LIST_SELECT,
+    DAQ_MODE_TIMESTAMP,
+    PID_ERR,
+    PID_EV,
+    PID_RES,
+    PID_SERV,
+    SYNCH_START_SELECTED,
+    SYNCH_STOP_ALL,
+    XCP_TCP_DEFAULT_PORT,
+    Cmd,
+    DaqInfo,
+    ErrCode,
+    XcpError,
+    XcpMaster,
+    XcpTimeoutError,
+    error_name,
+    open_transport,
+)
+
+# type name -> (size, NumPy kind)
+SIGNAL_TYPES = {
+    "u8": (1, "u1"), "i8": (1, "i1"),
+    "u16": (2, "u2"), "i16": (2, "i2"),
+    "u32": (4, "u4"), "i32": (4, "i4"),
+    "u64": (8, "u8"), "i64": (8, "i8"),
+    "f32": (4, "f4"), "f64": (8, "f8"),
+}
+_STRUCT_CODES = {"u1": "B", "i1": "b", "u2": "H", "i2": "h", "u4": "I", "i4": "i",
+                 "u8": "Q", "i8": "q", "f4": "f", "f8": "d"}
+
+DEFAULT_RING_ROWS = 16384
+DEFAULT_FLUSH_INTERVAL = 0.25
+RECEIVE_POLL = 0.1  # longest wait for a DTO before stop()/duration are re-checked
+HOST_TIME_SIZE = 8  # every ring row starts with the host receive time (f64)
+_F64 = struct.Struct("<d")
+
+
+@dataclass(frozen=True)
+class Signal:
+    name: str
+    address: int
+    type: str
+
+    @property
+    def size(self) -> int:
+        return SIGNAL_TYPES[self.type][0]
+
+    def dtype(self, byte_order: str) -> str:
+        return byte_order + SIGNAL_TYPES[self.type][1]
+
+
+def parse_signal(text: str) -> Signal:
+    try:
+        name, rest = text.split("@", 1)
+        address, type_name = rest.rsplit(":", 1)
+        signal = Signal(name.strip(), int(address, 0), type_name.strip().lower())
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected NAME@ADDRESS:TYPE, got {text!r}")
+    if signal.type not in SIGNAL_TYPES:
+        raise argparse.ArgumentTypeError(f"unknown signal type {signal.type!r}")
+    return signal
+
+
+def load_signals(path: Path) -> List[Signal]:
+    """Read ``name,address,type`` rows; blank lines and ``#`` comments are skipped."""
+    signals = []
+    with open(path, newline="") as fh:
+        for row in csv.reader(fh):
+            if not row or row[0].lstrip().startswith("#"):
+                continue
+            if len(row) != 3:
+                raise ValueError(f"{path}: expected name,address,type in {row!r}")
+            signals.append(parse_signal(f"{row[0]}@{row[1]}:{row[2]}"))
+    return signals
+
+
+_MAP_TYPES = {"s8": "i8", "s16": "i16", "s32": "i32", "bool": "u8"}
+_PARAM_RE = re.compile(r"^([^\[\]]+)((?:\[\d+\])*)$")
+
+
+def resolve_parameters(names: Sequence[str], platform: str) -> List[Signal]:
+    """Signals for calibration parameters (or ``name[i]`` elements) by name."""
+    from calibration_index import platform_index  # compiled index, loaded on first use
+    from calibration_map import MapError
+
+    try:
+        index = platform_index(platform)
+    except (MapError, RuntimeError) as exc:
+        raise ValueError(str(exc)) from exc
+    signals = []
+    for text in names:
+        match = _PARAM_RE.match(text.strip())
+        param = index.get(match.group(1)) if match else None
+        if param is None:
+            raise ValueError(f"{text!r} is not in the {platform} calibration map")
+        element = [int(i) for i in re.findall(r"\d+", match.group(2))]
+        if len(element) != len(param.shape) or any(
+                i >= n for i, n in zip(element, param.shape)):
+            shape = "".join(f"[{n}]" for n in param.shape)
+            raise ValueError(f"{text!r}: {param.name} is "
+                             + (f"an array of shape {shape}" if shape else "a scalar"))
+        flat = 0
+        for i, n in zip(element, param.shape):
+            flat = flat * n + i
+        type_name = _MAP_TYPES.get(param.type, param.type)
+        size = SIGNAL_TYPES[type_name][0]
+        signals.append(Signal(text.strip(), param.address + flat * size, type_name))
+    return signals
+
+
+# -- DAQ list layout -------------------------------------------------------
+
+
+@dataclass
+class DaqLayout:
+    """Signals packed into ODTs plus the matching ring-row layout.
+
+    A row is ``[host time f64][ODT 0 payload][ODT 1 payload]...``; ODT 0
+    carries the ECU timestamp in front of its signals when enabled.
+    """
+
+    odts: List[List[Signal]]
+    timestamp_size: int
+    odt_offsets: List[int] = field(default_factory=list)
+    odt_sizes: List[int] = field(default_factory=list)
+    signal_offsets: Dict[str, int] = field(default_factory=dict)
+    row_size: int = 0
+
+    def __post_init__(self) -> None:
+        offset = HOST_TIME_SIZE
+        for index, odt in enumerate(self.odts):
+            self.odt_offsets.append(offset)
+            size = self.timestamp_size if index == 0 else 0
+            for signal in odt:
+                self.signal_offsets[signal.name] = offset + size
+                size += signal.size
+            self.odt_sizes.append(size)
+            offset += size
+        self.row_size = offset
+
+    def row_dtype(self, byte_order: str):
+        names, formats, offsets = ["time"], ["<f8"], [0]
+        if self.timestamp_size:
+            names.append("daq_timestamp")
+            formats.append(f"{byte_order}u{self.timestamp_size}")
+            offsets.append(HOST_TIME_SIZE)
+        for odt in self.odts:
+            for signal in odt:
+                names.append(signal.name)
+                formats.append(signal.dtype(byte_order))
+                offsets.append(self.signal_offsets[signal.name])
+        return np.dtype({"names": names, "formats": formats, "offsets": offsets,
+                         "itemsize": self.row_size})
+
+
+def pack_odts(signals: Sequence[Signal], max_dto: int, timestamp_size: int = 0,
+              max_entries: int = 255) -> DaqLayout:
+    """First-fit the signals into ODTs of at most MAX_DTO-1 payload bytes."""
+    capacity = max_dto - 1  # one byte for the absolute ODT number
+    odts: List[List[Signal]] = [[]]
+    used = timestamp_size
+    for signal in signals:
+        if signal.size + timestamp_size > capacity:
+            raise ValueError(f"signal {signal.name} does not fit in one DTO")
+        if used + signal.size > capacity or len(odts[-1]) >= max_entries:
+            odts.append([])
+            used = 0
+        odts[-1].append(signal)
+        used += signal.size
+    if len(odts) > 0xFB:
+        raise ValueError(f"{len(signals)} signals need {len(odts)} ODTs; at most 251 fit")
+    return DaqLayout(odts, timestamp_size)
+
+
+# -- lock-free sample ring ---------------------------------------------------
+
+
+class SampleRing:
+    """Fixed-size single-producer/single-consumer ring of equally sized rows.
+
+    The producer only moves ``head`` and the consumer only moves ``tail``;
+    both are plain ints, so no lock is needed under the GIL.  When the ring
+    is full the producer writes into a scratch row and counts an overrun
+    instead of blocking the socket.
+    """
+
+    def __init__(self, row_size: int, rows: int) -> None:
+        self.row_size = row_size
+        self.rows = rows
+        self.buffer = bytearray(row_size * rows)
+        self.view = memoryview(self.buffer)
+        self._scratch = memoryview(bytearray(row_size))
+        self.head = 0
+        self.tail = 0
+        self.overruns = 0
+        self._on_scratch = False
+
+    def __len__(self) -> int:
+        return self.head - self.tail
+
+    def producer_slot(self) -> memoryview:
+        # Decided once per slot: a release() while the row is being filled
+        # must not turn a scratch row into a committed ring slot.
+        self._on_scratch = self.head - self.tail >= self.rows
+        if self._on_scratch:
+            return self._scratch
+        start = (self.head % self.rows) * self.row_size
+        return self.view[start:start + self.row_size]
+
+    def commit(self) -> None:
+        """Publish the row from the last ``producer_slot()``."""
+        if self._on_scratch:
+            self.overruns += 1
+        else:
+            self.head += 1
+
+    def readable(self) -> List[tuple]:
+        """``(first_row, count)`` spans ready for the consumer (at most two)."""
+        head, tail = self.head, self.tail
+        first = tail % self.rows
+        count = head - tail
+        if first + count <= self.rows:
+            return [(first, count)] if count else []
+        return [(first, self.rows - first), (0, first + count - self.rows)]
+
+    def release(self, count: int) -> None:
+        self.tail += count
+
+
+# -- DAQ recorder ------------------------------------------------------------
+
+
+@dataclass
+class RecordingStats:
+    samples: int = 0
+    packets: int = 0
+    lost: int = 0
+    overruns: int = 0
+    seconds: float = 0.0
+
+    @property
+    def rate(self) -> float:
+        return self.samples / self.seconds if self.seconds > 0 else 0.0
+
+
+class ColumnWriter:
+    """Drains a ``SampleRing`` and appends each field to its own column file."""
+
+    def __init__(self, ring: SampleRing, dtype, output_dir: Path) -> None:
+        self.ring = ring
+        self.dtype = dtype
+        self.files = {name: open(output_dir / self.column_file(name), "wb")
+                      for name in dtype.names}
+        self.rows = 0
+
+    def column_file(self, name: str) -> str:
+        return f"{name}.{self.dtype.fields[name][0].str.lstrip('<>|=')}"
+
+    def flush(self) -> int:
+        written = 0
+        for first, count in self.ring.readable():
+            rows = np.frombuffer(self.ring.buffer, dtype=self.dtype, count=count,
+                                 offset=first * self.ring.row_size)
+            for name, fh in self.files.items():
+                # Strided field view -> one contiguous column write per flush.
+                np.ascontiguousarray(rows[name]).tofile(fh)
+            del rows
+            self.ring.release(count)
+            written += count
+        self.rows += written
+        return written
+
+    def close(self) -> None:
+        for fh in self.files.values():
+            fh.close()
+
+
+class DaqRecorder:
+    def __init__(self, master: XcpMaster, signals: Sequence[Signal], event: int = 0,
+                 prescaler: int = 1, ring_rows: int = DEFAULT_RING_ROWS,
+                 use_timestamp: bool = True) -> None:
+        if np is None:
+            raise XcpError("the DAQ recorder requires NumPy")
+        if not signals:
+            raise ValueError("no signals to record")
+        self.master = master
+        self.signals = list(signals)
+        self.event = event
+        self.prescaler = prescaler
+        self.ring_rows = ring_rows
+        self.use_timestamp = use_timestamp
+        self.daq_info = DaqInfo()
+        self.layout: Optional[DaqLayout] = None
+        self.first_pid = 0
+        self.stats = RecordingStats()
+        self._stop = threading.Event()
+
+    def configure(self) -> DaqLayout:
+        master = self.master
+        info = self.daq_info = master.get_daq_info()
+        if info.identification_type != 0:
+            raise XcpError("only absolute ODT number identification is supported")
+        ts_size = info.timestamp_size if self.use_timestamp and info.timestamp_supported else 0
+        layout = pack_odts(self.signals, master.info.max_dto, ts_size)
+        for signal in self.signals:
+            if signal.size > info.max_odt_entry_size:
+                raise XcpError(f"signal {signal.name} exceeds MAX_ODT_ENTRY_SIZE_DAQ")
+
+        master.free_daq()
+        master.alloc_daq(1)
+        master.alloc_odt(0, len(layout.odts))
+        for odt_index, odt in enumerate(layout.odts):
+            master.alloc_odt_entry(0, odt_index, len(odt))
+        for odt_index, odt in enumerate(layout.odts):
+            master.set_daq_ptr(0, odt_index, 0)
+            for signal in odt:
+                master.write_daq(signal.size, signal.address)
+        master.set_daq_list_mode(0, DAQ_MODE_TIMESTAMP if ts_size else 0,
+                                 self.event, self.prescaler)
+        self.first_pid = master.start_stop_daq_list(DAQ_LIST_SELECT, 0)
+        self.layout = layout
+        return layout
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def record(self, output_dir: Path, duration: Optional[float] = None,
+               flush_interval: float = DEFAULT_FLUSH_INTERVAL) -> RecordingStats:
+        layout = self.layout or self.configure()
+        output_dir = Path(output_dir)
+        output_dir.mkdir(parents=True, exist_ok=True)
+        ring = SampleRing(layout.row_size, self.ring_rows)
+        writer = ColumnWriter(ring, layout.row_dtype(self.master.info.byte_order),
+                              output_dir)
+        flusher_done = threading.Event()
+
+        def flush_loop() -> None:
+            while not flusher_done.wait(flush_interval):
+                writer.flush()
+            writer.flush()
+
+        flusher = threading.Thread(target=flush_loop, name="daq-flush", daemon=True)
+        flusher.start()
+        start = time.perf_counter()
+        interrupted = False
+        try:
+            # Sent raw: the first DTOs may overtake its RES, so _receive
+            # consumes the response in-stream.
+            self.master.transport.send(bytes((Cmd.START_STOP_SYNCH, SYNCH_START_SELECTED)))
+            try:
+                self._receive(ring, start, duration)
+            except KeyboardInterrupt:
+                # Stop the DAQ lists and drain up to their RES, so the slave
+                # stops sending and the recording still gets its manifest.
+                interrupted = True
+                self.stop()
+                self._receive(ring, start, duration)
+        finally:
+            flusher_done.set()
+            flusher.join()
+            writer.close()
+            self.stats.seconds = time.perf_counter() - start
+            self.stats.samples = writer.rows
+            self.stats.overruns = ring.overruns
+        self._write_manifest(output_dir, writer)
+        if interrupted:
+            raise KeyboardInterrupt
+        return self.stats
+
+    def _receive(self, ring: SampleRing, start: float, duration: Optional[float]) -> None:
+        transport = self.master.transport
+        timeout = transport.timeout
+        transport.timeout = RECEIVE_POLL
+        try:
+            self._receive_loop(ring, start, duration, timeout)
+        finally:
+            transport.timeout = timeout
+
+    def _receive_loop(self, ring: SampleRing, start: float, duration: Optional[float],
+                      timeout: Optional[float]) -> None:
+        layout = self.layout
+        transport = self.master.transport
+        n_odts = len(layout.odts)
+        expected = 0
+        row = ring.producer_slot()
+        stopping = False
+        wall_offset = time.time() - time.perf_counter()
+
+        while True:
+            if not stopping and (self._stop.is_set() or (
+                    duration is not None and time.perf_counter() - start >= duration)):
+                # The RES to this arrives in-stream after any queued DTOs.
+                transport.send(bytes((Cmd.START_STOP_SYNCH, SYNCH_STOP_ALL)))
+                stopping = True
+                transport.timeout = timeout  # the RES must come within the usual timeout
+            try:
+                packet = transport.recv_view()
+            except XcpTimeoutError:
+                if stopping:
+                    raise
+                continue  # no data this poll; re-check stop() and the duration
+            length = len(packet)
+            pid = packet[0]
+            odt = pid - self.first_pid
+            if 0 <= odt < n_odts and pid < PID_SERV:
+                if length - 1 != layout.odt_sizes[odt]:
+                    raise XcpError(f"ODT {odt}: got {length - 1} bytes, "
+                                   f"expected {layout.odt_sizes[odt]}")
+                if odt != expected:
+                    # Lost part of a sample; resynchronise on the next ODT 0.
+                    self.stats.lost += 1
+                    expected = 0
+                    if odt != 0:
+                        continue
+                offset = layout.odt_offsets[odt]
+                row[offset:offset + length - 1] = packet[1:]
+                self.stats.packets += 1
+                if odt == 0:
+                    row[:HOST_TIME_SIZE] = _F64.pack(wall_offset + time.perf_counter())
+                expected = odt + 1
+                if expected == n_odts:
+                    ring.commit()
+                    row = ring.producer_slot()
+                    expected = 0
+                continue
+            if pid == PID_ERR:
+                code = packet[1] if length > 1 else ErrCode.GENERIC
+                raise XcpError(f"DAQ: {error_name(code)}", code)
+            if pid == PID_RES and stopping:
+                return
+            if pid not in (PID_RES, PID_EV, PID_SERV):
+                raise XcpError(f"DAQ: unexpected PID 0x{pid:02X}")
+
+    def _write_manifest(self, output_dir: Path, writer: ColumnWriter) -> None:
+        columns = []
+        for name in writer.dtype.names:
+            entry = {"name": name, "file": writer.column_file(name),
+                     "dtype": writer.dtype.fields[name][0].str}
+            if name == "time":
+                entry["unit"] = "s"
+            elif name == "daq_timestamp":
+                entry["unit"] = "s"
+                entry["scale"] = self.daq_info.seconds_per_tick
+            else:
+                signal = next(s for s in self.signals if s.name == name)
+                entry["address"] = f"0x{signal.address:08X}"
+            columns.append(entry)
+        manifest = {
+            "samples": writer.rows,
+            "event_channel": self.event,
+            "prescaler": self.prescaler,
+            "odts": len(self.layout.odts),
+            "lost_samples": self.stats.lost,
+            "ctr_lost_packets": self.master.transport.stats.lost,
+            "ring_overruns": self.stats.overruns,
+            "columns": columns,
+        }
+        (output_dir / "recording.json").write_text(json.dumps(manifest, indent=2) + "\n")
+
+
+# -- polling baseline --------------------------------------------------------
+
+
+def poll(master: XcpMaster, signals: Sequence[Signal], output: Path,
+         duration: float, period: float = 0.0) -> RecordingStats:
+    """SHORT_UPLOAD every signal once per sample and write a CSV file."""
+    order = master.info.byte_order
+    codes = [struct.Struct(order + _STRUCT_CODES[SIGNAL_TYPES[s.type][1]]) for s in signals]
+    stats = RecordingStats()
+    start = time.perf_counter()
+    with open(output, "w", newline="") as fh:
+        out = csv.writer(fh)
+        out.writerow(["time"] + [s.name for s in signals])
+        while time.perf_counter() - start < duration:
+            t = time.time()
+            row = [f"{t:.6f}"]
+            for signal, code in zip(signals, codes):
+                row.append(code.unpack(master.short_upload(signal.address, signal.size))[0])
+            out.writerow(row)
+            stats.samples += 1
+            if period:
+                time.sleep(max(0.0, period - (time.perf_counter() - start) % period))
+    stats.seconds = time.perf_counter() - start
+    return stats
+
+
+# -- command line ------------------------------------------------------------
+
+
+def build_arg_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Measure VCU signals over XCP-on-Ethernet")
+    parser.add_argument("--host", required=True, help="ECU IP address")
+    parser.add_argument("--port", type=int, default=XCP_TCP_DEFAULT_PORT)
+    parser.add_argument("--protocol", choices=("tcp", "udp"), default="tcp")
+    parser.add_argument("--timeout", type=float, default=2.0)
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("info", help="print CONNECT and DAQ processor information")
+
+    def add_signal_args(p: argparse.ArgumentParser) -> None:
+        p.add_argument("--signal", dest="signals", type=parse_signal, action="append",
+                       default=[], metavar="NAME@ADDR:TYPE")
+        p.add_argument("--signals-file", type=Path, help="CSV with name,address,type rows")
+        p.add_argument("--param", dest="params", action="append", default=[],
+                       metavar="NAME[INDEX]",
+                       help="calibration parameter from the --platform map index")
+        p.add_argument("--platform", choices=("S32K344", "S32K348"),
+                       help="platform whose calibration map resolves --param")
+        p.add_argument("--duration", type=float, default=10.0, help="seconds to record")
+
+    p_poll = sub.add_parser("poll", help="SHORT_UPLOAD polling to CSV (no DAQ needed)")
+    add_signal_args(p_poll)
+    p_poll.add_argument("--period", type=float, default=0.0, help="sample period in s")
+    p_poll.add_argument("-o", "--output", type=Path, required=True)
+
+    p_daq = sub.add_parser("daq", help="stream a DAQ list to column files")
+    add_signal_args(p_daq)
+    p_daq.add_argument("--event", type=int, default=0, help="ECU event channel")
+    p_daq.add_argument("--prescaler", type=int, default=1)
+    p_daq.add_argument("--ring-rows", type=int, default=DEFAULT_RING_ROWS)
+    p_daq.add_argument("--flush-interval", type=float, default=DEFAULT_FLUSH_INTERVAL)
+    p_daq.add_argument("--no-timestamp", action="store_true",
+                       help="do not request ECU timestamps in ODT 0")
+    p_daq.add_argument("-o", "--output-dir", type=Path, required=True)
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = build_arg_parser()
+    args = parser.parse_args(argv)
+    signals: List[Signal] = []
+    if args.command != "info":
+        try:
+            signals = list(args.signals)
+            if args.signals_file is not None:
+                signals += load_signals(args.signals_file)
+            if args.params:
+                if not args.platform:
+                    parser.error("--param needs --platform")
+                signals += resolve_parameters(args.params, args.platform)
+        except (OSError, ValueError, argparse.ArgumentTypeError) as exc:
+            parser.error(str(exc))
+        if not signals:
+            parser.error("give at least one --signal, --signals-file or --param")
+        if len({s.name for s in signals}) != len(signals):
+            parser.error("signal names must be unique")
+
+    try:
+        transport = open_transport(args.host, args.port, args.protocol, args.timeout)
+        with XcpMaster(transport) as master:
+            info = master.connect()
+            if args.command == "info":
+                print(f"MAX_CTO={info.max_cto} MAX_DTO={info.max_dto} "
+                      f"byte order={'big' if info.byte_order == '>' else 'little'}")
+                daq = master.get_daq_info()
+                print(f"MAX_DAQ={daq.max_daq} MAX_EVENT_CHANNEL={daq.max_event_channel} "
+                      f"timestamp={daq.timestamp_size} bytes x {daq.seconds_per_tick:g} s")
+                return 0
+            if args.command == "poll":
+                stats = poll(master, signals, args.output, args.duration, args.period)
+            else:
+                recorder = DaqRecorder(master, signals, args.event, args.prescaler,
+                                       args.ring_rows, not args.no_timestamp)
+                layout = recorder.configure()
+                print(f"{len(signals)} signals in {len(layout.odts)} ODT(s), "
+                      f"{layout.row_size} bytes per sample", file=sys.stderr)
+                try:
+                    stats = recorder.record(args.output_dir, args.duration,
+                                            args.flush_interval)
+                except KeyboardInterrupt:
+                    return 130
+    except (OSError, ValueError, XcpError) as exc:
+        print(f"error: {exc}", file=sys.stderr)
+        return 1
+
+    print(f"{stats.samples} samples in {stats.seconds:.2f} s ({stats.rate:.0f} Hz), "
+          f"lost {stats.lost}, overruns {stats.overruns}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
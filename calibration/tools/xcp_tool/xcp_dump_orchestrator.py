@@ -0,0 +1,270 @@
+#!/usr/bin/env python3
+"""Dump many VCUs in parallel from one asyncio event loop.
+
+Each ECU gets its own XCP session (TCP or UDP) with its own UPLOAD window,
+so a slow or failing ECU never stalls the others.  Upload buffers are
+drawn from a shared byte budget and streamed to disk chunk by chunk, which
+bounds total memory regardless of rack size.  A periodic line on stderr
+reports aggregate progress and throughput.
+
+Targets are given as ``NAME=PROTO://HOST:PORT`` (``PROTO`` is ``tcp`` or
+``udp``; ``NAME=`` and ``PROTO://`` are optional).
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import os
+import re
+import sys
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import List, Optional, Sequence
+
+_CALIB_LIB = Path(__file__).resolve().parents[3] / "tools" / "calibration"
+if str(_CALIB_LIB) not in sys.path:
+    sys.path.insert(0, str(_CALIB_LIB))
+
+from ethernet_xcp_adapter import (  # noqa: E402
+    XCP_TCP_DEFAULT_PORT,
+    AsyncXcpMaster,
+    XcpError,
+    open_async_transport,
+)
+from xcp_memory_dump import DEFAULT_WINDOW, MemoryRange, parse_range  # noqa: E402
+from xcp_transfer_plan import PlanError, add_plan_arguments, plan_from_args  # noqa: E402
+
+DEFAULT_CHUNK = 256 * 1024
+DEFAULT_BUDGET = 64 * 1024 * 1024
+
+_TARGET_RE = re.compile(r"^(?:(?P<name>[^=]+)=)?(?:(?P<proto>tcp|udp)://)?"
+                        r"(?P<host>[^:]+)(?::(?P<port>\d+))?$")
+
+
+@dataclass(frozen=True)
+class EcuTarget:
+    name: str
+    host: str
+    port: int = XCP_TCP_DEFAULT_PORT
+    protocol: str = "tcp"
+
+    def __str__(self) -> str:
+        return f"{self.name}={self.protocol}://{self.host}:{self.port}"
+
+
+def parse_target(text: str) -> EcuTarget:
+    match = _TARGET_RE.match(text.strip())
+    if match is None:
+        raise argparse.ArgumentTypeError(f"invalid target {text!r}")
+    host = match["host"]
+    port = int(match["port"] or XCP_TCP_DEFAULT_PORT)
+    name = match["name"] or f"{host}_{port}"
+    return EcuTarget(name, host, port, match["proto"] or "tcp")
+
+
+def parse_size(text: str) -> int:
+    """Parse ``4096``, ``0x1000``, ``256K`` or ``64M``."""
+    text = text.strip()
+    scale = {"K": 1024, "M": 1024 * 1024}.get(text[-1:].upper(), 1)
+    if scale != 1:
+        text = text[:-1]
+    try:
+        return int(text, 0) * scale
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid size {text!r}")
+
+
+class ByteBudget:
+    """Caps the bytes of upload buffers alive across all sessions."""
+
+    def __init__(self, limit: int) -> None:
+        self.limit = limit
+        self.used = 0
+        self._cond = asyncio.Condition()
+
+    async def acquire(self, size: int) -> None:
+        if size > self.limit:
+            raise ValueError(f"chunk of {size} bytes exceeds budget of {self.limit}")
+        async with self._cond:
+            await self._cond.wait_for(lambda: self.used + size <= self.limit)
+            self.used += size
+
+    async def release(self, size: int) -> None:
+        async with self._cond:
+            self.used -= size
+            self._cond.notify_all()
+
+
+@dataclass
+class SessionProgress:
+    target: EcuTarget
+    total: int
+    done: int = 0
+    status: str = "pending"
+    error: str = ""
+    started: float = 0.0
+    finished: float = 0.0
+
+    @property
+    def mb_per_s(self) -> float:
+        end = self.finished or time.perf_counter()
+        elapsed = end - self.started if self.started else 0.0
+        return self.done / elapsed / 1e6 if elapsed > 0 else 0.0
+
+
+class DumpOrchestrator:
+    def __init__(self, ranges: Sequence[MemoryRange], output_dir: Path,
+                 window: int = DEFAULT_WINDOW, chunk_size: int = DEFAULT_CHUNK,
+                 memory_budget: int = DEFAULT_BUDGET, max_sessions: int = 16,
+                 timeout: float = 2.0) -> None:
+        self.ranges = list(ranges)
+        self.output_dir = Path(output_dir)
+        self.window = window
+        self.chunk_size = min(chunk_size, memory_budget)
+        self.memory_budget = memory_budget
+        self.max_sessions = max_sessions
+        self.timeout = timeout
+        self.sessions: List[SessionProgress] = []
+
+    async def run(self, targets: Sequence[EcuTarget],
+                  progress_interval: float = 1.0) -> List[SessionProgress]:
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        total = sum(r.length for r in self.ranges)
+        self.sessions = [SessionProgress(t, total) for t in targets]
+        self._budget = ByteBudget(self.memory_budget)
+        self._slots = asyncio.Semaphore(self.max_sessions)
+        self._start = time.perf_counter()
+        reporter = asyncio.create_task(self._report(progress_interval))
+        try:
+            await asyncio.gather(*(self._dump_one(s) for s in self.sessions))
+        finally:
+            reporter.cancel()
+        return self.sessions
+
+    async def _dump_one(self, progress: SessionProgress) -> None:
+        target = progress.target
+        path = self.output_dir / f"{target.name}.bin"
+        tmp = path.with_name(path.name + ".part")
+        loop = asyncio.get_running_loop()
+        async with self._slots:
+            progress.status = "connecting"
+            try:
+                transport = await open_async_transport(target.host, target.port,
+                                                       target.protocol, self.timeout)
+                async with AsyncXcpMaster(transport) as master:
+                    await master.connect()
+                    progress.status = "uploading"
+                    progress.started = time.perf_counter()
+                    with open(tmp, "wb") as fh:
+                        for rng in self.ranges:
+                            await self._dump_range(master, rng, fh, progress, loop)
+                os.replace(tmp, path)
+                progress.status = "done"
+            except (OSError, XcpError, asyncio.TimeoutError) as exc:
+                progress.status = "failed"
+                progress.error = str(exc) or type(exc).__name__
+                try:
+                    tmp.unlink(missing_ok=True)
+                except OSError:
+                    pass
+            finally:
+                progress.finished = time.perf_counter()
+
+    async def _dump_range(self, master: AsyncXcpMaster, rng: MemoryRange, fh,
+                          progress: SessionProgress, loop) -> None:
+        for offset in range(0, rng.length, self.chunk_size):
+            size = min(self.chunk_size, rng.length - offset)
+            await self._budget.acquire(size)
+            try:
+                buf = bytearray(size)
+                await master.upload_into(rng.address + offset, memoryview(buf), self.window)
+                await loop.run_in_executor(None, fh.write, buf)
+            finally:
+                await self._budget.release(size)
+            progress.done += size
+
+    def _status_line(self) -> str:
+        done = sum(s.done for s in self.sessions)
+        total = sum(s.total for s in self.sessions)
+        elapsed = time.perf_counter() - self._start
+        states = {}
+        for s in self.sessions:
+            states[s.status] = states.get(s.status, 0) + 1
+        state_text = " ".join(f"{k}={v}" for k, v in sorted(states.items()))
+        pct = 100.0 * done / total if total else 100.0
+        rate = done / elapsed / 1e6 if elapsed > 0 else 0.0
+        return (f"[{pct:5.1f}%] {done / 1e6:.1f}/{total / 1e6:.1f} MB "
+                f"{rate:.2f} MB/s  {state_text}")
+
+    async def _report(self, interval: float) -> None:
+        while True:
+            await asyncio.sleep(interval)
+            print(self._status_line(), file=sys.stderr)
+
+
+def print_summary(sessions: Sequence[SessionProgress]) -> None:
+    print(f"{'ECU':<20}{'status':<10}{'bytes':>12}{'MB/s':>9}  detail")
+    for s in sessions:
+        print(f"{s.target.name:<20}{s.status:<10}{s.done:>12}{s.mb_per_s:>9.2f}  {s.error}")
+    done = sum(s.done for s in sessions)
+    span = (max((s.finished for s in sessions), default=0.0)
+            - min((s.started for s in sessions if s.started), default=0.0))
+    if span > 0:
+        print(f"aggregate: {done / 1e6:.1f} MB in {span:.2f} s ({done / span / 1e6:.2f} MB/s)")
+
+
+def build_arg_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Dump many VCUs in parallel over XCP")
+    parser.add_argument("--ecu", dest="targets", type=parse_target, action="append",
+                        default=[], metavar="[NAME=][tcp|udp://]HOST[:PORT]")
+    parser.add_argument("--targets-file", type=Path,
+                        help="file with one target per line (# comments allowed)")
+    parser.add_argument("--range", dest="ranges", type=parse_range, action="append",
+                        default=[], metavar="ADDR:LEN")
+    parser.add_argument("--output-dir", type=Path, required=True)
+    parser.add_argument("--window", type=int, default=DEFAULT_WINDOW,
+                        help="outstanding UPLOADs per session")
+    parser.add_argument("--chunk-size", type=parse_size, default=DEFAULT_CHUNK)
+    parser.add_argument("--memory-budget", type=parse_size, default=DEFAULT_BUDGET,
+                        help="upper bound on upload buffers across all sessions")
+    parser.add_argument("--max-sessions", type=int, default=16)
+    parser.add_argument("--timeout", type=float, default=2.0)
+    parser.add_argument("--progress-interval", type=float, default=1.0)
+    add_plan_arguments(parser)
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = build_arg_parser()
+    args = parser.parse_args(argv)
+    targets = list(args.targets)
+    try:
+        if args.targets_file is not None:
+            for line in args.targets_file.read_text().splitlines():
+                line = line.split("#", 1)[0].strip()
+                if line:
+                    targets.append(parse_target(line))
+        plan = plan_from_args(args)
+    except (OSError, PlanError, argparse.ArgumentTypeError) as exc:
+        parser.error(str(exc))
+    if plan is not None:
+        args.ranges += [MemoryRange(t.address, t.length) for t in plan.transfers]
+    if not targets:
+        parser.error("give at least one --ecu or --targets-file")
+    if not args.ranges:
+        parser.error("give at least one --range, --plan or --linker-script")
+    if len({t.name for t in targets}) != len(targets):
+        parser.error("target names must be unique")
+
+    orchestrator = DumpOrchestrator(args.ranges, args.output_dir, args.window,
+                                    args.chunk_size, args.memory_budget,
+                                    args.max_sessions, args.timeout)
+    sessions = asyncio.run(orchestrator.run(targets, args.progress_interval))
+    print_summary(sessions)
+    return 0 if all(s.status == "done" for s in sessions) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,562 @@
+#!/usr/bin/env python3
+"""Program VCU flash over XCP-on-Ethernet.
+
+The image is clipped to the programmable windows of a transfer plan (see
+``xcp_transfer_plan.py``) so nothing outside the linker-script flash
+regions is ever erased.  All touched sectors are erased, the data is
+written and then verified with BUILD_CHECKSUM.
+
+The default path uses what PROGRAM_START negotiates: PROGRAM_MAX or
+master block mode (PROGRAM + PROGRAM_NEXT, honouring MAX_BS_PGM and
+MIN_ST_PGM), whichever moves more bytes per response, with up to
+QUEUE_SIZE_PGM requests outstanding in interleaved mode.  In that mode the
+erase of the next sector is queued ahead of the current sector's data, so
+a slave that erases in the background overlaps the two.  ``--sequential``
+keeps the one-PROGRAM-per-round-trip reference path.
+
+With ``--delta`` every sector the image touches is BUILD_CHECKSUMmed on
+the target first and compared with the CRC of the sector as it would look
+after flashing (image data over erased 0xFF); only differing sectors are
+erased and programmed, and the whole image is verified at the end.
+
+Images (raw, Intel HEX, S-record or ELF) go through the preprocessed image
+cache of ``xcp_image_cache.py``, so repeated runs with the same file skip
+parsing and use the precomputed per-sector CRCs.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+import time
+import zlib
+from collections import deque
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Deque, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+_CALIB_LIB = Path(__file__).resolve().parents[3] / "tools" / "calibration"
+if str(_CALIB_LIB) not in sys.path:
+    sys.path.insert(0, str(_CALIB_LIB))
+
+from ethernet_xcp_adapter import (  # noqa: E402
+    XCP_TCP_DEFAULT_PORT,
+    ChecksumType,
+    Cmd,
+    ProgramInfo,
+    XcpError,
+    XcpMaster,
+    open_transport,
+)
+from xcp_image_cache import (  # noqa: E402
+    DEFAULT_IMAGE_CACHE,
+    FlashImage,
+    ImageError,
+    load_image,
+)
+from xcp_snapshot import SnapshotError  # noqa: E402
+from xcp_transfer_plan import (  # noqa: E402
+    PlanError,
+    TransferPlan,
+    add_plan_arguments,
+    plan_from_args,
+)
+
+DEFAULT_SECTOR_SIZE = 0x2000  # S32K3 code flash sector
+DEFAULT_WINDOW = 16
+VERIFY_BLOCK = 0x10000
+ERASED = 0xFF
+
+# One request unit: the command it answers to and the packets that make it up.
+Unit = Tuple[int, List[bytes]]
+
+
+@dataclass
+class FlashSegment:
+    address: int
+    data: bytes
+
+    @property
+    def end(self) -> int:
+        return self.address + len(self.data)
+
+
+def image_segments(image: FlashImage) -> List[FlashSegment]:
+    return [FlashSegment(address, data) for address, data in image.segments]
+
+
+def clip_to_plan(segments: Sequence[FlashSegment],
+                 plan: TransferPlan) -> List[FlashSegment]:
+    """Split segments along the plan's windows; data outside them is an error."""
+    windows = sorted((t.address, t.end) for t in plan.transfers)
+    clipped = []
+    for seg in segments:
+        covered = 0
+        for start, end in windows:
+            lo, hi = max(start, seg.address), min(end, seg.end)
+            if lo < hi:
+                clipped.append(FlashSegment(lo, seg.data[lo - seg.address:hi - seg.address]))
+                covered += hi - lo
+        if covered != len(seg.data):
+            raise PlanError(f"image data at 0x{seg.address:08X}..0x{seg.end - 1:08X} "
+                            "lies outside the programmable regions")
+    return clipped
+
+
+def sector_spans(segments: Sequence[FlashSegment], sector_size: int) -> List[Tuple[int, int]]:
+    """Merged, sector-aligned ``(address, size)`` spans covering all segments."""
+    spans: List[Tuple[int, int]] = []
+    for seg in sorted(segments, key=lambda s: s.address):
+        start = seg.address // sector_size * sector_size
+        end = -(-seg.end // sector_size) * sector_size
+        if spans and start <= spans[-1][0] + spans[-1][1]:
+            prev_start, prev_size = spans[-1]
+            spans[-1] = (prev_start, max(prev_start + prev_size, end) - prev_start)
+        else:
+            spans.append((start, end - start))
+    return spans
+
+
+def sector_pieces(segments: Sequence[FlashSegment],
+                  sector_size: int) -> Dict[int, List[Tuple[int, memoryview, bool]]]:
+    """Segment data cut at sector boundaries, keyed by sector address.
+
+    Each piece is ``(address, data, ends_segment)``.
+    """
+    pieces: Dict[int, List[Tuple[int, memoryview, bool]]] = {}
+    for seg in sorted(segments, key=lambda s: s.address):
+        view = memoryview(seg.data)
+        address = seg.address
+        while address < seg.end:
+            sector = address // sector_size * sector_size
+            end = min(sector + sector_size, seg.end)
+            pieces.setdefault(sector, []).append(
+                (address, view[address - seg.address:end - seg.address], end == seg.end))
+            address = end
+    return pieces
+
+
+def expected_sectors(segments: Sequence[FlashSegment],
+                     sector_size: int) -> Dict[int, bytearray]:
+    """Sector contents after erase + program: image data over 0xFF."""
+    sectors: Dict[int, bytearray] = {}
+    for sector, pieces in sector_pieces(segments, sector_size).items():
+        content = sectors[sector] = bytearray((ERASED,)) * sector_size
+        for address, data, _ in pieces:
+            content[address - sector:address - sector + len(data)] = data
+    return sectors
+
+
+def clip_to_sectors(segments: Sequence[FlashSegment], sectors: Iterable[int],
+                    sector_size: int) -> List[FlashSegment]:
+    """The parts of ``segments`` that fall into the given sectors."""
+    spans = sector_spans([FlashSegment(s, b"\0" * sector_size) for s in sectors],
+                         sector_size)
+    clipped = []
+    for seg in segments:
+        for start, size in spans:
+            lo, hi = max(start, seg.address), min(start + size, seg.end)
+            if lo < hi:
+                clipped.append(FlashSegment(lo, seg.data[lo - seg.address:hi - seg.address]))
+    return clipped
+
+
+@dataclass
+class FlashStats:
+    bytes: int = 0
+    erase_s: float = 0.0
+    program_s: float = 0.0
+    verify_s: float = 0.0
+    compare_s: float = 0.0
+    packets: int = 0
+    responses: int = 0
+    method: str = "PROGRAM"
+    window: int = 1
+    overlapped: bool = False
+    sectors_total: int = 0
+    sectors_changed: int = 0
+
+    @property
+    def total_s(self) -> float:
+        return self.compare_s + self.erase_s + self.program_s + self.verify_s
+
+    @property
+    def mb_per_s(self) -> float:
+        """Write throughput over erase + program time."""
+        busy = self.erase_s + self.program_s
+        return self.bytes / busy / 1e6 if busy > 0 else 0.0
+
+    def as_dict(self) -> dict:
+        return dict(asdict(self), total_s=self.total_s, mb_per_s=self.mb_per_s)
+
+    def summary(self) -> str:
+        erase = "overlapped with program" if self.overlapped else f"{self.erase_s:.2f} s"
+        delta = ""
+        if self.sectors_total:
+            delta = (f"delta {self.sectors_changed}/{self.sectors_total} sectors, "
+                     f"compare {self.compare_s:.2f} s, ")
+        return (f"programmed {self.bytes} bytes in {self.total_s:.2f} s "
+                f"({self.mb_per_s:.2f} MB/s, {self.method}, window {self.window}): "
+                f"{delta}erase {erase}, program {self.program_s:.2f} s, "
+                f"verify {self.verify_s:.2f} s")
+
+
+class FlashProgrammer:
+    def __init__(self, master: XcpMaster, sector_size: int = DEFAULT_SECTOR_SIZE,
+                 window: int = DEFAULT_WINDOW, use_program_max: bool = True,
+                 overlap_erase: bool = True) -> None:
+        self.master = master
+        self.sector_size = sector_size
+        self.window = window
+        self.use_program_max = use_program_max
+        self.overlap_erase = overlap_erase
+        self.stats = FlashStats()
+
+    # -- sequential reference path ---------------------------------------
+
+    def erase(self, segments: Sequence[FlashSegment]) -> None:
+        start = time.perf_counter()
+        spans = sector_spans(segments, self.sector_size)
+        for address, size in spans:
+            self.master.set_mta(address)
+            self.master.program_clear(size)
+        for address, size in spans:
+            # Answered once the flash controller has finished the erase.
+            self.master.set_mta(address + size - 1)
+            self.master.build_checksum(1)
+        self.stats.erase_s += time.perf_counter() - start
+
+    def write(self, segments: Sequence[FlashSegment], max_cto_pgm: int) -> None:
+        start = time.perf_counter()
+        chunk = max_cto_pgm - 2
+        for seg in segments:
+            self.master.set_mta(seg.address)
+            for offset in range(0, len(seg.data), chunk):
+                self.master.program(seg.data[offset:offset + chunk])
+            self.master.program(b"")
+            self.stats.bytes += len(seg.data)
+        self.stats.program_s += time.perf_counter() - start
+
+    # -- pipelined path ----------------------------------------------------
+
+    def _set_mta_unit(self, address: int) -> Unit:
+        return Cmd.SET_MTA, [bytes((Cmd.SET_MTA, 0, 0, 0)) + self.master.pack_u32(address)]
+
+    def _clear_unit(self, size: int) -> Unit:
+        return Cmd.PROGRAM_CLEAR, [bytes((Cmd.PROGRAM_CLEAR, 0, 0, 0))
+                                   + self.master.pack_u32(size)]
+
+    def _erased_units(self, spans: Iterable[Tuple[int, int]]) -> List[Unit]:
+        """Checksum the last byte of each span, answered once its erase is done.
+
+        A slave may acknowledge PROGRAM_CLEAR before the flash controller has
+        finished; waiting here keeps the erase time out of the program phase.
+        """
+        units: List[Unit] = []
+        for address, size in spans:
+            units += [self._set_mta_unit(address + size - 1),
+                      (Cmd.BUILD_CHECKSUM, [bytes((Cmd.BUILD_CHECKSUM, 0, 0, 0))
+                                            + self.master.pack_u32(1)])]
+        return units
+
+    def _use_block_mode(self, pgm: ProgramInfo) -> bool:
+        # A block costs one packet per MAX_CTO_PGM-2 bytes; only worth it
+        # when it saves responses over single-packet requests.
+        if self.use_program_max:
+            return pgm.block_size >= 2 * (pgm.max_cto_pgm - 1)
+        return pgm.block_size > pgm.max_cto_pgm - 2
+
+    def program_units(self, data: memoryview, pgm: ProgramInfo) -> Iterator[Unit]:
+        """Split ``data`` into requests that each draw one response."""
+        max_chunk = pgm.max_cto_pgm - 2
+        full = pgm.max_cto_pgm - 1
+        block = pgm.block_size
+        offset = 0
+        if self._use_block_mode(pgm):
+            while offset < len(data):
+                remaining = min(block, len(data) - offset)
+                packets = []
+                cmd = Cmd.PROGRAM
+                while remaining:
+                    part = min(remaining, max_chunk)
+                    packets.append(bytes((cmd, remaining)) + data[offset:offset + part])
+                    cmd = Cmd.PROGRAM_NEXT
+                    offset += part
+                    remaining -= part
+                yield Cmd.PROGRAM, packets
+            return
+        if self.use_program_max:
+            while len(data) - offset >= full:
+                yield Cmd.PROGRAM_MAX, [bytes((Cmd.PROGRAM_MAX,)) + data[offset:offset + full]]
+                offset += full
+        while offset < len(data):
+            part = min(max_chunk, len(data) - offset)
+            yield Cmd.PROGRAM, [bytes((Cmd.PROGRAM, part)) + data[offset:offset + part]]
+            offset += part
+
+    def _method(self, pgm: ProgramInfo) -> str:
+        if self._use_block_mode(pgm):
+            return f"master block mode ({pgm.block_size} B/block)"
+        return "PROGRAM_MAX" if self.use_program_max else "PROGRAM"
+
+    def run_units(self, units: Iterable[Unit], window: int, min_st: float = 0.0) -> None:
+        """Issue units with up to ``window`` outstanding; responses match FIFO."""
+        transport = self.master.transport
+        pending: Deque[int] = deque()
+        batch: List[bytes] = []
+
+        def flush() -> None:
+            if min_st:
+                for packet in batch:
+                    transport.send(packet)
+                    time.sleep(min_st)
+            elif batch:
+                transport.send_many(batch)
+            batch.clear()
+
+        for cmd, packets in units:
+            batch.extend(packets)
+            pending.append(cmd)
+            self.stats.packets += len(packets)
+            if len(pending) >= window:
+                flush()
+                self.master.recv_response(pending.popleft())
+                self.stats.responses += 1
+        flush()
+        while pending:
+            self.master.recv_response(pending.popleft())
+            self.stats.responses += 1
+
+    def _segment_units(self, address: int, data: memoryview, ends_segment: bool,
+                       pgm: ProgramInfo) -> Iterator[Unit]:
+        yield self._set_mta_unit(address)
+        yield from self.program_units(data, pgm)
+        if ends_segment:
+            yield Cmd.PROGRAM, [bytes((Cmd.PROGRAM, 0))]
+
+    def erase_pipelined(self, segments: Sequence[FlashSegment], window: int) -> None:
+        start = time.perf_counter()
+        spans = sector_spans(segments, self.sector_size)
+        units: List[Unit] = []
+        for address, size in spans:
+            units += [self._set_mta_unit(address), self._clear_unit(size)]
+        self.run_units(units + self._erased_units(spans), window)
+        self.stats.erase_s += time.perf_counter() - start
+
+    def write_pipelined(self, segments: Sequence[FlashSegment], pgm: ProgramInfo,
+                        window: int) -> None:
+        start = time.perf_counter()
+        for seg in segments:
+            self.run_units(self._segment_units(seg.address, memoryview(seg.data), True, pgm),
+                           window, pgm.min_separation)
+            self.stats.bytes += len(seg.data)
+        self.stats.program_s += time.perf_counter() - start
+
+    def write_overlapped(self, segments: Sequence[FlashSegment], pgm: ProgramInfo,
+                         window: int) -> None:
+        """Erase sector N+1 while sector N is programmed.
+
+        Only the first sector's erase is timed as the erase phase; the rest
+        runs inside the program phase.
+        """
+        pieces = sector_pieces(segments, self.sector_size)
+        sectors = sorted(pieces)
+        start = time.perf_counter()
+        self.run_units([self._set_mta_unit(sectors[0]), self._clear_unit(self.sector_size)]
+                       + self._erased_units([(sectors[0], self.sector_size)]), window)
+        self.stats.erase_s += time.perf_counter() - start
+
+        def units() -> Iterator[Unit]:
+            for index, sector in enumerate(sectors):
+                if index + 1 < len(sectors):
+                    yield self._set_mta_unit(sectors[index + 1])
+                    yield self._clear_unit(self.sector_size)
+                for address, data, ends_segment in pieces[sector]:
+                    yield from self._segment_units(address, data, ends_segment, pgm)
+
+        start = time.perf_counter()
+        self.run_units(units(), window, pgm.min_separation)
+        self.stats.bytes += sum(len(seg.data) for seg in segments)
+        self.stats.program_s += time.perf_counter() - start
+        self.stats.overlapped = True
+
+    # -- verification --------------------------------------------------------
+
+    def verify(self, segments: Sequence[FlashSegment], window: int = 1) -> None:
+        """BUILD_CHECKSUM in VERIFY_BLOCK pieces, falling back to read-back."""
+        start = time.perf_counter()
+        for seg in segments:
+            blocks = [(offset, min(VERIFY_BLOCK, len(seg.data) - offset))
+                      for offset in range(0, len(seg.data), VERIFY_BLOCK)]
+            self.master.set_mta(seg.address)
+            results = self._checksums([size for _, size in blocks], window)
+            for (offset, size), (checksum_type, value) in zip(blocks, results):
+                data = seg.data[offset:offset + size]
+                if checksum_type == ChecksumType.CRC_32:
+                    ok = value == zlib.crc32(data)
+                else:
+                    self.master.set_mta(seg.address + offset)
+                    ok = self.master.upload_block(size) == data
+                if not ok:
+                    raise XcpError(f"verify failed at 0x{seg.address + offset:08X}")
+        self.stats.verify_s += time.perf_counter() - start
+
+    def _checksums(self, sizes: Sequence[int], window: int) -> List[Tuple[int, int]]:
+        """Pipelined BUILD_CHECKSUM over consecutive blocks from the MTA."""
+        master = self.master
+        results = []
+        pending = 0
+        for index, size in enumerate(sizes):
+            master.transport.send(bytes((Cmd.BUILD_CHECKSUM, 0, 0, 0)) + master.pack_u32(size))
+            pending += 1
+            if pending >= window or index == len(sizes) - 1:
+                while pending:
+                    res = master.recv_response(Cmd.BUILD_CHECKSUM)
+                    results.append((res[1], master.unpack_u32(res, 4)))
+                    pending -= 1
+        return results
+
+    # -- delta programming -------------------------------------------------
+
+    def changed_sectors(self, segments: Sequence[FlashSegment], window: int,
+                        sector_crcs: Optional[Dict[int, int]] = None) -> Optional[List[int]]:
+        """Sectors whose target CRC differs from the flashed image's.
+
+        ``sector_crcs`` are precomputed expected CRCs (from the image cache);
+        without them they are computed here.  Returns None when the slave's
+        checksum is not CRC-32, in which case the caller has to fall back to
+        a full flash.
+        """
+        start = time.perf_counter()
+        if sector_crcs is None:
+            sector_crcs = {sector: zlib.crc32(content) for sector, content
+                           in expected_sectors(segments, self.sector_size).items()}
+        changed = []
+        for address, size in sector_spans(segments, self.sector_size):
+            sectors = range(address, address + size, self.sector_size)
+            self.master.set_mta(address)
+            results = self._checksums([self.sector_size] * len(sectors), window)
+            for sector, (checksum_type, value) in zip(sectors, results):
+                if checksum_type != ChecksumType.CRC_32:
+                    self.stats.compare_s += time.perf_counter() - start
+                    return None
+                if value != sector_crcs[sector]:
+                    changed.append(sector)
+        self.stats.sectors_total = len(sector_crcs)
+        self.stats.sectors_changed = len(changed)
+        self.stats.compare_s += time.perf_counter() - start
+        return changed
+
+    def flash(self, segments: Sequence[FlashSegment], verify: bool = True,
+              sequential: bool = False, delta: bool = False,
+              sector_crcs: Optional[Dict[int, int]] = None) -> FlashStats:
+        targets = list(segments)
+        if delta:
+            changed = self.changed_sectors(segments, self.master.pipeline_window(self.window),
+                                           sector_crcs)
+            if changed is not None:
+                targets = clip_to_sectors(segments, changed, self.sector_size)
+                if not targets:
+                    # The compare already checked every sector's CRC.
+                    return self.stats
+
+        pgm = self.master.program_start()
+        if sequential:
+            self.erase(targets)
+            self.write(targets, pgm.max_cto_pgm)
+            window = 1
+        else:
+            window = pgm.pipeline_window(self.window)
+            self.stats.method = self._method(pgm)
+            self.stats.window = window
+            if self.overlap_erase and window > 1 and targets:
+                self.write_overlapped(targets, pgm, window)
+            else:
+                self.erase_pipelined(targets, window)
+                self.write_pipelined(targets, pgm, window)
+        if verify:
+            # Checksums are not programming commands, so the normal
+            # interleaved queue size applies.
+            self.verify(segments, window and self.master.pipeline_window(window))
+        self.master.program_reset()
+        return self.stats
+
+
+def build_arg_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Program VCU flash over XCP-on-Ethernet")
+    parser.add_argument("--host", required=True, help="ECU IP address")
+    parser.add_argument("--port", type=int, default=XCP_TCP_DEFAULT_PORT)
+    parser.add_argument("--protocol", choices=("tcp", "udp"), default="tcp")
+    parser.add_argument("--timeout", type=float, default=5.0)
+    parser.add_argument("--image", type=Path, required=True,
+                        help="raw binary, Intel HEX, S-record or ELF image")
+    parser.add_argument("--base", type=lambda v: int(v, 0), default=0x00400000,
+                        help="load address of a raw binary image")
+    parser.add_argument("--image-cache", type=Path, default=DEFAULT_IMAGE_CACHE)
+    parser.add_argument("--no-image-cache", action="store_true",
+                        help="parse the image without reading or writing the cache")
+    parser.add_argument("--sector-size", type=lambda v: int(v, 0),
+                        default=DEFAULT_SECTOR_SIZE)
+    parser.add_argument("--no-verify", action="store_true")
+    parser.add_argument("--window", type=int, default=DEFAULT_WINDOW,
+                        help="outstanding programming requests (interleaved mode)")
+    parser.add_argument("--sequential", action="store_true",
+                        help="one PROGRAM per round trip (reference path)")
+    parser.add_argument("--no-program-max", action="store_true",
+                        help="do not use PROGRAM_MAX")
+    parser.add_argument("--no-erase-overlap", action="store_true",
+                        help="erase all sectors before programming")
+    parser.add_argument("--delta", action="store_true",
+                        help="only erase and program sectors whose checksum differs")
+    parser.add_argument("--stats-json", type=Path,
+                        help="write per-phase timing and throughput as JSON")
+    add_plan_arguments(parser)
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = build_arg_parser()
+    args = parser.parse_args(argv)
+    try:
+        image = load_image(args.image, args.sector_size, args.base,
+                           None if args.no_image_cache else args.image_cache)
+    except (OSError, ImageError, SnapshotError) as exc:
+        print(f"error: {exc}", file=sys.stderr)
+        return 1
+
+    with image:
+        try:
+            segments = image_segments(image)
+            plan = plan_from_args(args)
+            if plan is not None:
+                segments = clip_to_plan(segments, plan)
+        except (OSError, PlanError) as exc:
+            print(f"error: {exc}", file=sys.stderr)
+            return 1
+
+        try:
+            transport = open_transport(args.host, args.port, args.protocol, args.timeout)
+            with XcpMaster(transport) as master:
+                master.connect()
+                programmer = FlashProgrammer(master, args.sector_size, args.window,
+                                             use_program_max=not args.no_program_max,
+                                             overlap_erase=not args.no_erase_overlap)
+                # Cached CRCs describe the whole image; after clipping to a
+                # plan they no longer match, so let delta mode recompute.
+                crcs = image.sector_crcs if plan is None else None
+                stats = programmer.flash(segments, verify=not args.no_verify,
+                                         sequential=args.sequential, delta=args.delta,
+                                         sector_crcs=crcs)
+            if args.stats_json is not None:
+                args.stats_json.write_text(json.dumps(stats.as_dict(), indent=2) + "\n")
+        except (OSError, XcpError) as exc:
+            print(f"error: {exc}", file=sys.stderr)
+            return 1
+
+    print(stats.summary(), file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,263 @@
+#!/usr/bin/env python3
+"""Preprocessed, content-addressed cache of flash images.
+
+Intel HEX, S-record, ELF and raw binary inputs are parsed once into a
+sector-aligned image: every sector the data touches is materialised with
+erased bytes (0xFF) around the data, and the CRC-32 of each sector as it
+will read after flashing is precomputed.  The result is stored as an
+``xcp_snapshot.py`` container named after the SHA-256 of the input file
+(plus the sector size and base address), so later runs only hash the input
+and mmap the cached file.
+
+Cached metadata::
+
+    source        input file name and SHA-256
+    sector_size   sector size the image was aligned to
+    segments      [[address, length], ...] extents of real image data
+    sector_crcs   {"0xADDRESS": crc32, ...} for every touched sector
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import os
+import struct
+import sys
+import tempfile
+import zlib
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+_CALIB_LIB = Path(__file__).resolve().parents[3] / "tools" / "calibration"
+if str(_CALIB_LIB) not in sys.path:
+    sys.path.insert(0, str(_CALIB_LIB))
+
+from hex_parser import (  # noqa: E402
+    HEX_SUFFIXES,
+    SREC_SUFFIXES,
+    HexParseError,
+    SegmentMap,
+    parse_bytes,
+)
+from xcp_snapshot import Snapshot, SnapshotError, SnapshotWriter  # noqa: E402
+
+CACHE_VERSION = 1
+DEFAULT_IMAGE_CACHE = Path.home() / ".cache" / "vcu_xcp" / "images"
+DEFAULT_SECTOR_SIZE = 0x2000  # S32K3 code flash sector
+ERASED = 0xFF
+
+Segment = Tuple[int, bytes]
+
+
+class ImageError(Exception):
+    """Raised for malformed image files."""
+
+
+# -- input formats -----------------------------------------------------------
+
+
+def parse_elf(data: bytes, path: Path = Path("<elf>")) -> List[Segment]:
+    """PT_LOAD segments at their load (physical) addresses."""
+    if data[:4] != b"\x7fELF" or len(data) < 52:
+        raise ImageError(f"{path}: not an ELF file")
+    is64 = data[4] == 2
+    order = "<" if data[5] == 1 else ">"
+    if is64:
+        phoff, = struct.unpack_from(order + "Q", data, 0x20)
+        phentsize, phnum = struct.unpack_from(order + "HH", data, 0x36)
+        layout = order + "IIQQQQQQ"  # type flags offset vaddr paddr filesz memsz align
+    else:
+        phoff, = struct.unpack_from(order + "I", data, 0x1C)
+        phentsize, phnum = struct.unpack_from(order + "HH", data, 0x2A)
+        layout = order + "IIIIIIII"  # type offset vaddr paddr filesz memsz flags align
+    chunks: List[Segment] = []
+    for index in range(phnum):
+        fields = struct.unpack_from(layout, data, phoff + index * phentsize)
+        if is64:
+            p_type, _, offset, _, paddr, filesz = fields[:6]
+        else:
+            p_type, offset, _, paddr, filesz = fields[:5]
+        if p_type == 1 and filesz:  # PT_LOAD; .bss (memsz only) is not flashed
+            if offset + filesz > len(data):
+                raise ImageError(f"{path}: program header {index} runs past end of file")
+            chunks.append((paddr, data[offset:offset + filesz]))
+    try:
+        return SegmentMap(chunks, str(path)).segments
+    except HexParseError as exc:
+        raise ImageError(str(exc)) from exc
+
+
+def image_format(path: Path, data: bytes) -> str:
+    """``elf``, ``hex``, ``srec`` or ``raw``, by content first, then extension."""
+    suffix = Path(path).suffix.lower()
+    if data[:4] == b"\x7fELF":
+        return "elf"
+    if suffix in HEX_SUFFIXES or data[:1] == b":":
+        return "hex"
+    if suffix in SREC_SUFFIXES or data[:2] == b"S0":
+        return "srec"
+    return "raw"
+
+
+def read_image(path: Path, data: Optional[bytes] = None,
+               base: Optional[int] = None) -> List[Segment]:
+    """Parse ``path`` by content/extension; raw binaries need ``base``."""
+    path = Path(path)
+    if data is None:
+        data = path.read_bytes()
+    fmt = image_format(path, data)
+    if fmt == "elf":
+        return parse_elf(data, path)
+    if fmt in ("hex", "srec"):
+        try:
+            return parse_bytes(data, fmt, str(path)).segments
+        except HexParseError as exc:
+            raise ImageError(str(exc)) from exc
+    if base is None:
+        raise ImageError(f"{path}: raw binary needs a load address (--base)")
+    return [(base, data)]
+
+
+# -- sector alignment --------------------------------------------------------
+
+
+def sector_align(segments: Sequence[Segment],
+                 sector_size: int) -> List[Tuple[int, bytearray]]:
+    """Merged sector-aligned spans holding the data over erased bytes."""
+    spans: List[Tuple[int, bytearray]] = []
+    for address, data in sorted(segments, key=lambda seg: seg[0]):
+        start = address // sector_size * sector_size
+        end = -(-(address + len(data)) // sector_size) * sector_size
+        if spans and start <= spans[-1][0] + len(spans[-1][1]):
+            span_start, buf = spans[-1]
+            if end > span_start + len(buf):
+                buf.extend(bytes((ERASED,)) * (end - span_start - len(buf)))
+        else:
+            spans.append((start, bytearray((ERASED,)) * (end - start)))
+        span_start, buf = spans[-1]
+        buf[address - span_start:address - span_start + len(data)] = data
+    return spans
+
+
+# -- cache -------------------------------------------------------------------
+
+
+class FlashImage:
+    """A cached, mmap-backed image; segment data are zero-copy views."""
+
+    def __init__(self, snapshot: Snapshot) -> None:
+        meta = snapshot.metadata
+        if meta.get("cache_version") != CACHE_VERSION:
+            raise SnapshotError(f"{snapshot.path}: stale image cache entry")
+        self.snapshot = snapshot
+        self.path = snapshot.path
+        self.sector_size: int = meta["sector_size"]
+        self.source: Dict[str, str] = meta["source"]
+        self.segments: List[Tuple[int, memoryview]] = [
+            (address, snapshot.read(address, length)) for address, length in meta["segments"]]
+        self.sector_crcs: Dict[int, int] = {
+            int(address, 16): crc for address, crc in meta["sector_crcs"].items()}
+
+    def __enter__(self) -> "FlashImage":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    @property
+    def size(self) -> int:
+        return sum(len(data) for _, data in self.segments)
+
+    def close(self) -> None:
+        for _, view in self.segments:
+            view.release()
+        self.segments = []
+        self.snapshot.close()
+
+
+def _cache_key(digest: str, sector_size: int, base: Optional[int]) -> str:
+    options = f"v{CACHE_VERSION}:{digest}:{sector_size:x}:{base if base is None else hex(base)}"
+    return hashlib.sha256(options.encode()).hexdigest()
+
+
+def build_image(path: Path, data: bytes, digest: str, out: Path, sector_size: int,
+                base: Optional[int] = None) -> None:
+    segments = read_image(path, data, base)
+    if not segments:
+        raise ImageError(f"{path}: no data records")
+    crcs = {}
+    metadata = {
+        "cache_version": CACHE_VERSION,
+        "source": {"name": Path(path).name, "sha256": digest},
+        "sector_size": sector_size,
+        "segments": [[address, len(payload)] for address, payload in segments],
+        "sector_crcs": crcs,
+    }
+    tmp = out.with_name(out.name + ".tmp")
+    writer = SnapshotWriter(tmp, page_size=0x1000, metadata=metadata)
+    spans = sector_align(segments, sector_size)
+    for start, buf in spans:
+        view = memoryview(buf)
+        for offset in range(0, len(buf), sector_size):
+            crcs[f"0x{start + offset:08X}"] = zlib.crc32(view[offset:offset + sector_size])
+        writer.add_range(start, buf)
+    writer.close()
+    os.replace(tmp, out)
+
+
+def load_image(path: Path, sector_size: int = DEFAULT_SECTOR_SIZE,
+               base: Optional[int] = None,
+               cache_dir: Optional[Path] = DEFAULT_IMAGE_CACHE) -> FlashImage:
+    """Return the preprocessed image for ``path``, building it on a miss.
+
+    Without a cache directory the image is built into a temporary file
+    that is unlinked once mapped.
+    """
+    data = Path(path).read_bytes()
+    digest = hashlib.sha256(data).hexdigest()
+    if image_format(path, data) != "raw":
+        base = None  # addresses come from the file; keep one cache entry
+    if cache_dir is None:
+        fd, tmp = tempfile.mkstemp(suffix=".img")
+        os.close(fd)
+        try:
+            build_image(path, data, digest, Path(tmp), sector_size, base)
+            return FlashImage(Snapshot(Path(tmp)))
+        finally:
+            os.unlink(tmp)
+
+    cache_path = Path(cache_dir) / f"{_cache_key(digest, sector_size, base)}.img"
+    if cache_path.is_file():
+        try:
+            return FlashImage(Snapshot(cache_path))
+        except (SnapshotError, KeyError, ValueError):
+            pass  # stale or corrupt entry: rebuild below
+    cache_path.parent.mkdir(parents=True, exist_ok=True)
+    build_image(path, data, digest, cache_path, sector_size, base)
+    return FlashImage(Snapshot(cache_path))
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Preprocess flash images into the cache")
+    parser.add_argument("images", type=Path, nargs="+")
+    parser.add_argument("--base", type=lambda v: int(v, 0),
+                        help="load address for raw binaries")
+    parser.add_argument("--sector-size", type=lambda v: int(v, 0),
+                        default=DEFAULT_SECTOR_SIZE)
+    parser.add_argument("--cache-dir", type=Path, default=DEFAULT_IMAGE_CACHE)
+    args = parser.parse_args(argv)
+
+    try:
+        for path in args.images:
+            with load_image(path, args.sector_size, args.base, args.cache_dir) as image:
+                print(f"{path}: {image.size} bytes in {len(image.segments)} segment(s), "
+                      f"{len(image.sector_crcs)} sector(s) -> {image.path}")
+    except (OSError, ImageError, SnapshotError) as exc:
+        print(f"error: {exc}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
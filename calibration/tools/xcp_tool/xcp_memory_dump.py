@@ -0,0 +1,447 @@
+#!/usr/bin/env python3
+"""Dump VCU memory over XCP-on-Ethernet.
+
+Uploads are pipelined: the engine negotiates slave block mode and
+MAX_CTO/MAX_DTO in CONNECT/GET_COMM_MODE_INFO, then keeps a window of
+UPLOAD requests outstanding (bounded by the slave's interleaved-mode
+QUEUE_SIZE) and lets each response land directly in a preallocated buffer.
+
+With ``--incremental`` the tool BUILD_CHECKSUMs every page, compares the
+result with the snapshot cached for the same ECU serial and firmware
+version, and uploads only the pages that differ.
+
+``--format snapshot`` writes a sparse, mmap-able container (see
+``xcp_snapshot.py``) instead of a flat blob.  Instead of ``--range`` the
+address ranges can come from a transfer plan (``xcp_transfer_plan.py``).
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import os
+import re
+import sys
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Deque, Iterable, List, Optional, Sequence, Tuple
+
+_CALIB_LIB = Path(__file__).resolve().parents[3] / "tools" / "calibration"
+if str(_CALIB_LIB) not in sys.path:
+    sys.path.insert(0, str(_CALIB_LIB))
+
+from ethernet_xcp_adapter import (  # noqa: E402
+    PID_ERR,
+    PID_EV,
+    PID_RES,
+    PID_SERV,
+    ID_ASCII,
+    ID_ECU_SERIAL,
+    XCP_TCP_DEFAULT_PORT,
+    Cmd,
+    ErrCode,
+    XcpError,
+    XcpMaster,
+    error_name,
+    open_transport,
+)
+from xcp_snapshot import SnapshotWriter  # noqa: E402
+from xcp_transfer_plan import PlanError, add_plan_arguments, plan_from_args  # noqa: E402
+
+DEFAULT_WINDOW = 16
+DEFAULT_PAGE_SIZE = 0x1000
+DEFAULT_CACHE_DIR = Path.home() / ".cache" / "vcu_xcp" / "snapshots"
+
+
+@dataclass(frozen=True)
+class MemoryRange:
+    address: int
+    length: int
+
+    @property
+    def end(self) -> int:
+        return self.address + self.length
+
+    def __str__(self) -> str:
+        return f"0x{self.address:08X}..0x{self.end - 1:08X} ({self.length} bytes)"
+
+
+@dataclass
+class UploadStats:
+    bytes: int = 0
+    requests: int = 0
+    packets: int = 0
+    seconds: float = 0.0
+
+    @property
+    def mb_per_s(self) -> float:
+        return self.bytes / self.seconds / 1e6 if self.seconds else 0.0
+
+
+class PipelinedUploader:
+    """Windowed UPLOAD engine.
+
+    XCP responses carry no address, so outstanding requests are matched to
+    responses in issue order; each request owns a fixed slice of the output
+    buffer and its response packets are copied into that slice straight from
+    the transport's receive buffer.
+    """
+
+    def __init__(self, master: XcpMaster, window: int = DEFAULT_WINDOW) -> None:
+        if window < 1:
+            raise ValueError("window must be >= 1")
+        self.master = master
+        self.requested_window = window
+        self.stats = UploadStats()
+
+    @property
+    def window(self) -> int:
+        return self.master.pipeline_window(self.requested_window)
+
+    @property
+    def chunk_size(self) -> int:
+        return self.master.info.upload_chunk
+
+    def upload(self, address: int, length: int,
+               out: Optional[memoryview] = None) -> memoryview:
+        """Upload ``length`` bytes from ``address`` into ``out`` (or a new buffer)."""
+        if out is None:
+            out = memoryview(bytearray(length))
+        elif len(out) < length:
+            raise ValueError("output buffer too small")
+        start = time.perf_counter()
+        transport = self.master.transport
+        window = self.window
+        chunk = self.chunk_size
+        pending: Deque[Tuple[int, int]] = deque()
+        issued = 0
+
+        self.master.set_mta(address)
+        while issued < length or pending:
+            batch = []
+            while issued < length and len(pending) < window:
+                size = min(chunk, length - issued)
+                batch.append(bytes((Cmd.UPLOAD, size)))
+                pending.append((issued, size))
+                issued += size
+            if batch:
+                transport.send_many(batch)
+                self.stats.requests += len(batch)
+            offset, size = pending.popleft()
+            self._receive_into(out[offset:offset + size])
+
+        self.stats.bytes += length
+        self.stats.seconds += time.perf_counter() - start
+        return out[:length]
+
+    def _receive_into(self, dest: memoryview) -> None:
+        transport = self.master.transport
+        received = 0
+        while received < len(dest):
+            packet = transport.recv_view()
+            pid = packet[0]
+            payload = len(packet) - 1
+            if pid == PID_RES:
+                if received + payload > len(dest):
+                    raise XcpError("UPLOAD response longer than requested")
+                dest[received:received + payload] = packet[1:]
+                received += payload
+                self.stats.packets += 1
+                continue
+            if pid == PID_ERR:
+                code = packet[1] if payload else ErrCode.GENERIC
+                raise XcpError(f"UPLOAD rejected: {error_name(code)}", code)
+            if pid not in (PID_EV, PID_SERV):
+                raise XcpError(f"UPLOAD: unexpected PID 0x{pid:02X}")
+
+
+def dump_sequential(master: XcpMaster, address: int, length: int) -> bytes:
+    """Reference path: one SHORT_UPLOAD round trip per MAX_CTO-1 bytes."""
+    chunk = master.info.max_cto - 1
+    out = bytearray()
+    for offset in range(0, length, chunk):
+        size = min(chunk, length - offset)
+        out += master.short_upload(address + offset, size)
+    return bytes(out)
+
+
+def dump_ranges(master: XcpMaster, ranges: Sequence[MemoryRange],
+                window: int = DEFAULT_WINDOW) -> Tuple[bytearray, UploadStats]:
+    """Dump ``ranges`` back to back into one preallocated buffer."""
+    total = sum(r.length for r in ranges)
+    image = bytearray(total)
+    view = memoryview(image)
+    uploader = PipelinedUploader(master, window)
+    offset = 0
+    for rng in ranges:
+        uploader.upload(rng.address, rng.length, view[offset:offset + rng.length])
+        offset += rng.length
+    return image, uploader.stats
+
+
+# -- incremental dumps -------------------------------------------------------
+
+
+def checksum_pages(master: XcpMaster, address: int, length: int,
+                   page_size: int = DEFAULT_PAGE_SIZE,
+                   window: int = DEFAULT_WINDOW) -> Tuple[int, List[int]]:
+    """BUILD_CHECKSUM each page of a range; returns ``(type, checksums)``.
+
+    BUILD_CHECKSUM post-increments the MTA by the block size, so one SET_MTA
+    covers the range and the per-page requests can be pipelined.
+    """
+    sizes = [min(page_size, length - off) for off in range(0, length, page_size)]
+    window = master.pipeline_window(window)
+    checksums: List[int] = []
+    checksum_type = 0
+    issued = 0
+    master.set_mta(address)
+    while len(checksums) < len(sizes):
+        batch = []
+        while issued < len(sizes) and issued - len(checksums) < window:
+            batch.append(bytes((Cmd.BUILD_CHECKSUM, 0, 0, 0)) + master.pack_u32(sizes[issued]))
+            issued += 1
+        if batch:
+            master.transport.send_many(batch)
+        res = master.recv_response(Cmd.BUILD_CHECKSUM)
+        checksum_type = res[1]
+        checksums.append(master.unpack_u32(res, 4))
+    return checksum_type, checksums
+
+
+@dataclass
+class CachedRange:
+    page_size: int
+    checksum_type: int
+    checksums: List[Optional[int]]
+    data: bytearray
+
+
+class SnapshotCache:
+    """Previous dumps on disk, keyed by ECU serial and firmware version.
+
+    Each range is stored as ``<addr>_<len>.bin`` next to a JSON sidecar that
+    records the slave checksums the data was validated against.  A page whose
+    checksum is ``null`` changed while it was uploaded and is always refetched.
+    """
+
+    def __init__(self, root: Path = DEFAULT_CACHE_DIR) -> None:
+        self.root = Path(root)
+
+    def _paths(self, serial: str, firmware: str, rng: MemoryRange) -> Tuple[Path, Path]:
+        key = re.sub(r"[^A-Za-z0-9._-]", "_", f"{serial}__{firmware}")
+        stem = self.root / key / f"{rng.address:08X}_{rng.length:08X}"
+        return stem.with_suffix(".bin"), stem.with_suffix(".json")
+
+    def load(self, serial: str, firmware: str, rng: MemoryRange) -> Optional[CachedRange]:
+        data_path, meta_path = self._paths(serial, firmware, rng)
+        try:
+            meta = json.loads(meta_path.read_text())
+            data = bytearray(data_path.read_bytes())
+        except (OSError, ValueError):
+            return None
+        if len(data) != rng.length or meta.get("sha256") != hashlib.sha256(data).hexdigest():
+            return None
+        return CachedRange(meta["page_size"], meta["checksum_type"], meta["checksums"], data)
+
+    def store(self, serial: str, firmware: str, rng: MemoryRange,
+              entry: CachedRange) -> None:
+        data_path, meta_path = self._paths(serial, firmware, rng)
+        data_path.parent.mkdir(parents=True, exist_ok=True)
+        meta = {
+            "serial": serial,
+            "firmware": firmware,
+            "address": rng.address,
+            "length": rng.length,
+            "page_size": entry.page_size,
+            "checksum_type": entry.checksum_type,
+            "checksums": entry.checksums,
+            "sha256": hashlib.sha256(entry.data).hexdigest(),
+        }
+        # Data first: a sidecar never describes a half-written blob.
+        _write_atomic(data_path, entry.data)
+        _write_atomic(meta_path, json.dumps(meta).encode())
+
+
+def _write_atomic(path: Path, data: bytes) -> None:
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_bytes(data)
+    os.replace(tmp, path)
+
+
+def _page_runs(pages: Iterable[int]) -> List[Tuple[int, int]]:
+    """Coalesce sorted page indices into ``(first, count)`` runs."""
+    runs: List[Tuple[int, int]] = []
+    for page in pages:
+        if runs and runs[-1][0] + runs[-1][1] == page:
+            runs[-1] = (runs[-1][0], runs[-1][1] + 1)
+        else:
+            runs.append((page, 1))
+    return runs
+
+
+@dataclass
+class IncrementalStats:
+    pages: int = 0
+    changed_pages: int = 0
+    unstable_pages: int = 0
+    upload: UploadStats = field(default_factory=UploadStats)
+
+
+def dump_incremental(master: XcpMaster, rng: MemoryRange, cache: SnapshotCache,
+                     serial: str, firmware: str,
+                     page_size: int = DEFAULT_PAGE_SIZE,
+                     window: int = DEFAULT_WINDOW,
+                     stats: Optional[IncrementalStats] = None) -> bytearray:
+    """Return a full image of ``rng``, uploading only pages that changed."""
+    stats = stats if stats is not None else IncrementalStats()
+    checksum_type, checksums = checksum_pages(master, rng.address, rng.length,
+                                              page_size, window)
+    cached = cache.load(serial, firmware, rng)
+    if (cached is not None and cached.page_size == page_size
+            and cached.checksum_type == checksum_type):
+        image = cached.data
+        stale = [i for i, (old, new) in enumerate(zip(cached.checksums, checksums))
+                 if old != new]
+    else:
+        image = bytearray(rng.length)
+        stale = list(range(len(checksums)))
+
+    view = memoryview(image)
+    uploader = PipelinedUploader(master, window)
+    uploader.stats = stats.upload
+    validated: List[Optional[int]] = list(checksums)
+    for first, count in _page_runs(stale):
+        start = first * page_size
+        end = min(rng.length, (first + count) * page_size)
+        uploader.upload(rng.address + start, end - start, view[start:end])
+        # A page that changed between checksum and upload is kept in the
+        # image but not trusted by the next incremental run.
+        _, after = checksum_pages(master, rng.address + start, end - start,
+                                  page_size, window)
+        for page, value in enumerate(after, first):
+            if value != checksums[page]:
+                validated[page] = None
+                stats.unstable_pages += 1
+
+    stats.pages += len(checksums)
+    stats.changed_pages += len(stale)
+    cache.store(serial, firmware, rng,
+                CachedRange(page_size, checksum_type, validated, image))
+    return image
+
+
+def parse_range(text: str) -> MemoryRange:
+    """Parse ``ADDR:LEN`` (both accept 0x prefixes)."""
+    try:
+        address, length = (int(part, 0) for part in text.split(":", 1))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid range {text!r}, expected ADDR:LEN")
+    if length <= 0:
+        raise argparse.ArgumentTypeError(f"empty range {text!r}")
+    return MemoryRange(address, length)
+
+
+def build_arg_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Dump VCU memory over XCP-on-Ethernet")
+    parser.add_argument("--host", required=True, help="ECU IP address")
+    parser.add_argument("--port", type=int, default=XCP_TCP_DEFAULT_PORT)
+    parser.add_argument("--protocol", choices=("tcp", "udp"), default="tcp")
+    parser.add_argument("--timeout", type=float, default=2.0)
+    parser.add_argument("--range", dest="ranges", type=parse_range, action="append",
+                        default=[], metavar="ADDR:LEN",
+                        help="memory range to dump (repeatable)")
+    parser.add_argument("--window", type=int, default=DEFAULT_WINDOW,
+                        help="maximum outstanding UPLOAD requests")
+    parser.add_argument("--sequential", action="store_true",
+                        help="use one SHORT_UPLOAD per round trip (no pipelining)")
+    parser.add_argument("--incremental", action="store_true",
+                        help="upload only pages whose BUILD_CHECKSUM differs from the cache")
+    parser.add_argument("--page-size", type=lambda v: int(v, 0), default=DEFAULT_PAGE_SIZE)
+    parser.add_argument("--cache-dir", type=Path, default=DEFAULT_CACHE_DIR)
+    parser.add_argument("--ecu-serial", help="override the serial read via GET_ID")
+    parser.add_argument("--fw-version", help="override the firmware ID read via GET_ID")
+    parser.add_argument("--format", choices=("raw", "snapshot"), default="raw",
+                        help="flat blob of all ranges, or a sparse indexed snapshot")
+    parser.add_argument("-o", "--output", type=Path, required=True)
+    add_plan_arguments(parser)
+    return parser
+
+
+def write_output(path: Path, fmt: str, ranges: Sequence[MemoryRange], image,
+                 metadata: dict) -> None:
+    if fmt == "raw":
+        path.write_bytes(image)
+        return
+    view = memoryview(image)
+    offset = 0
+    with SnapshotWriter(path, metadata=metadata) as writer:
+        for rng in ranges:
+            writer.add_range(rng.address, view[offset:offset + rng.length])
+            offset += rng.length
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = build_arg_parser()
+    args = parser.parse_args(argv)
+    try:
+        plan = plan_from_args(args)
+    except (OSError, PlanError) as exc:
+        parser.error(str(exc))
+    if plan is not None:
+        args.ranges += [MemoryRange(t.address, t.length) for t in plan.transfers]
+    if not args.ranges:
+        parser.error("give at least one --range, --plan or --linker-script")
+    metadata = {"host": args.host, "created": time.strftime("%Y-%m-%dT%H:%M:%S")}
+    try:
+        transport = open_transport(args.host, args.port, args.protocol, args.timeout)
+        with XcpMaster(transport) as master:
+            info = master.connect()
+            print(f"connected: MAX_CTO={info.max_cto} MAX_DTO={info.max_dto} "
+                  f"block_mode={info.slave_block_mode} queue={info.queue_size}",
+                  file=sys.stderr)
+            if args.sequential:
+                start = time.perf_counter()
+                image = b"".join(dump_sequential(master, r.address, r.length)
+                                 for r in args.ranges)
+                stats = UploadStats(bytes=len(image),
+                                    seconds=time.perf_counter() - start)
+            elif args.incremental:
+                serial = args.ecu_serial or master.get_id(ID_ECU_SERIAL).decode(errors="replace")
+                firmware = args.fw_version or master.get_id(ID_ASCII).decode(errors="replace")
+                metadata.update(serial=serial, firmware=firmware)
+                cache = SnapshotCache(args.cache_dir)
+                inc = IncrementalStats()
+                start = time.perf_counter()
+                image = bytearray()
+                for rng in args.ranges:
+                    image += dump_incremental(master, rng, cache, serial, firmware,
+                                              args.page_size, args.window, inc)
+                stats = UploadStats(bytes=len(image),
+                                    seconds=time.perf_counter() - start)
+                print(f"{serial} / {firmware}: {inc.changed_pages} of {inc.pages} pages "
+                      f"uploaded, {inc.unstable_pages} changed during upload",
+                      file=sys.stderr)
+            else:
+                image, stats = dump_ranges(master, args.ranges, args.window)
+    except (OSError, XcpError) as exc:
+        print(f"error: {exc}", file=sys.stderr)
+        return 1
+
+    try:
+        write_output(args.output, args.format, args.ranges, image, metadata)
+    except (OSError, ValueError) as exc:
+        print(f"error: {exc}", file=sys.stderr)
+        return 1
+    for rng in args.ranges:
+        print(f"  {rng}", file=sys.stderr)
+    print(f"wrote {stats.bytes} bytes to {args.output} in {stats.seconds:.2f} s "
+          f"({stats.mb_per_s:.2f} MB/s)", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
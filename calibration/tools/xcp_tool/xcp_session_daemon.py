@@ -0,0 +1,536 @@
+#!/usr/bin/env python3
+"""Long-lived XCP session daemon shared by the calibration scripts.
+
+``serve`` keeps one XCP-on-Ethernet session per ECU connected and
+unlocked: CONNECT, GET_COMM_MODE_INFO, GET_STATUS and seed & key run once,
+not once per script step.  Client processes talk to the daemon over a Unix
+socket (``XcpDaemonClient``); each request runs atomically on its ECU's
+session, so any number of clients can share one ECU.
+
+A health check sends GET_STATUS on sessions that have been idle for
+``--health-interval`` seconds and reconnects broken ones before the next
+client needs them.  A request that fails on the link (timeout, closed
+connection) reconnects and, when it is safe to repeat, is retried once,
+so clients never see a dropped session.
+
+Wire format, both directions: ``<II`` (JSON header length, payload
+length), the UTF-8 JSON header, then the raw payload bytes.
+
+Targets are given as ``NAME=PROTO://HOST:PORT`` like
+``xcp_dump_orchestrator.py``.  Keys come from ``--key-function
+MODULE:FUNCTION`` (or ``path/to/file.py:FUNCTION``), called as
+``function(resource, seed) -> key``.
+"""
+
+from __future__ import annotations
+
+import argparse
+import importlib
+import importlib.util
+import json
+import os
+import socket
+import socketserver
+import struct
+import sys
+import threading
+import time
+from dataclasses import asdict
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+_CALIB_LIB = Path(__file__).resolve().parents[3] / "tools" / "calibration"
+if str(_CALIB_LIB) not in sys.path:
+    sys.path.insert(0, str(_CALIB_LIB))
+
+from ethernet_xcp_adapter import (  # noqa: E402
+    RESOURCE_CAL_PAG,
+    RESOURCE_DAQ,
+    RESOURCE_PGM,
+    RESOURCE_STIM,
+    ErrCode,
+    XcpError,
+    XcpMaster,
+    XcpTimeoutError,
+    open_transport,
+)
+from xcp_dump_orchestrator import EcuTarget, parse_target  # noqa: E402
+from xcp_memory_dump import DEFAULT_WINDOW, PipelinedUploader  # noqa: E402
+
+DEFAULT_SOCKET = Path(os.environ.get(
+    "VCU_XCP_SESSIOND", Path.home() / ".cache" / "vcu_xcp" / "xcp_sessiond.sock"))
+DEFAULT_HEALTH_INTERVAL = 2.0
+MAX_MESSAGE = 64 * 1024 * 1024
+RESOURCES = {"cal": RESOURCE_CAL_PAG, "daq": RESOURCE_DAQ, "stim": RESOURCE_STIM,
+             "pgm": RESOURCE_PGM}
+
+_MSG = struct.Struct("<II")
+
+KeyFunction = Callable[[int, bytes], bytes]
+
+
+class DaemonError(Exception):
+    """Raised for daemon protocol and setup errors."""
+
+
+# -- wire format -------------------------------------------------------------
+
+
+def send_message(sock: socket.socket, header: dict, data: bytes = b"") -> None:
+    body = json.dumps(header).encode()
+    sock.sendall(_MSG.pack(len(body), len(data)) + body)
+    if data:
+        sock.sendall(data)
+
+
+def _recv_exact(sock: socket.socket, size: int) -> Optional[bytearray]:
+    buf = bytearray(size)
+    view = memoryview(buf)
+    received = 0
+    while received < size:
+        n = sock.recv_into(view[received:])
+        if n == 0:
+            if received == 0:
+                return None
+            raise DaemonError("connection closed mid-message")
+        received += n
+    return buf
+
+
+def recv_message(sock: socket.socket) -> Optional[Tuple[dict, bytes]]:
+    """One message, or None when the peer closed the connection cleanly."""
+    head = _recv_exact(sock, _MSG.size)
+    if head is None:
+        return None
+    header_len, data_len = _MSG.unpack(head)
+    if header_len + data_len > MAX_MESSAGE:
+        raise DaemonError(f"message of {header_len + data_len} bytes exceeds limit")
+    header = _recv_exact(sock, header_len) if header_len else bytearray(b"{}")
+    data = _recv_exact(sock, data_len) if data_len else bytearray()
+    if header is None or data is None:
+        raise DaemonError("connection closed mid-message")
+    return json.loads(header), bytes(data)
+
+
+# -- sessions ----------------------------------------------------------------
+
+
+def load_key_function(spec: str) -> KeyFunction:
+    """``MODULE:FUNCTION`` or ``path/to/file.py:FUNCTION``."""
+    target, sep, name = spec.rpartition(":")
+    if not sep or not target or not name:
+        raise DaemonError(f"key function {spec!r} is not MODULE:FUNCTION")
+    if target.endswith(".py"):
+        loader = importlib.util.spec_from_file_location(Path(target).stem, target)
+        if loader is None or loader.loader is None:
+            raise DaemonError(f"cannot load {target}")
+        module = importlib.util.module_from_spec(loader)
+        loader.loader.exec_module(module)
+    else:
+        module = importlib.import_module(target)
+    try:
+        return getattr(module, name)
+    except AttributeError:
+        raise DaemonError(f"{target} has no function {name!r}") from None
+
+
+def _link_failure(exc: Exception) -> bool:
+    """True for errors that mean the session is gone, not that a command failed."""
+    if isinstance(exc, (XcpTimeoutError, OSError)):
+        return True
+    return isinstance(exc, XcpError) and exc.code in (None, ErrCode.ACCESS_LOCKED)
+
+
+class EcuSession:
+    """One ECU's XCP session, kept connected and unlocked between requests."""
+
+    def __init__(self, target: EcuTarget, timeout: float = 2.0, resources: int = 0,
+                 key_fn: Optional[KeyFunction] = None) -> None:
+        self.target = target
+        self.timeout = timeout
+        self.resources = resources
+        self.key_fn = key_fn
+        self.master: Optional[XcpMaster] = None
+        self.lock = threading.Lock()
+        self.connects = 0
+        self.reconnects = 0
+        self.requests = 0
+        self.healthy = False
+        self.last_error = ""
+        self.last_used = 0.0
+
+    def _open(self) -> XcpMaster:
+        master = XcpMaster(open_transport(self.target.host, self.target.port,
+                                          self.target.protocol, self.timeout))
+        try:
+            master.connect()
+            if self.resources and self.key_fn is not None:
+                master.unlock(self.resources, self.key_fn)
+        except Exception as exc:
+            # Anything may come out of a user --key-function; record it all.
+            self.last_error, self.healthy = str(exc) or type(exc).__name__, False
+            master.close()
+            raise
+        if self.connects:
+            self.reconnects += 1
+        self.connects += 1
+        self.master, self.healthy = master, True
+        return master
+
+    def _drop(self, exc: Optional[Exception] = None) -> None:
+        if exc is not None:
+            self.last_error = str(exc) or type(exc).__name__
+            self.healthy = False
+        if self.master is not None:
+            master, self.master = self.master, None
+            if exc is not None:
+                master.connected = False  # the link is gone; skip DISCONNECT
+            try:
+                master.close()
+            except (XcpError, OSError):
+                pass
+
+    def run(self, fn: Callable[[XcpMaster], object], retry: bool = True,
+            pipelined: bool = False):
+        """Run ``fn(master)`` on the live session, reconnecting if needed.
+
+        A link failure drops the session; the call is repeated once on a
+        fresh one when ``retry`` is set (the request is idempotent).  A
+        ``pipelined`` request that fails any other way still drops it, since
+        responses to its outstanding commands would otherwise be read as
+        answers to the next request.
+        """
+        with self.lock:
+            self.requests += 1
+            self.last_used = time.monotonic()
+            for attempt in range(2):
+                master = self.master or self._open()
+                try:
+                    return fn(master)
+                except Exception as exc:
+                    if not _link_failure(exc):
+                        if pipelined:
+                            self._drop(exc)
+                        raise
+                    self._drop(exc)
+                    if attempt or not retry:
+                        raise
+        raise AssertionError("unreachable")
+
+    def health_check(self) -> None:
+        """GET_STATUS on an idle session; reconnect it if that fails."""
+        if not self.lock.acquire(blocking=False):
+            return  # busy, so evidently alive
+        try:
+            if self.master is not None:
+                try:
+                    self.master.get_status()
+                    self.healthy = True
+                    return
+                except (XcpError, OSError) as exc:
+                    self._drop(exc)
+            try:
+                self._open()
+            except Exception:  # noqa: BLE001 - recorded by _open; keep the checks running
+                pass
+        finally:
+            self.last_used = time.monotonic()
+            self.lock.release()
+
+    def close(self) -> None:
+        with self.lock:
+            self._drop()
+
+    def describe(self) -> dict:
+        master = self.master
+        return {"name": self.target.name, "target": str(self.target),
+                "connected": master is not None, "healthy": self.healthy,
+                "connects": self.connects, "reconnects": self.reconnects,
+                "requests": self.requests, "last_error": self.last_error,
+                "info": asdict(master.info) if master is not None else None}
+
+
+# -- daemon ------------------------------------------------------------------
+
+
+def _upload(window: int):
+    def op(session: EcuSession, args: dict, data: bytes):
+        def fn(master: XcpMaster):
+            out = PipelinedUploader(master, window).upload(args["address"], args["size"])
+            return {}, bytes(out)
+        return session.run(fn, pipelined=True)
+    return op
+
+
+def _short_upload(session: EcuSession, args: dict, data: bytes):
+    return session.run(lambda m: ({}, m.short_upload(args["address"], args["size"],
+                                                     args.get("extension", 0))))
+
+
+def _download(session: EcuSession, args: dict, data: bytes):
+    def fn(master: XcpMaster):
+        master.set_mta(args["address"], args.get("extension", 0))
+        master.download(data)
+        return {}, b""
+    return session.run(fn)
+
+
+def _checksum(session: EcuSession, args: dict, data: bytes):
+    def fn(master: XcpMaster):
+        master.set_mta(args["address"], args.get("extension", 0))
+        kind, value = master.build_checksum(args["size"])
+        return {"type": kind, "value": value}, b""
+    return session.run(fn)
+
+
+def _command(session: EcuSession, args: dict, data: bytes):
+    # arbitrary commands may not be repeatable: reconnect, but do not retry
+    return session.run(lambda m: ({}, bytes(m.command(args["cmd"], data))), retry=False)
+
+
+def _open_session(session: EcuSession, args: dict, data: bytes):
+    return session.run(lambda m: ({"info": asdict(m.info)}, b""))
+
+
+class _ClientHandler(socketserver.BaseRequestHandler):
+    def handle(self) -> None:
+        sock: socket.socket = self.request
+        server: XcpSessionDaemon = self.server  # type: ignore[assignment]
+        while True:
+            try:
+                message = recv_message(sock)
+            except (DaemonError, OSError, ValueError):
+                return
+            if message is None:
+                return
+            header, data = message
+            try:
+                reply, payload = server.dispatch(header, data)
+                reply = dict(reply, ok=True)
+            except Exception as exc:  # noqa: BLE001 - e.g. a failing --key-function
+                code = exc.code if isinstance(exc, XcpError) else None
+                reply, payload = {"ok": False, "error": str(exc) or type(exc).__name__,
+                                  "code": code}, b""
+            try:
+                send_message(sock, reply, payload)
+            except OSError:
+                return
+            if header.get("op") == "shutdown":
+                threading.Thread(target=server.shutdown, daemon=True).start()
+                return
+
+
+class XcpSessionDaemon(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """Unix-socket server holding one ``EcuSession`` per target."""
+
+    daemon_threads = True
+
+    def __init__(self, path: Path, targets: Sequence[EcuTarget], timeout: float = 2.0,
+                 resources: int = 0, key_fn: Optional[KeyFunction] = None,
+                 window: int = DEFAULT_WINDOW,
+                 health_interval: float = DEFAULT_HEALTH_INTERVAL) -> None:
+        self.path = Path(path)
+        self.sessions: Dict[str, EcuSession] = {
+            t.name: EcuSession(t, timeout, resources, key_fn) for t in targets}
+        self.health_interval = health_interval
+        self.ops = {"upload": _upload(window), "short_upload": _short_upload,
+                    "download": _download, "checksum": _checksum, "command": _command,
+                    "open": _open_session}
+        self._stop = threading.Event()
+        self._health: Optional[threading.Thread] = None
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        _remove_stale_socket(self.path)
+        super().__init__(str(self.path), _ClientHandler)
+        os.chmod(self.path, 0o600)
+
+    def dispatch(self, header: dict, data: bytes) -> Tuple[dict, bytes]:
+        op = header.get("op")
+        if op == "status":
+            return {"sessions": [s.describe() for s in self.sessions.values()]}, b""
+        if op == "shutdown":
+            return {}, b""
+        if op not in self.ops:
+            raise DaemonError(f"unknown operation {op!r}")
+        session = self.sessions.get(header.get("ecu", ""))
+        if session is None:
+            raise DaemonError(f"unknown ECU {header.get('ecu')!r}; "
+                              f"known: {', '.join(sorted(self.sessions))}")
+        return self.ops[op](session, header, data)
+
+    def start_health_checks(self) -> None:
+        def loop() -> None:
+            while not self._stop.wait(self.health_interval / 2):
+                now = time.monotonic()
+                for session in self.sessions.values():
+                    if now - session.last_used >= self.health_interval:
+                        session.health_check()
+
+        self._health = threading.Thread(target=loop, daemon=True)
+        self._health.start()
+
+    def server_close(self) -> None:
+        self._stop.set()
+        if self._health is not None:
+            self._health.join()
+        super().server_close()
+        for session in self.sessions.values():
+            session.close()
+        try:
+            self.path.unlink()
+        except FileNotFoundError:
+            pass
+
+
+def _remove_stale_socket(path: Path) -> None:
+    if not path.exists():
+        return
+    probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        probe.connect(str(path))
+    except OSError:
+        path.unlink()  # nobody listening: left over from a crashed daemon
+        return
+    finally:
+        probe.close()
+    raise DaemonError(f"{path}: a daemon is already running")
+
+
+# -- client ------------------------------------------------------------------
+
+
+class XcpDaemonClient:
+    """Client side of the daemon; every call is one request/response exchange."""
+
+    def __init__(self, path: Path = DEFAULT_SOCKET, timeout: Optional[float] = 60.0) -> None:
+        self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._sock.settimeout(timeout)
+        try:
+            self._sock.connect(str(path))
+        except OSError as exc:
+            self._sock.close()
+            raise DaemonError(f"{path}: no XCP session daemon ({exc})") from exc
+
+    def __enter__(self) -> "XcpDaemonClient":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self._sock.close()
+
+    def request(self, op: str, data: bytes = b"", **args) -> Tuple[dict, bytes]:
+        send_message(self._sock, dict(args, op=op), data)
+        message = recv_message(self._sock)
+        if message is None:
+            raise DaemonError("daemon closed the connection")
+        header, payload = message
+        if not header.get("ok"):
+            raise XcpError(header.get("error", "daemon request failed"), header.get("code"))
+        return header, payload
+
+    def status(self) -> List[dict]:
+        return self.request("status")[0]["sessions"]
+
+    def open(self, ecu: str) -> dict:
+        return self.request("open", ecu=ecu)[0]["info"]
+
+    def upload(self, ecu: str, address: int, size: int) -> bytes:
+        return self.request("upload", ecu=ecu, address=address, size=size)[1]
+
+    def short_upload(self, ecu: str, address: int, size: int, extension: int = 0) -> bytes:
+        return self.request("short_upload", ecu=ecu, address=address, size=size,
+                            extension=extension)[1]
+
+    def download(self, ecu: str, address: int, data: bytes, extension: int = 0) -> None:
+        self.request("download", data, ecu=ecu, address=address, extension=extension)
+
+    def checksum(self, ecu: str, address: int, size: int) -> Tuple[int, int]:
+        header = self.request("checksum", ecu=ecu, address=address, size=size)[0]
+        return header["type"], header["value"]
+
+    def command(self, ecu: str, cmd: int, payload: bytes = b"") -> bytes:
+        return self.request("command", payload, ecu=ecu, cmd=int(cmd))[1]
+
+    def shutdown(self) -> None:
+        self.request("shutdown")
+
+
+# -- CLI ---------------------------------------------------------------------
+
+
+def _resources(text: str) -> int:
+    bits = 0
+    for name in filter(None, (part.strip().lower() for part in text.split(","))):
+        if name not in RESOURCES:
+            raise argparse.ArgumentTypeError(
+                f"unknown resource {name!r} (choose from {', '.join(RESOURCES)})")
+        bits |= RESOURCES[name]
+    return bits
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Shared XCP session daemon")
+    parser.add_argument("--socket", type=Path, default=DEFAULT_SOCKET,
+                        help=f"Unix socket path (default: {DEFAULT_SOCKET})")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_serve = sub.add_parser("serve", help="run the daemon in the foreground")
+    p_serve.add_argument("targets", type=parse_target, nargs="+",
+                         metavar="[NAME=][tcp|udp://]HOST[:PORT]")
+    p_serve.add_argument("--timeout", type=float, default=2.0)
+    p_serve.add_argument("--unlock", type=_resources, default=0, metavar="cal,daq,stim,pgm",
+                         help="resources to unlock with seed & key after CONNECT")
+    p_serve.add_argument("--key-function", help="MODULE:FUNCTION computing keys from seeds")
+    p_serve.add_argument("--window", type=int, default=DEFAULT_WINDOW,
+                         help="outstanding UPLOADs per upload request")
+    p_serve.add_argument("--health-interval", type=float, default=DEFAULT_HEALTH_INTERVAL,
+                         help="seconds of idleness before a session is checked")
+    sub.add_parser("status", help="show the daemon's sessions")
+    p_upload = sub.add_parser("upload", help="upload memory through the daemon")
+    p_upload.add_argument("ecu")
+    p_upload.add_argument("address", type=lambda v: int(v, 0))
+    p_upload.add_argument("size", type=lambda v: int(v, 0))
+    p_upload.add_argument("-o", "--output", type=Path, required=True)
+    sub.add_parser("stop", help="shut the daemon down")
+    args = parser.parse_args(argv)
+
+    try:
+        if args.command == "serve":
+            if args.unlock and not args.key_function:
+                parser.error("--unlock needs --key-function")
+            key_fn = load_key_function(args.key_function) if args.key_function else None
+            names = [t.name for t in args.targets]
+            if len(set(names)) != len(names):
+                parser.error("target names must be unique")
+            server = XcpSessionDaemon(args.socket, args.targets, args.timeout, args.unlock,
+                                      key_fn, args.window, args.health_interval)
+            server.start_health_checks()
+            print(f"serving {len(names)} ECU(s) on {args.socket}", file=sys.stderr)
+            try:
+                server.serve_forever()
+            except KeyboardInterrupt:
+                pass
+            finally:
+                server.server_close()
+            return 0
+        with XcpDaemonClient(args.socket) as client:
+            if args.command == "status":
+                for s in client.status():
+                    state = ("healthy" if s["healthy"] else "unhealthy") \
+                        if s["connected"] else "disconnected"
+                    print(f"{s['name']:16s} {s['target']:32s} {state:12s} "
+                          f"requests {s['requests']}, connects {s['connects']}, "
+                          f"reconnects {s['reconnects']}"
+                          + (f", last error: {s['last_error']}" if s["last_error"] else ""))
+            elif args.command == "upload":
+                args.output.write_bytes(client.upload(args.ecu, args.address, args.size))
+            else:
+                client.shutdown()
+    except (DaemonError, XcpError, OSError) as exc:
+        print(f"error: {exc}", file=sys.stderr)
+        return 2
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
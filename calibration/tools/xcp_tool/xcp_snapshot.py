@@ -0,0 +1,269 @@
+#!/usr/bin/env python3
+"""Sparse, memory-mapped snapshot container for XCP memory dumps.
+
+File layout (all integers little endian)::
+
+    header      magic "VCUSNAP1", version, page size, range count,
+                metadata offset/length
+    range table one (address, length, file offset) entry per range
+    metadata    optional JSON (ECU serial, firmware, timestamp, ...)
+    data        one section per range, each starting on a page boundary
+
+Readers mmap the file and get zero-copy ``memoryview`` (or NumPy) slices by
+target address; nothing outside the requested pages is touched.
+"""
+
+from __future__ import annotations
+
+import argparse
+import bisect
+import json
+import mmap
+import struct
+import sys
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional; memoryview access always works.
+    np = None
+
+MAGIC = b"VCUSNAP1"
+FORMAT_VERSION = 1
+DEFAULT_PAGE_SIZE = 0x1000
+
+_HEADER = struct.Struct("<8sHHIIQI")
+_ENTRY = struct.Struct("<QQQ")
+
+
+class SnapshotError(Exception):
+    """Raised for malformed snapshot files or unmapped addresses."""
+
+
+@dataclass(frozen=True)
+class RangeEntry:
+    address: int
+    length: int
+    offset: int
+
+    @property
+    def end(self) -> int:
+        return self.address + self.length
+
+
+def _align(value: int, alignment: int) -> int:
+    return (value + alignment - 1) // alignment * alignment
+
+
+class SnapshotWriter:
+    """Collects address ranges and writes them as one snapshot file."""
+
+    def __init__(self, path: Path, page_size: int = DEFAULT_PAGE_SIZE,
+                 metadata: Optional[Dict[str, Any]] = None) -> None:
+        if page_size <= 0 or page_size & (page_size - 1):
+            raise ValueError("page size must be a power of two")
+        self.path = Path(path)
+        self.page_size = page_size
+        self.metadata = dict(metadata or {})
+        self._ranges: List[Tuple[int, memoryview]] = []
+
+    def __enter__(self) -> "SnapshotWriter":
+        return self
+
+    def __exit__(self, exc_type, *exc_info) -> None:
+        if exc_type is None:
+            self.close()
+
+    def add_range(self, address: int, data) -> None:
+        view = memoryview(data).cast("B")
+        new_end = address + len(view)
+        for other, other_view in self._ranges:
+            if address < other + len(other_view) and other < new_end:
+                raise SnapshotError(f"range at 0x{address:08X} overlaps 0x{other:08X}")
+        self._ranges.append((address, view))
+
+    def close(self) -> None:
+        self._ranges.sort(key=lambda item: item[0])
+        meta = json.dumps(self.metadata, sort_keys=True).encode()
+        table_end = _HEADER.size + _ENTRY.size * len(self._ranges)
+        offset = _align(table_end + len(meta), self.page_size)
+        entries = []
+        for address, view in self._ranges:
+            entries.append(RangeEntry(address, len(view), offset))
+            offset = _align(offset + len(view), self.page_size)
+
+        with open(self.path, "wb") as fh:
+            fh.write(_HEADER.pack(MAGIC, FORMAT_VERSION, 0, self.page_size,
+                                  len(entries), table_end, len(meta)))
+            for entry in entries:
+                fh.write(_ENTRY.pack(entry.address, entry.length, entry.offset))
+            fh.write(meta)
+            for entry, (_, view) in zip(entries, self._ranges):
+                fh.seek(entry.offset)
+                fh.write(view)
+            # Pad the tail so the last section is page-aligned as well.
+            fh.truncate(_align(fh.tell(), self.page_size))
+
+
+class Snapshot:
+    """Read-only, mmap-backed view of a snapshot file."""
+
+    def __init__(self, path: Path) -> None:
+        self.path = Path(path)
+        self._fh = open(self.path, "rb")
+        try:
+            self._mm = mmap.mmap(self._fh.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            self._fh.close()
+            raise SnapshotError(f"{self.path}: empty file")
+        self._view = memoryview(self._mm)
+        try:
+            self._parse()
+        except Exception:
+            self.close()
+            raise
+
+    def _parse(self) -> None:
+        if len(self._mm) < _HEADER.size:
+            raise SnapshotError(f"{self.path}: truncated header")
+        magic, version, _flags, page_size, count, meta_off, meta_len = \
+            _HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC:
+            raise SnapshotError(f"{self.path}: not a VCU snapshot")
+        if version != FORMAT_VERSION:
+            raise SnapshotError(f"{self.path}: unsupported version {version}")
+        self.page_size = page_size
+        self.ranges: List[RangeEntry] = []
+        for i in range(count):
+            entry = RangeEntry(*_ENTRY.unpack_from(self._mm, _HEADER.size + i * _ENTRY.size))
+            if entry.offset % page_size or entry.offset + entry.length > len(self._mm):
+                raise SnapshotError(f"{self.path}: bad section for 0x{entry.address:08X}")
+            self.ranges.append(entry)
+        self._starts = [entry.address for entry in self.ranges]
+        self.metadata: Dict[str, Any] = json.loads(
+            bytes(self._view[meta_off:meta_off + meta_len]) or b"{}")
+
+    def __enter__(self) -> "Snapshot":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self._view.release()
+        try:
+            self._mm.close()
+        except BufferError:
+            # A caller still holds a slice; the mapping goes away with it.
+            pass
+        self._fh.close()
+
+    def find(self, address: int) -> Optional[RangeEntry]:
+        index = bisect.bisect_right(self._starts, address) - 1
+        if index >= 0 and address < self.ranges[index].end:
+            return self.ranges[index]
+        return None
+
+    def read(self, address: int, length: int) -> memoryview:
+        """Zero-copy slice of ``length`` bytes at target ``address``."""
+        entry = self.find(address)
+        if entry is None or address + length > entry.end:
+            raise SnapshotError(f"0x{address:08X}+{length} is not covered by one range")
+        start = entry.offset + address - entry.address
+        return self._view[start:start + length]
+
+    def array(self, address: int, length: int, dtype: str = "u1"):
+        """NumPy view of ``length`` bytes at ``address`` (no copy)."""
+        if np is None:
+            raise SnapshotError("NumPy is required for array access")
+        return np.frombuffer(self.read(address, length), dtype=dtype)
+
+    def section(self, entry: RangeEntry) -> memoryview:
+        return self._view[entry.offset:entry.offset + entry.length]
+
+
+def overlaps(a: Snapshot, b: Snapshot) -> Iterator[Tuple[int, int]]:
+    """Yield ``(address, length)`` for every address span present in both."""
+    i = j = 0
+    while i < len(a.ranges) and j < len(b.ranges):
+        ra, rb = a.ranges[i], b.ranges[j]
+        start = max(ra.address, rb.address)
+        end = min(ra.end, rb.end)
+        if start < end:
+            yield start, end - start
+        if ra.end <= rb.end:
+            i += 1
+        else:
+            j += 1
+
+
+def diff(a: Snapshot, b: Snapshot,
+         page_size: Optional[int] = None) -> List[Tuple[int, int]]:
+    """Return merged ``(address, length)`` spans of pages that differ.
+
+    Only the overlapping address spans are compared, one page at a time, so
+    memory outside those spans is never faulted in.
+    """
+    page = page_size or max(a.page_size, b.page_size)
+    changed: List[Tuple[int, int]] = []
+    for start, length in overlaps(a, b):
+        va, vb = a.read(start, length), b.read(start, length)
+        offset = 0
+        while offset < length:
+            # Step to the next address-aligned page boundary.
+            step = min(page - (start + offset) % page, length - offset)
+            if va[offset:offset + step] != vb[offset:offset + step]:
+                address = start + offset
+                if changed and changed[-1][0] + changed[-1][1] == address:
+                    changed[-1] = (changed[-1][0], changed[-1][1] + step)
+                else:
+                    changed.append((address, step))
+            offset += step
+    return changed
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Inspect and compare XCP snapshots")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_info = sub.add_parser("info", help="print the range table and metadata")
+    p_info.add_argument("snapshot", type=Path)
+    p_extract = sub.add_parser("extract", help="write one address span as raw bytes")
+    p_extract.add_argument("snapshot", type=Path)
+    p_extract.add_argument("address", type=lambda v: int(v, 0))
+    p_extract.add_argument("length", type=lambda v: int(v, 0))
+    p_extract.add_argument("-o", "--output", type=Path, required=True)
+    p_diff = sub.add_parser("diff", help="list changed pages between two snapshots")
+    p_diff.add_argument("old", type=Path)
+    p_diff.add_argument("new", type=Path)
+    p_diff.add_argument("--page-size", type=lambda v: int(v, 0))
+    args = parser.parse_args(argv)
+
+    try:
+        if args.command == "info":
+            with Snapshot(args.snapshot) as snap:
+                print(f"page size: {snap.page_size}")
+                for key, value in sorted(snap.metadata.items()):
+                    print(f"{key}: {value}")
+                for entry in snap.ranges:
+                    print(f"  0x{entry.address:08X}..0x{entry.end - 1:08X} "
+                          f"({entry.length} bytes) @ file 0x{entry.offset:X}")
+        elif args.command == "extract":
+            with Snapshot(args.snapshot) as snap:
+                args.output.write_bytes(snap.read(args.address, args.length))
+        else:
+            with Snapshot(args.old) as old, Snapshot(args.new) as new:
+                changes = diff(old, new, args.page_size)
+            for address, length in changes:
+                print(f"0x{address:08X}..0x{address + length - 1:08X} ({length} bytes)")
+            print(f"{len(changes)} changed span(s)", file=sys.stderr)
+            return 1 if changes else 0
+    except (OSError, SnapshotError) as exc:
+        print(f"error: {exc}", file=sys.stderr)
+        return 2
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
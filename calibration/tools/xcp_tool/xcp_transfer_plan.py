@@ -0,0 +1,355 @@
+#!/usr/bin/env python3
+"""Build XCP transfer plans from the VCU linker scripts and MPU configuration.
+
+The planner reads the ``MEMORY`` block of a GNU ld script such as
+``config/baremetal/memory_layout_S32K344.ld`` or ``S32K348.ld``, drops the
+areas that ``config/baremetal/mpu_config_*.yaml`` marks as inaccessible,
+and merges what is left into the fewest, largest transfers.  Gaps and
+reserved holes between regions are never requested from the ECU.
+
+MPU configuration schema (keys other than these are ignored)::
+
+    mpu_regions:            # or "regions", or "mpu: {regions: [...]}"
+      - name: hse_mu
+        base: 0x4038C000    # or "start"/"address"
+        size: 16K           # or "length", or "end" (exclusive)
+        access: none        # none/no_access/PRIV_NA_USER_NA/0 => skipped
+        protected: true     # alternative explicit flag
+        enabled: true       # disabled regions are ignored
+
+Plans are cached by the hash of their inputs so repeated runs skip parsing.
+"""
+
+from __future__ import annotations
+
+import argparse
+import ast
+import fnmatch
+import hashlib
+import json
+import operator
+import re
+import sys
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+DEFAULT_PLAN_CACHE = Path.home() / ".cache" / "vcu_xcp" / "plans"
+PLAN_VERSION = 1
+
+_NO_ACCESS = {"NONE", "NO_ACCESS", "NA", "PRIV_NA_USER_NA", "0"}
+
+
+class PlanError(Exception):
+    """Raised for unparsable linker scripts, MPU configs or plan files."""
+
+
+@dataclass(frozen=True)
+class LinkerRegion:
+    name: str
+    origin: int
+    length: int
+    attributes: str = ""
+
+    @property
+    def end(self) -> int:
+        return self.origin + self.length
+
+    @property
+    def readable(self) -> bool:
+        # ld attributes select sections, not permissions; only an explicit
+        # "!R" marks a region the dump must not touch.
+        attrs = self.attributes.upper()
+        return "!" not in attrs or "R" not in attrs.split("!", 1)[1]
+
+
+@dataclass
+class Transfer:
+    address: int
+    length: int
+    regions: List[str] = field(default_factory=list)
+
+    @property
+    def end(self) -> int:
+        return self.address + self.length
+
+
+@dataclass
+class TransferPlan:
+    transfers: List[Transfer]
+    sources: Dict[str, str] = field(default_factory=dict)
+    options: Dict[str, Any] = field(default_factory=dict)
+
+    @property
+    def total_bytes(self) -> int:
+        return sum(t.length for t in self.transfers)
+
+    def to_json(self) -> str:
+        return json.dumps({
+            "version": PLAN_VERSION,
+            "sources": self.sources,
+            "options": self.options,
+            "transfers": [asdict(t) for t in self.transfers],
+        }, indent=2)
+
+    @classmethod
+    def from_json(cls, text: str) -> "TransferPlan":
+        try:
+            data = json.loads(text)
+            if data.get("version") != PLAN_VERSION:
+                raise PlanError(f"unsupported plan version {data.get('version')}")
+            transfers = [Transfer(t["address"], t["length"], t.get("regions", []))
+                         for t in data["transfers"]]
+        except (KeyError, TypeError, ValueError) as exc:
+            raise PlanError(f"malformed plan: {exc}") from exc
+        return cls(transfers, data.get("sources", {}), data.get("options", {}))
+
+    def save(self, path: Path) -> None:
+        Path(path).write_text(self.to_json())
+
+    @classmethod
+    def load(cls, path: Path) -> "TransferPlan":
+        return cls.from_json(Path(path).read_text())
+
+
+# -- linker script parsing ---------------------------------------------------
+
+_COMMENT_RE = re.compile(r"/\*.*?\*/|//[^\n]*", re.S)
+_MEMORY_RE = re.compile(r"\bMEMORY\s*\{(.*?)\}", re.S)
+_REGION_RE = re.compile(
+    r"([A-Za-z_.$][\w.$-]*)\s*(?:\(([^)]*)\))?\s*:\s*"
+    r"(?:ORIGIN|org|o)\s*=\s*(.+?)\s*,\s*(?:LENGTH|len|l)\s*=\s*(.+?)\s*(?=\n|$)")
+_SUFFIX_RE = re.compile(r"\b(0[xX][0-9a-fA-F]+|\d+)\s*([KkMm])\b")
+_FUNC_RE = re.compile(r"\b(ORIGIN|LENGTH)\s*\(\s*([\w.$-]+)\s*\)")
+
+_BINOPS = {
+    ast.Add: operator.add, ast.Sub: operator.sub, ast.Mult: operator.mul,
+    ast.FloorDiv: operator.floordiv, ast.Div: operator.floordiv,
+}
+
+
+def _eval_int(node: ast.AST) -> int:
+    if isinstance(node, ast.Expression):
+        return _eval_int(node.body)
+    if isinstance(node, ast.Constant) and isinstance(node.value, int):
+        return node.value
+    if isinstance(node, ast.BinOp) and type(node.op) in _BINOPS:
+        return _BINOPS[type(node.op)](_eval_int(node.left), _eval_int(node.right))
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.USub):
+        return -_eval_int(node.operand)
+    raise PlanError("unsupported linker expression")
+
+
+def eval_ld_expression(text: str, regions: Dict[str, LinkerRegion]) -> int:
+    """Evaluate an ld ORIGIN/LENGTH expression (K/M suffixes, + - * /)."""
+    def lookup(match: "re.Match[str]") -> str:
+        region = regions.get(match.group(2))
+        if region is None:
+            raise PlanError(f"unknown memory region {match.group(2)!r}")
+        return str(region.origin if match.group(1) == "ORIGIN" else region.length)
+
+    expr = _FUNC_RE.sub(lookup, text)
+    expr = _SUFFIX_RE.sub(
+        lambda m: f"({m.group(1)}*{1024 if m.group(2) in 'Kk' else 1024 * 1024})", expr)
+    try:
+        return _eval_int(ast.parse(expr.strip(), mode="eval"))
+    except SyntaxError as exc:
+        raise PlanError(f"cannot evaluate {text!r}") from exc
+
+
+def parse_linker_script(text: str) -> List[LinkerRegion]:
+    """Return the regions declared in the script's MEMORY block(s)."""
+    text = _COMMENT_RE.sub("", text)
+    regions: Dict[str, LinkerRegion] = {}
+    for block in _MEMORY_RE.findall(text):
+        for name, attrs, origin, length in _REGION_RE.findall(block):
+            origin_val = eval_ld_expression(origin, regions)
+            length_val = eval_ld_expression(length, regions)
+            regions[name] = LinkerRegion(name, origin_val, length_val, attrs.strip())
+    return list(regions.values())
+
+
+# -- MPU configuration -------------------------------------------------------
+
+def _to_int(value: Any) -> int:
+    if isinstance(value, int):
+        return value
+    return eval_ld_expression(str(value), {})
+
+
+def load_mpu_protected(path: Path) -> List[Tuple[int, int, str]]:
+    """Return ``(start, end, name)`` for every MPU region the dump must skip."""
+    import yaml  # only needed when an MPU config is given
+
+    try:
+        config = yaml.safe_load(Path(path).read_text()) or {}
+    except yaml.YAMLError as exc:
+        raise PlanError(f"{path}: {exc}") from exc
+    if isinstance(config, dict) and isinstance(config.get("mpu"), dict):
+        config = config["mpu"]
+    if isinstance(config, dict):
+        entries = config.get("mpu_regions", config.get("regions", [])) or []
+    else:
+        entries = config if isinstance(config, list) else []
+
+    protected = []
+    for index, entry in enumerate(entries):
+        if not isinstance(entry, dict) or entry.get("enabled", True) is False:
+            continue
+        name = str(entry.get("name", f"mpu_region_{index}"))
+        access = str(entry.get("access", "")).strip().upper()
+        if not (entry.get("protected") or access in _NO_ACCESS):
+            continue
+        try:
+            start = _to_int(entry.get("base", entry.get("start", entry.get("address"))))
+            if "end" in entry:
+                end = _to_int(entry["end"])
+            else:
+                end = start + _to_int(entry.get("size", entry.get("length")))
+        except (PlanError, TypeError, ValueError) as exc:
+            raise PlanError(f"{path}: region {name!r}: {exc}") from exc
+        protected.append((start, end, name))
+    return protected
+
+
+# -- planning ----------------------------------------------------------------
+
+def _subtract(intervals: List[Tuple[int, int, List[str]]],
+              holes: Iterable[Tuple[int, int, str]]) -> List[Tuple[int, int, List[str]]]:
+    for hole_start, hole_end, _ in holes:
+        result = []
+        for start, end, names in intervals:
+            if hole_end <= start or end <= hole_start:
+                result.append((start, end, names))
+                continue
+            if start < hole_start:
+                result.append((start, hole_start, names))
+            if hole_end < end:
+                result.append((hole_end, end, names))
+        intervals = result
+    return intervals
+
+
+def build_plan(regions: Sequence[LinkerRegion],
+               protected: Sequence[Tuple[int, int, str]] = (),
+               include: Sequence[str] = (),
+               exclude: Sequence[str] = (),
+               max_transfer: Optional[int] = None) -> List[Transfer]:
+    """Merge readable regions into maximal transfers, skipping protected areas."""
+    selected = [
+        (r.origin, r.end, [r.name]) for r in regions
+        if r.readable and r.length > 0
+        and (not include or any(fnmatch.fnmatch(r.name, p) for p in include))
+        and not any(fnmatch.fnmatch(r.name, p) for p in exclude)
+    ]
+    selected.sort(key=lambda item: item[0])
+
+    merged: List[Tuple[int, int, List[str]]] = []
+    for start, end, names in selected:
+        if merged and start <= merged[-1][1]:
+            prev_start, prev_end, prev_names = merged[-1]
+            merged[-1] = (prev_start, max(prev_end, end), prev_names + names)
+        else:
+            merged.append((start, end, names))
+
+    transfers = []
+    for start, end, names in _subtract(merged, protected):
+        step = max_transfer or (end - start)
+        for address in range(start, end, step):
+            transfers.append(Transfer(address, min(step, end - address), list(names)))
+    return transfers
+
+
+def _digest(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def plan_from_files(linker_script: Path, mpu_config: Optional[Path] = None,
+                    include: Sequence[str] = (), exclude: Sequence[str] = (),
+                    max_transfer: Optional[int] = None,
+                    cache_dir: Optional[Path] = DEFAULT_PLAN_CACHE) -> TransferPlan:
+    """Build (or fetch from the cache) the plan for a linker script."""
+    ld_bytes = Path(linker_script).read_bytes()
+    sources = {"linker_script": _digest(ld_bytes)}
+    mpu_bytes = b""
+    if mpu_config is not None:
+        mpu_bytes = Path(mpu_config).read_bytes()
+        sources["mpu_config"] = _digest(mpu_bytes)
+    options = {"include": list(include), "exclude": list(exclude),
+               "max_transfer": max_transfer}
+    key = _digest(json.dumps([sources, options], sort_keys=True).encode())
+
+    cache_path = Path(cache_dir) / f"{key}.json" if cache_dir else None
+    if cache_path is not None and cache_path.is_file():
+        try:
+            return TransferPlan.load(cache_path)
+        except PlanError:
+            pass  # stale or corrupt entry: rebuild below
+
+    regions = parse_linker_script(ld_bytes.decode(errors="replace"))
+    if not regions:
+        raise PlanError(f"{linker_script}: no MEMORY regions found")
+    protected = load_mpu_protected(mpu_config) if mpu_config is not None else []
+    plan = TransferPlan(build_plan(regions, protected, include, exclude, max_transfer),
+                        sources, options)
+    if cache_path is not None:
+        cache_path.parent.mkdir(parents=True, exist_ok=True)
+        plan.save(cache_path)
+    return plan
+
+
+def add_plan_arguments(parser: argparse.ArgumentParser) -> None:
+    """Options shared by every tool that consumes a transfer plan."""
+    group = parser.add_argument_group("transfer plan")
+    group.add_argument("--plan", type=Path, help="precomputed plan (JSON)")
+    group.add_argument("--linker-script", type=Path,
+                       help="derive the plan from this linker script")
+    group.add_argument("--mpu-config", type=Path,
+                       help="MPU configuration whose no-access regions are skipped")
+    group.add_argument("--region", dest="include", action="append", default=[],
+                       metavar="PATTERN", help="only use matching MEMORY regions")
+    group.add_argument("--exclude-region", dest="exclude", action="append", default=[],
+                       metavar="PATTERN", help="skip matching MEMORY regions")
+    group.add_argument("--plan-cache", type=Path, default=DEFAULT_PLAN_CACHE)
+
+
+def plan_from_args(args: argparse.Namespace) -> Optional[TransferPlan]:
+    if args.plan is not None:
+        return TransferPlan.load(args.plan)
+    if args.linker_script is not None:
+        return plan_from_files(args.linker_script, args.mpu_config,
+                               args.include, args.exclude, cache_dir=args.plan_cache)
+    return None
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Build an XCP transfer plan")
+    parser.add_argument("linker_script", type=Path)
+    parser.add_argument("--mpu-config", type=Path)
+    parser.add_argument("--region", dest="include", action="append", default=[],
+                        metavar="PATTERN")
+    parser.add_argument("--exclude-region", dest="exclude", action="append", default=[],
+                        metavar="PATTERN")
+    parser.add_argument("--max-transfer", type=lambda v: int(v, 0))
+    parser.add_argument("--no-cache", action="store_true")
+    parser.add_argument("-o", "--output", type=Path, help="write the plan as JSON")
+    args = parser.parse_args(argv)
+
+    try:
+        plan = plan_from_files(args.linker_script, args.mpu_config, args.include,
+                               args.exclude, args.max_transfer,
+                               None if args.no_cache else DEFAULT_PLAN_CACHE)
+    except (OSError, PlanError) as exc:
+        print(f"error: {exc}", file=sys.stderr)
+        return 1
+    for t in plan.transfers:
+        print(f"0x{t.address:08X}..0x{t.end - 1:08X} {t.length:>10} "
+              f"{','.join(t.regions)}")
+    print(f"{len(plan.transfers)} transfer(s), {plan.total_bytes} bytes", file=sys.stderr)
+    if args.output:
+        plan.save(args.output)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,46 @@
+#!/usr/bin/env bash
+# Flash a calibration image into a VCU over XCP-on-Ethernet.
+#
+# Usage: calibration_flash.sh <S32K344|S32K348> <ecu-ip> [image] [programmer options...]
+#
+# The image defaults to calibration/data/<platform>/default_calibration.hex.
+# Images are preprocessed once into the flash image cache
+# (~/.cache/vcu_xcp/images, override with VCU_IMAGE_CACHE), so repeated
+# runs with an unchanged file start immediately; only sectors whose
+# checksum differs on the target are reprogrammed.
+set -euo pipefail
+
+ROOT="$(cd "$(dirname "${BASH_SOURCE[0]}")/.." && pwd)"
+PROGRAMMER="$ROOT/calibration/tools/xcp_tool/xcp_flash_programmer.py"
+
+if [[ $# -lt 2 ]]; then
+    sed -n '2,10s/^# \{0,1\}//p' "$0" >&2
+    exit 2
+fi
+
+PLATFORM="$1"
+HOST="$2"
+shift 2
+
+case "$PLATFORM" in
+    S32K344|S32K348) ;;
+    *) echo "error: unknown platform '$PLATFORM'" >&2; exit 2 ;;
+esac
+
+IMAGE="$ROOT/calibration/data/$PLATFORM/default_calibration.hex"
+if [[ $# -gt 0 && "$1" != -* ]]; then
+    IMAGE="$1"
+    shift
+fi
+if [[ ! -s "$IMAGE" ]]; then
+    echo "error: image '$IMAGE' is missing or empty" >&2
+    exit 1
+fi
+
+CACHE_ARGS=()
+if [[ -n "${VCU_IMAGE_CACHE:-}" ]]; then
+    CACHE_ARGS=(--image-cache "$VCU_IMAGE_CACHE")
+fi
+
+exec python3 "$PROGRAMMER" --host "$HOST" --image "$IMAGE" --delta \
+    ${CACHE_ARGS[@]+"${CACHE_ARGS[@]}"} "$@"
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""Benchmark the parameter-level calibration diff on growing images.
+
+Builds a map of ``--params`` parameters at the start of the image, pads
+raw images of 1, 4 and ``--max-mb`` MiB, changes ``--changes`` scattered
+bytes and reports the diff time, the peak traced allocation on top of
+the two loaded images, and the size of the Markdown report.
+"""
+
+from __future__ import annotations
+
+import argparse
+import io
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+from typing import List, Optional
+
+import yaml
+
+_ROOT = Path(__file__).resolve().parents[3]
+if str(_ROOT / "tools" / "calibration") not in sys.path:
+    sys.path.insert(0, str(_ROOT / "tools" / "calibration"))
+
+from bench_calib_verify_batch import CALIB_BASE, make_image, make_map  # noqa: E402
+from calibration_index import load_index  # noqa: E402
+from calibration_report_gen import diff_images, write_diff  # noqa: E402
+from calibration_verify import load_image  # noqa: E402
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--params", type=int, default=3000)
+    parser.add_argument("--changes", type=int, default=50)
+    parser.add_argument("--max-mb", type=int, default=10)
+    args = parser.parse_args(argv)
+
+    rng = random.Random(1)
+    spec, size = make_map(args.params)
+    calib = make_image(spec, size, rng)
+    with tempfile.TemporaryDirectory() as tmp:
+        map_path = Path(tmp) / "calibration_map.yaml"
+        map_path.write_text(yaml.safe_dump(spec))
+        cmap = load_index([map_path], cache_dir=None).compiled()
+        for mb in sorted({1, 4, args.max_mb}):
+            total = max(mb << 20, size)
+            old = bytearray(calib + bytes(total - size))
+            new = bytearray(old)
+            for at in rng.sample(range(total), args.changes):
+                new[at] ^= 0x5A
+            old_path, new_path = Path(tmp) / "old.bin", Path(tmp) / "new.bin"
+            old_path.write_bytes(old)
+            new_path.write_bytes(new)
+            a, b = load_image(old_path, CALIB_BASE), load_image(new_path, CALIB_BASE)
+            tracemalloc.start()
+            start = time.perf_counter()
+            diff = diff_images(cmap, a, b)
+            out = io.StringIO()
+            write_diff(diff, out)
+            elapsed = time.perf_counter() - start
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            print(f"{mb:3d} MiB: {elapsed * 1e3:7.1f} ms  peak {peak / 1024:8.0f} KiB  "
+                  f"{len(diff.changes):4d} parameter(s)  report {len(out.getvalue()):7d} chars")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""Benchmark batch calibration verification across worker counts.
+
+Generates a synthetic map of ``--params`` parameters (scalars, axes and
+2-D maps) and ``--images`` raw images, then verifies the whole batch with
+1, 2, 4, ... workers up to ``--max-workers`` and reports images per second.
+Before timing, an empty image and one shorter than any value must verify
+with every element reported missing.
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import List, Optional
+
+import yaml
+
+_ROOT = Path(__file__).resolve().parents[3]
+if str(_ROOT / "tools" / "calibration") not in sys.path:
+    sys.path.insert(0, str(_ROOT / "tools" / "calibration"))
+
+from calibration_index import load_index  # noqa: E402
+from calibration_verify import (  # noqa: E402
+    KIND_NAMES,
+    MISSING,
+    BatchJob,
+    ImageBuffer,
+    SharedIndex,
+    run_batch,
+    verify,
+)
+
+CALIB_BASE = 0x00600000
+
+
+def make_map(count: int) -> tuple:
+    params = []
+    offset = 0
+    for i in range(count):
+        kind = i % 3
+        if kind == 0:
+            params.append({"name": f"gain_{i}", "offset": offset, "type": "f32",
+                           "min": 0.0, "max": 100.0})
+            offset += 4
+        elif kind == 1:
+            params.append({"name": f"axis_{i}", "offset": offset, "type": "u16",
+                           "shape": [16], "min": 0, "max": 60000,
+                           "monotonic": "increasing"})
+            offset += 32
+        else:
+            params.append({"name": f"map_{i}", "offset": offset, "type": "s16",
+                           "shape": [8, 8], "scale": 0.1, "min": -500, "max": 500})
+            offset += 128
+    return {"base_address": CALIB_BASE, "parameters": params}, offset
+
+
+def make_image(spec: dict, size: int, rng: random.Random) -> bytes:
+    import numpy as np
+
+    image = np.zeros(size, dtype=np.uint8)
+    for param in spec["parameters"]:
+        at = param["offset"]
+        if param["type"] == "f32":
+            image[at:at + 4] = np.array([rng.uniform(0, 120)], "<f4").view(np.uint8)
+        elif param["type"] == "u16":
+            axis = np.sort(np.array([rng.randrange(60000) for _ in range(16)], "<u2"))
+            image[at:at + 32] = axis.view(np.uint8)
+        else:
+            cells = np.array([rng.randrange(-5000, 5000) for _ in range(64)], "<i2")
+            image[at:at + 128] = cells.view(np.uint8)
+    return image.tobytes()
+
+
+def check_missing(cmap) -> None:
+    for label, segments in (("empty", []), ("2-byte", [(CALIB_BASE, b"\x00\x00")])):
+        result = verify(cmap, ImageBuffer(segments))
+        missing = sum(1 for v in result.violations if v.kind == KIND_NAMES[MISSING])
+        if missing != cmap.elements:
+            raise SystemExit(f"{label} image: {missing} of {cmap.elements} values missing")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--params", type=int, default=3000)
+    parser.add_argument("--images", type=int, default=64)
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args(argv)
+
+    rng = random.Random(1)
+    spec, size = make_map(args.params)
+    with tempfile.TemporaryDirectory() as tmp:
+        map_path = Path(tmp) / "calibration_map.yaml"
+        map_path.write_text(yaml.safe_dump(spec))
+        paths = []
+        for i in range(args.images):
+            path = Path(tmp) / f"calib_{i:04d}.bin"
+            path.write_bytes(make_image(spec, size, rng))
+            paths.append(path)
+        index = load_index([map_path], cache_dir=None)
+        check_missing(index.compiled())
+        block = SharedIndex(index.data)
+        jobs = [BatchJob(str(path), block.name, base=CALIB_BASE) for path in paths]
+        print(f"{args.images} images x {index.compiled().elements} values")
+        try:
+            workers, baseline = 1, None
+            while workers <= args.max_workers:
+                start = time.perf_counter()
+                rows = list(run_batch(jobs, workers))
+                elapsed = time.perf_counter() - start
+                if len(rows) != len(jobs) or any(r["status"] == "error" for r in rows):
+                    print("batch verification failed", file=sys.stderr)
+                    return 1
+                baseline = baseline or elapsed
+                print(f"{workers:3d} worker(s): {elapsed:7.2f} s  "
+                      f"{len(jobs) / elapsed:8.1f} images/s  x{baseline / elapsed:.2f}")
+                workers *= 2
+        finally:
+            block.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""Benchmark the host CRC library paths for every firmware CRC model.
+
+Reports MB/s for the bytewise table loop, slicing-by-8 and the default
+``checksum`` path (NumPy lanes or zlib/binascii) on one ``--size`` buffer,
+and the time to CRC ``--frames`` small frames with ``Crc.batch`` against a
+per-frame loop.
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+import time
+from pathlib import Path
+from typing import List, Optional
+
+_ROOT = Path(__file__).resolve().parents[3]
+if str(_ROOT / "tools" / "calibration") not in sys.path:
+    sys.path.insert(0, str(_ROOT / "tools" / "calibration"))
+
+from crc_lib import MODELS, engine, np  # noqa: E402
+
+
+def _rate(size: int, fn) -> float:
+    start = time.perf_counter()
+    fn()
+    return size / 1e6 / (time.perf_counter() - start)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size", type=int, default=4 << 20, help="large buffer bytes")
+    parser.add_argument("--loop-size", type=int, default=256 << 10,
+                        help="bytes for the pure Python paths")
+    parser.add_argument("--frames", type=int, default=10000)
+    parser.add_argument("--frame-size", type=int, default=64)
+    args = parser.parse_args(argv)
+
+    data = os.urandom(args.size)
+    small = data[:args.loop_size]
+    print(f"{'model':9s} {'bytewise':>9s} {'slice-8':>9s} {'default':>9s}  MB/s"
+          + ("   batch / loop ms" if np is not None else ""))
+    for name in MODELS:
+        crc = engine(name)
+        bytewise = _rate(len(small), lambda: crc.update_bytewise(crc.initial(), small))
+        slicing = _rate(len(small), lambda: crc.update(crc.initial(), small))
+        default = _rate(len(data), lambda: crc.checksum(data))
+        line = f"{name:9s} {bytewise:9.1f} {slicing:9.1f} {default:9.1f}"
+        if np is not None:
+            frames = np.frombuffer(data[:args.frames * args.frame_size], dtype=np.uint8) \
+                .reshape(args.frames, args.frame_size)
+            start = time.perf_counter()
+            batch = crc.batch(frames)
+            batch_ms = (time.perf_counter() - start) * 1e3
+            start = time.perf_counter()
+            loop = [crc.checksum(frame.tobytes()) for frame in frames]
+            loop_ms = (time.perf_counter() - start) * 1e3
+            if [int(v) for v in batch] != loop:
+                print(f"{name}: batch results differ", file=sys.stderr)
+                return 1
+            line += f"   {batch_ms:7.1f} / {loop_ms:7.1f}"
+        print(line)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""Benchmark the dcm_calib bulk writer against per-DID writes.
+
+A simulated ECU maps every calibration parameter onto its memory as a DID.
+The tester writes ``--params`` contiguous 4-byte parameters (one large
+map), first one WriteDataByIdentifier per parameter, then as one
+RequestDownload, then with the writer choosing, and finally a handful of
+scattered parameters where per-DID writes should win.  The runs go over
+DoIP and over ISO-TP on a timed virtual CAN bus (classic 500 kbit/s and
+CAN-FD 2 Mbit/s); each request costs ``--service-ms`` in the ECU.  Every
+write is checked against the ECU memory.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import random
+import sys
+import threading
+from pathlib import Path
+from typing import List, Optional
+
+_ROOT = Path(__file__).resolve().parents[3]
+for _sub in ("tools/calibration", "calibration/tools/dcm_tool"):
+    if str(_ROOT / _sub) not in sys.path:
+        sys.path.insert(0, str(_ROOT / _sub))
+
+from dcm_calib import BulkWriter, CalParameter, measure_link  # noqa: E402
+from uds_ecu_sim import DoipServerSim, SimulatedEcu, serve_isotp  # noqa: E402
+from uds_xcp_adapter import (  # noqa: E402
+    CLASSIC_DL,
+    FD_DL,
+    DoipConnection,
+    IsoTpConfig,
+    IsoTpConnection,
+    IsoTpUdsTransport,
+    UdsClient,
+    VirtualCanBus,
+)
+
+ECU_ADDRESS = 0x1001
+TESTER_ID, ECU_ID = 0x7E0, 0x7E8
+BASE = 0x00400000
+SCATTERED_AT = 0x00420000
+MEMORY = 0x40000
+
+
+def build_ecu(count: int, service_time: float) -> SimulatedEcu:
+    ecu = SimulatedEcu(ECU_ADDRESS, bytearray(MEMORY), BASE, service_time=service_time,
+                       session=0x03)
+    for i in range(count):
+        ecu.memory_dids[0x4000 + i] = (BASE + 4 * i, 4)
+    for i in range(8):
+        ecu.memory_dids[0x6000 + i] = (SCATTERED_AT + 0x1000 * i, 4)
+    return ecu
+
+
+def parameters(ecu: SimulatedEcu, first_did: int, count: int, seed: int) -> List[CalParameter]:
+    rng = random.Random(seed)
+    return [CalParameter(f"P{did:04X}", rng.randbytes(4), did, ecu.memory_dids[did][0])
+            for did in range(first_did, first_did + count)]
+
+
+async def run(label: str, client: UdsClient, ecu: SimulatedEcu, count: int) -> None:
+    model = await measure_link(client, BASE, min(client.max_response - 1, 0x400))
+    print(f"{label}: round trip {model.rtt * 1e3:.2f} ms, {model.bandwidth / 1e3:.0f} kB/s")
+    cases = [(method, 0x4000, count) for method in ("did", "block", "auto")]
+    cases.append(("auto", 0x6000, 8))
+    for seed, (method, first_did, n) in enumerate(cases):
+        params = parameters(ecu, first_did, n, seed)
+        writer = BulkWriter(client, model, method=method)
+        requests = ecu.requests
+        regions = await writer.write(params)
+        for param in params:
+            offset = param.address - BASE
+            if bytes(ecu.memory[offset:offset + 4]) != param.value:
+                raise SystemExit(f"{label} {method}: {param.name} not written")
+        elapsed = sum(r.elapsed for r in regions)
+        predicted = sum(r.predicted for r in regions)
+        chosen = "/".join(sorted({r.method for r in regions}))
+        print(f"  {n:5d} params {method:5s} -> {chosen:9s} {ecu.requests - requests:6d} req "
+              f"{elapsed * 1e3:9.1f} ms (predicted {predicted * 1e3:8.1f} ms)")
+
+
+async def over_doip(port: int, ecu: SimulatedEcu, count: int) -> None:
+    async with await DoipConnection.open("127.0.0.1", port) as conn:
+        client = UdsClient(conn.session(ECU_ADDRESS), max_request=0xFFFF, max_response=0xFFFF)
+        await run("DoIP", client, ecu, count)
+
+
+async def over_isotp(label: str, ecu: SimulatedEcu, count: int, dl: int,
+                     bitrate: float, data_bitrate: float) -> None:
+    bus = VirtualCanBus(fd=dl > CLASSIC_DL, bitrate=bitrate, data_bitrate=data_bitrate)
+    ecu_conn = IsoTpConnection(bus.channel([TESTER_ID]), IsoTpConfig(ECU_ID, TESTER_ID, tx_dl=dl))
+    tester = IsoTpConnection(bus.channel([ECU_ID]), IsoTpConfig(TESTER_ID, ECU_ID, tx_dl=dl))
+    stop = threading.Event()
+    thread = threading.Thread(target=serve_isotp, args=(ecu_conn, ecu, stop), daemon=True)
+    thread.start()
+    try:
+        await run(label, UdsClient(IsoTpUdsTransport(tester)), ecu, count)
+    finally:
+        stop.set()
+        thread.join()
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--params", type=int, default=1024)
+    parser.add_argument("--service-ms", type=float, default=1.0)
+    args = parser.parse_args(argv)
+
+    ecu = build_ecu(args.params, args.service_ms / 1000.0)
+    with DoipServerSim([ecu]) as server:
+        server.start()
+        asyncio.run(over_doip(server.port, ecu, args.params))
+    asyncio.run(over_isotp("CAN 500k", ecu, args.params, CLASSIC_DL, 500e3, 500e3))
+    asyncio.run(over_isotp("CAN-FD 2M", ecu, args.params, FD_DL, 500e3, 2e6))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""Benchmark DoIP UDS sessions against the local DoIP gateway stand-in.
+
+``--ecus`` simulated ECUs sit behind one DoIP entity; each takes
+``--service-ms`` to process a request.  After vehicle discovery and
+routing activation the bench reads ``--size`` bytes from every ECU with
+ReadMemoryByAddress, first one ECU after the other and then with all
+sessions running concurrently on the one TCP connection, and finally
+downloads the same amount to one ECU with 0x34/0x36/0x37.  Every read is
+checked; the write count shows how many requests shared a TCP write.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import sys
+import time
+from pathlib import Path
+from typing import List, Optional
+
+_ROOT = Path(__file__).resolve().parents[3]
+if str(_ROOT / "tools" / "calibration") not in sys.path:
+    sys.path.insert(0, str(_ROOT / "tools" / "calibration"))
+
+from uds_ecu_sim import DoipServerSim, SimulatedEcu  # noqa: E402
+from uds_xcp_adapter import DoipConnection, DoipSession, discover_vehicles  # noqa: E402
+
+BASE = 0x00400000
+CHUNK = 0xF000
+FIRST_ECU = 0x1001
+
+
+def read_request(address: int, size: int) -> bytes:
+    return b"\x23\x44" + address.to_bytes(4, "big") + size.to_bytes(4, "big")
+
+
+async def read_all(session: DoipSession, size: int) -> bytes:
+    out = bytearray()
+    for offset in range(0, size, CHUNK):
+        response = await session.request(read_request(BASE + offset, min(CHUNK, size - offset)))
+        if response[0] != 0x63:
+            raise SystemExit(f"0x{session.target_address:04X}: {response.hex()}")
+        out += response[1:]
+    return bytes(out)
+
+
+async def download(session: DoipSession, data: bytes) -> None:
+    await session.request(b"\x10\x02")
+    response = await session.request(b"\x34\x00\x44" + BASE.to_bytes(4, "big")
+                                      + len(data).to_bytes(4, "big"))
+    length_bytes = response[1] >> 4
+    block = int.from_bytes(response[2:2 + length_bytes], "big") - 2
+    for counter, offset in enumerate(range(0, len(data), block), 1):
+        response = await session.request(bytes((0x36, counter & 0xFF))
+                                          + data[offset:offset + block])
+        if response[0] != 0x76:
+            raise SystemExit(f"TransferData failed: {response.hex()}")
+    await session.request(b"\x37")
+
+
+async def bench(port: int, ecus: List[SimulatedEcu], size: int) -> None:
+    vehicles = await discover_vehicles("127.0.0.1", port, timeout=0.2)
+    for vehicle in vehicles:
+        print(f"announced: VIN {vehicle.vin} at {vehicle.host}, "
+              f"logical address 0x{vehicle.logical_address:04X}")
+    async with await DoipConnection.open("127.0.0.1", port) as conn:
+        sessions = [conn.session(ecu.logical_address) for ecu in ecus]
+        expected = {ecu.logical_address: bytes(ecu.memory[:size]) for ecu in ecus}
+        total = size * len(ecus) / 1e6
+
+        start = time.perf_counter()
+        for session in sessions:
+            assert await read_all(session, size) == expected[session.target_address]
+        elapsed = time.perf_counter() - start
+        print(f"{'sequential read':24s} {elapsed:7.3f} s {total / elapsed:7.1f} MB/s")
+
+        sent, writes = conn.stats.messages_sent, conn.stats.writes
+        start = time.perf_counter()
+        results = await asyncio.gather(*(read_all(s, size) for s in sessions))
+        elapsed = time.perf_counter() - start
+        for session, data in zip(sessions, results):
+            assert data == expected[session.target_address]
+        print(f"{'concurrent read':24s} {elapsed:7.3f} s {total / elapsed:7.1f} MB/s  "
+              f"({conn.stats.messages_sent - sent} requests in "
+              f"{conn.stats.writes - writes} writes)")
+
+        image = bytes((i * 13) & 0xFF for i in range(size))
+        start = time.perf_counter()
+        await download(sessions[0], image)
+        elapsed = time.perf_counter() - start
+        assert bytes(ecus[0].memory[:size]) == image
+        print(f"{'download (1 ECU)':24s} {elapsed:7.3f} s {size / elapsed / 1e6:7.1f} MB/s  "
+              f"(blocks of {ecus[0].max_block_length - 2} bytes)")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--ecus", type=int, default=16)
+    parser.add_argument("--size", type=lambda v: int(v, 0), default=0x40000)
+    parser.add_argument("--service-ms", type=float, default=2.0)
+    args = parser.parse_args(argv)
+
+    ecus = [SimulatedEcu(FIRST_ECU + i, bytearray(bytes((i + j) & 0xFF
+                                                        for j in range(args.size))),
+                         BASE, service_time=args.service_ms / 1000.0,
+                         max_block_length=0x4002)
+            for i in range(args.ecus)]
+    with DoipServerSim(ecus) as server:
+        server.start()
+        asyncio.run(bench(server.port, ecus, args.size))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
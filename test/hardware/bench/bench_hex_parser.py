@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""Benchmark the shared Intel HEX / S-record parser on synthetic images.
+
+Writes a ``--size`` image (default 8 MB, two segments) as Intel HEX and as
+S-record, then parses each file line by line, in one vectorised pass, and
+streamed in ``--chunk-size`` pieces, checking that all three agree.
+Each way must also reject a file without records and a file cut off
+before its end record.
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import struct
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, List, Optional, Tuple
+
+_CALIB_LIB = Path(__file__).resolve().parents[3] / "tools" / "calibration"
+if str(_CALIB_LIB) not in sys.path:
+    sys.path.insert(0, str(_CALIB_LIB))
+
+import hex_parser  # noqa: E402
+
+RECORD_BYTES = 32
+
+
+def write_ihex(path: Path, segments) -> None:
+    with open(path, "w") as fh:
+        upper = None
+        for address, data in segments:
+            for offset in range(0, len(data), RECORD_BYTES):
+                at = address + offset
+                if at >> 16 != upper:
+                    upper = at >> 16
+                    record = bytes((2, 0, 0, 4)) + struct.pack(">H", upper)
+                    fh.write(f":{(record + bytes(((-sum(record)) & 0xFF,))).hex().upper()}\n")
+                chunk = data[offset:offset + RECORD_BYTES]
+                record = bytes((len(chunk),)) + struct.pack(">H", at & 0xFFFF) + b"\0" + chunk
+                fh.write(f":{(record + bytes(((-sum(record)) & 0xFF,))).hex().upper()}\n")
+        fh.write(":00000001FF\n")
+
+
+def write_srec(path: Path, segments) -> None:
+    with open(path, "w") as fh:
+        fh.write("S00600004844521B\n")
+        for address, data in segments:
+            for offset in range(0, len(data), RECORD_BYTES):
+                chunk = data[offset:offset + RECORD_BYTES]
+                record = bytes((len(chunk) + 5,)) + struct.pack(">I", address + offset) + chunk
+                fh.write(f"S3{(record + bytes((0xFF - (sum(record) & 0xFF),))).hex().upper()}\n")
+        fh.write("S70500000000FA\n")
+
+
+def timed(label: str, size: int, fn: Callable[[], hex_parser.SegmentMap]):
+    start = time.perf_counter()
+    result = fn()
+    elapsed = time.perf_counter() - start
+    print(f"  {label:<12}{elapsed:8.3f} s {size / elapsed / 1e6:8.1f} MB/s of file")
+    return result
+
+
+def parsers(path: Path, chunk_size: int) -> List[Tuple[str, Callable[[], object]]]:
+    return [("lines", lambda: hex_parser.parse_file(path, vectorized=False)),
+            ("vectorised", lambda: hex_parser.parse_file(path)),
+            ("streamed", lambda: hex_parser.load(path, True, chunk_size))]
+
+
+def check_rejects(tmp: Path, segments, chunk_size: int) -> List[str]:
+    """Garbage and truncated files must raise ``HexParseError`` every way."""
+    small = [(address, data[:4096]) for address, data in segments]
+    cases = [("garbage.hex", b"this is not an Intel HEX file\n")]
+    for name, writer in (("cut.hex", write_ihex), ("cut.s37", write_srec)):
+        writer(tmp / name, small)
+        lines = (tmp / name).read_bytes().splitlines(keepends=True)
+        cases.append((name, b"".join(lines[:-1])))            # end record missing
+        cases.append((name, b"".join(lines[:len(lines) // 2])))
+    failures = []
+    for name, content in cases:
+        path = tmp / name
+        path.write_bytes(content)
+        for label, parse in parsers(path, chunk_size):
+            try:
+                parse()
+            except hex_parser.HexParseError:
+                continue
+            failures.append(f"{name} {len(content)} bytes ({label})")
+    return failures
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size", type=lambda v: int(v, 0), default=8 * 1024 * 1024)
+    parser.add_argument("--chunk-size", type=lambda v: int(v, 0), default=4 * 1024 * 1024)
+    args = parser.parse_args(argv)
+    if hex_parser.np is None:
+        print("error: NumPy is required for the vectorised parser", file=sys.stderr)
+        return 1
+
+    half = args.size // 2
+    segments = [(0x00400000, os.urandom(half)), (0x10000000, os.urandom(args.size - half))]
+    with tempfile.TemporaryDirectory() as tmp:
+        failures = check_rejects(Path(tmp), segments, 1024)
+        if failures:
+            print(f"accepted bad input: {', '.join(failures)}", file=sys.stderr)
+            return 1
+        for name, writer in (("image.hex", write_ihex), ("image.s37", write_srec)):
+            path = Path(tmp) / name
+            writer(path, segments)
+            size = path.stat().st_size
+            print(f"{name}: {size / 1e6:.1f} MB")
+            results = [timed(label, size, parse)
+                       for label, parse in parsers(path, args.chunk_size)]
+            if any(r.segments != segments for r in results):
+                print(f"{name}: parsers disagree", file=sys.stderr)
+                return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""Benchmark ISO-TP transfers over the in-process virtual CAN bus.
+
+An ECU stand-in thread answers ReadMemoryByAddress (0x23) with ``--size``
+bytes.  The tester grants block size 1 (a flow control after every
+consecutive frame, i.e. the single-frame wait of the old tooling), a
+block size of ``--block-size``, or 0 (the whole message as one burst), on
+classic CAN and CAN-FD.  A last run sends a 4 KB download towards the
+ECU under a 1 ms STmin to check the pacing.
+"""
+
+from __future__ import annotations
+
+import argparse
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import List, Optional
+
+_ROOT = Path(__file__).resolve().parents[3]
+if str(_ROOT / "tools" / "calibration") not in sys.path:
+    sys.path.insert(0, str(_ROOT / "tools" / "calibration"))
+
+from uds_xcp_adapter import (  # noqa: E402
+    CLASSIC_DL,
+    FD_DL,
+    IsoTpConfig,
+    IsoTpConnection,
+    IsoTpTimeoutError,
+    VirtualCanBus,
+)
+
+TESTER_ID, ECU_ID = 0x7E0, 0x7E8
+
+
+def ecu(conn: IsoTpConnection, memory: bytes, stop: threading.Event) -> None:
+    while not stop.is_set():
+        try:
+            request = conn.recv(timeout=0.1)
+        except IsoTpTimeoutError:
+            continue
+        if request[0] == 0x23:
+            address = int.from_bytes(request[2:6], "big")
+            size = int.from_bytes(request[6:10], "big")
+            conn.send(b"\x63" + memory[address:address + size])
+        elif request[0] == 0x36:
+            conn.send(request[:2].replace(b"\x36", b"\x76"))
+
+
+def run(size: int, dl: int, block_size: int, st_min: float = 0.0,
+        upload: int = 0) -> tuple:
+    bus = VirtualCanBus(fd=dl > CLASSIC_DL)
+    memory = bytes(i * 31 & 0xFF for i in range(size))
+    ecu_conn = IsoTpConnection(bus.channel([TESTER_ID]),
+                               IsoTpConfig(ECU_ID, TESTER_ID, tx_dl=dl, st_min=st_min))
+    tester = IsoTpConnection(bus.channel([ECU_ID]),
+                             IsoTpConfig(TESTER_ID, ECU_ID, tx_dl=dl, block_size=block_size))
+    stop = threading.Event()
+    thread = threading.Thread(target=ecu, args=(ecu_conn, memory, stop), daemon=True)
+    thread.start()
+    try:
+        start = time.perf_counter()
+        if upload:
+            tester.request(b"\x36\x01" + bytes(upload))
+        else:
+            response = tester.request(b"\x23\x44" + (0).to_bytes(4, "big")
+                                      + size.to_bytes(4, "big"))
+            if response[1:] != memory:
+                raise SystemExit("data mismatch")
+        elapsed = time.perf_counter() - start
+    finally:
+        stop.set()
+        thread.join()
+    return elapsed, bus.frames
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size", type=lambda v: int(v, 0), default=0x10000)
+    parser.add_argument("--block-size", type=int, default=16)
+    args = parser.parse_args(argv)
+
+    print(f"{'bus':10s} {'block size':>10s} {'frames':>8s} {'ms':>9s} {'MB/s':>7s}")
+    for label, dl in (("classic", CLASSIC_DL), ("CAN-FD 64", FD_DL)):
+        for block_size in (1, args.block_size, 0):
+            elapsed, frames = run(args.size, dl, block_size)
+            print(f"{label:10s} {block_size:10d} {frames:8d} {elapsed * 1e3:9.1f} "
+                  f"{args.size / elapsed / 1e6:7.2f}")
+    upload = 4096
+    elapsed, frames = run(args.size, CLASSIC_DL, 0, st_min=0.001, upload=upload)
+    expected = (upload + 2 - 6) // 7 * 0.001
+    print(f"STmin 1 ms: {upload} bytes in {frames} frames, {elapsed * 1e3:.1f} ms "
+          f"(>= {expected * 1e3:.0f} ms required)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
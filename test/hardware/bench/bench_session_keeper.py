@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""Benchmark the dcm_calib session keeper with many ECUs on one event loop.
+
+``--ecus`` simulated ECUs behind one DoIP entity fall back to the default
+session after ``--s3`` seconds without a request.  All of them are put in
+the extended session.  For ``--duration`` seconds every other ECU is polled
+every 50 ms while the rest sit idle, first without and then with a
+``SessionKeeper`` sending TesterPresent every 0.4 * S3.  The bench reports
+how many sessions dropped, how many keep-alives went to busy and to idle
+ECUs, and how closely the idle ECUs saw the keep-alive period.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import statistics
+import sys
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import List, Optional
+
+_ROOT = Path(__file__).resolve().parents[3]
+for _sub in ("tools/calibration", "calibration/tools/dcm_tool"):
+    if str(_ROOT / _sub) not in sys.path:
+        sys.path.insert(0, str(_ROOT / _sub))
+
+from dcm_calib import SessionKeeper  # noqa: E402
+from uds_ecu_sim import DoipServerSim, SimulatedEcu  # noqa: E402
+from uds_xcp_adapter import DoipConnection, UdsClient  # noqa: E402
+
+FIRST_ECU = 0x1001
+POLL = 0.05
+
+
+@dataclass
+class TimedEcu(SimulatedEcu):
+    keep_alive_times: List[float] = field(default_factory=list)
+
+    def handle(self, request: bytes):
+        if request[:1] == b"\x3E":
+            self.keep_alive_times.append(time.monotonic())
+        return super().handle(request)
+
+
+async def poll(client: UdsClient, until: float) -> None:
+    while time.monotonic() < until:
+        await client.request(b"\x22\xF1\x90")
+        await asyncio.sleep(POLL)
+
+
+async def run(port: int, ecus: List[TimedEcu], duration: float, interval: Optional[float]) -> None:
+    async with await DoipConnection.open("127.0.0.1", port) as conn:
+        clients = [UdsClient(conn.session(ecu.logical_address)) for ecu in ecus]
+        for client in clients:
+            await client.request(b"\x10\x03")
+        for ecu in ecus:
+            ecu.session_timeouts = 0
+            ecu.keep_alive_times.clear()
+        keeper = SessionKeeper(interval or 1.0)
+        if interval:
+            for ecu, client in zip(ecus, clients):
+                keeper.add(client, f"0x{ecu.logical_address:04X}")
+            keeper.start()
+        writes = conn.stats.writes
+        until = time.monotonic() + duration
+        await asyncio.gather(*(poll(client, until) for client in clients[::2]),
+                             asyncio.sleep(duration))
+        await keeper.stop()
+        writes = conn.stats.writes - writes
+        for client in clients:
+            await client.request(b"\x22\xF1\x90")   # lets each ECU notice an S3 timeout
+
+    busy, idle = ecus[::2], ecus[1::2]
+    dropped = sum(1 for ecu in ecus if ecu.session_timeouts)
+    label = f"keeper {interval * 1e3:.0f} ms" if interval else "no keeper"
+    print(f"{label:16s} dropped {dropped:3d}/{len(ecus)}  keep-alives: busy "
+          f"{sum(len(e.keep_alive_times) for e in busy):4d}, idle "
+          f"{sum(len(e.keep_alive_times) for e in idle):4d}  ({writes} TCP writes)")
+    if interval:
+        periods = [b - a for ecu in idle
+                   for a, b in zip(ecu.keep_alive_times, ecu.keep_alive_times[1:])]
+        coalesced = sum(s.coalesced for s in keeper.sessions.values())
+        if periods:
+            print(f"{'':16s} idle period mean {statistics.mean(periods) * 1e3:.2f} ms, "
+                  f"min {min(periods) * 1e3:.2f}, max {max(periods) * 1e3:.2f}; "
+                  f"{coalesced} keep-alives skipped for traffic")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--ecus", type=int, default=32)
+    parser.add_argument("--s3", type=float, default=0.5, help="S3server timeout, seconds")
+    parser.add_argument("--duration", type=float, default=3.0)
+    parser.add_argument("--service-ms", type=float, default=1.0)
+    args = parser.parse_args(argv)
+
+    ecus = [TimedEcu(FIRST_ECU + i, bytearray(16), dids={0xF190: b"WVCUSIM0000000001"},
+                     service_time=args.service_ms / 1000.0, s3_timeout=args.s3)
+            for i in range(args.ecus)]
+    with DoipServerSim(ecus) as server:
+        server.start()
+        asyncio.run(run(server.port, ecus, args.duration, None))
+        asyncio.run(run(server.port, ecus, args.duration, 0.4 * args.s3))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""Benchmark batched ReadDataByIdentifier with the static-DID cache.
+
+A simulated ECU holds ``--dids`` measurement DIDs of 1..8 bytes plus the
+static identification DIDs (VIN, software version, calibration ID); each
+request costs ``--service-ms``.  A tester polls all of them ``--cycles``
+times, one DID per request, then batched, then batched with the static
+DIDs cached, over DoIP and over ISO-TP on classic CAN.  Every read is
+checked.  A last run changes the ECU's calibration ID behind the
+tester's back and checks that ECUReset makes the next poll see it.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+_ROOT = Path(__file__).resolve().parents[3]
+if str(_ROOT / "tools" / "calibration") not in sys.path:
+    sys.path.insert(0, str(_ROOT / "tools" / "calibration"))
+
+from uds_ecu_sim import DoipServerSim, SimulatedEcu, serve_isotp  # noqa: E402
+from uds_xcp_adapter import (  # noqa: E402
+    DoipConnection,
+    IsoTpConfig,
+    IsoTpConnection,
+    IsoTpUdsTransport,
+    UdsClient,
+    VirtualCanBus,
+)
+
+ECU_ADDRESS = 0x1001
+TESTER_ID, ECU_ID = 0x7E0, 0x7E8
+VIN, SW_VERSION, CAL_ID = 0xF190, 0xF189, 0xF806
+STATIC = {VIN: b"WDD2220001A000001", SW_VERSION: b"SW 04.12", CAL_ID: b"CAL-2026-0001-A0"}
+MAX_RESPONSE = 256
+
+
+def build_ecu(count: int, service_time: float) -> SimulatedEcu:
+    dids = dict(STATIC)
+    for i in range(count):
+        dids[0x0100 + i] = bytes((i + j) & 0xFF for j in range(1 + i % 8))
+    return SimulatedEcu(ECU_ADDRESS, bytearray(16), dids=dids,
+                        service_time=service_time, max_response=MAX_RESPONSE)
+
+
+async def poll(transport, ecu: SimulatedEcu, cycles: int, batched: bool,
+               cached: bool) -> tuple:
+    sizes = {did: len(data) for did, data in ecu.dids.items()}
+    client = UdsClient(transport, did_sizes=sizes, static_dids=STATIC if cached else (),
+                       max_response=MAX_RESPONSE, max_dids=32 if batched else 1)
+    dids = list(ecu.dids)
+    start = time.perf_counter()
+    for _ in range(cycles):
+        if await client.read_dids(dids) != ecu.dids:
+            raise SystemExit("DID data mismatch")
+    return time.perf_counter() - start, client.stats
+
+
+async def check_reset(transport, ecu: SimulatedEcu) -> None:
+    client = UdsClient(transport, static_dids=STATIC)
+    before: Dict[int, bytes] = await client.read_dids(STATIC)
+    ecu.dids[CAL_ID] = b"CAL-2026-0002-B1"
+    if await client.read_dids(STATIC) != before:
+        raise SystemExit("static DIDs were not served from the cache")
+    await client.request(b"\x11\x01")
+    if (await client.read_did(CAL_ID)) != ecu.dids[CAL_ID]:
+        raise SystemExit("calibration ID still cached after ECUReset")
+    ecu.dids[CAL_ID] = STATIC[CAL_ID]
+    print(f"ECUReset: cache invalidated ({client.stats.invalidations}), "
+          f"new calibration ID read back")
+
+
+async def run_all(label: str, transport, ecu: SimulatedEcu, cycles: int) -> None:
+    for mode, batched, cached in (("per DID", False, False), ("batched", True, False),
+                                  ("batched + cache", True, True)):
+        elapsed, stats = await poll(transport, ecu, cycles, batched, cached)
+        print(f"{label:7s} {mode:16s} {stats.requests:8d} {stats.cache_hits:6d} "
+              f"{elapsed * 1e3:9.1f} {elapsed / cycles * 1e3:8.2f}")
+    await check_reset(transport, ecu)
+
+
+async def over_doip(port: int, ecu: SimulatedEcu, cycles: int) -> None:
+    async with await DoipConnection.open("127.0.0.1", port) as conn:
+        await run_all("DoIP", conn.session(ECU_ADDRESS), ecu, cycles)
+
+
+async def over_isotp(ecu: SimulatedEcu, cycles: int) -> None:
+    bus = VirtualCanBus()
+    ecu_conn = IsoTpConnection(bus.channel([TESTER_ID]), IsoTpConfig(ECU_ID, TESTER_ID))
+    tester = IsoTpConnection(bus.channel([ECU_ID]), IsoTpConfig(TESTER_ID, ECU_ID))
+    stop = threading.Event()
+    thread = threading.Thread(target=serve_isotp, args=(ecu_conn, ecu, stop), daemon=True)
+    thread.start()
+    try:
+        await run_all("ISO-TP", IsoTpUdsTransport(tester), ecu, cycles)
+    finally:
+        stop.set()
+        thread.join()
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--dids", type=int, default=40)
+    parser.add_argument("--cycles", type=int, default=10)
+    parser.add_argument("--service-ms", type=float, default=2.0)
+    args = parser.parse_args(argv)
+
+    ecu = build_ecu(args.dids, args.service_ms / 1000.0)
+    print(f"{len(ecu.dids)} DIDs per poll, {args.cycles} polls, "
+          f"responses limited to {MAX_RESPONSE} bytes")
+    print(f"{'link':7s} {'mode':16s} {'requests':>8s} {'cached':>6s} {'ms':>9s} {'ms/poll':>8s}")
+    with DoipServerSim([ecu]) as server:
+        server.start()
+        asyncio.run(over_doip(server.port, ecu, args.cycles))
+    asyncio.run(over_isotp(ecu, args.cycles))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""Benchmark DAQ streaming against SHORT_UPLOAD polling on a local XCP slave.
+
+Records ``--signals`` u32 signals for ``--duration`` seconds both ways and
+reports the achieved sample rate; the DAQ run also checks the recorded
+column values against the slave memory.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+import tempfile
+from pathlib import Path
+from typing import List, Optional
+
+_ROOT = Path(__file__).resolve().parents[3]
+for _sub in ("tools/calibration", "calibration/tools/ethernet_calib"):
+    if str(_ROOT / _sub) not in sys.path:
+        sys.path.insert(0, str(_ROOT / _sub))
+
+from eth_xcp_tool import DaqRecorder, Signal, poll  # noqa: E402
+from ethernet_xcp_adapter import XcpMaster, XcpTcpTransport  # noqa: E402
+from xcp_slave_sim import SimulatedMemory, SlaveConfig, XcpSlaveServer  # noqa: E402
+
+SRAM_BASE = 0x20400000
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--signals", type=int, default=200)
+    parser.add_argument("--duration", type=float, default=2.0)
+    parser.add_argument("--rate-hz", type=float, default=1000.0, help="slave DAQ event rate")
+    parser.add_argument("--latency-ms", type=float, default=0.5)
+    args = parser.parse_args(argv)
+
+    memory = SimulatedMemory()
+    image = bytes(range(256)) * (args.signals * 4 // 256 + 1)
+    memory.add_segment(SRAM_BASE, image)
+    config = SlaveConfig(latency=args.latency_ms / 1000.0, daq_period=1.0 / args.rate_hz,
+                         memory=memory)
+    signals = [Signal(f"sig{i:03d}", SRAM_BASE + 4 * i, "u32") for i in range(args.signals)]
+    server = XcpSlaveServer(config)
+    server.start()
+    try:
+        with tempfile.TemporaryDirectory() as out:
+            with XcpMaster(XcpTcpTransport("127.0.0.1", server.port)) as master:
+                master.connect()
+                stats = poll(master, signals, Path(out) / "poll.csv", args.duration)
+                print(f"poll: {stats.samples} samples, {stats.rate:8.1f} Hz")
+            with XcpMaster(XcpTcpTransport("127.0.0.1", server.port)) as master:
+                master.connect()
+                recorder = DaqRecorder(master, signals)
+                stats = recorder.record(Path(out), args.duration)
+                print(f"daq:  {stats.samples} samples, {stats.rate:8.1f} Hz "
+                      f"({stats.packets} ODT packets, lost {stats.lost})")
+            manifest = json.loads((Path(out) / "recording.json").read_text())
+            for column in manifest["columns"][2:]:
+                values = (Path(out) / column["file"]).read_bytes()
+                expected = image[int(column["address"], 16) - SRAM_BASE:][:4]
+                if values[:4] != expected or len(values) != 4 * stats.samples:
+                    print(f"{column['name']}: recorded values differ", file=sys.stderr)
+                    return 1
+    finally:
+        server.shutdown()
+        server.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
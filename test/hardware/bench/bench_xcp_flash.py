@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""Benchmark XCP flash programming paths against a local XCP slave.
+
+Flashes the same image with the sequential PROGRAM path, the pipelined
+path with and without erase/program overlap, and the pipelined path with
+PROGRAM_MAX disabled, then prints the per-phase timing of each run.  The slave emulates a background sector
+erase of ``--sector-erase-ms``.
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+from pathlib import Path
+from typing import List, Optional
+
+_ROOT = Path(__file__).resolve().parents[3]
+for _sub in ("tools/calibration", "calibration/tools/xcp_tool"):
+    if str(_ROOT / _sub) not in sys.path:
+        sys.path.insert(0, str(_ROOT / _sub))
+
+from ethernet_xcp_adapter import XcpMaster, XcpTcpTransport  # noqa: E402
+from xcp_flash_programmer import FlashProgrammer, FlashSegment  # noqa: E402
+from xcp_slave_sim import SimulatedMemory, SlaveConfig, XcpSlaveServer  # noqa: E402
+
+FLASH_BASE = 0x00400000
+
+RUNS = [
+    ("sequential PROGRAM", dict(sequential=True), {}),
+    ("pipelined", {}, dict(overlap_erase=False)),
+    ("pipelined + overlap", {}, {}),
+    ("no PROGRAM_MAX", {}, dict(use_program_max=False, overlap_erase=False)),
+]
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size", type=lambda v: int(v, 0), default=0x80000)
+    parser.add_argument("--latency-ms", type=float, default=0.2)
+    parser.add_argument("--sector-erase-ms", type=float, default=1.0)
+    parser.add_argument("--max-cto", type=int, default=255)
+    args = parser.parse_args(argv)
+
+    image = os.urandom(args.size)
+    for name, flash_kwargs, programmer_kwargs in RUNS:
+        memory = SimulatedMemory()
+        memory.add_segment(FLASH_BASE, bytes(args.size))
+        config = SlaveConfig(max_cto=args.max_cto, latency=args.latency_ms / 1000.0,
+                             sector_erase_time=args.sector_erase_ms / 1000.0,
+                             memory=memory)
+        server = XcpSlaveServer(config)
+        server.start()
+        try:
+            with XcpMaster(XcpTcpTransport("127.0.0.1", server.port, 30.0)) as master:
+                master.connect()
+                stats = FlashProgrammer(master, **programmer_kwargs).flash(
+                    [FlashSegment(FLASH_BASE, image)], **flash_kwargs)
+        finally:
+            server.shutdown()
+            server.server_close()
+        if bytes(memory.view(FLASH_BASE, args.size)) != image:
+            print(f"{name}: flash content mismatch", file=sys.stderr)
+            return 1
+        print(f"{name:<24}{stats.summary()}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""Benchmark the parallel dump orchestrator against several local XCP slaves.
+
+Starts ``--ecus`` slave stand-ins (alternating TCP and UDP), dumps the same
+range from all of them at once and checks every image byte for byte.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import sys
+import tempfile
+from pathlib import Path
+from typing import List, Optional
+
+_ROOT = Path(__file__).resolve().parents[3]
+for _sub in ("tools/calibration", "calibration/tools/xcp_tool"):
+    if str(_ROOT / _sub) not in sys.path:
+        sys.path.insert(0, str(_ROOT / _sub))
+
+from xcp_dump_orchestrator import (  # noqa: E402
+    DumpOrchestrator,
+    EcuTarget,
+    parse_size,
+    print_summary,
+)
+from xcp_memory_dump import MemoryRange  # noqa: E402
+from xcp_slave_sim import (  # noqa: E402
+    SimulatedMemory,
+    SlaveConfig,
+    XcpSlaveServer,
+    XcpUdpSlaveServer,
+)
+
+SRAM_BASE = 0x20400000
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--ecus", type=int, default=8)
+    parser.add_argument("--size", type=parse_size, default=parse_size("1M"))
+    parser.add_argument("--latency-ms", type=float, default=0.5)
+    parser.add_argument("--memory-budget", type=parse_size, default=parse_size("4M"))
+    parser.add_argument("--tcp-only", action="store_true")
+    args = parser.parse_args(argv)
+
+    servers = []
+    targets = []
+    images = {}
+    for index in range(args.ecus):
+        memory = SimulatedMemory()
+        image = bytes((index + i) & 0xFF for i in range(256)) * (args.size // 256)
+        memory.add_segment(SRAM_BASE, image)
+        config = SlaveConfig(latency=args.latency_ms / 1000.0, memory=memory)
+        udp = index % 2 == 1 and not args.tcp_only
+        server = (XcpUdpSlaveServer if udp else XcpSlaveServer)(config)
+        server.start()
+        servers.append(server)
+        name = f"vcu{index:02d}"
+        targets.append(EcuTarget(name, "127.0.0.1", server.port, "udp" if udp else "tcp"))
+        images[name] = image
+
+    try:
+        with tempfile.TemporaryDirectory() as out:
+            orchestrator = DumpOrchestrator([MemoryRange(SRAM_BASE, len(image))],
+                                            Path(out), memory_budget=args.memory_budget)
+            sessions = asyncio.run(orchestrator.run(targets, progress_interval=0.5))
+            print_summary(sessions)
+            for s in sessions:
+                dumped = (Path(out) / f"{s.target.name}.bin").read_bytes()
+                if dumped != images[s.target.name]:
+                    print(f"{s.target.name}: image mismatch", file=sys.stderr)
+                    return 1
+    finally:
+        for server in servers:
+            server.shutdown()
+            server.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""Benchmark short XCP script steps direct versus through the session daemon.
+
+Every step reads a few calibration bytes, the way the snapshot and
+verification scripts poke the ECU.  "direct" opens its own connection per
+step (TCP connect, CONNECT, GET_COMM_MODE_INFO, GET_STATUS, UPLOAD,
+DISCONNECT); "daemon" sends the same read to a running
+``xcp_session_daemon`` over its Unix socket.  The simulated slave answers
+every command after ``--latency`` seconds.  Finally the daemon's link is
+cut under it to check that the next request reconnects transparently.
+"""
+
+from __future__ import annotations
+
+import argparse
+import socket
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import List, Optional
+
+_ROOT = Path(__file__).resolve().parents[3]
+for _lib in (_ROOT / "tools" / "calibration", _ROOT / "calibration" / "tools" / "xcp_tool"):
+    if str(_lib) not in sys.path:
+        sys.path.insert(0, str(_lib))
+
+from ethernet_xcp_adapter import XcpMaster, open_transport  # noqa: E402
+from xcp_dump_orchestrator import EcuTarget  # noqa: E402
+from xcp_session_daemon import XcpDaemonClient, XcpSessionDaemon  # noqa: E402
+from xcp_slave_sim import SimulatedMemory, SlaveConfig, XcpSlaveServer  # noqa: E402
+
+BASE = 0x00400000
+SIZE = 0x10000
+
+
+def direct_step(port: int, address: int, size: int) -> bytes:
+    with XcpMaster(open_transport("127.0.0.1", port, "tcp", 2.0)) as master:
+        master.connect()
+        master.get_status()
+        return master.short_upload(address, size)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--steps", type=int, default=200)
+    parser.add_argument("--clients", type=int, default=4,
+                        help="concurrent client threads in the shared run")
+    parser.add_argument("--latency", type=float, default=0.0005,
+                        help="simulated per-command slave latency (s)")
+    args = parser.parse_args(argv)
+
+    memory = SimulatedMemory()
+    image = bytes(i * 7 & 0xFF for i in range(SIZE))
+    memory.add_segment(BASE, image)
+    slave = XcpSlaveServer(SlaveConfig(latency=args.latency, memory=memory))
+    slave.start()
+    addresses = [BASE + (i * 977) % (SIZE - 16) for i in range(args.steps)]
+
+    start = time.perf_counter()
+    for address in addresses:
+        assert direct_step(slave.port, address, 8) == image[address - BASE:address - BASE + 8]
+    direct = time.perf_counter() - start
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "sessiond.sock"
+        daemon = XcpSessionDaemon(path, [EcuTarget("vcu", "127.0.0.1", slave.port)],
+                                  health_interval=0.5)
+        daemon.start_health_checks()
+        threading.Thread(target=daemon.serve_forever, daemon=True).start()
+
+        with XcpDaemonClient(path) as client:
+            client.open("vcu")
+            start = time.perf_counter()
+            for address in addresses:
+                assert client.short_upload("vcu", address, 8) == \
+                    image[address - BASE:address - BASE + 8]
+            shared = time.perf_counter() - start
+
+        def worker(part: List[int]) -> None:
+            with XcpDaemonClient(path) as own:
+                for address in part:
+                    assert own.short_upload("vcu", address, 8) == \
+                        image[address - BASE:address - BASE + 8]
+
+        threads = [threading.Thread(target=worker, args=(addresses[i::args.clients],))
+                   for i in range(args.clients)]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        concurrent = time.perf_counter() - start
+
+        # cut the link under the daemon, as a pulled cable or ECU reset would
+        session = daemon.sessions["vcu"]
+        session.master.transport._sock.shutdown(socket.SHUT_RDWR)  # noqa: SLF001
+        with XcpDaemonClient(path) as client:
+            data = client.upload("vcu", BASE, SIZE)
+            status = client.status()[0]
+            client.shutdown()
+        daemon.server_close()
+
+    slave.shutdown()
+    slave.server_close()
+    for label, elapsed in (("direct (connect per step)", direct),
+                           ("daemon, 1 client", shared),
+                           (f"daemon, {args.clients} clients", concurrent)):
+        print(f"{label:28s} {elapsed * 1e3:8.1f} ms  {elapsed / args.steps * 1e3:6.2f} ms/step")
+    print(f"after link drop: upload {'ok' if data == image else 'MISMATCH'}, "
+          f"connects {status['connects']}, reconnects {status['reconnects']}, "
+          f"last error: {status['last_error'] or '-'}")
+    return 0 if data == image else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""Benchmark the XCP slave simulator as a load target.
+
+``--masters`` concurrent masters each run a pipelined upload of ``--size``
+bytes against one simulated slave, first the thread-per-connection server
+and then the asyncio one, over TCP and UDP; the aggregate MB/s is the
+throughput the simulator sustains.  A final run checks the link model:
+with ``--bandwidth`` set, a single upload must take about size/bandwidth.
+
+The memory is built the way ``--layout/--image`` build it: a small MEMORY
+block with a generated Intel HEX image on top, and every upload is
+checked against it.
+"""
+
+from __future__ import annotations
+
+import argparse
+import random
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import List, Optional
+
+_ROOT = Path(__file__).resolve().parents[3]
+for _sub in ("tools/calibration", "calibration/tools/xcp_tool"):
+    if str(_ROOT / _sub) not in sys.path:
+        sys.path.insert(0, str(_ROOT / _sub))
+
+from ethernet_xcp_adapter import XcpMaster, open_transport  # noqa: E402
+from xcp_memory_dump import PipelinedUploader  # noqa: E402
+from xcp_slave_sim import (  # noqa: E402
+    AsyncXcpSlaveServer,
+    SimulatedMemory,
+    SlaveConfig,
+    XcpSlaveServer,
+    XcpUdpSlaveServer,
+)
+
+CAL_BASE = 0x00600000
+LAYOUT = """
+MEMORY
+{
+    int_cal   (R)  : ORIGIN = 0x00600000, LENGTH = {size}
+    int_dtcm  (RW) : ORIGIN = 0x20000000, LENGTH = 64K
+    peripheral     : ORIGIN = 0x40000000, LENGTH = 1024M
+}
+"""
+
+
+def write_ihex(path: Path, address: int, data: bytes) -> None:
+    lines = []
+    upper = None
+    for offset in range(0, len(data), 32):
+        at = address + offset
+        if at >> 16 != upper:
+            upper = at >> 16
+            record = bytes((2, 0, 0, 4)) + upper.to_bytes(2, "big")
+            lines.append(record)
+        chunk = data[offset:offset + 32]
+        lines.append(bytes((len(chunk),)) + (at & 0xFFFF).to_bytes(2, "big") + b"\x00" + chunk)
+    lines.append(bytes((0, 0, 0, 1)))
+    path.write_text("".join(f":{r.hex().upper()}{(-sum(r)) & 0xFF:02X}\n" for r in lines))
+
+
+def build_memory(tmp: Path, size: int) -> tuple:
+    image = random.Random(1).randbytes(size // 2)
+    layout, hex_path = tmp / "layout.ld", tmp / "cal.hex"
+    layout.write_text(LAYOUT.replace("{size}", str(size)))
+    write_ihex(hex_path, CAL_BASE + size // 4, image)
+    memory = SimulatedMemory.from_files(layout, [hex_path])
+    expected = b"\xff" * (size // 4) + image + b"\xff" * (size - size // 4 - len(image))
+    return memory, expected
+
+
+def upload_run(port: int, protocol: str, masters: int, size: int,
+               expected: bytes) -> float:
+    errors: List[str] = []
+
+    def master_thread() -> None:
+        try:
+            with XcpMaster(open_transport("127.0.0.1", port, protocol, 5.0)) as master:
+                master.connect()
+                data = PipelinedUploader(master, 16).upload(CAL_BASE, size)
+                if data != expected:
+                    errors.append("data mismatch")
+        except Exception as exc:  # noqa: BLE001 - report and fail the run
+            errors.append(f"{type(exc).__name__}: {exc}")
+
+    threads = [threading.Thread(target=master_thread) for _ in range(masters)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    if errors:
+        raise SystemExit(f"{protocol}: {errors[0]}")
+    return elapsed
+
+
+def check_download(port: int) -> None:
+    payload = bytes(range(256)) * 4
+    with XcpMaster(open_transport("127.0.0.1", port, "tcp", 5.0)) as master:
+        master.connect()
+        master.set_mta(0x20000100)
+        master.download(payload)
+        if PipelinedUploader(master).upload(0x20000100, len(payload)) != payload:
+            raise SystemExit("DOWNLOAD readback mismatch")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--masters", type=int, default=8)
+    parser.add_argument("--size", type=lambda v: int(v, 0), default=0x80000)
+    parser.add_argument("--bandwidth", type=float, default=2e6, help="bytes/s for the link check")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        memory, expected = build_memory(Path(tmp), args.size)
+    print(f"memory: {len(memory.segments)} segment(s), {memory.size} bytes "
+          f"(peripheral window skipped)")
+    total = args.masters * args.size / 1e6
+    print(f"{'server':12s} {'proto':6s} {'masters':>8s} {'seconds':>8s} {'MB/s':>8s}")
+    for label in ("threaded", "asyncio"):
+        for protocol in ("tcp", "udp"):
+            config = SlaveConfig(memory=memory)
+            if label == "asyncio":
+                server = AsyncXcpSlaveServer(config, udp=protocol == "udp")
+            else:
+                server = (XcpUdpSlaveServer if protocol == "udp" else XcpSlaveServer)(config)
+            server.start()
+            try:
+                if protocol == "tcp":
+                    check_download(server.port)
+                elapsed = upload_run(server.port, protocol, args.masters, args.size, expected)
+            finally:
+                server.shutdown()
+                server.server_close()
+            print(f"{label:12s} {protocol:6s} {args.masters:8d} {elapsed:8.3f} "
+                  f"{total / elapsed:8.1f}")
+
+    config = SlaveConfig(memory=memory, bandwidth=args.bandwidth)
+    with AsyncXcpSlaveServer(config) as server:
+        server.start()
+        elapsed = upload_run(server.port, "tcp", 1, args.size, expected)
+        server.shutdown()
+    print(f"link model: {args.size / elapsed / 1e6:.2f} MB/s measured at "
+          f"{args.bandwidth / 1e6:.2f} MB/s configured")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+"""Benchmark XCP-on-Ethernet receive throughput against a loopback slave.
+
+A local "slave" thread streams pre-framed DAQ packets with a continuous
+CTR as fast as it can.  Over TCP the buffered ``recv_view`` path is
+compared with a per-packet header/payload ``recv`` loop (the way the
+transport used to read); over UDP with one packet per datagram against
+packed datagrams.  The UDP slave is paced to ``--udp-rate`` packets/s so
+the loopback socket buffer does not overflow; a UDP row at that rate is
+capped by the pacing, so raise it until packets start to drop.  Reports packets received
+against offered, packets/s and MB/s over the packets actually delivered,
+and the CTR gaps; any lost packet fails the run, since the rates would
+then be measured on a fraction of the data.
+"""
+
+from __future__ import annotations
+
+import argparse
+import socket
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Callable, List, Optional
+
+_ROOT = Path(__file__).resolve().parents[3]
+if str(_ROOT / "tools" / "calibration") not in sys.path:
+    sys.path.insert(0, str(_ROOT / "tools" / "calibration"))
+
+from ethernet_xcp_adapter import (  # noqa: E402
+    ETH_HEADER,
+    XcpTcpTransport,
+    XcpTimeoutError,
+    XcpUdpTransport,
+)
+
+CTR_PERIOD = 0x10000
+
+
+def make_stream(payload: int) -> bytes:
+    """One full CTR period of DAQ frames, so repeats keep the CTR continuous."""
+    frame = bytearray(ETH_HEADER.size + payload)
+    out = bytearray()
+    for ctr in range(CTR_PERIOD):
+        ETH_HEADER.pack_into(frame, 0, payload, ctr)
+        frame[ETH_HEADER.size] = ctr & 0x7F  # ODT PID
+        out += frame
+    return bytes(out)
+
+
+def tcp_slave(listener: socket.socket, stream: bytes, repeats: int) -> None:
+    conn, _ = listener.accept()
+    with conn:
+        for _ in range(repeats):
+            conn.sendall(stream)
+
+
+def udp_slave(sock: socket.socket, stream: bytes, repeats: int, frame: int,
+              per_datagram: int, rate: float) -> None:
+    _, client = sock.recvfrom(64)
+    step = frame * per_datagram
+    view = memoryview(stream)
+    sent = 0
+    start = time.perf_counter()
+    for _ in range(repeats):
+        for n, offset in enumerate(range(0, len(stream), step)):
+            sock.sendto(view[offset:offset + step], client)
+            sent += per_datagram
+            ahead = sent / rate - (time.perf_counter() - start) if rate else 0.0
+            if ahead > 0.001:
+                time.sleep(ahead)
+            elif n % 16 == 15:
+                time.sleep(0)  # let the receiver run between bursts
+
+
+def legacy_recv(transport: XcpTcpTransport) -> bytes:
+    """Header and payload as separate reads, one new bytes object per packet."""
+    sock = transport._sock  # noqa: SLF001 - baseline needs the raw socket
+    header = bytearray(ETH_HEADER.size)
+    view = memoryview(header)
+    got = 0
+    while got < len(header):
+        got += sock.recv_into(view[got:])
+    length, _ctr = ETH_HEADER.unpack_from(header)
+    packet = bytearray(length)
+    view = memoryview(packet)
+    got = 0
+    while got < length:
+        got += sock.recv_into(view[got:])
+    return bytes(packet)
+
+
+def run_tcp(stream: bytes, repeats: int,
+            receive: Callable[[XcpTcpTransport], object]) -> tuple:
+    listener = socket.create_server(("127.0.0.1", 0))
+    thread = threading.Thread(target=tcp_slave, args=(listener, stream, repeats), daemon=True)
+    thread.start()
+    transport = XcpTcpTransport("127.0.0.1", listener.getsockname()[1], timeout=10.0)
+    total = CTR_PERIOD * repeats
+    start = time.perf_counter()
+    for _ in range(total):
+        receive(transport)
+    elapsed = time.perf_counter() - start
+    gaps = transport.stats.ctr_gaps
+    transport.close()
+    listener.close()
+    thread.join()
+    return total, elapsed, gaps
+
+
+def run_udp(stream: bytes, repeats: int, frame: int, per_datagram: int,
+            rate: float) -> tuple:
+    slave = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    slave.bind(("127.0.0.1", 0))
+    thread = threading.Thread(target=udp_slave, daemon=True,
+                              args=(slave, stream, repeats, frame, per_datagram, rate))
+    thread.start()
+    transport = XcpUdpTransport("127.0.0.1", slave.getsockname()[1], timeout=0.5)
+    transport.send(b"\xFF\x00")  # CONNECT; tells the slave where to stream
+    received = 0
+    start = last = time.perf_counter()
+    try:
+        while True:
+            transport.recv_view()
+            received += 1
+            last = time.perf_counter()
+    except XcpTimeoutError:
+        pass  # the slave has finished and the socket ran dry
+    elapsed = last - start
+    stats = transport.stats
+    lost = stats.account(CTR_PERIOD * repeats)
+    transport.close()
+    slave.close()
+    thread.join()
+    return received, elapsed, stats.ctr_gaps, lost
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--payload", type=int, default=16, help="bytes per DAQ packet")
+    parser.add_argument("--repeats", type=int, default=8,
+                        help="CTR periods (65536 packets each) per run")
+    parser.add_argument("--udp-rate", type=float, default=600e3,
+                        help="packets/s the UDP slave sends (0: unpaced)")
+    args = parser.parse_args(argv)
+
+    stream = make_stream(args.payload)
+    frame = ETH_HEADER.size + args.payload
+    offered = CTR_PERIOD * args.repeats
+    size = frame * offered / 1e6
+    rows = []
+    for label, receive in (("tcp per-packet recv", legacy_recv),
+                           ("tcp recv_view", XcpTcpTransport.recv_view)):
+        packets, elapsed, gaps = run_tcp(stream, args.repeats, receive)
+        rows.append((label, packets, elapsed, gaps, 0))
+    packed = XcpUdpTransport.MAX_DATAGRAM // frame
+    for per_datagram in (1, packed):
+        packets, elapsed, gaps, lost = run_udp(stream, args.repeats, frame, per_datagram,
+                                               args.udp_rate)
+        rows.append((f"udp {per_datagram} pkt/datagram", packets, elapsed, gaps, lost))
+
+    print(f"{'path':24s} {'received':>17s} {'kpkt/s':>9s} {'MB/s':>8s} {'gaps':>6s} {'lost':>8s}")
+    for label, packets, elapsed, gaps, lost in rows:
+        print(f"{label:24s} {packets:8d}/{offered:8d} {packets / elapsed / 1e3:9.1f} "
+              f"{packets * frame / elapsed / 1e6:8.1f} {gaps:6d} {lost:8d}")
+    print(f"({size:.1f} MB offered per run; UDP paced at {args.udp_rate / 1e3:.0f} kpkt/s)")
+    dropped = [label for label, packets, *_ in rows if packets < offered]
+    if dropped:
+        print(f"error: packets lost on {', '.join(dropped)}; lower --udp-rate",
+              file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""Benchmark pipelined XCP uploads against a local XCP-on-TCP slave.
+
+Reports MB/s for the SHORT_UPLOAD baseline and for the block-mode upload
+engine at several window sizes.  Pass ``--host/--port`` to run against a
+real ECU instead of the in-process slave stand-in.
+"""
+
+from __future__ import annotations
+
+import argparse
+import sys
+import time
+from pathlib import Path
+from typing import List, Optional
+
+_ROOT = Path(__file__).resolve().parents[3]
+for _sub in ("tools/calibration", "calibration/tools/xcp_tool"):
+    if str(_ROOT / _sub) not in sys.path:
+        sys.path.insert(0, str(_ROOT / _sub))
+
+from ethernet_xcp_adapter import XcpMaster, XcpTcpTransport  # noqa: E402
+from xcp_memory_dump import PipelinedUploader, dump_sequential  # noqa: E402
+from xcp_slave_sim import SimulatedMemory, SlaveConfig, XcpSlaveServer  # noqa: E402
+
+SRAM_BASE = 0x20400000
+
+
+def run(host: str, port: int, address: int, size: int, windows: List[int]) -> None:
+    with XcpMaster(XcpTcpTransport(host, port)) as master:
+        info = master.connect()
+        print(f"MAX_CTO={info.max_cto} MAX_DTO={info.max_dto} "
+              f"block_mode={info.slave_block_mode} queue_size={info.queue_size}")
+        print(f"{'mode':<20}{'MB/s':>10}{'seconds':>10}")
+
+        baseline = min(size, 64 * 1024)
+        start = time.perf_counter()
+        dump_sequential(master, address, baseline)
+        elapsed = time.perf_counter() - start
+        print(f"{'SHORT_UPLOAD':<20}{baseline / elapsed / 1e6:>10.2f}{elapsed:>10.3f}")
+
+        reference = None
+        for window in windows:
+            uploader = PipelinedUploader(master, window)
+            data = bytes(uploader.upload(address, size))
+            if reference is None:
+                reference = data
+            elif data != reference:
+                raise SystemExit(f"window {window}: data mismatch")
+            stats = uploader.stats
+            label = f"window={uploader.window}"
+            print(f"{label:<20}{stats.mb_per_s:>10.2f}{stats.seconds:>10.3f}")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host")
+    parser.add_argument("--port", type=int, default=5555)
+    parser.add_argument("--address", type=lambda v: int(v, 0), default=SRAM_BASE)
+    parser.add_argument("--size", type=lambda v: int(v, 0), default=0x240000)
+    parser.add_argument("--windows", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32])
+    parser.add_argument("--latency-ms", type=float, default=0.5,
+                        help="simulated slave turnaround for the local stand-in")
+    args = parser.parse_args(argv)
+
+    if args.host:
+        run(args.host, args.port, args.address, args.size, args.windows)
+        return 0
+
+    memory = SimulatedMemory()
+    memory.add_segment(args.address, bytes(range(256)) * (args.size // 256 + 1))
+    config = SlaveConfig(latency=args.latency_ms / 1000.0, memory=memory)
+    with XcpSlaveServer(config) as server:
+        server.start()
+        run("127.0.0.1", server.port, args.address, args.size, args.windows)
+        server.shutdown()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
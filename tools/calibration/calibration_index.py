@@ -0,0 +1,450 @@
+#!/usr/bin/env python3
+"""Compiled binary index of the calibration map and its board variants.
+
+Parsing the calibration map YAML costs far more than the tools that need
+it, so the merged map (see ``calibration_map.py`` for the schema) and
+the board variants in ``config/calibration/board_variant.yaml`` are
+compiled once into a compact binary file named after the SHA-256 of the
+YAML contents.  Any edit to a source file changes the key, and the index
+is rebuilt on the next load.
+
+File layout (all integers little endian)::
+
+    header     magic "VCUCIDX1", version, flags, parameter count,
+               hash slot count, override count, metadata offset/length
+    sections   8-byte aligned arrays, located by the metadata:
+               entries     one ``INDEX_DTYPE_FIELDS`` row per parameter, by address
+               slots       open-addressing table of CRC-32(name) -> row + 1
+               names       UTF-8 names and their (count + 1) offsets
+               units       UTF-8 units and their (count + 1) offsets
+               overrides   ``OVERRIDE_DTYPE_FIELDS`` rows for all variants
+    metadata   JSON: platform, checksum definitions, variant -> [first,
+               count] of its override rows
+
+Name lookup is one hash probe (O(1)), address lookup a binary search over
+the sorted entries (O(log n)).  Tools import this module and load the
+index only when they actually need a parameter; a warm load is a file read
+and a few ``numpy.frombuffer`` views.
+
+Board variants replace the limits of individual parameters::
+
+    variants:
+      VCU_HP:
+        platform: S32K348           # optional; a string or a list
+        parameters:
+          motor_max_current: {max: 400000}
+"""
+
+from __future__ import annotations
+
+import argparse
+import functools
+import hashlib
+import json
+import os
+import struct
+import sys
+import zlib
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from calibration_map import (
+    MAP_DTYPE_FIELDS,
+    Checksum,
+    MONO_DECREASING,
+    MONO_INCREASING,
+    REPO_ROOT,
+    TYPE_NAMES,
+    TYPES,
+    CompiledMap,
+    MapError,
+    Parameter,
+    default_maps,
+    merge_maps,
+    np,
+    parse_map,
+    parse_number,
+    require_numpy,
+)
+
+MAGIC = b"VCUCIDX1"
+INDEX_VERSION = 2
+DEFAULT_INDEX_CACHE = Path.home() / ".cache" / "vcu_xcp" / "calib_index"
+
+FLAG_BIG_ENDIAN = 0x0001
+
+_HEADER = struct.Struct("<8sHHIIIQI")
+INDEX_DTYPE_FIELDS = MAP_DTYPE_FIELDS + [
+    ("size", "<u4"),    # bytes covered by the parameter
+    ("dim0", "<u4"),    # shape; 0 for unused dimensions
+    ("dim1", "<u4"),
+]
+OVERRIDE_DTYPE_FIELDS = [("param", "<u4"), ("min", "<f8"), ("max", "<f8")]
+
+
+class IndexFileError(Exception):
+    """Raised for malformed or stale index files."""
+
+
+def _name_hash(name: bytes) -> int:
+    return zlib.crc32(name)
+
+
+def _align8(value: int) -> int:
+    return (value + 7) & ~7
+
+
+# -- building ----------------------------------------------------------------
+
+
+def parse_variants(text: str, where: str = "<variants>",
+                   platform: Optional[str] = None) -> Dict[str, Dict[str, dict]]:
+    """``{variant: {parameter: {"min": .., "max": ..}}}`` for ``platform``."""
+    import yaml  # only needed when the index is (re)built
+
+    try:
+        doc = yaml.safe_load(text) or {}
+    except yaml.YAMLError as exc:
+        raise MapError(f"{where}: {exc}") from exc
+    variants = doc.get("variants") if isinstance(doc, dict) else None
+    if not isinstance(variants, dict):
+        if doc:
+            raise MapError(f"{where}: expected a 'variants' mapping")
+        return {}
+    result = {}
+    for name, spec in variants.items():
+        spec = spec or {}
+        platforms = spec.get("platform")
+        if isinstance(platforms, str):
+            platforms = [platforms]
+        if platform and platforms and platform not in platforms:
+            continue
+        overrides = spec.get("parameters") or {}
+        if not isinstance(overrides, dict):
+            raise MapError(f"{where}: {name}: 'parameters' must be a mapping")
+        result[str(name)] = {str(p): dict(o or {}) for p, o in overrides.items()}
+    return result
+
+
+def _override_rows(params: Sequence[Parameter], variants: Dict[str, Dict[str, dict]],
+                   where: str) -> Tuple[list, Dict[str, List[int]]]:
+    rows = {p.name: i for i, p in enumerate(params)}
+    overrides = []
+    table = {}
+    for variant, changes in variants.items():
+        table[variant] = [len(overrides), len(changes)]
+        for name, limits in changes.items():
+            if name not in rows:
+                raise MapError(f"{where}: {variant}: unknown parameter {name!r}")
+            param = params[rows[name]]
+            _, type_min, type_max = TYPES[param.type]
+            lo, hi = sorted((type_min * param.scale + param.offset,
+                             type_max * param.scale + param.offset))
+            label = f"{where}: {variant}: {name}"
+            minimum = max(lo, parse_number(limits.get("min", param.min), "min", label))
+            maximum = min(hi, parse_number(limits.get("max", param.max), "max", label))
+            if minimum > maximum:
+                raise MapError(f"{label}: min {minimum:g} > max {maximum:g}")
+            overrides.append((rows[name], minimum, maximum))
+    return overrides, table
+
+
+def build_index(params: Sequence[Parameter], byte_order: str = "<",
+                variants: Optional[Dict[str, Dict[str, dict]]] = None,
+                platform: str = "", where: str = "<variants>",
+                checksums: Sequence[Checksum] = ()) -> bytes:
+    """Serialise merged ``params`` (and ``checksums``) into the index format."""
+    require_numpy()
+    params = sorted(params, key=lambda p: p.address)
+    compiled = CompiledMap.compile(params, byte_order)
+    entries = np.zeros(len(params), dtype=INDEX_DTYPE_FIELDS)
+    for name, _ in MAP_DTYPE_FIELDS:
+        entries[name] = compiled.entries[name]
+    entries["size"] = [p.size for p in params]
+    entries["dim0"] = [p.shape[0] if p.shape else 0 for p in params]
+    entries["dim1"] = [p.shape[1] if len(p.shape) > 1 else 0 for p in params]
+
+    names = [p.name.encode() for p in params]
+    slot_count = 1 << max(3, (2 * len(params)).bit_length())
+    slots = np.zeros(slot_count, dtype="<u4")
+    mask = slot_count - 1
+    for row, name in enumerate(names):
+        slot = _name_hash(name) & mask
+        while slots[slot]:
+            slot = (slot + 1) & mask
+        slots[slot] = row + 1
+
+    def blob(strings: List[bytes]):
+        offsets = np.zeros(len(strings) + 1, dtype="<u4")
+        offsets[1:] = np.cumsum([len(s) for s in strings])
+        return b"".join(strings), offsets
+
+    name_blob, name_off = blob(names)
+    unit_blob, unit_off = blob([p.unit.encode() for p in params])
+    overrides, variant_table = _override_rows(params, variants or {}, where)
+    override_rows = np.array(overrides, dtype=OVERRIDE_DTYPE_FIELDS)
+
+    sections = [("entries", entries.tobytes()), ("slots", slots.tobytes()),
+                ("names", name_blob), ("name_off", name_off.tobytes()),
+                ("units", unit_blob), ("unit_off", unit_off.tobytes()),
+                ("overrides", override_rows.tobytes())]
+    out = bytearray(_HEADER.size)
+    layout = {}
+    for name, data in sections:
+        out.extend(bytes(_align8(len(out)) - len(out)))
+        layout[name] = [len(out), len(data)]
+        out.extend(data)
+    meta = json.dumps({"platform": platform, "sections": layout,
+                       "variants": variant_table,
+                       "checksums": [[c.name, c.address, c.algorithm, c.start, c.end]
+                                     for c in checksums]}, sort_keys=True).encode()
+    meta_offset = len(out)
+    out.extend(meta)
+    flags = FLAG_BIG_ENDIAN if byte_order == ">" else 0
+    _HEADER.pack_into(out, 0, MAGIC, INDEX_VERSION, flags, len(params), slot_count,
+                      len(overrides), meta_offset, len(meta))
+    return bytes(out)
+
+
+# -- reading -----------------------------------------------------------------
+
+
+class CalibrationIndex:
+    """Read-only view of a compiled index; arrays are views into one buffer.
+
+    ``data`` may be any buffer (``bytes``, ``mmap``, a shared memory block);
+    it is never copied.
+    """
+
+    def __init__(self, data, path: Optional[Path] = None) -> None:
+        require_numpy()
+        self.path = path
+        self.data = data
+        where = path or "<index>"
+        if len(data) < _HEADER.size:
+            raise IndexFileError(f"{where}: truncated header")
+        magic, version, flags, count, slot_count, _, meta_off, meta_len = \
+            _HEADER.unpack_from(data, 0)
+        if magic != MAGIC:
+            raise IndexFileError(f"{where}: not a calibration index")
+        if version != INDEX_VERSION:
+            raise IndexFileError(f"{where}: unsupported version {version}")
+        try:
+            meta = json.loads(bytes(data[meta_off:meta_off + meta_len]))
+            sections = {name: data[offset:offset + length]
+                        for name, (offset, length) in meta["sections"].items()}
+        except (ValueError, KeyError, TypeError) as exc:
+            raise IndexFileError(f"{where}: bad metadata") from exc
+        self.byte_order = ">" if flags & FLAG_BIG_ENDIAN else "<"
+        self.platform: str = meta.get("platform", "")
+        self._variants: Dict[str, List[int]] = meta.get("variants", {})
+        self.checksums = [Checksum(*fields, source=str(where))
+                          for fields in meta.get("checksums", [])]
+        self.entries = np.frombuffer(sections["entries"], dtype=INDEX_DTYPE_FIELDS)
+        self._slots = np.frombuffer(sections["slots"], dtype="<u4")
+        self._names = sections["names"]
+        self._name_off = np.frombuffer(sections["name_off"], dtype="<u4")
+        self._units = sections["units"]
+        self._unit_off = np.frombuffer(sections["unit_off"], dtype="<u4")
+        self._overrides = np.frombuffer(sections["overrides"], dtype=OVERRIDE_DTYPE_FIELDS)
+        if len(self.entries) != count or len(self._slots) != slot_count:
+            raise IndexFileError(f"{where}: section sizes disagree with header")
+        self._ends = self.entries["address"] + self.entries["size"]
+
+    @classmethod
+    def open(cls, path: Path) -> "CalibrationIndex":
+        return cls(Path(path).read_bytes(), Path(path))
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def __contains__(self, name: str) -> bool:
+        return self.lookup(name) is not None
+
+    @property
+    def variants(self) -> List[str]:
+        return sorted(self._variants)
+
+    def name(self, row: int) -> str:
+        return bytes(self._names[self._name_off[row]:self._name_off[row + 1]]).decode()
+
+    def unit(self, row: int) -> str:
+        return bytes(self._units[self._unit_off[row]:self._unit_off[row + 1]]).decode()
+
+    def shape(self, row: int) -> Tuple[int, ...]:
+        entry = self.entries[row]
+        return tuple(int(n) for n in (entry["dim0"], entry["dim1"]) if n)
+
+    def lookup(self, name: str) -> Optional[int]:
+        """Row of parameter ``name`` (one hash probe plus collisions)."""
+        key = name.encode()
+        mask = len(self._slots) - 1
+        slot = _name_hash(key) & mask
+        while True:
+            row = int(self._slots[slot])
+            if not row:
+                return None
+            start, end = self._name_off[row - 1], self._name_off[row]
+            if self._names[start:end] == key:
+                return row - 1
+            slot = (slot + 1) & mask
+
+    def find(self, address: int) -> Optional[int]:
+        """Row of the parameter covering ``address`` (binary search)."""
+        row = int(np.searchsorted(self.entries["address"], address, side="right")) - 1
+        if row >= 0 and address < self._ends[row]:
+            return row
+        return None
+
+    def _limits(self, variant: Optional[str]):
+        minimum = self.entries["min"].copy()
+        maximum = self.entries["max"].copy()
+        if variant is not None:
+            if variant not in self._variants:
+                raise MapError(f"unknown board variant {variant!r} "
+                               f"(known: {', '.join(self.variants) or 'none'})")
+            first, count = self._variants[variant]
+            rows = self._overrides[first:first + count]
+            minimum[rows["param"]] = rows["min"]
+            maximum[rows["param"]] = rows["max"]
+        return minimum, maximum
+
+    def parameter(self, row: int, variant: Optional[str] = None) -> Parameter:
+        entry = self.entries[row]
+        minimum, maximum = float(entry["min"]), float(entry["max"])
+        if variant is not None:
+            low, high = self._limits(variant)
+            minimum, maximum = float(low[row]), float(high[row])
+        flags = int(entry["flags"])
+        monotonic = ("increasing" if flags & MONO_INCREASING
+                     else "decreasing" if flags & MONO_DECREASING else "")
+        return Parameter(self.name(row), int(entry["address"]),
+                         TYPE_NAMES[int(entry["type"])], self.shape(row), minimum, maximum,
+                         float(entry["scale"]), float(entry["offset"]), self.unit(row),
+                         monotonic, str(self.path or "<index>"))
+
+    def get(self, name: str, variant: Optional[str] = None) -> Optional[Parameter]:
+        row = self.lookup(name)
+        return None if row is None else self.parameter(row, variant)
+
+    def at(self, address: int, variant: Optional[str] = None) -> Optional[Parameter]:
+        row = self.find(address)
+        return None if row is None else self.parameter(row, variant)
+
+    def compiled(self, variant: Optional[str] = None) -> CompiledMap:
+        """The whole map as a ``CompiledMap``, with ``variant``'s limits applied."""
+        entries = np.zeros(len(self.entries), dtype=MAP_DTYPE_FIELDS)
+        for name, _ in MAP_DTYPE_FIELDS:
+            entries[name] = self.entries[name]
+        entries["min"], entries["max"] = self._limits(variant)
+        rows = range(len(self.entries))
+        return CompiledMap(entries, [self.name(r) for r in rows],
+                           [self.unit(r) for r in rows], [self.shape(r) for r in rows],
+                           self.byte_order, self.checksums)
+
+
+# -- cache -------------------------------------------------------------------
+
+
+def default_sources(platform: str, root: Path = REPO_ROOT) -> Tuple[List[Path], Optional[Path]]:
+    """The platform's map files and the board variant file, if non-empty."""
+    variants = root / "config" / "calibration" / "board_variant.yaml"
+    if not (variants.is_file() and variants.stat().st_size):
+        variants = None
+    return default_maps(platform, root), variants
+
+
+def _index_key(contents: Sequence[bytes], has_variants: bool, platform: str) -> str:
+    digest = hashlib.sha256(f"v{INDEX_VERSION}:{platform}:{has_variants}".encode())
+    for data in contents:
+        digest.update(hashlib.sha256(data).digest())
+    return digest.hexdigest()
+
+
+def load_index(maps: Sequence[Path], variants: Optional[Path] = None,
+               platform: str = "",
+               cache_dir: Optional[Path] = DEFAULT_INDEX_CACHE) -> CalibrationIndex:
+    """Index for ``maps`` (+ ``variants``), from the cache or freshly built."""
+    sources = list(maps) + ([variants] if variants else [])
+    try:
+        contents = [Path(path).read_bytes() for path in sources]
+    except OSError as exc:
+        raise MapError(f"{exc.filename}: {exc.strerror}") from exc
+    key = _index_key(contents, variants is not None, platform)
+    cache_path = Path(cache_dir) / f"{key}.cidx" if cache_dir is not None else None
+    if cache_path is not None and cache_path.is_file():
+        try:
+            return CalibrationIndex.open(cache_path)
+        except (IndexFileError, ValueError):
+            pass  # stale or corrupt entry: rebuild below
+
+    doc = merge_maps([parse_map(data.decode(), str(path))
+                      for path, data in zip(maps, contents)])
+    variant_specs = (parse_variants(contents[-1].decode(), str(variants), platform)
+                     if variants else {})
+    data = build_index(doc.parameters, doc.byte_order, variant_specs, platform,
+                       str(variants), doc.checksums)
+    if cache_path is None:
+        return CalibrationIndex(data)
+    cache_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = cache_path.with_name(f"{cache_path.name}.{os.getpid()}.tmp")
+    tmp.write_bytes(data)
+    os.replace(tmp, cache_path)
+    return CalibrationIndex(data, cache_path)
+
+
+@functools.lru_cache(maxsize=None)
+def platform_index(platform: str) -> CalibrationIndex:
+    """The repository index for ``platform``, loaded once per process."""
+    maps, variants = default_sources(platform)
+    if not maps:
+        raise MapError(f"no calibration map for {platform} in {REPO_ROOT}")
+    return load_index(maps, variants, platform)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Build and query the compiled "
+                                                 "calibration map index")
+    parser.add_argument("queries", nargs="*",
+                        help="parameter names or addresses (0x...) to look up")
+    parser.add_argument("--platform", choices=("S32K344", "S32K348"))
+    parser.add_argument("--map", dest="maps", type=Path, action="append", default=[],
+                        help="calibration map YAML (repeatable; overrides --platform)")
+    parser.add_argument("--variants", type=Path, help="board variant YAML")
+    parser.add_argument("--variant", help="apply this board variant's limits")
+    parser.add_argument("--cache-dir", type=Path, default=DEFAULT_INDEX_CACHE)
+    args = parser.parse_args(argv)
+
+    if np is None:
+        print("error: calibration_index.py needs NumPy (pip install numpy)", file=sys.stderr)
+        return 2
+    maps, variants = (args.maps, args.variants) if args.maps else \
+        default_sources(args.platform) if args.platform else ([], None)
+    if not maps:
+        print("error: no calibration map (give --map or --platform with a non-empty map)",
+              file=sys.stderr)
+        return 2
+    try:
+        index = load_index(maps, args.variants or variants, args.platform or "",
+                           args.cache_dir)
+        print(f"{index.path or '<memory>'}: {len(index)} parameters, "
+              f"variants: {', '.join(index.variants) or 'none'}")
+        status = 0
+        for query in args.queries:
+            param = (index.at(int(query, 16), args.variant) if query.lower().startswith("0x")
+                     else index.get(query, args.variant))
+            if param is None:
+                print(f"{query}: not in map")
+                status = 1
+                continue
+            shape = "".join(f"[{n}]" for n in param.shape)
+            print(f"{param.name}{shape} @0x{param.address:08X} {param.type} "
+                  f"[{param.min:g}, {param.max:g}] {param.unit}".rstrip())
+    except (MapError, ValueError) as exc:
+        print(f"error: {exc}", file=sys.stderr)
+        return 2
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,386 @@
+"""Calibration map model shared by the calibration tools.
+
+The calibration map (``calibration/data/<platform>/calibration_map.yaml``
+plus ``config/calibration/calibration_map_<platform>.yaml``) describes every
+parameter in the calibration flash block::
+
+    byte_order: little            # optional, S32K3 default
+    base_address: 0x00600000      # optional, for ``offset:`` entries
+    parameters:
+      - name: motor_max_rpm
+        offset: 0x0C              # or ``address:`` (absolute)
+        type: u16                 # u8 s8 u16 s16 u32 s32 f32 f64 bool
+        min: 0
+        max: 12000
+        unit: rpm
+      - name: soc_table
+        address: 0x00600100
+        type: u8
+        shape: [101]              # axis; ``[rows, cols]`` for a map
+        min: 0
+        max: 100
+        scale: 0.5                # physical = raw * scale + phys_offset
+        unit: "%"
+        monotonic: increasing     # optional, for axes
+    checksums:
+      - name: calib_block_crc
+        address: 0x0060FFFC       # where the checksum is stored (or ``offset:``)
+        algorithm: CRC32          # any ``crc_lib.MODELS`` name
+        start: 0x00600000         # covered range [start, end), or
+        end: 0x0060FFFC           # ``start_offset``/``end_offset``
+
+``parameters`` may also be a mapping of name to entry.  A parameter defined
+in several map files must agree on address, type, shape and unit; its
+limits are intersected.  Checksums defined in several files must agree.
+
+``CompiledMap`` holds the merged map as one structured array
+(``MAP_DTYPE_FIELDS``, one row per parameter) plus flat per-element arrays
+for vectorised checks.
+"""
+
+from __future__ import annotations
+
+import math
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Iterable, List, Sequence, Tuple
+
+from crc_lib import MODELS as CRC_MODELS
+
+try:
+    import numpy as np
+except ImportError:  # the compiled map needs NumPy; parsing does not
+    np = None
+
+REPO_ROOT = Path(__file__).resolve().parents[2]
+
+# code -> (NumPy type, natural raw limits)
+TYPES: Dict[str, Tuple[str, float, float]] = {
+    "u8": ("u1", 0, 0xFF),
+    "s8": ("i1", -0x80, 0x7F),
+    "u16": ("u2", 0, 0xFFFF),
+    "s16": ("i2", -0x8000, 0x7FFF),
+    "u32": ("u4", 0, 0xFFFFFFFF),
+    "s32": ("i4", -0x80000000, 0x7FFFFFFF),
+    "f32": ("f4", -math.inf, math.inf),
+    "f64": ("f8", -math.inf, math.inf),
+    "bool": ("u1", 0, 1),
+}
+TYPE_ALIASES = {
+    "uint8": "u8", "uint8_t": "u8", "int8": "s8", "int8_t": "s8", "i8": "s8",
+    "uint16": "u16", "uint16_t": "u16", "int16": "s16", "int16_t": "s16", "i16": "s16",
+    "uint32": "u32", "uint32_t": "u32", "int32": "s32", "int32_t": "s32", "i32": "s32",
+    "float": "f32", "float32": "f32", "double": "f64", "float64": "f64",
+    "boolean": "bool",
+}
+TYPE_CODES = {name: code for code, name in enumerate(TYPES)}
+TYPE_NAMES = list(TYPES)
+
+MONO_INCREASING = 0x01
+MONO_DECREASING = 0x02
+
+MAP_DTYPE_FIELDS = [
+    ("address", "<u8"),
+    ("count", "<u4"),
+    ("first", "<u4"),   # index of the first element in the flat element arrays
+    ("type", "u1"),
+    ("flags", "u1"),
+    ("min", "<f8"),
+    ("max", "<f8"),
+    ("scale", "<f8"),
+    ("offset", "<f8"),
+]
+
+
+class MapError(Exception):
+    """Raised for malformed or inconsistent calibration maps."""
+
+
+def require_numpy() -> None:
+    if np is None:
+        raise RuntimeError("calibration verification needs NumPy (pip install numpy)")
+
+
+# -- calibration map ---------------------------------------------------------
+
+
+@dataclass
+class Parameter:
+    name: str
+    address: int
+    type: str
+    shape: Tuple[int, ...] = ()
+    min: float = -math.inf
+    max: float = math.inf
+    scale: float = 1.0
+    offset: float = 0.0
+    unit: str = ""
+    monotonic: str = ""
+    source: str = ""
+
+    @property
+    def count(self) -> int:
+        return math.prod(self.shape)
+
+    @property
+    def size(self) -> int:
+        return self.count * np.dtype(TYPES[self.type][0]).itemsize
+
+
+def parse_number(value, what: str, where: str) -> float:
+    if isinstance(value, str):
+        try:
+            return float(int(value, 0))
+        except ValueError:
+            pass
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        raise MapError(f"{where}: {what} {value!r} is not a number") from None
+
+
+def _parameter(name: str, spec: dict, base: int, where: str) -> Parameter:
+    where = f"{where}: {name}"
+    if not isinstance(spec, dict):
+        raise MapError(f"{where}: entry must be a mapping")
+    type_name = str(spec.get("type", "")).lower()
+    type_name = TYPE_ALIASES.get(type_name, type_name)
+    if type_name not in TYPES:
+        raise MapError(f"{where}: unknown type {spec.get('type')!r}")
+    if "address" in spec:
+        address = int(parse_number(spec["address"], "address", where))
+    elif "offset" in spec:
+        address = base + int(parse_number(spec["offset"], "offset", where))
+    else:
+        raise MapError(f"{where}: needs an address or offset")
+    shape = spec.get("shape", spec.get("count", ()))
+    shape = tuple(int(n) for n in (shape if isinstance(shape, (list, tuple)) else (shape,)))
+    if any(n <= 0 for n in shape):
+        raise MapError(f"{where}: shape {list(shape)} has an empty dimension")
+    if len(shape) > 2:
+        raise MapError(f"{where}: shape {list(shape)} has more than two dimensions")
+    _, type_min, type_max = TYPES[type_name]
+    scale = parse_number(spec.get("scale", 1.0), "scale", where)
+    offset = parse_number(spec.get("phys_offset", 0.0), "phys_offset", where)
+    if scale == 0:
+        raise MapError(f"{where}: scale must be non-zero")
+    lo, hi = sorted((type_min * scale + offset, type_max * scale + offset))
+    minimum = parse_number(spec.get("min", lo), "min", where)
+    maximum = parse_number(spec.get("max", hi), "max", where)
+    if minimum > maximum:
+        raise MapError(f"{where}: min {minimum:g} > max {maximum:g}")
+    if maximum < lo or minimum > hi:
+        raise MapError(f"{where}: range [{minimum:g}, {maximum:g}] is not "
+                       f"representable as {type_name}")
+    monotonic = str(spec.get("monotonic", "") or "").lower()
+    if monotonic not in ("", "increasing", "decreasing"):
+        raise MapError(f"{where}: monotonic must be 'increasing' or 'decreasing'")
+    return Parameter(name, address, type_name, shape, max(minimum, lo), min(maximum, hi),
+                     scale, offset, str(spec.get("unit", "") or ""), monotonic, where)
+
+
+@dataclass
+class Checksum:
+    name: str
+    address: int                  # where the checksum is stored
+    algorithm: str
+    start: int                    # covered range [start, end)
+    end: int
+    source: str = ""
+
+    @property
+    def size(self) -> int:
+        return CRC_MODELS[self.algorithm].width // 8
+
+    def key(self) -> tuple:
+        return (self.address, self.algorithm, self.start, self.end)
+
+
+@dataclass
+class MapDocument:
+    parameters: List[Parameter]
+    byte_order: str = "<"         # ``"<"`` or ``">"``
+    checksums: List[Checksum] = field(default_factory=list)
+
+
+def _checksum(spec: dict, base: int, where: str) -> Checksum:
+    name = spec.get("name") if isinstance(spec, dict) else None
+    if not name:
+        raise MapError(f"{where}: checksum entry without a name")
+    where = f"{where}: {name}"
+
+    def address(key: str) -> int:
+        if key in spec:
+            return int(parse_number(spec[key], key, where))
+        if f"{key}_offset" in spec or (key == "address" and "offset" in spec):
+            rel = spec.get(f"{key}_offset", spec.get("offset"))
+            return base + int(parse_number(rel, f"{key}_offset", where))
+        raise MapError(f"{where}: needs {key} or {key}_offset")
+
+    algorithm = str(spec.get("algorithm", "")).upper()
+    if algorithm not in CRC_MODELS:
+        raise MapError(f"{where}: unknown algorithm {spec.get('algorithm')!r} "
+                       f"(one of {', '.join(CRC_MODELS)})")
+    checksum = Checksum(str(name), address("address"), algorithm, address("start"),
+                        address("end"), where)
+    if checksum.end <= checksum.start:
+        raise MapError(f"{where}: empty range")
+    if checksum.start < checksum.address + checksum.size and checksum.address < checksum.end:
+        raise MapError(f"{where}: the checksum lies inside the range it covers")
+    return checksum
+
+
+def parse_map(text: str, where: str = "<map>") -> MapDocument:
+    """Parameters, byte order and checksums of one map document."""
+    import yaml  # only needed when a map is parsed
+
+    try:
+        doc = yaml.safe_load(text) or {}
+    except yaml.YAMLError as exc:
+        raise MapError(f"{where}: {exc}") from exc
+    if not isinstance(doc, dict):
+        raise MapError(f"{where}: expected a mapping at top level")
+    order = str(doc.get("byte_order", "little")).lower()
+    if order not in ("little", "big"):
+        raise MapError(f"{where}: byte_order must be 'little' or 'big'")
+    base = int(parse_number(doc.get("base_address", 0), "base_address", where))
+    entries = doc.get("parameters") or []
+    if isinstance(entries, dict):
+        entries = [dict(spec or {}, name=name) for name, spec in entries.items()]
+    params = []
+    for index, spec in enumerate(entries):
+        name = spec.get("name") if isinstance(spec, dict) else None
+        if not name:
+            raise MapError(f"{where}: parameter #{index} has no name")
+        params.append(_parameter(str(name), spec, base, where))
+    checksums = [_checksum(spec, base, where) for spec in doc.get("checksums") or []]
+    return MapDocument(params, "<" if order == "little" else ">", checksums)
+
+
+def merge_parameters(groups: Iterable[Sequence[Parameter]]) -> List[Parameter]:
+    """Union of several maps; duplicates must agree and get the tighter limits."""
+    merged: Dict[str, Parameter] = {}
+    for params in groups:
+        for param in params:
+            other = merged.get(param.name)
+            if other is None:
+                merged[param.name] = param
+                continue
+            for attr in ("address", "type", "shape", "unit", "scale", "offset"):
+                mine, theirs = getattr(param, attr), getattr(other, attr)
+                if mine != theirs:
+                    if attr == "address":
+                        mine, theirs = f"0x{mine:08X}", f"0x{theirs:08X}"
+                    raise MapError(f"{param.source}: {attr} {mine!r} disagrees with "
+                                   f"{other.source} ({theirs!r})")
+            other.min = max(other.min, param.min)
+            other.max = min(other.max, param.max)
+            other.monotonic = other.monotonic or param.monotonic
+            if other.min > other.max:
+                raise MapError(f"{param.source}: limits do not overlap with {other.source}")
+    return sorted(merged.values(), key=lambda p: p.address)
+
+
+def default_maps(platform: str, root: Path = REPO_ROOT) -> List[Path]:
+    """The platform's calibration maps that exist and are non-empty."""
+    candidates = [root / "calibration" / "data" / platform / "calibration_map.yaml",
+                  root / "config" / "calibration" / f"calibration_map_{platform}.yaml"]
+    return [path for path in candidates if path.is_file() and path.stat().st_size]
+
+
+def merge_maps(docs: Sequence[MapDocument]) -> MapDocument:
+    orders = {doc.byte_order for doc in docs}
+    if len(orders) > 1:
+        raise MapError("calibration maps disagree on byte_order")
+    checksums: Dict[str, Checksum] = {}
+    for doc in docs:
+        for checksum in doc.checksums:
+            other = checksums.setdefault(checksum.name, checksum)
+            if other.key() != checksum.key():
+                raise MapError(f"{checksum.source}: disagrees with {other.source}")
+    return MapDocument(merge_parameters(doc.parameters for doc in docs),
+                       orders.pop() if orders else "<",
+                       sorted(checksums.values(), key=lambda c: c.address))
+
+
+def load_map(paths: Sequence[Path]) -> MapDocument:
+    docs = []
+    for path in paths:
+        try:
+            text = Path(path).read_text()
+        except OSError as exc:
+            raise MapError(f"{path}: {exc.strerror}") from exc
+        docs.append(parse_map(text, str(path)))
+    return merge_maps(docs)
+
+
+# -- compiled map ------------------------------------------------------------
+
+
+class CompiledMap:
+    """Calibration map as parallel arrays: one row per parameter, one per element."""
+
+    def __init__(self, entries, names: List[str], units: List[str],
+                 shapes: List[Tuple[int, ...]], byte_order: str = "<",
+                 checksums: Sequence[Checksum] = ()) -> None:
+        require_numpy()
+        self.entries = entries
+        self.names = names
+        self.units = units
+        self.shapes = shapes
+        self.byte_order = byte_order
+        self.checksums = list(checksums)
+        counts = entries["count"].astype(np.intp)
+        itemsizes = np.array([np.dtype(TYPES[t][0]).itemsize for t in TYPE_NAMES],
+                             dtype=np.uint64)[entries["type"]]
+        self.sizes = entries["count"].astype(np.uint64) * itemsizes
+        self.elem_param = np.repeat(np.arange(len(entries), dtype=np.uint32), counts)
+        self.elem_index = (np.arange(len(self.elem_param), dtype=np.uint32)
+                           - entries["first"][self.elem_param])
+        self.elem_address = (entries["address"][self.elem_param]
+                             + self.elem_index * itemsizes[self.elem_param])
+        self.by_type = {code: np.flatnonzero(entries["type"][self.elem_param] == code)
+                        for code in np.unique(entries["type"]).tolist()}
+        # element i is compared with element i-1 when both belong to a monotonic axis
+        same = np.zeros(len(self.elem_param), dtype=bool)
+        same[1:] = self.elem_param[1:] == self.elem_param[:-1]
+        flags = entries["flags"][self.elem_param]
+        self.mono_inc = same & (flags & MONO_INCREASING).astype(bool)
+        self.mono_dec = same & (flags & MONO_DECREASING).astype(bool)
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    @property
+    def elements(self) -> int:
+        return len(self.elem_param)
+
+    def subset(self, rows) -> "CompiledMap":
+        """The map restricted to parameter ``rows`` (sorted), without checksums."""
+        rows = np.asarray(rows, dtype=np.intp)
+        entries = self.entries[rows].copy()
+        entries["first"] = np.cumsum(entries["count"]) - entries["count"]
+        return CompiledMap(entries, [self.names[r] for r in rows],
+                           [self.units[r] for r in rows], [self.shapes[r] for r in rows],
+                           self.byte_order)
+
+    @classmethod
+    def compile(cls, params: Sequence[Parameter], byte_order: str = "<",
+                checksums: Sequence[Checksum] = ()) -> "CompiledMap":
+        require_numpy()
+        flags = {"increasing": MONO_INCREASING, "decreasing": MONO_DECREASING}
+        entries = np.zeros(len(params), dtype=MAP_DTYPE_FIELDS)
+        entries["address"] = [p.address for p in params]
+        entries["count"] = [p.count for p in params]
+        entries["first"] = np.cumsum(entries["count"]) - entries["count"]
+        entries["type"] = [TYPE_CODES[p.type] for p in params]
+        entries["flags"] = [flags.get(p.monotonic, 0) for p in params]
+        for name in ("min", "max", "scale", "offset"):
+            entries[name] = [getattr(p, name) for p in params]
+        return cls(entries, [p.name for p in params], [p.unit for p in params],
+                   [p.shape for p in params], byte_order, checksums)
+
+    @classmethod
+    def from_yaml(cls, paths: Sequence[Path]) -> "CompiledMap":
+        doc = load_map(paths)
+        return cls.compile(doc.parameters, doc.byte_order, doc.checksums)
@@ -0,0 +1,572 @@
+#!/usr/bin/env python3
+"""Calibration reports.
+
+``diff`` compares two calibration images (e.g. ``test_calibration.hex``
+against ``safety_calibration.hex``) parameter by parameter, in physical
+units.  Both images are aligned through the compiled calibration map
+(``calibration_map.py``): when their segment layouts match, only the byte
+runs that differ are located (in fixed-size chunks) and mapped to the
+parameters they touch, so just those parameters are decoded; otherwise
+every map element is decoded from both images.  Changed elements are then
+found with one vectorised comparison.
+
+The report is streamed row by row as Markdown, CSV or JSON and lists only
+changed elements, so its size follows the number of changes rather than
+the image size.  Changed bytes outside every parameter are summarised as
+address ranges.
+
+``report`` writes an HTML report of the map for the base map and every
+board variant: a summary per variant (verification status, checksums) and
+the parameter tables with values and charts, split into sections of
+``SECTION_ROWS`` parameters.  Each section is keyed by the SHA-256 of
+exactly the data it renders (map rows, variant limits, decoded values,
+violations) and cached under ``~/.cache/vcu_xcp/report_sections``.  Only
+sections whose key is missing are rendered, in a process pool; all
+sections are streamed to the output file in order, so the report is never
+held in memory and a one-parameter change re-renders one section per
+variant.
+"""
+
+from __future__ import annotations
+
+import argparse
+import csv
+import hashlib
+import json
+import math
+import multiprocessing
+import os
+import shutil
+import sys
+import time
+from dataclasses import dataclass
+from html import escape
+from pathlib import Path
+from typing import IO, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from calibration_map import TYPE_NAMES, CompiledMap, MapError, np
+from calibration_verify import (
+    ImageBuffer,
+    ImageError,
+    IntervalIndex,
+    byte_runs,
+    changed_ranges,
+    load_image,
+    physical_values,
+    verify,
+)
+
+DIFF_FORMATS = ("md", "csv", "json")
+
+
+# -- diff engine -------------------------------------------------------------
+
+
+@dataclass
+class ParameterChange:
+    name: str
+    unit: str
+    shape: Tuple[int, ...]
+    elements: int
+    index: "np.ndarray"           # flat element indices that changed
+    address: "np.ndarray"         # their addresses
+    old: "np.ndarray"             # physical values; NaN where absent from the image
+    new: "np.ndarray"
+
+    def cell(self, flat: int) -> str:
+        if not self.shape:
+            return ""
+        return "".join(f"[{i}]" for i in np.unravel_index(flat, self.shape))
+
+    def rows(self) -> Iterator[dict]:
+        for index, address, old, new in zip(self.index.tolist(), self.address.tolist(),
+                                            self.old.tolist(), self.new.tolist()):
+            yield {"parameter": self.name + self.cell(index), "index": index,
+                   "address": address,
+                   "old": old, "new": new, "delta": new - old, "unit": self.unit}
+
+
+@dataclass
+class ImageDiff:
+    parameters: int
+    elements: int
+    changes: List[ParameterChange]
+    unmapped: Tuple["np.ndarray", "np.ndarray"]  # changed byte runs outside the map
+    layout_changed: bool
+
+    @property
+    def changed_elements(self) -> int:
+        return sum(len(change.index) for change in self.changes)
+
+    @property
+    def unmapped_bytes(self) -> int:
+        lo, hi = self.unmapped
+        return int((hi - lo).sum())
+
+    @property
+    def identical(self) -> bool:
+        return not self.changes and not len(self.unmapped[0]) and not self.layout_changed
+
+
+def diff_images(cmap: CompiledMap, old: ImageBuffer, new: ImageBuffer) -> ImageDiff:
+    """Changed parameters between ``old`` and ``new``, in physical values."""
+    intervals = IntervalIndex(cmap)
+    ranges = changed_ranges(old, new)
+    empty = np.zeros(0, dtype=np.uint64)
+    if ranges is None:
+        sub, unmapped = cmap, (empty, empty)
+    else:
+        lo, hi = ranges
+        sub = cmap.subset(intervals.overlapping(lo, hi))
+        counts = (hi - lo).astype(np.intp)
+        addresses = (np.repeat(lo, counts) + np.arange(counts.sum(), dtype=np.uint64)
+                     - np.repeat(np.cumsum(counts) - counts, counts).astype(np.uint64))
+        unmapped = byte_runs(addresses[~intervals.covers(addresses)])
+
+    with np.errstate(invalid="ignore", over="ignore"):
+        a, in_old = physical_values(sub, old)
+        b, in_new = physical_values(sub, new)
+    a[~in_old] = np.nan
+    b[~in_new] = np.nan
+    changed = np.flatnonzero((a != b) & ~(np.isnan(a) & np.isnan(b)))
+
+    changes = []
+    param = sub.elem_param[changed]
+    bounds = np.flatnonzero(np.diff(param)) + 1
+    for group in np.split(np.arange(len(changed)), bounds) if len(changed) else []:
+        row = int(param[group[0]])
+        elems = changed[group]
+        changes.append(ParameterChange(
+            sub.names[row], sub.units[row], sub.shapes[row], int(sub.entries["count"][row]),
+            sub.elem_index[elems], sub.elem_address[elems], a[elems], b[elems]))
+    return ImageDiff(len(cmap), cmap.elements, changes, unmapped, ranges is None)
+
+
+# -- rendering ---------------------------------------------------------------
+
+
+def _value(value: float) -> str:
+    return "absent" if math.isnan(value) else f"{value:.6g}"
+
+
+def _json_value(value: float):
+    return None if math.isnan(value) else value
+
+
+def _summary(diff: ImageDiff) -> str:
+    text = (f"{len(diff.changes)} of {diff.parameters} parameter(s) changed "
+            f"({diff.changed_elements} of {diff.elements} value(s))")
+    if diff.layout_changed:
+        text += "; segment layouts differ, all parameters compared"
+    elif diff.unmapped_bytes:
+        text += (f"; {diff.unmapped_bytes} changed byte(s) outside the map in "
+                 f"{len(diff.unmapped[0])} range(s)")
+    return text
+
+
+def write_diff(diff: ImageDiff, out: IO[str], fmt: str = "md",
+               old_name: str = "old", new_name: str = "new") -> None:
+    """Stream ``diff`` to ``out`` as Markdown, CSV or JSON."""
+    if fmt == "csv":
+        writer = csv.DictWriter(out, ["parameter", "address", "old", "new", "delta", "unit"],
+                                extrasaction="ignore")
+        writer.writeheader()
+        for change in diff.changes:
+            for row in change.rows():
+                writer.writerow(dict(row, address=f"0x{row['address']:08X}",
+                                     old=_json_value(row["old"]),
+                                     new=_json_value(row["new"]),
+                                     delta=_json_value(row["delta"])))
+        return
+
+    if fmt == "json":
+        out.write(json.dumps({"old": old_name, "new": new_name,
+                              "parameters": diff.parameters, "elements": diff.elements,
+                              "layout_changed": diff.layout_changed})[:-1])
+        out.write(', "changes": [')
+        for n, change in enumerate(diff.changes):
+            out.write(("," if n else "") + "\n  " + json.dumps({
+                "name": change.name, "unit": change.unit, "shape": list(change.shape),
+                "elements": change.elements,
+                "values": [{"cell": change.cell(row["index"]),
+                            "address": f"0x{row['address']:08X}",
+                            "old": _json_value(row["old"]), "new": _json_value(row["new"])}
+                           for row in change.rows()]}))
+        lo, hi = diff.unmapped
+        out.write('\n], "unmapped": ' + json.dumps(
+            [[f"0x{a:08X}", int(b - a)] for a, b in zip(lo.tolist(), hi.tolist())]) + "}\n")
+        return
+
+    out.write(f"# Calibration diff\n\n`{old_name}` → `{new_name}`\n\n{_summary(diff)}\n")
+    if diff.changes:
+        out.write("\n## Changed parameters\n\n"
+                  "| Parameter | Changed | Max \\|Δ\\| | Unit |\n|---|---:|---:|---|\n")
+        for change in diff.changes:
+            with np.errstate(invalid="ignore"):
+                delta = np.abs(change.new - change.old)
+            worst = np.nanmax(delta) if not np.isnan(delta).all() else math.nan
+            out.write(f"| {change.name} | {len(change.index)}/{change.elements} | "
+                      f"{_value(worst)} | {change.unit} |\n")
+        out.write("\n## Changed values\n\n"
+                  "| Parameter | Address | Old | New | Δ | Unit |\n"
+                  "|---|---|---:|---:|---:|---|\n")
+        for change in diff.changes:
+            for row in change.rows():
+                out.write(f"| {row['parameter']} | 0x{row['address']:08X} | "
+                          f"{_value(row['old'])} | {_value(row['new'])} | "
+                          f"{_value(row['delta'])} | {row['unit']} |\n")
+    lo, hi = diff.unmapped
+    if len(lo):
+        out.write("\n## Changed bytes outside the map\n\n| Start | End | Bytes |\n|---|---|---:|\n")
+        for start, end in zip(lo.tolist(), hi.tolist()):
+            out.write(f"| 0x{start:08X} | 0x{end - 1:08X} | {end - start} |\n")
+
+
+# -- full report -------------------------------------------------------------
+
+REPORT_VERSION = 1            # bump whenever the rendered markup changes
+DEFAULT_SECTION_CACHE = Path.home() / ".cache" / "vcu_xcp" / "report_sections"
+SECTION_ROWS = 128            # parameters per cached section
+
+_STYLE = """body{font-family:sans-serif;font-size:13px}
+table{border-collapse:collapse;margin-bottom:1em}
+td,th{border:1px solid #ccc;padding:2px 6px;vertical-align:middle}
+td.num{text-align:right}.bad{background:#fdd}"""
+
+
+@dataclass
+class Section:
+    kind: str                     # key into RENDERERS
+    payload: dict                 # everything the renderer reads, and nothing else
+    key: str = ""
+
+    def __post_init__(self) -> None:
+        digest = hashlib.sha256(f"v{REPORT_VERSION}:{self.kind}".encode())
+        for name in sorted(self.payload):
+            value = self.payload[name]
+            digest.update(name.encode())
+            if isinstance(value, np.ndarray):
+                digest.update(f"{value.dtype.str}{value.shape}".encode())
+                digest.update(value.tobytes())
+            else:
+                digest.update(json.dumps(value, sort_keys=True).encode())
+        self.key = digest.hexdigest()
+
+
+def _anchor(variant: Optional[str]) -> str:
+    return f"variant-{variant or 'base'}"
+
+
+def _svg_line(values) -> str:
+    finite = values[np.isfinite(values)]
+    if len(values) < 2 or not len(finite):
+        return ""
+    low, span = finite.min(), float(np.ptp(finite)) or 1.0
+    xs = np.linspace(2, 158, len(values))
+    ys = 38 - (values - low) / span * 36
+    points = " ".join(f"{x:.1f},{y:.1f}" for x, y in zip(xs, ys) if math.isfinite(y))
+    return (f'<svg width="160" height="40"><polyline fill="none" stroke="#36c" '
+            f'points="{points}"/></svg>')
+
+
+def _svg_heatmap(values, shape: Tuple[int, ...]) -> str:
+    grid = values.reshape(shape)
+    finite = grid[np.isfinite(grid)]
+    if not len(finite):
+        return ""
+    low, span = finite.min(), float(np.ptp(finite)) or 1.0
+    cell = max(2, min(12, 160 // max(shape)))
+    rects = []
+    for (i, j), value in np.ndenumerate(grid):
+        if math.isfinite(value):
+            t = (value - low) / span
+            color = f"rgb({int(255 * t)},{int(80 + 60 * (1 - abs(2 * t - 1)))},{int(255 * (1 - t))})"
+        else:
+            color = "#eee"
+        rects.append(f'<rect x="{j * cell}" y="{i * cell}" width="{cell}" height="{cell}" '
+                     f'fill="{color}"/>')
+    return (f'<svg width="{shape[1] * cell}" height="{shape[0] * cell}">'
+            + "".join(rects) + "</svg>")
+
+
+def _bad(flag) -> str:
+    return ' class="bad"' if flag else ""
+
+
+def render_variant(payload: dict) -> str:
+    p = payload
+    status = "OK" if not p["failed"] and not p["bad_checksums"] else "FAILED"
+    lines = [f'<h2 id="{_anchor(p["variant"])}">{escape(p["variant"] or "Base map")}</h2>',
+             "<table>",
+             f'<tr><th>Image</th><td>{escape(p["image"] or "none")}</td></tr>',
+             f'<tr><th>Parameters</th><td class="num">{p["parameters"]}</td></tr>',
+             f'<tr><th>Values</th><td class="num">{p["elements"]}</td></tr>']
+    if p["image"]:
+        lines += [f'<tr><th>Status</th><td{_bad(status != "OK")}>'
+                  f'{status}</td></tr>',
+                  f'<tr><th>Violations</th><td class="num">{p["violations"]} in '
+                  f'{len(p["failed"])} parameter(s)</td></tr>']
+    lines.append("</table>")
+    if p["checksums"]:
+        lines.append("<table><tr><th>Checksum</th><th>Address</th><th>Algorithm</th>"
+                     "<th>Status</th></tr>")
+        for name, address, algorithm, state in p["checksums"]:
+            lines.append(f'<tr><td>{escape(name)}</td><td>0x{address:08X}</td>'
+                         f'<td>{algorithm}</td><td{_bad(state != "ok")}>'
+                         f'{state}</td></tr>')
+        lines.append("</table>")
+    return "\n".join(lines) + "\n"
+
+
+def render_parameters(payload: dict) -> str:
+    p = payload
+    entries, values, present = p["entries"], p["values"], p["present"]
+    lines = ["<table><tr><th>Parameter</th><th>Address</th><th>Type</th><th>Shape</th>"
+             "<th>Value</th><th>Min</th><th>Max</th><th>Unit</th><th>Status</th>"
+             "<th>Chart</th></tr>"]
+    base = int(entries["first"][0]) if len(entries) else 0
+    for row, entry in enumerate(entries):
+        first, count = int(entry["first"]) - base, int(entry["count"])
+        cells, shape = values[first:first + count], tuple(p["shapes"][row])
+        if not p["has_image"]:
+            shown, chart = "", ""
+        elif not present[first:first + count].any():
+            shown, chart = "absent", ""
+        elif count == 1:
+            shown, chart = _value(float(cells[0])), ""
+        else:
+            finite = cells[np.isfinite(cells)]
+            shown = (f"{_value(float(finite.min()))} … {_value(float(finite.max()))}"
+                     if len(finite) else "not finite")
+            chart = _svg_heatmap(cells, shape) if len(shape) == 2 else _svg_line(cells)
+        problems = p["status"][row]
+        lines.append(
+            f'<tr><td>{escape(p["names"][row])}</td><td>0x{int(entry["address"]):08X}</td>'
+            f'<td>{TYPE_NAMES[entry["type"]]}</td><td>{"×".join(map(str, shape))}</td>'
+            f'<td class="num">{shown}</td><td class="num">{_value(float(entry["min"]))}</td>'
+            f'<td class="num">{_value(float(entry["max"]))}</td>'
+            f'<td>{escape(p["units"][row])}</td>'
+            f'<td{_bad(problems)}>'
+            f'{", ".join(problems) or ("ok" if p["has_image"] else "")}</td>'
+            f"<td>{chart}</td></tr>")
+    lines.append("</table>")
+    return "\n".join(lines) + "\n"
+
+
+RENDERERS = {"variant": render_variant, "parameters": render_parameters}
+
+
+def _render(section: Section) -> str:
+    return RENDERERS[section.kind](section.payload)
+
+
+def build_sections(index, images: Dict[Optional[str], Path], base: Optional[int] = None,
+                   variants: Optional[Sequence[str]] = None) -> List[Section]:
+    """Sections for every variant (and the base map), in report order.
+
+    ``images`` maps a variant name to its image; the ``None`` entry is used
+    for variants without one of their own.
+    """
+    loaded: Dict[Path, ImageBuffer] = {}
+    sections = []
+    names = [None] + list(index.variants) if variants is None else list(variants)
+    for variant in names:
+        cmap = index.compiled(variant)
+        path = images.get(variant, images.get(None))
+        if path is not None and path not in loaded:
+            loaded[path] = load_image(path, base)
+        status: Dict[str, set] = {}
+        if path is not None:
+            image = loaded[path]
+            result = verify(cmap, image)
+            for violation in result.violations:
+                status.setdefault(violation.name, set()).add(violation.kind)
+            with np.errstate(invalid="ignore", over="ignore"):
+                values, present = physical_values(cmap, image)
+            checksums = [[c.name, c.address, c.algorithm, c.status] for c in result.checksums]
+            violations = len(result.violations)
+        else:
+            values = np.full(cmap.elements, np.nan)
+            present = np.zeros(cmap.elements, dtype=bool)
+            checksums, violations = [], 0
+        sections.append(Section("variant", {
+            "variant": variant, "image": path.name if path else None,
+            "parameters": len(cmap), "elements": cmap.elements, "violations": violations,
+            "failed": sorted(status), "checksums": checksums,
+            "bad_checksums": sum(c[3] != "ok" for c in checksums)}))
+        for r0 in range(0, len(cmap), SECTION_ROWS):
+            r1 = min(r0 + SECTION_ROWS, len(cmap))
+            e0 = int(cmap.entries["first"][r0])
+            e1 = int(cmap.entries["first"][r1 - 1] + cmap.entries["count"][r1 - 1])
+            sections.append(Section("parameters", {
+                "has_image": path is not None,
+                "names": cmap.names[r0:r1], "units": cmap.units[r0:r1],
+                "shapes": [list(s) for s in cmap.shapes[r0:r1]],
+                "entries": cmap.entries[r0:r1], "values": values[e0:e1],
+                "present": present[e0:e1],
+                "status": [sorted(status.get(n, ())) for n in cmap.names[r0:r1]]}))
+    return sections
+
+
+@dataclass
+class ReportStats:
+    sections: int = 0
+    cached: int = 0
+    rendered: int = 0
+
+
+def write_report(sections: Sequence[Section], out: IO[str], title: str,
+                 cache_dir: Optional[Path] = DEFAULT_SECTION_CACHE,
+                 workers: int = 1) -> ReportStats:
+    """Stream the report to ``out``, section by section, in order.
+
+    Cached sections are copied from ``cache_dir``; the others are rendered
+    in a process pool (in order, so each can be written as soon as it and
+    everything before it is ready) and stored for the next run.
+    """
+    stats = ReportStats(len(sections))
+    cached = {s.key for s in sections
+              if cache_dir is not None and (Path(cache_dir) / f"{s.key}.html").is_file()}
+    misses = [s for s in sections if s.key not in cached]
+    stats.cached, stats.rendered = len(sections) - len(misses), len(misses)
+    if cache_dir is not None:
+        Path(cache_dir).mkdir(parents=True, exist_ok=True)
+
+    out.write(f"<!DOCTYPE html>\n<html><head><meta charset=\"utf-8\"><title>{escape(title)}"
+              f"</title><style>{_STYLE}</style></head><body>\n<h1>{escape(title)}</h1>\n")
+    pool = (multiprocessing.get_context().Pool(min(workers, len(misses)))
+            if workers > 1 and len(misses) > 1 else None)
+    try:
+        rendered = pool.imap(_render, misses) if pool else map(_render, misses)
+        for section in sections:
+            path = Path(cache_dir) / f"{section.key}.html" if cache_dir is not None else None
+            if section.key in cached:
+                with open(path, encoding="utf-8") as fh:
+                    shutil.copyfileobj(fh, out)
+                continue
+            text = next(rendered)
+            out.write(text)
+            if path is not None:
+                tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+                tmp.write_text(text, encoding="utf-8")
+                os.replace(tmp, path)
+    finally:
+        if pool:
+            pool.close()
+            pool.join()
+    out.write("</body></html>\n")
+    return stats
+
+
+# -- CLI ---------------------------------------------------------------------
+
+
+def _load_index(args):
+    from calibration_index import DEFAULT_INDEX_CACHE, default_sources, load_index
+
+    maps, variants = list(args.maps), getattr(args, "variants", None)
+    if not maps and args.platform:
+        maps, default_variants = default_sources(args.platform)
+        variants = variants or default_variants
+    if not maps:
+        raise MapError("no calibration map (give --map or --platform with a non-empty map)")
+    return load_index(maps, variants, args.platform or "", DEFAULT_INDEX_CACHE)
+
+
+def _image_arg(value: str) -> Tuple[Optional[str], Path]:
+    variant, sep, path = value.rpartition("=")
+    return (variant if sep else None), Path(path)
+
+
+def report_main(args) -> int:
+    start = time.perf_counter()
+    try:
+        index = _load_index(args)
+        unknown = set(args.variant or ()) - set(index.variants)
+        if unknown:
+            raise MapError(f"unknown variant(s): {', '.join(sorted(unknown))}")
+        sections = build_sections(index, dict(args.images), args.base, args.variant)
+        title = args.title or f"Calibration report {args.platform or ''}".strip()
+        tmp = args.output.with_name(args.output.name + ".tmp")
+        with open(tmp, "w", encoding="utf-8") as out:
+            stats = write_report(sections, out, title,
+                                 None if args.no_cache else args.cache_dir,
+                                 args.jobs or os.cpu_count() or 1)
+        os.replace(tmp, args.output)
+    except (OSError, MapError, ImageError) as exc:
+        print(f"error: {exc}", file=sys.stderr)
+        return 2
+    print(f"{args.output}: {stats.sections} section(s), {stats.cached} cached, "
+          f"{stats.rendered} rendered in {time.perf_counter() - start:.2f} s", file=sys.stderr)
+    return 0
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Calibration image reports")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_diff = sub.add_parser("diff", help="parameter-level diff of two calibration images")
+    p_diff.add_argument("old", type=Path)
+    p_diff.add_argument("new", type=Path)
+    p_diff.add_argument("--platform", choices=("S32K344", "S32K348"),
+                        help="use the platform's calibration maps from the repository")
+    p_diff.add_argument("--map", dest="maps", type=Path, action="append", default=[],
+                        help="calibration map YAML (repeatable; overrides --platform)")
+    p_diff.add_argument("--base", type=lambda v: int(v, 0),
+                        help="load address for raw binaries")
+    p_diff.add_argument("--format", choices=DIFF_FORMATS,
+                        help="report format (default: from the output suffix, else md)")
+    p_diff.add_argument("-o", "--output", type=Path, help="report file (default: stdout)")
+    p_report = sub.add_parser("report", help="HTML report of the map for every board variant")
+    p_report.add_argument("--platform", choices=("S32K344", "S32K348"),
+                          help="use the platform's calibration maps from the repository")
+    p_report.add_argument("--map", dest="maps", type=Path, action="append", default=[],
+                          help="calibration map YAML (repeatable; overrides --platform)")
+    p_report.add_argument("--variants", type=Path,
+                          help="board variant YAML (default with --platform: "
+                               "config/calibration/board_variant.yaml)")
+    p_report.add_argument("--variant", action="append",
+                          help="report only this variant (repeatable; default: base map "
+                               "and every variant)")
+    p_report.add_argument("--image", dest="images", type=_image_arg, action="append",
+                          default=[], metavar="[VARIANT=]PATH",
+                          help="image to show values for (repeatable; without VARIANT= "
+                               "it is used for every variant without its own)")
+    p_report.add_argument("--base", type=lambda v: int(v, 0),
+                          help="load address for raw binaries")
+    p_report.add_argument("--title", help="report title")
+    p_report.add_argument("-o", "--output", type=Path, required=True, help="HTML report file")
+    p_report.add_argument("-j", "--jobs", type=int, default=0,
+                          help="render processes (default: one per core)")
+    p_report.add_argument("--cache-dir", type=Path, default=DEFAULT_SECTION_CACHE,
+                          help="rendered section cache")
+    p_report.add_argument("--no-cache", action="store_true",
+                          help="render every section and cache nothing")
+    args = parser.parse_args(argv)
+
+    if np is None:
+        print("error: calibration_report_gen.py needs NumPy (pip install numpy)",
+              file=sys.stderr)
+        return 2
+    if args.command == "report":
+        return report_main(args)
+    fmt = args.format or (args.output.suffix.lstrip(".").lower()
+                          if args.output and args.output.suffix.lstrip(".").lower()
+                          in DIFF_FORMATS else "md")
+    try:
+        cmap = _load_index(args).compiled()
+        diff = diff_images(cmap, load_image(args.old, args.base),
+                           load_image(args.new, args.base))
+        if args.output:
+            with open(args.output, "w", newline="") as out:
+                write_diff(diff, out, fmt, str(args.old), str(args.new))
+        else:
+            write_diff(diff, sys.stdout, fmt, str(args.old), str(args.new))
+    except (OSError, MapError, ImageError) as exc:
+        print(f"error: {exc}", file=sys.stderr)
+        return 2
+    print(_summary(diff), file=sys.stderr)
+    return 0 if diff.identical else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,813 @@
+#!/usr/bin/env python3
+"""Range and type verification of calibration images against the calibration map.
+
+The map (schema in ``calibration_map.py``) is compiled into one structured
+array and flat per-element arrays, so an image is checked with a handful
+of NumPy operations per value type: all elements are gathered from the
+image with one fancy-indexing step, scaled, and compared against their
+limits at once.  Every violation is reported, not just the first.
+
+The map is read through the compiled index (``calibration_index.py``)
+unless ``--no-index-cache`` is given.
+
+Batch mode (several images or ``--manifest``) fans the images out over a
+process pool.  Each distinct map is copied once into a shared memory block
+that the workers map read-only; a task carries only the image path and
+the block name.  Results are streamed into a CSV or JSON ``--summary`` as
+they arrive.
+
+Checksums declared in the map are recomputed over their ranges with
+``crc_lib.py`` and compared with the value stored in the image.
+
+``--incremental`` keeps the last verified image and its result under
+``~/.cache/vcu_xcp/verify_state``.  The next run diffs the new image
+against it byte for byte, maps the changed byte runs to parameters through
+an interval index over the parameter extents, and re-checks only those
+parameters and the checksums whose range or storage was touched.
+``--watch`` does the same in one process each time the file changes.
+"""
+
+from __future__ import annotations
+
+import argparse
+import csv
+import hashlib
+import json
+import math
+import multiprocessing
+import os
+import sys
+import time
+from dataclasses import asdict, dataclass, field
+from multiprocessing import shared_memory
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from calibration_map import (
+    TYPE_NAMES,
+    TYPES,
+    Checksum,
+    CompiledMap,
+    MapError,
+    np,
+    require_numpy,
+)
+from crc_lib import engine as crc_engine
+from hex_parser import HEX_SUFFIXES, SREC_SUFFIXES, HexParseError, load
+
+# violation kinds, in reporting priority
+MISSING, NOT_FINITE, BELOW_MIN, ABOVE_MAX, NOT_MONOTONIC = range(5)
+KIND_NAMES = ["missing", "not_finite", "below_min", "above_max", "not_monotonic"]
+
+
+class ImageError(Exception):
+    """Raised for unreadable calibration images."""
+
+
+# -- image -------------------------------------------------------------------
+
+
+class ImageBuffer:
+    """Segments concatenated into one byte array with an address translation table."""
+
+    def __init__(self, segments: Iterable[Tuple[int, bytes]]) -> None:
+        require_numpy()
+        segments = sorted(segments, key=lambda seg: seg[0])
+        lengths = [len(data) for _, data in segments]
+        self.starts = np.array([address for address, _ in segments], dtype=np.uint64)
+        self.ends = self.starts + np.array(lengths, dtype=np.uint64)
+        self.offsets = np.concatenate(([0], np.cumsum(lengths[:-1], dtype=np.uint64))) \
+            .astype(np.uint64)
+        self.data = (np.frombuffer(b"".join(data for _, data in segments), dtype=np.uint8)
+                     if segments else np.zeros(0, dtype=np.uint8))
+
+    def locate(self, addresses, size: int):
+        """Buffer positions of ``size``-byte values and a mask of those fully present."""
+        if not len(self.starts):
+            return np.zeros(len(addresses), dtype=np.intp), np.zeros(len(addresses), dtype=bool)
+        seg = np.searchsorted(self.starts, addresses, side="right").astype(np.intp) - 1
+        present = seg >= 0
+        seg = np.maximum(seg, 0)
+        present &= addresses + np.uint64(size) <= self.ends[seg]
+        positions = np.where(present, self.offsets[seg] + addresses - self.starts[seg],
+                             0).astype(np.intp)
+        return positions, present
+
+    def read(self, address: int, length: int):
+        """``length`` bytes at ``address`` as a view, or None unless fully present."""
+        positions, present = self.locate(np.array([address], dtype=np.uint64), length)
+        if not present[0]:
+            return None
+        return self.data[positions[0]:positions[0] + length]
+
+    def addresses(self, positions):
+        """Target addresses of buffer ``positions``."""
+        seg = np.searchsorted(self.offsets, positions, side="right").astype(np.intp) - 1
+        return self.starts[seg] + (positions.astype(np.uint64) - self.offsets[seg])
+
+    def same_layout(self, other: "ImageBuffer") -> bool:
+        return np.array_equal(self.starts, other.starts) and \
+            np.array_equal(self.ends, other.ends)
+
+
+def load_image(path: Path, base: Optional[int] = None) -> ImageBuffer:
+    """Intel HEX / S-record by extension or content; raw binaries need ``base``."""
+    path = Path(path)
+    try:
+        with open(path, "rb") as fh:
+            head = fh.read(2)
+        if path.suffix.lower() in HEX_SUFFIXES | SREC_SUFFIXES or head[:1] == b":" \
+                or head == b"S0":
+            return ImageBuffer(load(path).segments)
+        if base is None:
+            raise ImageError(f"{path}: raw binary needs a load address (--base)")
+        return ImageBuffer([(base, path.read_bytes())])
+    except HexParseError as exc:
+        raise ImageError(str(exc)) from exc
+    except OSError as exc:
+        raise ImageError(f"{path}: {exc.strerror}") from exc
+
+
+# -- verification ------------------------------------------------------------
+
+
+@dataclass
+class Violation:
+    name: str
+    index: Tuple[int, ...]
+    address: int
+    kind: str
+    value: Optional[float]
+    min: float
+    max: float
+    unit: str = ""
+
+    def describe(self) -> str:
+        label = self.name + "".join(f"[{i}]" for i in self.index)
+        unit = f" {self.unit}" if self.unit else ""
+        where = f"{label} @0x{self.address:08X}"
+        if self.kind == "missing":
+            return f"{where}: not present in image"
+        if self.kind == "not_finite":
+            return f"{where}: {self.value}"
+        if self.kind == "not_monotonic":
+            return f"{where}: {self.value:g}{unit} breaks monotonic order"
+        bound = (f"< min {self.min:g}" if self.kind == "below_min"
+                 else f"> max {self.max:g}")
+        return f"{where}: {self.value:g}{unit} {bound}{unit}"
+
+
+@dataclass
+class ChecksumResult:
+    name: str
+    address: int
+    algorithm: str
+    status: str                   # "ok", "mismatch" or "missing"
+    stored: Optional[int] = None
+    computed: Optional[int] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.status == "ok"
+
+    def describe(self) -> str:
+        where = f"{self.name} @0x{self.address:08X} ({self.algorithm})"
+        if self.status == "missing":
+            return f"{where}: checksum or covered range not present in image"
+        if self.status == "mismatch":
+            return f"{where}: stored 0x{self.stored:X} != computed 0x{self.computed:X}"
+        return f"{where}: ok"
+
+
+@dataclass
+class VerifyResult:
+    parameters: int
+    elements: int
+    violations: List[Violation] = field(default_factory=list)
+    checksums: List[ChecksumResult] = field(default_factory=list)
+
+    @property
+    def ok(self) -> bool:
+        return not self.violations and all(c.ok for c in self.checksums)
+
+    @property
+    def failed_parameters(self) -> int:
+        return len({v.name for v in self.violations})
+
+    @property
+    def failed_checksums(self) -> int:
+        return sum(not c.ok for c in self.checksums)
+
+    def as_dict(self) -> dict:
+        return {
+            "parameters": self.parameters,
+            "elements": self.elements,
+            "failed_parameters": self.failed_parameters,
+            "violations": [dict(asdict(v), index=list(v.index), address=f"0x{v.address:08X}",
+                                min=_json_float(v.min), max=_json_float(v.max),
+                                value=_json_float(v.value))
+                           for v in self.violations],
+            "checksums": [dict(asdict(c), address=f"0x{c.address:08X}")
+                          for c in self.checksums],
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "VerifyResult":
+        violations = [Violation(v["name"], tuple(v["index"]), int(v["address"], 16),
+                                v["kind"], _float(v["value"]), _float(v["min"]),
+                                _float(v["max"]), v["unit"]) for v in data["violations"]]
+        checksums = [ChecksumResult(**dict(c, address=int(c["address"], 16)))
+                     for c in data.get("checksums", [])]
+        return cls(data["parameters"], data["elements"], violations, checksums)
+
+
+def _json_float(value: Optional[float]):
+    if value is None or math.isfinite(value):
+        return value
+    return str(value)
+
+
+def _float(value) -> Optional[float]:
+    return None if value is None else float(value)
+
+
+def check_checksums(checksums: Sequence[Checksum], image: ImageBuffer,
+                    byte_order: str = "<") -> List[ChecksumResult]:
+    """Recompute every checksum over its range and compare with the stored value."""
+    results = []
+    for checksum in checksums:
+        stored = image.read(checksum.address, checksum.size)
+        covered = image.read(checksum.start, checksum.end - checksum.start)
+        if stored is None or covered is None:
+            results.append(ChecksumResult(checksum.name, checksum.address,
+                                          checksum.algorithm, "missing"))
+            continue
+        value = int.from_bytes(stored.tobytes(), "little" if byte_order == "<" else "big")
+        computed = crc_engine(checksum.algorithm).checksum(covered)
+        results.append(ChecksumResult(checksum.name, checksum.address, checksum.algorithm,
+                                      "ok" if value == computed else "mismatch",
+                                      value, computed))
+    return results
+
+
+def physical_values(cmap: CompiledMap, image: ImageBuffer):
+    """Physical value of every map element and a mask of those in the image."""
+    values = np.full(cmap.elements, np.nan)
+    present = np.zeros(cmap.elements, dtype=bool)
+    for code, sel in cmap.by_type.items():
+        dtype = np.dtype(TYPES[TYPE_NAMES[code]][0]).newbyteorder(cmap.byte_order)
+        positions, found = image.locate(cmap.elem_address[sel], dtype.itemsize)
+        positions = np.where(found, positions, 0)
+        data = image.data
+        if len(data) < dtype.itemsize:
+            # nothing of this type can be present; gather from padding instead
+            data = np.zeros(dtype.itemsize, dtype=np.uint8)
+        if dtype.itemsize == 1:
+            raw = data[positions].view(dtype)
+        else:
+            raw = data[positions[:, None] + np.arange(dtype.itemsize)].view(dtype)[:, 0]
+        values[sel] = np.where(found, raw, np.nan)
+        present[sel] = found
+    param = cmap.elem_param
+    return values * cmap.entries["scale"][param] + cmap.entries["offset"][param], present
+
+
+def verify(cmap: CompiledMap, image: ImageBuffer) -> VerifyResult:
+    """Check every element of every parameter in one vectorised pass."""
+    phys, present = physical_values(cmap, image)
+    param = cmap.elem_param
+    kind = np.full(cmap.elements, -1, dtype=np.int8)
+    step = np.empty_like(phys)
+    step[0:1] = np.nan
+    step[1:] = np.diff(phys)
+    with np.errstate(invalid="ignore"):
+        checks = [
+            (NOT_MONOTONIC, (cmap.mono_inc & (step <= 0)) | (cmap.mono_dec & (step >= 0))),
+            (ABOVE_MAX, phys > cmap.entries["max"][param]),
+            (BELOW_MIN, phys < cmap.entries["min"][param]),
+            (NOT_FINITE, present & ~np.isfinite(phys)),
+            (MISSING, ~present),
+        ]
+    for code, mask in checks:  # later checks take priority
+        kind[mask] = code
+
+    violations = []
+    for i in np.flatnonzero(kind >= 0).tolist():
+        p = int(param[i])
+        shape = cmap.shapes[p]
+        index = tuple(int(n) for n in np.unravel_index(int(cmap.elem_index[i]), shape)) \
+            if shape else ()
+        code = int(kind[i])
+        violations.append(Violation(
+            cmap.names[p], index, int(cmap.elem_address[i]), KIND_NAMES[code],
+            None if code == MISSING else float(phys[i]),
+            float(cmap.entries["min"][p]), float(cmap.entries["max"][p]), cmap.units[p]))
+    return VerifyResult(len(cmap), cmap.elements, violations,
+                        check_checksums(cmap.checksums, image, cmap.byte_order))
+
+
+# -- incremental -------------------------------------------------------------
+
+DEFAULT_STATE_DIR = Path.home() / ".cache" / "vcu_xcp" / "verify_state"
+
+
+class IntervalIndex:
+    """Byte extents of the map's parameters, for range-overlap queries."""
+
+    def __init__(self, cmap: CompiledMap) -> None:
+        starts = cmap.entries["address"]
+        self.order = np.argsort(starts, kind="stable")
+        self.starts = starts[self.order]
+        self.ends = (starts + cmap.sizes)[self.order]
+        # the running maximum of the ends is sorted too, so both bounds are binary searches
+        self.max_end = np.maximum.accumulate(self.ends) if len(self.ends) else self.ends
+
+    def covers(self, addresses):
+        """Mask of the byte ``addresses`` that lie inside some parameter."""
+        k = np.searchsorted(self.starts, addresses, side="right").astype(np.intp) - 1
+        return (k >= 0) & (self.max_end[np.maximum(k, 0)] > addresses) if len(self.starts) \
+            else np.zeros(len(addresses), dtype=bool)
+
+    def overlapping(self, lo, hi):
+        """Sorted parameter rows whose extent intersects any range ``[lo, hi)``."""
+        first = np.searchsorted(self.max_end, lo, side="right")
+        last = np.searchsorted(self.starts, hi, side="left")
+        counts = np.maximum(last.astype(np.intp) - first, 0)
+        total = int(counts.sum())
+        if not total:
+            return np.zeros(0, dtype=np.intp)
+        run = np.repeat(np.arange(len(counts)), counts)
+        candidates = (np.repeat(first, counts) + np.arange(total)
+                      - np.repeat(np.cumsum(counts) - counts, counts))
+        hit = self.ends[candidates] > lo[run]
+        return np.unique(self.order[candidates[hit]])
+
+
+DIFF_CHUNK = 1 << 20
+
+
+def byte_runs(addresses):
+    """``(lo, hi)`` arrays of the contiguous runs in sorted byte ``addresses``."""
+    if not len(addresses):
+        return addresses, addresses
+    breaks = np.flatnonzero(np.diff(addresses) != 1) + 1
+    lo = addresses[np.concatenate(([0], breaks))]
+    hi = addresses[np.concatenate((breaks - 1, [len(addresses) - 1]))] + np.uint64(1)
+    return lo, hi
+
+
+def changed_ranges(old: ImageBuffer, new: ImageBuffer):
+    """``(lo, hi)`` address arrays of the byte runs that differ, or None when the
+    segment layouts differ and the images cannot be compared byte for byte.
+
+    The images are compared in fixed-size chunks, so the temporaries stay
+    small however large the images are.
+    """
+    if not old.same_layout(new):
+        return None
+    positions = [np.flatnonzero(old.data[at:at + DIFF_CHUNK] != new.data[at:at + DIFF_CHUNK])
+                 + at for at in range(0, len(old.data), DIFF_CHUNK)]
+    positions = np.concatenate(positions) if positions else np.zeros(0, dtype=np.intp)
+    return byte_runs(old.addresses(positions))
+
+
+def _touches(lo, hi, start: int, end: int) -> bool:
+    return bool(np.any((lo < end) & (hi > start)))
+
+
+@dataclass
+class IncrementalStats:
+    mode: str                     # "full" or "incremental"
+    changed_bytes: int = 0
+    ranges: int = 0
+    parameters: int = 0
+    checksums: int = 0
+    seconds: float = 0.0
+
+    def describe(self) -> str:
+        if self.mode == "full":
+            return f"full verification in {self.seconds * 1e3:.1f} ms"
+        return (f"incremental: {self.changed_bytes} changed byte(s) in {self.ranges} "
+                f"range(s), re-checked {self.parameters} parameter(s) and "
+                f"{self.checksums} checksum(s) in {self.seconds * 1e3:.1f} ms")
+
+
+class IncrementalVerifier:
+    """Verifies successive versions of one image, re-checking only what changed.
+
+    The last image and its result are kept in memory and, with a
+    ``state_path``, in an ``.npz`` file so the next process can pick up
+    where this one stopped.  A changed segment layout falls back to a full
+    verification.
+    """
+
+    def __init__(self, cmap: CompiledMap, state_path: Optional[Path] = None) -> None:
+        self.cmap = cmap
+        self.intervals = IntervalIndex(cmap)
+        self.state_path = state_path
+        self.image: Optional[ImageBuffer] = None
+        self.result: Optional[VerifyResult] = None
+        if state_path is not None and state_path.is_file():
+            self._load()
+
+    def run(self, image: ImageBuffer) -> Tuple[VerifyResult, IncrementalStats]:
+        start = time.perf_counter()
+        ranges = changed_ranges(self.image, image) if self.image is not None else None
+        if ranges is None:
+            result, stats = verify(self.cmap, image), IncrementalStats("full")
+        else:
+            lo, hi = ranges
+            rows = self.intervals.overlapping(lo, hi)
+            fresh = verify(self.cmap.subset(rows), image).violations if len(rows) else []
+            touched = {self.cmap.names[r] for r in rows.tolist()}
+            violations = sorted([v for v in self.result.violations if v.name not in touched]
+                                + fresh, key=lambda v: (v.address, v.kind))
+            previous = {c.name: c for c in self.result.checksums}
+            stale = [c for c in self.cmap.checksums
+                     if c.name not in previous
+                     or _touches(lo, hi, c.start, c.end)
+                     or _touches(lo, hi, c.address, c.address + c.size)]
+            rechecked = {c.name: c for c in
+                         check_checksums(stale, image, self.cmap.byte_order)}
+            checksums = [rechecked.get(c.name) or previous[c.name] for c in self.cmap.checksums]
+            result = VerifyResult(len(self.cmap), self.cmap.elements, violations, checksums)
+            stats = IncrementalStats("incremental", int((hi - lo).sum()), len(lo),
+                                     len(rows), len(stale))
+        self.image, self.result = image, result
+        if self.state_path is not None:
+            self._save()
+        stats.seconds = time.perf_counter() - start
+        return result, stats
+
+    def _save(self) -> None:
+        self.state_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.state_path.with_name(self.state_path.name + ".tmp")
+        with open(tmp, "wb") as fh:
+            np.savez(fh, starts=self.image.starts, ends=self.image.ends,
+                     offsets=self.image.offsets, data=self.image.data,
+                     result=np.frombuffer(json.dumps(self.result.as_dict()).encode(),
+                                          dtype=np.uint8))
+        os.replace(tmp, self.state_path)
+
+    def _load(self) -> None:
+        try:
+            with np.load(self.state_path) as state:
+                image = ImageBuffer(())
+                image.starts, image.ends = state["starts"], state["ends"]
+                image.offsets, image.data = state["offsets"], state["data"]
+                result = VerifyResult.from_dict(json.loads(state["result"].tobytes()))
+        except (OSError, ValueError, KeyError):
+            return  # unreadable state: the next run verifies everything
+        if result.parameters == len(self.cmap) and result.elements == self.cmap.elements:
+            self.image, self.result = image, result
+
+
+def state_path(image: Path, index_data, variant: Optional[str],
+               state_dir: Path = DEFAULT_STATE_DIR) -> Path:
+    """State file for ``image`` checked against one index and variant."""
+    key = hashlib.sha256()
+    key.update(str(Path(image).resolve()).encode())
+    key.update(hashlib.sha256(index_data).digest())
+    key.update((variant or "").encode())
+    return Path(state_dir) / f"{key.hexdigest()}.npz"
+
+
+# -- batch -------------------------------------------------------------------
+
+SUMMARY_FIELDS = ["image", "platform", "variant", "status", "parameters", "elements",
+                  "violations", "failed_parameters", "failed_checksums", "seconds", "error"]
+
+
+@dataclass(frozen=True)
+class BatchJob:
+    image: str
+    segment: str                  # shared memory block holding the compiled index
+    platform: str = ""
+    variant: Optional[str] = None
+    base: Optional[int] = None
+
+
+class SharedIndex:
+    """A compiled index copied once into a shared memory block."""
+
+    def __init__(self, data) -> None:
+        self.shm = shared_memory.SharedMemory(create=True, size=max(1, len(data)))
+        self.shm.buf[:len(data)] = data
+        self.name = self.shm.name
+
+    def close(self) -> None:
+        self.shm.close()
+        self.shm.unlink()
+
+
+# per-process caches: block name -> (block, index), (block, variant) -> map
+_indexes: Dict[str, tuple] = {}
+_maps: Dict[Tuple[str, Optional[str]], CompiledMap] = {}
+
+
+def _job_map(segment: str, variant: Optional[str]) -> CompiledMap:
+    key = (segment, variant)
+    if key not in _maps:
+        if segment not in _indexes:
+            from calibration_index import CalibrationIndex
+
+            block = shared_memory.SharedMemory(segment)
+            _indexes[segment] = (block, CalibrationIndex(block.buf))
+        _maps[key] = _indexes[segment][1].compiled(variant)
+    return _maps[key]
+
+
+def _release_maps() -> None:
+    _maps.clear()
+    while _indexes:
+        _, (block, index) = _indexes.popitem()
+        del index  # drop the views into the block before closing it
+        block.close()
+
+
+def run_job(job: BatchJob) -> dict:
+    """Verify one image; errors become a row with ``status == "error"``."""
+    start = time.perf_counter()
+    row = {"image": job.image, "platform": job.platform, "variant": job.variant or ""}
+    try:
+        result = verify(_job_map(job.segment, job.variant), load_image(job.image, job.base))
+        details = result.as_dict()
+        row.update(status="ok" if result.ok else "failed",
+                   parameters=result.parameters, elements=result.elements,
+                   violations=len(result.violations),
+                   failed_parameters=result.failed_parameters,
+                   failed_checksums=result.failed_checksums,
+                   details=details["violations"], checksums=details["checksums"])
+    except (MapError, ImageError) as exc:
+        row.update(status="error", error=str(exc))
+    row["seconds"] = round(time.perf_counter() - start, 6)
+    return row
+
+
+def run_batch(jobs: Sequence[BatchJob], workers: int) -> Iterator[dict]:
+    """Yield one result row per job, in completion order."""
+    if workers <= 1 or len(jobs) <= 1:
+        try:
+            for job in jobs:
+                yield run_job(job)
+        finally:
+            _release_maps()
+        return
+    chunksize = max(1, min(16, len(jobs) // (workers * 4)))
+    with multiprocessing.get_context().Pool(workers) as pool:
+        yield from pool.imap_unordered(run_job, jobs, chunksize)
+
+
+class SummaryWriter:
+    """Streams result rows to a CSV or JSON summary as they arrive."""
+
+    def __init__(self, path: Path) -> None:
+        self.path = Path(path)
+        self.csv = self.path.suffix.lower() == ".csv"
+        self._fh = open(self.path, "w", newline="")
+        self._rows = 0
+        if self.csv:
+            self._writer = csv.DictWriter(self._fh, SUMMARY_FIELDS, extrasaction="ignore")
+            self._writer.writeheader()
+        else:
+            self._fh.write('{"results": [\n')
+
+    def write(self, row: dict) -> None:
+        if self.csv:
+            self._writer.writerow(row)
+        else:
+            self._fh.write((",\n" if self._rows else "") + json.dumps(row))
+        self._rows += 1
+        self._fh.flush()
+
+    def close(self, totals: dict) -> None:
+        if not self.csv:
+            self._fh.write(f'\n],\n"totals": {json.dumps(totals)}}}\n')
+        self._fh.close()
+
+
+def read_manifest(path: Path) -> List[dict]:
+    """``image[,platform,variant,base]`` rows; relative images are manifest-relative."""
+    with open(path, newline="") as fh:
+        rows = list(csv.DictReader(fh))
+    if rows and "image" not in rows[0]:
+        raise ValueError(f"{path}: manifest needs an 'image' column")
+    jobs = []
+    for row in rows:
+        image = (row.get("image") or "").strip()
+        if not image or image.startswith("#"):
+            continue
+        base = (row.get("base") or "").strip()
+        jobs.append({"image": str(Path(path).parent / image),
+                     "platform": (row.get("platform") or "").strip(),
+                     "variant": (row.get("variant") or "").strip() or None,
+                     "base": int(base, 0) if base else None})
+    return jobs
+
+
+# -- CLI ---------------------------------------------------------------------
+
+
+def _map_sources(args, platform: str):
+    from calibration_index import default_sources
+
+    if args.maps:
+        return list(args.maps), args.variants
+    if not platform:
+        return [], None
+    maps, variants = default_sources(platform)
+    return maps, args.variants or variants
+
+
+def _print_row(row: dict) -> None:
+    label = row["image"] + (f" [{row['variant']}]" if row["variant"] else "")
+    if row["status"] == "error":
+        print(f"{label}: ERROR: {row['error']}")
+    else:
+        checksums = row.get("checksums") or ()
+        print(f"{label}: {'OK' if row['status'] == 'ok' else 'FAILED'}: "
+              f"{row['violations']} violation(s) in {row['failed_parameters']} parameter(s)"
+              + (f", {row['failed_checksums']} of {len(checksums)} checksum(s) failed"
+                 if checksums else ""))
+
+
+def batch_main(args, items: List[dict]) -> int:
+    from calibration_index import DEFAULT_INDEX_CACHE, load_index
+
+    cache = None if args.no_index_cache else DEFAULT_INDEX_CACHE
+    blocks: Dict[tuple, SharedIndex] = {}
+    jobs = []
+    try:
+        for item in items:
+            platform = item["platform"] or args.platform or ""
+            maps, variants = _map_sources(args, platform)
+            if not maps:
+                raise MapError(f"{item['image']}: no calibration map "
+                               f"(give --map, --platform or a manifest platform)")
+            key = (tuple(maps), variants, platform)
+            if key not in blocks:
+                index = load_index(maps, variants, platform, cache)
+                blocks[key] = SharedIndex(index.data)
+            variant = item["variant"] or args.variant
+            jobs.append(BatchJob(item["image"], blocks[key].name, platform, variant,
+                                 item["base"] if item["base"] is not None else args.base))
+    except (MapError, ValueError) as exc:
+        for block in blocks.values():
+            block.close()
+        print(f"error: {exc}", file=sys.stderr)
+        return 2
+
+    workers = args.jobs or os.cpu_count() or 1
+    counts = {"ok": 0, "failed": 0, "error": 0}
+    writer = SummaryWriter(args.summary) if args.summary else None
+    start = time.perf_counter()
+    try:
+        for row in run_batch(jobs, workers):
+            counts[row["status"]] += 1
+            _print_row(row)
+            if writer:
+                writer.write(row)
+    finally:
+        elapsed = time.perf_counter() - start
+        totals = dict(counts, images=len(jobs), workers=min(workers, len(jobs)),
+                      seconds=round(elapsed, 3))
+        if writer:
+            writer.close(totals)
+        for block in blocks.values():
+            block.close()
+    print(f"{len(jobs)} image(s): {counts['ok']} ok, {counts['failed']} failed, "
+          f"{counts['error']} error(s) in {elapsed:.2f} s with {totals['workers']} worker(s)")
+    return 0 if counts["ok"] == len(jobs) else 1
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Verify calibration images against "
+                                                 "the calibration map")
+    parser.add_argument("images", type=Path, nargs="*",
+                        help="calibration images (.hex, .srec or raw)")
+    parser.add_argument("--platform", choices=("S32K344", "S32K348"),
+                        help="use the platform's calibration maps from the repository")
+    parser.add_argument("--map", dest="maps", type=Path, action="append", default=[],
+                        help="calibration map YAML (repeatable; overrides --platform)")
+    parser.add_argument("--base", type=lambda v: int(v, 0),
+                        help="load address for raw binaries")
+    parser.add_argument("--variants", type=Path,
+                        help="board variant YAML (default with --platform: "
+                             "config/calibration/board_variant.yaml)")
+    parser.add_argument("--variant", help="check against this board variant's limits")
+    parser.add_argument("--json", type=Path,
+                        help="write the result of a single image as JSON ('-' for stdout)")
+    parser.add_argument("--no-index-cache", action="store_true",
+                        help="build the index from the YAML maps without caching it")
+    batch = parser.add_argument_group("batch mode (several images or --manifest)")
+    batch.add_argument("--manifest", type=Path,
+                       help="CSV with image[,platform,variant,base] columns")
+    batch.add_argument("-j", "--jobs", type=int, default=0,
+                       help="worker processes (default: one per core)")
+    batch.add_argument("--summary", type=Path,
+                       help="stream per-image results to this .csv or .json file")
+    incremental = parser.add_argument_group("incremental mode (single image)")
+    incremental.add_argument("--incremental", action="store_true",
+                             help="re-check only parameters and checksums whose bytes "
+                                  "changed since the last run on this image")
+    incremental.add_argument("--state-dir", type=Path, default=DEFAULT_STATE_DIR,
+                             help="where the last verified image and result are kept")
+    incremental.add_argument("--watch", type=float, nargs="?", const=0.5, metavar="SECONDS",
+                             help="keep running and re-verify whenever the image file "
+                                  "changes (polls every SECONDS, default 0.5)")
+    args = parser.parse_args(argv)
+
+    if np is None:
+        print("error: calibration_verify.py needs NumPy (pip install numpy)", file=sys.stderr)
+        return 2
+    if not args.images and not args.manifest:
+        parser.error("give an image or --manifest")
+    if args.manifest or len(args.images) > 1 or args.summary:
+        if args.incremental or args.watch is not None:
+            parser.error("--incremental and --watch take a single image")
+        if args.json:
+            parser.error("--json is for a single image; use --summary in batch mode")
+        items = [{"image": str(path), "platform": "", "variant": None, "base": None}
+                 for path in args.images]
+        try:
+            if args.manifest:
+                items += read_manifest(args.manifest)
+        except (OSError, ValueError) as exc:
+            print(f"error: {exc}", file=sys.stderr)
+            return 2
+        return batch_main(args, items)
+
+    from calibration_index import DEFAULT_INDEX_CACHE, load_index
+
+    image = args.images[0]
+    maps, variants = _map_sources(args, args.platform)
+    if not maps:
+        print("error: no calibration map (give --map or --platform with a non-empty map)",
+              file=sys.stderr)
+        return 2
+    try:
+        index = load_index(maps, variants, args.platform or "",
+                           None if args.no_index_cache else DEFAULT_INDEX_CACHE)
+        cmap = index.compiled(args.variant)
+        if args.incremental or args.watch is not None:
+            verifier = IncrementalVerifier(
+                cmap, state_path(image, index.data, args.variant, args.state_dir))
+            if args.watch is not None:
+                return watch(args, image, maps, verifier)
+            result, stats = verifier.run(load_image(image, args.base))
+            print(stats.describe(), file=sys.stderr)
+        else:
+            result = verify(cmap, load_image(image, args.base))
+    except (MapError, ImageError) as exc:
+        print(f"error: {exc}", file=sys.stderr)
+        return 2
+    return report(args, image, maps, result)
+
+
+def watch(args, image: Path, maps: List[Path], verifier: IncrementalVerifier) -> int:
+    """Re-verify ``image`` each time its size or mtime changes, until interrupted."""
+    seen, status = None, 2
+    try:
+        while True:
+            try:
+                stat = os.stat(image)
+                current = (stat.st_mtime_ns, stat.st_size)
+                if current != seen:
+                    seen = current
+                    result, stats = verifier.run(load_image(image, args.base))
+                    print(stats.describe(), file=sys.stderr)
+                    status = report(args, image, maps, result)
+            except (OSError, ImageError) as exc:
+                print(f"error: {exc}", file=sys.stderr)  # e.g. caught mid-write
+                status = 2
+            time.sleep(args.watch)
+    except KeyboardInterrupt:
+        return status
+
+
+def report(args, image: Path, maps: List[Path], result: VerifyResult) -> int:
+    if args.json:
+        report = dict(result.as_dict(), image=str(image), maps=[str(m) for m in maps],
+                      variant=args.variant)
+        text = json.dumps(report, indent=2)
+        if str(args.json) == "-":
+            print(text)
+        else:
+            args.json.write_text(text + "\n")
+    if str(args.json) != "-":
+        for violation in result.violations:
+            print(violation.describe())
+        for checksum in result.checksums:
+            if not checksum.ok:
+                print(checksum.describe())
+        status = "OK" if result.ok else "FAILED"
+        print(f"{image}: {status}: {result.parameters} parameters, "
+              f"{result.elements} values, {len(result.violations)} violation(s) in "
+              f"{result.failed_parameters} parameter(s)"
+              + (f", {result.failed_checksums} of {len(result.checksums)} checksum(s) failed"
+                 if result.checksums else ""))
+    return 0 if result.ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
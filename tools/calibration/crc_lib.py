@@ -0,0 +1,457 @@
+#!/usr/bin/env python3
+"""Host implementations of the CRCs used by the VCU firmware.
+
+Covers the AUTOSAR CRC library routines behind the firmware's data
+integrity checks and the E2E profiles:
+
+    CRC8          SAE J1850, poly 0x1D            E2E profile 01
+    CRC8H2F       poly 0x2F                       E2E profile 02
+    CRC16         CCITT-FALSE, poly 0x1021
+    CRC16ARC      poly 0x8005, reflected
+    CRC32         IEEE 802.3, poly 0x04C11DB7     flash/sector checksums
+    CRC32P4       poly 0xF4ACFB13, reflected      E2E profile 04
+    CRC64         ECMA-182, poly 0x42F0E1EBA9EA3693, reflected  E2E profile 07
+
+Every model carries its ``"123456789"`` check value and is cross-checked
+by ``--self-test``.  ``Crc`` picks the fastest available path:
+
+* ``zlib``/``binascii`` for the two models the standard library covers;
+* a NumPy lane engine for large buffers: the data are cut into a few
+  thousand lanes, all lanes advance one byte per vectorised table lookup,
+  and the lane CRCs are folded pairwise with the GF(2) zero-extension
+  operator (the ``crc32_combine`` idea, for any width and bit order);
+* table-driven slicing-by-8 in pure Python otherwise.
+
+``Crc.batch`` computes the CRCs of many equal-length buffers (E2E frames,
+parameter blocks) with one table lookup per byte column.
+
+Chained calls follow ``Crc_CalculateCRCx(..., StartValue, IsFirstCall=FALSE)``:
+pass the previous result as ``previous``.
+"""
+
+from __future__ import annotations
+
+import argparse
+import binascii
+import struct
+import sys
+import zlib
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional; the table-driven paths always work.
+    np = None
+
+LANE_THRESHOLD = 1 << 16  # bytes; below this the lane setup costs more than it saves
+DEFAULT_LANES = 4096
+
+
+@dataclass(frozen=True)
+class CrcModel:
+    name: str
+    width: int
+    poly: int
+    init: int
+    reflected: bool    # reflected input and output
+    xor_out: int
+    check: int         # CRC of b"123456789"
+
+
+CRC8 = CrcModel("CRC8", 8, 0x1D, 0xFF, False, 0xFF, 0x4B)
+CRC8H2F = CrcModel("CRC8H2F", 8, 0x2F, 0xFF, False, 0xFF, 0xDF)
+CRC16 = CrcModel("CRC16", 16, 0x1021, 0xFFFF, False, 0x0000, 0x29B1)
+CRC16ARC = CrcModel("CRC16ARC", 16, 0x8005, 0x0000, True, 0x0000, 0xBB3D)
+CRC32 = CrcModel("CRC32", 32, 0x04C11DB7, 0xFFFFFFFF, True, 0xFFFFFFFF, 0xCBF43926)
+CRC32P4 = CrcModel("CRC32P4", 32, 0xF4ACFB13, 0xFFFFFFFF, True, 0xFFFFFFFF, 0x1697D06A)
+CRC64 = CrcModel("CRC64", 64, 0x42F0E1EBA9EA3693, (1 << 64) - 1, True, (1 << 64) - 1,
+                 0x995DC9BBDF1939FA)
+
+MODELS: Dict[str, CrcModel] = {m.name: m for m in
+                               (CRC8, CRC8H2F, CRC16, CRC16ARC, CRC32, CRC32P4, CRC64)}
+
+# Vectors from the AUTOSAR CRC library specification (SWS_Crc), as
+# (data, {model: crc}).
+KNOWN_VECTORS = [
+    (bytes(4), {"CRC8": 0x59, "CRC8H2F": 0x12, "CRC16": 0x84C0,
+                "CRC32": 0x2144DF1C, "CRC32P4": 0x6FB32240}),
+    (bytes((0xF2, 0x01, 0x83)), {"CRC8": 0x37, "CRC8H2F": 0xC2, "CRC16": 0xD374,
+                                 "CRC32": 0x24AB9D77, "CRC32P4": 0x4F721A25}),
+    (bytes((0xFF,) * 4), {"CRC8": 0x74, "CRC8H2F": 0x6C, "CRC16": 0x1D0F,
+                          "CRC32": 0xFFFFFFFF, "CRC32P4": 0xFFFFFFFF}),
+]
+
+
+def _reflect(value: int, width: int) -> int:
+    return int(f"{value:0{width}b}"[::-1], 2)
+
+
+class Crc:
+    """CRC engine for one model; tables are built on construction."""
+
+    def __init__(self, model: CrcModel) -> None:
+        self.model = model
+        self.width = model.width
+        self.mask = (1 << model.width) - 1
+        self.reflected = model.reflected
+        self.tables = self._slice_tables(self._table())
+        self.table = self.tables[0]
+        self._np_table = None
+        self._zero_ops: Dict[int, List[int]] = {}
+
+    def _table(self) -> List[int]:
+        w, mask = self.width, self.mask
+        table = []
+        if self.reflected:
+            poly = _reflect(self.model.poly, w)
+            for byte in range(256):
+                crc = byte
+                for _ in range(8):
+                    crc = (crc >> 1) ^ poly if crc & 1 else crc >> 1
+                table.append(crc)
+        else:
+            top = 1 << (w - 1)
+            for byte in range(256):
+                crc = byte << (w - 8)
+                for _ in range(8):
+                    crc = ((crc << 1) ^ self.model.poly) & mask if crc & top else (crc << 1) & mask
+                table.append(crc)
+        return table
+
+    def _slice_tables(self, table: List[int]) -> List[List[int]]:
+        """``tables[k][b]``: register contribution of byte ``b`` followed by ``k`` zero bytes."""
+        tables = [table]
+        shift = self.width - 8
+        for _ in range(7):
+            prev = tables[-1]
+            if self.reflected:
+                tables.append([(c >> 8) ^ table[c & 0xFF] for c in prev])
+            else:
+                tables.append([((c << 8) & self.mask) ^ table[c >> shift] for c in prev])
+        return tables
+
+    # -- register helpers ----------------------------------------------------
+
+    def initial(self, previous: Optional[int] = None) -> int:
+        """Register value to start from, fresh or chained from ``previous``."""
+        if previous is not None:
+            return (previous ^ self.model.xor_out) & self.mask
+        init = self.model.init
+        return _reflect(init, self.width) if self.reflected else init
+
+    def final(self, register: int) -> int:
+        return (register ^ self.model.xor_out) & self.mask
+
+    # -- pure Python ---------------------------------------------------------
+
+    def update_bytewise(self, register: int, data) -> int:
+        table = self.table
+        if self.reflected:
+            for byte in bytes(data):
+                register = table[(register ^ byte) & 0xFF] ^ (register >> 8)
+        else:
+            shift, mask = self.width - 8, self.mask
+            for byte in bytes(data):
+                register = table[((register >> shift) ^ byte) & 0xFF] ^ ((register << 8) & mask)
+        return register
+
+    def update(self, register: int, data) -> int:
+        """Slicing-by-8: one 64-bit word and eight table lookups per step."""
+        data = bytes(data)
+        whole = len(data) - len(data) % 8
+        t0, t1, t2, t3, t4, t5, t6, t7 = self.tables
+        if self.reflected:
+            for (word,) in struct.iter_unpack("<Q", data[:whole]):
+                b = (register ^ word).to_bytes(8, "little")
+                register = (t7[b[0]] ^ t6[b[1]] ^ t5[b[2]] ^ t4[b[3]]
+                            ^ t3[b[4]] ^ t2[b[5]] ^ t1[b[6]] ^ t0[b[7]])
+        else:
+            up = 64 - self.width
+            for (word,) in struct.iter_unpack(">Q", data[:whole]):
+                b = ((register << up) ^ word).to_bytes(8, "big")
+                register = (t7[b[0]] ^ t6[b[1]] ^ t5[b[2]] ^ t4[b[3]]
+                            ^ t3[b[4]] ^ t2[b[5]] ^ t1[b[6]] ^ t0[b[7]])
+        return self.update_bytewise(register, data[whole:])
+
+    # -- zero-extension operator (GF(2) matrices as column lists) ------------
+
+    def _apply(self, columns: List[int], register: int) -> int:
+        out = 0
+        bit = 0
+        while register:
+            if register & 1:
+                out ^= columns[bit]
+            register >>= 1
+            bit += 1
+        return out
+
+    def zero_operator(self, length: int) -> List[int]:
+        """Columns of the linear map "advance the register over ``length`` zero bytes"."""
+        ops = self._zero_ops
+        if length not in ops:
+            if not ops:
+                ops[1] = [self.update_bytewise(1 << bit, b"\0") for bit in range(self.width)]
+            result = None
+            power, step = 1, ops[1]
+            remaining = length
+            while remaining:
+                if remaining & 1:
+                    result = step if result is None else [self._apply(step, c) for c in result]
+                remaining >>= 1
+                if remaining:
+                    power *= 2
+                    if power not in ops:
+                        ops[power] = [self._apply(step, c) for c in step]
+                    step = ops[power]
+            ops[length] = result if result is not None else \
+                [1 << bit for bit in range(self.width)]
+        return ops[length]
+
+    def combine(self, register: int, lane_register: int, lane_length: int) -> int:
+        """Register after ``register``'s data followed by a lane computed from zero."""
+        return self._apply(self.zero_operator(lane_length), register) ^ lane_register
+
+    # -- NumPy ---------------------------------------------------------------
+
+    def _numpy_table(self):
+        if self._np_table is None:
+            self._np_table = np.array(self.table, dtype=np.uint64)
+        return self._np_table
+
+    def _step_columns(self, registers, columns):
+        """Advance every register by one byte per column of ``columns`` (bytes x lanes)."""
+        table = self._numpy_table()
+        if self.reflected:
+            eight = np.uint64(8)
+            for column in columns:
+                registers = table[(registers ^ column) & 0xFF] ^ (registers >> eight)
+        else:
+            shift, eight, mask = np.uint64(self.width - 8), np.uint64(8), np.uint64(self.mask)
+            for column in columns:
+                registers = table[((registers >> shift) ^ column) & 0xFF] \
+                    ^ ((registers << eight) & mask)
+        return registers
+
+    def _apply_vector(self, columns: List[int], registers):
+        out = np.zeros_like(registers)
+        one = np.uint64(1)
+        for bit, column in enumerate(columns):
+            out ^= np.where((registers >> np.uint64(bit)) & one, np.uint64(column),
+                            np.uint64(0))
+        return out
+
+    def update_lanes(self, register: int, data, lanes: int = DEFAULT_LANES) -> int:
+        """NumPy lane engine; equivalent to ``update`` for any length."""
+        buf = np.frombuffer(data, dtype=np.uint8)
+        length = len(buf) // lanes
+        if length == 0:
+            return self.update(register, data)
+        body = buf[:lanes * length].reshape(lanes, length).T.astype(np.uint64)
+        regs = self._step_columns(np.zeros(lanes, dtype=np.uint64), body)
+        span = length
+        if lanes & (lanes - 1):  # pad in front to a power of two; zero lanes fold away
+            pad = (1 << lanes.bit_length()) - lanes
+            regs = np.concatenate((np.zeros(pad, dtype=np.uint64), regs))
+        while len(regs) > 1:
+            regs = self._apply_vector(self.zero_operator(span), regs[0::2]) ^ regs[1::2]
+            span *= 2
+        register = self.combine(register, int(regs[0]), lanes * length)
+        return self.update(register, buf[lanes * length:].tobytes())
+
+    def batch(self, buffers, previous=None):
+        """CRCs of many equal-length buffers: rows of a 2-D ``uint8`` array or a list."""
+        if np is None:
+            return [self.checksum(b, previous) for b in buffers]
+        rows = buffers if isinstance(buffers, np.ndarray) else \
+            np.array([np.frombuffer(bytes(b), dtype=np.uint8) for b in buffers]).reshape(
+                len(buffers), -1)
+        if self.model in (CRC32, CRC16):  # the C routines beat one gather per column
+            starts = [None] * len(rows) if previous is None else [int(p) for p in previous]
+            return np.array([self.checksum(row.tobytes(), start)
+                             for row, start in zip(rows, starts)], dtype=np.uint64)
+        start = np.full(len(rows), self.initial(), dtype=np.uint64) if previous is None \
+            else (np.asarray(previous, dtype=np.uint64) ^ np.uint64(self.model.xor_out)) \
+            & np.uint64(self.mask)
+        regs = self._step_columns(start, rows.T.astype(np.uint64))
+        return regs ^ np.uint64(self.model.xor_out)
+
+    # -- public --------------------------------------------------------------
+
+    def checksum(self, data, previous: Optional[int] = None) -> int:
+        """CRC of ``data``; ``previous`` chains on from an earlier result."""
+        model = self.model
+        if model is CRC32:
+            return zlib.crc32(data, 0 if previous is None else previous)
+        if model is CRC16:
+            return binascii.crc_hqx(data, model.init if previous is None else previous)
+        register = self.initial(previous)
+        if np is not None and len(data) >= LANE_THRESHOLD:
+            register = self.update_lanes(register, data)
+        else:
+            register = self.update(register, data)
+        return self.final(register)
+
+    __call__ = checksum
+
+
+_ENGINES: Dict[str, Crc] = {}
+
+
+def engine(model) -> Crc:
+    """Shared engine for a model (or model name); tables are built once."""
+    name = model if isinstance(model, str) else model.name
+    if name not in _ENGINES:
+        _ENGINES[name] = Crc(MODELS[name])
+    return _ENGINES[name]
+
+
+def crc8(data, previous: Optional[int] = None) -> int:
+    return engine(CRC8).checksum(data, previous)
+
+
+def crc8h2f(data, previous: Optional[int] = None) -> int:
+    return engine(CRC8H2F).checksum(data, previous)
+
+
+def crc16(data, previous: Optional[int] = None) -> int:
+    return engine(CRC16).checksum(data, previous)
+
+
+def crc32(data, previous: Optional[int] = None) -> int:
+    return engine(CRC32).checksum(data, previous)
+
+
+def crc32p4(data, previous: Optional[int] = None) -> int:
+    return engine(CRC32P4).checksum(data, previous)
+
+
+def crc64(data, previous: Optional[int] = None) -> int:
+    return engine(CRC64).checksum(data, previous)
+
+
+# -- E2E profiles ------------------------------------------------------------
+
+E2E_P01_DATAID_BOTH, E2E_P01_DATAID_ALT, E2E_P01_DATAID_LOW, E2E_P01_DATAID_NIBBLE = range(4)
+
+
+def _skip_field(fn, data: bytes, offset: int, size: int, first: int) -> int:
+    crc = fn(data[:offset], first)
+    return fn(data[offset + size:], crc)
+
+
+def e2e_p01_crc(data: bytes, data_id: int, counter: int = 0, crc_offset: int = 0,
+                mode: int = E2E_P01_DATAID_BOTH) -> int:
+    """Profile 01 CRC8 over the Data ID and ``data`` without its CRC byte."""
+    low, high = data_id & 0xFF, (data_id >> 8) & 0xFF
+    crc = 0xFF
+    if mode == E2E_P01_DATAID_BOTH:
+        crc = crc8(bytes((low, high)), crc)
+    elif mode == E2E_P01_DATAID_ALT:
+        crc = crc8(bytes((low if counter % 2 == 0 else high,)), crc)
+    elif mode == E2E_P01_DATAID_LOW:
+        crc = crc8(bytes((low,)), crc)
+    else:  # NIBBLE: low byte, then a zero byte (the high nibble travels in the data)
+        crc = crc8(bytes((low, 0)), crc)
+    crc = _skip_field(crc8, bytes(data), crc_offset, 1, crc)
+    return crc ^ 0xFF
+
+
+def e2e_p02_crc(data: bytes, data_id_list: Sequence[int], counter: int) -> int:
+    """Profile 02 CRC8H2F over ``data[1:]`` then ``DataIDList[counter]``."""
+    crc = crc8h2f(bytes(data[1:]))
+    return crc8h2f(bytes((data_id_list[counter % len(data_id_list)] & 0xFF,)), crc)
+
+
+def e2e_p04_crc(data: bytes, offset: int = 0) -> int:
+    """Profile 04 CRC32P4 over the frame without the CRC field.
+
+    The 12-byte header at ``offset`` is Length (16), Counter (16), DataID
+    (32), CRC (32), big endian; the CRC covers everything but its own 4 bytes.
+    """
+    data = bytes(data)
+    crc = crc32p4(data[:offset + 8])
+    return crc32p4(data[offset + 12:], crc) if len(data) > offset + 12 else crc
+
+
+def e2e_p07_crc(data: bytes, offset: int = 0) -> int:
+    """Profile 07 CRC64 over the frame without the CRC field.
+
+    The 20-byte header at ``offset`` is CRC (64), Length (32), Counter
+    (32), DataID (32), big endian.
+    """
+    data = bytes(data)
+    crc = crc64(data[:offset])
+    return crc64(data[offset + 8:], crc)
+
+
+# -- self test ---------------------------------------------------------------
+
+
+def self_test(verbose: bool = False) -> List[str]:
+    """Cross-check every model and code path; returns the failures."""
+    import random
+
+    failures = []
+    rng = random.Random(0x5EED)
+    blobs = [bytes(rng.randrange(256) for _ in range(n)) for n in (0, 1, 7, 8, 9, 63, 1000)]
+    large = bytes(rng.randrange(256) for _ in range(LANE_THRESHOLD + 12345))
+    for model in MODELS.values():
+        crc = Crc(model)
+        results = {
+            "check": crc.checksum(b"123456789") == model.check,
+            "bytewise": crc.final(crc.update_bytewise(crc.initial(), b"123456789"))
+            == model.check,
+        }
+        for data, expected in KNOWN_VECTORS:
+            if model.name in expected:
+                results[f"vector {data.hex()}"] = crc.checksum(data) == expected[model.name]
+        for blob in blobs:
+            ref = crc.final(crc.update_bytewise(crc.initial(), blob))
+            results[f"slicing {len(blob)}"] = crc.final(crc.update(crc.initial(), blob)) == ref
+            results[f"chained {len(blob)}"] = \
+                crc.checksum(blob[len(blob) // 3:], crc.checksum(blob[:len(blob) // 3])) == ref
+        ref = crc.final(crc.update(crc.initial(), large))
+        if np is not None:
+            results["lanes"] = crc.final(crc.update_lanes(crc.initial(), large, 1000)) == ref
+            rows = [blob[:7] for blob in blobs if len(blob) >= 7]
+            results["batch"] = [int(v) for v in crc.batch(rows)] == \
+                [crc.checksum(r) for r in rows]
+        results["large"] = crc.checksum(large) == ref
+        for what, ok in results.items():
+            if not ok:
+                failures.append(f"{model.name}: {what}")
+            elif verbose:
+                print(f"{model.name}: {what} ok")
+    return failures
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Compute firmware-compatible CRCs")
+    parser.add_argument("files", nargs="*", help="files to checksum")
+    parser.add_argument("--model", choices=sorted(MODELS), default="CRC32")
+    parser.add_argument("--self-test", action="store_true",
+                        help="check all models against known vectors and each other")
+    parser.add_argument("-v", "--verbose", action="store_true")
+    args = parser.parse_args(argv)
+
+    if args.self_test:
+        failures = self_test(args.verbose)
+        for failure in failures:
+            print(f"FAIL {failure}", file=sys.stderr)
+        print(f"self-test: {'FAILED' if failures else 'ok'} ({len(MODELS)} models)")
+        return 1 if failures else 0
+    crc = engine(args.model)
+    digits = crc.width // 4
+    try:
+        for path in args.files:
+            with open(path, "rb") as fh:
+                print(f"{crc.checksum(fh.read()):0{digits}X}  {path}")
+    except OSError as exc:
+        print(f"error: {exc}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
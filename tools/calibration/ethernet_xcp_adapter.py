@@ -0,0 +1,1037 @@
+#!/usr/bin/env python3
+"""XCP-on-Ethernet transport and master for the S32K3xx VCU calibration tools.
+
+Implements the ASAM MCD-1 XCP 1.x command layer on top of the XCP-on-TCP
+framing (2-byte LEN, 2-byte CTR, both little endian).  The calibration tools
+under ``calibration/tools/`` import this module as their single entry point
+to the ECU's XCP slave.
+
+``XcpMaster`` is the blocking API over ``XcpTcpTransport`` or
+``XcpUdpTransport``; ``AsyncXcpMaster`` offers the subset the asyncio tools
+need over TCP or UDP.
+
+The transports receive into one preallocated buffer (``recv_into`` or an
+asyncio ``BufferedProtocol``) and parse headers in place; ``recv_view``
+returns packets as views into that buffer.  Several packets travel in one
+write or datagram in both directions, and every transport counts gaps in
+the slave's CTR sequence in ``stats``.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import socket
+import struct
+from collections import deque
+from dataclasses import dataclass, field
+from enum import IntEnum
+from typing import Callable, Deque, Iterable, List, Optional, Tuple
+
+XCP_TCP_DEFAULT_PORT = 5555
+
+PID_RES = 0xFF
+PID_ERR = 0xFE
+PID_EV = 0xFD
+PID_SERV = 0xFC
+
+ETH_HEADER = struct.Struct("<HH")
+SLAVE_BLOCK_MAX_ELEMENTS = 255
+RX_BUFFER_SIZE = 1 << 18
+TX_BUFFER_SIZE = 1 << 16
+UDP_RCVBUF = 1 << 21
+
+
+class Cmd(IntEnum):
+    """XCP command codes (master -> slave PID)."""
+
+    CONNECT = 0xFF
+    DISCONNECT = 0xFE
+    GET_STATUS = 0xFD
+    SYNCH = 0xFC
+    GET_COMM_MODE_INFO = 0xFB
+    GET_ID = 0xFA
+    SET_REQUEST = 0xF9
+    GET_SEED = 0xF8
+    UNLOCK = 0xF7
+    SET_MTA = 0xF6
+    UPLOAD = 0xF5
+    SHORT_UPLOAD = 0xF4
+    BUILD_CHECKSUM = 0xF3
+    DOWNLOAD = 0xF0
+    DOWNLOAD_NEXT = 0xEF
+    DOWNLOAD_MAX = 0xEE
+    SHORT_DOWNLOAD = 0xED
+    CLEAR_DAQ_LIST = 0xE3
+    SET_DAQ_PTR = 0xE2
+    WRITE_DAQ = 0xE1
+    SET_DAQ_LIST_MODE = 0xE0
+    START_STOP_DAQ_LIST = 0xDE
+    START_STOP_SYNCH = 0xDD
+    GET_DAQ_PROCESSOR_INFO = 0xDA
+    GET_DAQ_RESOLUTION_INFO = 0xD9
+    FREE_DAQ = 0xD6
+    ALLOC_DAQ = 0xD5
+    ALLOC_ODT = 0xD4
+    ALLOC_ODT_ENTRY = 0xD3
+    PROGRAM_START = 0xD2
+    PROGRAM_CLEAR = 0xD1
+    PROGRAM = 0xD0
+    PROGRAM_RESET = 0xCF
+    PROGRAM_NEXT = 0xCA
+    PROGRAM_MAX = 0xC9
+    PROGRAM_VERIFY = 0xC8
+
+
+class ErrCode(IntEnum):
+    """XCP negative response codes."""
+
+    CMD_SYNCH = 0x00
+    CMD_BUSY = 0x10
+    DAQ_ACTIVE = 0x11
+    PGM_ACTIVE = 0x12
+    CMD_UNKNOWN = 0x20
+    CMD_SYNTAX = 0x21
+    OUT_OF_RANGE = 0x22
+    WRITE_PROTECTED = 0x23
+    ACCESS_DENIED = 0x24
+    ACCESS_LOCKED = 0x25
+    PAGE_NOT_VALID = 0x26
+    MODE_NOT_VALID = 0x27
+    SEGMENT_NOT_VALID = 0x28
+    SEQUENCE = 0x29
+    DAQ_CONFIG = 0x2A
+    MEMORY_OVERFLOW = 0x30
+    GENERIC = 0x31
+    VERIFY = 0x32
+    RESOURCE_TEMPORARY_NOT_ACCESSIBLE = 0x33
+
+
+# COMM_MODE_BASIC bits (CONNECT response)
+COMM_BYTE_ORDER_MOTOROLA = 0x01
+COMM_ADDRESS_GRANULARITY_MASK = 0x06
+COMM_SLAVE_BLOCK_MODE = 0x40
+COMM_OPTIONAL = 0x80
+
+# COMM_MODE_OPTIONAL bits (GET_COMM_MODE_INFO response)
+COMM_OPT_MASTER_BLOCK_MODE = 0x01
+COMM_OPT_INTERLEAVED_MODE = 0x02
+
+# Resource bits (CONNECT response, GET_STATUS protection status, GET_SEED)
+RESOURCE_CAL_PAG = 0x01
+RESOURCE_DAQ = 0x04
+RESOURCE_STIM = 0x08
+RESOURCE_PGM = 0x10
+
+# GET_ID identification types; 0x80+ are VCU-specific.
+ID_ASCII = 0x00
+ID_ECU_SERIAL = 0x80
+GET_ID_IN_RESPONSE = 0x01
+
+
+# DAQ list mode bits (SET_DAQ_LIST_MODE)
+DAQ_MODE_TIMESTAMP = 0x10
+DAQ_MODE_PID_OFF = 0x20
+
+# START_STOP_DAQ_LIST / START_STOP_SYNCH modes
+DAQ_LIST_STOP = 0x00
+DAQ_LIST_START = 0x01
+DAQ_LIST_SELECT = 0x02
+SYNCH_STOP_ALL = 0x00
+SYNCH_START_SELECTED = 0x01
+SYNCH_STOP_SELECTED = 0x02
+
+# GET_DAQ_PROCESSOR_INFO properties
+DAQ_PROP_TIMESTAMP_SUPPORTED = 0x10
+DAQ_KEY_IDENTIFICATION_MASK = 0xC0
+
+# Timestamp unit codes (GET_DAQ_RESOLUTION_INFO, bits 4..7) in seconds
+TIMESTAMP_UNITS = {0: 1e-9, 1: 1e-8, 2: 1e-7, 3: 1e-6, 4: 1e-5, 5: 1e-4,
+                   6: 1e-3, 7: 1e-2, 8: 1e-1, 9: 1.0, 10: 1e-12, 11: 1e-11, 12: 1e-10}
+
+
+class ChecksumType(IntEnum):
+    """BUILD_CHECKSUM algorithm identifiers."""
+
+    ADD_11 = 0x01
+    ADD_12 = 0x02
+    ADD_14 = 0x03
+    ADD_22 = 0x04
+    ADD_24 = 0x05
+    ADD_44 = 0x06
+    CRC_16 = 0x07
+    CRC_16_CITT = 0x08
+    CRC_32 = 0x09
+    USER_DEFINED = 0xFF
+
+
+@dataclass
+class ProgramInfo:
+    """Programming parameters returned by PROGRAM_START."""
+
+    comm_mode_pgm: int = 0
+    max_cto_pgm: int = 8
+    max_bs_pgm: int = 0
+    min_st_pgm: int = 0
+    queue_size_pgm: int = 0
+
+    @property
+    def master_block_mode(self) -> bool:
+        return bool(self.comm_mode_pgm & COMM_OPT_MASTER_BLOCK_MODE)
+
+    @property
+    def interleaved_mode(self) -> bool:
+        return bool(self.comm_mode_pgm & COMM_OPT_INTERLEAVED_MODE)
+
+    @property
+    def slave_block_mode(self) -> bool:
+        return bool(self.comm_mode_pgm & COMM_SLAVE_BLOCK_MODE)
+
+    @property
+    def block_size(self) -> int:
+        """Bytes per master-block PROGRAM sequence (0 without block mode)."""
+        if not self.master_block_mode:
+            return 0
+        return min(SLAVE_BLOCK_MAX_ELEMENTS, self.max_bs_pgm * (self.max_cto_pgm - 2))
+
+    @property
+    def min_separation(self) -> float:
+        """MIN_ST_PGM in seconds (the unit is 100 us)."""
+        return self.min_st_pgm * 100e-6
+
+    def pipeline_window(self, requested: int) -> int:
+        """Number of programming requests that may be outstanding at once."""
+        if not self.interleaved_mode:
+            return 1
+        return max(1, min(requested, self.queue_size_pgm))
+
+
+@dataclass
+class DaqInfo:
+    """GET_DAQ_PROCESSOR_INFO and GET_DAQ_RESOLUTION_INFO results."""
+
+    properties: int = 0
+    max_daq: int = 0
+    max_event_channel: int = 0
+    min_daq: int = 0
+    daq_key_byte: int = 0
+    max_odt_entry_size: int = 0xFF
+    timestamp_size: int = 0
+    timestamp_unit: float = 0.0
+    timestamp_ticks: int = 0
+
+    @property
+    def timestamp_supported(self) -> bool:
+        return bool(self.properties & DAQ_PROP_TIMESTAMP_SUPPORTED) and self.timestamp_size > 0
+
+    @property
+    def identification_type(self) -> int:
+        return (self.daq_key_byte & DAQ_KEY_IDENTIFICATION_MASK) >> 6
+
+    @property
+    def seconds_per_tick(self) -> float:
+        return self.timestamp_unit * self.timestamp_ticks
+
+
+class XcpError(Exception):
+    """Raised when the slave answers with an ERR packet or the link fails."""
+
+    def __init__(self, message: str, code: Optional[int] = None) -> None:
+        super().__init__(message)
+        self.code = code
+
+
+class XcpTimeoutError(XcpError):
+    """Raised when the slave does not answer within the transport timeout."""
+
+
+def error_name(code: int) -> str:
+    try:
+        return ErrCode(code).name
+    except ValueError:
+        return f"0x{code:02X}"
+
+
+@dataclass
+class SlaveInfo:
+    """Communication parameters negotiated in CONNECT/GET_COMM_MODE_INFO."""
+
+    resource: int = 0
+    comm_mode_basic: int = 0
+    max_cto: int = 8
+    max_dto: int = 8
+    protocol_version: int = 1
+    transport_version: int = 1
+    comm_mode_optional: int = 0
+    max_bs: int = 0
+    min_st: int = 0
+    queue_size: int = 0
+    driver_version: int = 0
+
+    @classmethod
+    def from_connect(cls, res: bytes) -> "SlaveInfo":
+        info = cls(resource=res[1], comm_mode_basic=res[2], max_cto=res[3])
+        info.max_dto = struct.unpack_from(info.byte_order + "H", res, 4)[0]
+        info.protocol_version = res[6]
+        info.transport_version = res[7]
+        return info
+
+    def update_comm_mode_info(self, res: bytes) -> None:
+        self.comm_mode_optional = res[2]
+        self.max_bs = res[4]
+        self.min_st = res[5]
+        self.queue_size = res[6]
+        self.driver_version = res[7]
+
+    @property
+    def has_comm_mode_info(self) -> bool:
+        return bool(self.comm_mode_basic & COMM_OPTIONAL)
+
+    @property
+    def byte_order(self) -> str:
+        return ">" if self.comm_mode_basic & COMM_BYTE_ORDER_MOTOROLA else "<"
+
+    @property
+    def address_granularity(self) -> int:
+        return 1 << ((self.comm_mode_basic & COMM_ADDRESS_GRANULARITY_MASK) >> 1)
+
+    @property
+    def slave_block_mode(self) -> bool:
+        return bool(self.comm_mode_basic & COMM_SLAVE_BLOCK_MODE)
+
+    @property
+    def master_block_mode(self) -> bool:
+        return bool(self.comm_mode_optional & COMM_OPT_MASTER_BLOCK_MODE)
+
+    @property
+    def interleaved_mode(self) -> bool:
+        return bool(self.comm_mode_optional & COMM_OPT_INTERLEAVED_MODE)
+
+    @property
+    def upload_chunk(self) -> int:
+        """Bytes per UPLOAD request, a whole number of response packets."""
+        if self.address_granularity != 1:
+            raise XcpError("only byte address granularity is supported")
+        per_packet = self.max_cto - 1
+        if self.slave_block_mode:
+            return max(per_packet, SLAVE_BLOCK_MAX_ELEMENTS // per_packet * per_packet)
+        return per_packet
+
+    def pipeline_window(self, requested: int) -> int:
+        """Number of requests that may be outstanding at once."""
+        if not self.interleaved_mode:
+            return 1
+        return max(1, min(requested, self.queue_size))
+
+
+@dataclass
+class TransportStats:
+    """Receive counters, including gaps in the slave's CTR sequence.
+
+    The CTR is 16 bits, so ``lost`` only sees a gap modulo 65536: a burst
+    of 65536 or more lost packets is undercounted (or, at an exact multiple,
+    missed).  When the number of packets sent is known, ``account`` turns
+    ``lost`` into the exact count.
+    """
+
+    packets: int = 0
+    bytes: int = 0
+    ctr_gaps: int = 0             # discontinuities in the received CTR sequence
+    lost: int = 0                 # packets skipped over (a lower bound, see above)
+    _next_ctr: Optional[int] = field(default=None, repr=False)
+
+    def received(self, ctr: int, length: int) -> None:
+        if self._next_ctr is not None and ctr != self._next_ctr:
+            self.ctr_gaps += 1
+            self.lost += (ctr - self._next_ctr) & 0xFFFF
+        self._next_ctr = (ctr + 1) & 0xFFFF
+        self.packets += 1
+        self.bytes += length
+
+    def account(self, sent: int) -> int:
+        """Reconcile ``lost`` with ``sent`` packets offered by the slave."""
+        self.lost = max(self.lost, sent - self.packets)
+        return self.lost
+
+
+class XcpTransport:
+    """XCP-on-Ethernet framing over a preallocated receive buffer.
+
+    Subclasses only move bytes (``_fill``/``_send_buffer``).  Headers are
+    parsed in place and ``recv_view`` hands out packets as views into the
+    buffer, so the receive path allocates nothing per packet; ``send_many``
+    packs frames into a preallocated transmit buffer the same way.
+    """
+
+    max_write = TX_BUFFER_SIZE    # bytes per socket write
+    min_free = 1                  # receive room to restore before each fill
+
+    def __init__(self, sock: socket.socket) -> None:
+        self._sock = sock
+        self._ctr = 0
+        self._rx = bytearray(RX_BUFFER_SIZE)
+        self._rx_view = memoryview(self._rx)
+        self._start = self._end = 0
+        self._tx = bytearray(TX_BUFFER_SIZE)
+        self._tx_view = memoryview(self._tx)
+        self.stats = TransportStats()
+
+    @property
+    def timeout(self) -> Optional[float]:
+        return self._sock.gettimeout()
+
+    @timeout.setter
+    def timeout(self, value: Optional[float]) -> None:
+        self._sock.settimeout(value)
+
+    # -- transmit ----------------------------------------------------------
+
+    def frame(self, packet: bytes) -> bytes:
+        header = ETH_HEADER.pack(len(packet), self._ctr)
+        self._ctr = (self._ctr + 1) & 0xFFFF
+        return header + packet
+
+    def _pack(self, packet, offset: int) -> int:
+        ETH_HEADER.pack_into(self._tx, offset, len(packet), self._ctr)
+        self._ctr = (self._ctr + 1) & 0xFFFF
+        end = offset + ETH_HEADER.size + len(packet)
+        self._tx_view[offset + ETH_HEADER.size:end] = packet
+        return end
+
+    def send(self, packet: bytes) -> None:
+        self.send_many((packet,))
+
+    def send_many(self, packets: Iterable[bytes]) -> None:
+        """Send several packets, as few writes (or datagrams) as possible."""
+        used = 0
+        for packet in packets:
+            if used and used + ETH_HEADER.size + len(packet) > self.max_write:
+                self._send_buffer(self._tx_view[:used])
+                used = 0
+            used = self._pack(packet, used)
+        if used:
+            self._send_buffer(self._tx_view[:used])
+
+    def _send_buffer(self, data: memoryview) -> None:
+        raise NotImplementedError
+
+    # -- receive -----------------------------------------------------------
+
+    def _fill(self) -> None:
+        """Receive more bytes into ``self._rx_view[self._end:]``."""
+        raise NotImplementedError
+
+    def _ensure(self, count: int) -> None:
+        if self._start == self._end:
+            self._start = self._end = 0
+        while self._end - self._start < count:
+            if len(self._rx) - self._end < self.min_free:
+                left = self._end - self._start
+                self._rx[:left] = self._rx[self._start:self._end]
+                self._start, self._end = 0, left
+            self._fill()
+
+    def recv_header(self) -> int:
+        """Read one XCP-on-Ethernet header and return the packet length."""
+        self._ensure(ETH_HEADER.size)
+        length, ctr = ETH_HEADER.unpack_from(self._rx, self._start)
+        if length == 0:
+            raise XcpError("received empty XCP packet")
+        self._start += ETH_HEADER.size
+        self.stats.received(ctr, length)
+        return length
+
+    def recv_view(self) -> memoryview:
+        """The next packet as a view into the receive buffer.
+
+        The view is only valid until the next receive call on this transport.
+        A timeout leaves the packet unread, so the call can simply be retried.
+        """
+        self._ensure(ETH_HEADER.size)
+        length, _ctr = ETH_HEADER.unpack_from(self._rx, self._start)
+        self._ensure(ETH_HEADER.size + length)
+        length = self.recv_header()
+        self._ensure(length)
+        start = self._start
+        self._start += length
+        return self._rx_view[start:start + length]
+
+    def recv(self) -> bytes:
+        return bytes(self.recv_view())
+
+    def recv_exact_into(self, view: memoryview) -> None:
+        buffered = min(len(view), self._end - self._start)
+        view[:buffered] = self._rx_view[self._start:self._start + buffered]
+        self._start += buffered
+        if buffered < len(view):
+            self._recv_direct(view[buffered:])
+
+    def _recv_direct(self, view: memoryview) -> None:
+        self._ensure(len(view))
+        view[:] = self._rx_view[self._start:self._start + len(view)]
+        self._start += len(view)
+
+    def close(self) -> None:
+        self._sock.close()
+
+
+class XcpTcpTransport(XcpTransport):
+    """XCP-on-TCP framing over a single stream socket.
+
+    Payloads larger than what is already buffered are received straight
+    into the caller's ``recv_exact_into`` buffer.
+    """
+
+    min_free = ETH_HEADER.size + 0xFFFF  # room for one maximal frame
+
+    def __init__(self, host: str, port: int = XCP_TCP_DEFAULT_PORT,
+                 timeout: float = 2.0) -> None:
+        sock = socket.create_connection((host, port), timeout=timeout)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        super().__init__(sock)
+
+    def _send_buffer(self, data: memoryview) -> None:
+        self._sock.sendall(data)
+
+    def _fill(self) -> None:
+        try:
+            n = self._sock.recv_into(self._rx_view[self._end:])
+        except socket.timeout as exc:
+            raise XcpTimeoutError("timeout waiting for slave response") from exc
+        if n == 0:
+            raise XcpError("connection closed by slave")
+        self._end += n
+
+    def _recv_direct(self, view: memoryview) -> None:
+        received = 0
+        total = len(view)
+        try:
+            while received < total:
+                n = self._sock.recv_into(view[received:], total - received)
+                if n == 0:
+                    raise XcpError("connection closed by slave")
+                received += n
+        except socket.timeout as exc:
+            raise XcpTimeoutError("timeout waiting for slave response") from exc
+
+
+class XcpUdpTransport(XcpTransport):
+    """XCP-on-UDP: several packets per datagram in both directions."""
+
+    MAX_DATAGRAM = 1472
+    max_write = MAX_DATAGRAM
+    min_free = 0x10000            # room for one maximal datagram
+
+    def __init__(self, host: str, port: int = XCP_TCP_DEFAULT_PORT,
+                 timeout: float = 2.0) -> None:
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, UDP_RCVBUF)
+        sock.settimeout(timeout)
+        sock.connect((host, port))
+        super().__init__(sock)
+
+    def _send_buffer(self, data: memoryview) -> None:
+        self._sock.send(data)
+
+    def _fill(self) -> None:
+        if self._start != self._end:
+            # frames never span datagrams; drop the tail and report it
+            self._start = self._end
+            raise XcpError("truncated XCP packet in datagram")
+        try:
+            n = self._sock.recv_into(self._rx_view[self._end:])
+        except socket.timeout as exc:
+            raise XcpTimeoutError("timeout waiting for slave response") from exc
+        self._end += n
+
+
+def open_transport(host: str, port: int = XCP_TCP_DEFAULT_PORT,
+                   protocol: str = "tcp", timeout: float = 2.0) -> XcpTransport:
+    if protocol == "tcp":
+        return XcpTcpTransport(host, port, timeout)
+    if protocol == "udp":
+        return XcpUdpTransport(host, port, timeout)
+    raise ValueError(f"unknown XCP transport {protocol!r}")
+
+
+class XcpMaster:
+    """Blocking XCP master on top of an Ethernet transport."""
+
+    def __init__(self, transport: XcpTransport) -> None:
+        self.transport = transport
+        self.info = SlaveInfo()
+        self.connected = False
+
+    def __enter__(self) -> "XcpMaster":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def close(self) -> None:
+        if self.connected:
+            try:
+                self.disconnect()
+            except XcpError:
+                pass
+        self.transport.close()
+
+    # -- framing helpers -------------------------------------------------
+
+    def pack_u32(self, value: int) -> bytes:
+        return struct.pack(self.info.byte_order + "I", value & 0xFFFFFFFF)
+
+    def unpack_u32(self, data: bytes, offset: int = 0) -> int:
+        return struct.unpack_from(self.info.byte_order + "I", data, offset)[0]
+
+    @staticmethod
+    def check_response(packet: bytes, cmd: int) -> bytes:
+        if not packet:
+            raise XcpError(f"{Cmd(cmd).name}: empty response")
+        if packet[0] == PID_ERR:
+            code = packet[1] if len(packet) > 1 else ErrCode.GENERIC
+            raise XcpError(f"{Cmd(cmd).name} rejected: {error_name(code)}", code)
+        if packet[0] != PID_RES:
+            raise XcpError(f"{Cmd(cmd).name}: unexpected PID 0x{packet[0]:02X}")
+        return packet
+
+    def recv_response(self, cmd: int) -> bytes:
+        """Receive the response to ``cmd``, skipping interleaved EV/SERV packets."""
+        while True:
+            packet = self.transport.recv_view()
+            if packet[0] not in (PID_EV, PID_SERV):
+                return self.check_response(bytes(packet), cmd)
+
+    def command(self, cmd: int, payload: bytes = b"") -> bytes:
+        """Send one command and return the positive response packet."""
+        self.transport.send(bytes((cmd,)) + payload)
+        return self.recv_response(cmd)
+
+    def pipeline_window(self, requested: int) -> int:
+        return self.info.pipeline_window(requested)
+
+    # -- standard commands -----------------------------------------------
+
+    def connect(self, mode: int = 0) -> SlaveInfo:
+        res = self.command(Cmd.CONNECT, bytes((mode,)))
+        self.info = SlaveInfo.from_connect(res)
+        self.connected = True
+        if self.info.has_comm_mode_info:
+            self.get_comm_mode_info()
+        return self.info
+
+    def disconnect(self) -> None:
+        self.command(Cmd.DISCONNECT)
+        self.connected = False
+
+    def get_status(self) -> bytes:
+        return self.command(Cmd.GET_STATUS)
+
+    def get_comm_mode_info(self) -> SlaveInfo:
+        res = self.command(Cmd.GET_COMM_MODE_INFO)
+        self.info.update_comm_mode_info(res)
+        return self.info
+
+    def protection_status(self) -> int:
+        """Resource bits still protected by seed & key (GET_STATUS)."""
+        return self.get_status()[2]
+
+    def get_seed(self, resource: int) -> bytes:
+        """The complete seed for one resource; empty if it is not protected."""
+        res = self.command(Cmd.GET_SEED, bytes((0, resource)))
+        remaining, seed = res[1], bytearray(res[2:2 + res[1]])
+        while len(seed) < remaining:
+            res = self.command(Cmd.GET_SEED, bytes((1, resource)))
+            seed += res[2:2 + res[1]]
+        return bytes(seed[:remaining])
+
+    def unlock_key(self, key: bytes) -> int:
+        """Send ``key`` in UNLOCK parts; returns the new protection status."""
+        step = self.info.max_cto - 2
+        status = 0
+        for offset in range(0, len(key), step):
+            part = key[offset:offset + step]
+            status = self.command(Cmd.UNLOCK, bytes((len(key) - offset,)) + part)[1]
+        return status
+
+    def unlock(self, resources: int, key_fn: Callable[[int, bytes], bytes]) -> int:
+        """Unlock every protected resource in ``resources`` with ``key_fn(resource, seed)``.
+
+        Returns the protection status left afterwards.
+        """
+        status = self.protection_status()
+        for resource in (RESOURCE_CAL_PAG, RESOURCE_DAQ, RESOURCE_STIM, RESOURCE_PGM):
+            if resources & status & resource:
+                seed = self.get_seed(resource)
+                if seed:
+                    status = self.unlock_key(key_fn(resource, seed))
+        return status
+
+    def set_mta(self, address: int, extension: int = 0) -> None:
+        self.command(Cmd.SET_MTA, bytes((0, 0, extension)) + self.pack_u32(address))
+
+    def download(self, data: bytes) -> None:
+        """DOWNLOAD ``data`` to the current MTA, ``MAX_CTO - 2`` bytes per command."""
+        step = self.info.max_cto - 2
+        for offset in range(0, len(data), step):
+            part = data[offset:offset + step]
+            self.command(Cmd.DOWNLOAD, bytes((len(part),)) + part)
+
+    def upload(self, size: int) -> bytes:
+        """UPLOAD ``size`` bytes from the current MTA (slave block mode aware)."""
+        if size > self.info.max_cto - 1 and not self.info.slave_block_mode:
+            raise XcpError(f"UPLOAD of {size} bytes needs slave block mode")
+        res = self.command(Cmd.UPLOAD, bytes((size,)))
+        data = bytearray(res[1:])
+        while len(data) < size:
+            data += self.check_response(self.transport.recv(), Cmd.UPLOAD)[1:]
+        return bytes(data[:size])
+
+    def upload_block(self, size: int) -> bytes:
+        """UPLOAD an arbitrary number of bytes from the current MTA."""
+        step = 255 if self.info.slave_block_mode else self.info.max_cto - 1
+        out = bytearray()
+        while len(out) < size:
+            out += self.upload(min(step, size - len(out)))
+        return bytes(out)
+
+    def get_id(self, id_type: int = ID_ASCII) -> bytes:
+        res = self.command(Cmd.GET_ID, bytes((id_type,)))
+        mode = res[1]
+        length = self.unpack_u32(res, 4)
+        if mode & GET_ID_IN_RESPONSE:
+            return bytes(res[8:8 + length])
+        return self.upload_block(length) if length else b""
+
+    def build_checksum(self, size: int) -> Tuple[int, int]:
+        """Checksum ``size`` bytes from the MTA; returns ``(type, value)``."""
+        res = self.command(Cmd.BUILD_CHECKSUM, bytes(3) + self.pack_u32(size))
+        return res[1], self.unpack_u32(res, 4)
+
+    # -- flash programming -----------------------------------------------
+
+    def program_start(self) -> ProgramInfo:
+        res = self.command(Cmd.PROGRAM_START)
+        return ProgramInfo(res[2], res[3], res[4], res[5], res[6])
+
+    def program_clear(self, size: int, mode: int = 0) -> None:
+        """Erase ``size`` bytes from the MTA (mode 0: absolute access)."""
+        self.command(Cmd.PROGRAM_CLEAR, bytes((mode, 0, 0)) + self.pack_u32(size))
+
+    def program(self, data: bytes) -> None:
+        """PROGRAM one packet at the MTA; empty data ends the segment."""
+        self.command(Cmd.PROGRAM, bytes((len(data),)) + data)
+
+    def program_max(self, data: bytes) -> None:
+        """PROGRAM_MAX: exactly MAX_CTO_PGM-1 bytes at the MTA."""
+        self.command(Cmd.PROGRAM_MAX, data)
+
+    def program_reset(self) -> None:
+        self.command(Cmd.PROGRAM_RESET)
+        self.connected = False
+
+    # -- synchronous data acquisition --------------------------------------
+
+    def pack_u16(self, value: int) -> bytes:
+        return struct.pack(self.info.byte_order + "H", value & 0xFFFF)
+
+    def get_daq_info(self) -> DaqInfo:
+        res = self.command(Cmd.GET_DAQ_PROCESSOR_INFO)
+        order = self.info.byte_order
+        max_daq, max_event = struct.unpack_from(order + "HH", res, 2)
+        info = DaqInfo(properties=res[1], max_daq=max_daq, max_event_channel=max_event,
+                       min_daq=res[6], daq_key_byte=res[7])
+        res = self.command(Cmd.GET_DAQ_RESOLUTION_INFO)
+        info.max_odt_entry_size = res[2]
+        info.timestamp_size = res[5] & 0x07
+        info.timestamp_unit = TIMESTAMP_UNITS.get(res[5] >> 4, 0.0)
+        info.timestamp_ticks = struct.unpack_from(order + "H", res, 6)[0]
+        return info
+
+    def free_daq(self) -> None:
+        self.command(Cmd.FREE_DAQ)
+
+    def alloc_daq(self, count: int) -> None:
+        self.command(Cmd.ALLOC_DAQ, b"\x00" + self.pack_u16(count))
+
+    def alloc_odt(self, daq: int, count: int) -> None:
+        self.command(Cmd.ALLOC_ODT, b"\x00" + self.pack_u16(daq) + bytes((count,)))
+
+    def alloc_odt_entry(self, daq: int, odt: int, count: int) -> None:
+        self.command(Cmd.ALLOC_ODT_ENTRY,
+                     b"\x00" + self.pack_u16(daq) + bytes((odt, count)))
+
+    def set_daq_ptr(self, daq: int, odt: int, entry: int) -> None:
+        self.command(Cmd.SET_DAQ_PTR, b"\x00" + self.pack_u16(daq) + bytes((odt, entry)))
+
+    def write_daq(self, size: int, address: int, extension: int = 0) -> None:
+        self.command(Cmd.WRITE_DAQ, bytes((0xFF, size, extension)) + self.pack_u32(address))
+
+    def set_daq_list_mode(self, daq: int, mode: int, event: int,
+                          prescaler: int = 1, priority: int = 0) -> None:
+        self.command(Cmd.SET_DAQ_LIST_MODE, bytes((mode,)) + self.pack_u16(daq)
+                     + self.pack_u16(event) + bytes((prescaler, priority)))
+
+    def start_stop_daq_list(self, mode: int, daq: int) -> int:
+        """Returns the FIRST_PID assigned to the list."""
+        res = self.command(Cmd.START_STOP_DAQ_LIST, bytes((mode,)) + self.pack_u16(daq))
+        return res[1]
+
+    def start_stop_synch(self, mode: int) -> None:
+        self.command(Cmd.START_STOP_SYNCH, bytes((mode,)))
+
+    def short_upload(self, address: int, size: int, extension: int = 0) -> bytes:
+        res = self.command(Cmd.SHORT_UPLOAD,
+                           bytes((size, 0, extension)) + self.pack_u32(address))
+        return res[1:1 + size]
+
+
+# -- asyncio transports --------------------------------------------------------
+
+
+class _TcpStreamProtocol(asyncio.BufferedProtocol):
+    """Frames XCP-on-TCP packets straight out of a preallocated receive buffer."""
+
+    def __init__(self) -> None:
+        self._buf = bytearray(RX_BUFFER_SIZE)
+        self._view = memoryview(self._buf)
+        self._start = self._end = 0
+        self.packets: "asyncio.Queue[Optional[bytes]]" = asyncio.Queue()
+        self.stats = TransportStats()
+        self.writable = asyncio.Event()
+        self.writable.set()
+
+    def pause_writing(self) -> None:
+        self.writable.clear()
+
+    def resume_writing(self) -> None:
+        self.writable.set()
+
+    def get_buffer(self, sizehint: int) -> memoryview:
+        if self._start == self._end:
+            self._start = self._end = 0
+        elif len(self._buf) - self._end < ETH_HEADER.size + 0xFFFF:
+            left = self._end - self._start
+            self._buf[:left] = self._buf[self._start:self._end]
+            self._start, self._end = 0, left
+        return self._view[self._end:]
+
+    def buffer_updated(self, nbytes: int) -> None:
+        self._end += nbytes
+        start, end = self._start, self._end
+        while end - start >= ETH_HEADER.size:
+            length, ctr = ETH_HEADER.unpack_from(self._buf, start)
+            stop = start + ETH_HEADER.size + length
+            if stop > end:
+                break
+            self.stats.received(ctr, length)
+            self.packets.put_nowait(bytes(self._view[start + ETH_HEADER.size:stop]))
+            start = stop
+        self._start = start
+
+    def connection_lost(self, exc: Optional[Exception]) -> None:
+        self.writable.set()
+        self.packets.put_nowait(None)
+
+
+class AsyncXcpTcpTransport:
+    """asyncio XCP-on-TCP transport."""
+
+    def __init__(self, transport: asyncio.Transport, protocol: _TcpStreamProtocol,
+                 timeout: float) -> None:
+        self._transport = transport
+        self._protocol = protocol
+        self.stats = protocol.stats
+        self.timeout = timeout
+        self._ctr = 0
+
+    @classmethod
+    async def open(cls, host: str, port: int, timeout: float = 2.0) -> "AsyncXcpTcpTransport":
+        loop = asyncio.get_running_loop()
+        transport, protocol = await asyncio.wait_for(
+            loop.create_connection(_TcpStreamProtocol, host, port), timeout)
+        sock = transport.get_extra_info("socket")
+        if sock is not None:
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        return cls(transport, protocol, timeout)
+
+    async def send_many(self, packets: Iterable[bytes]) -> None:
+        frames = bytearray()
+        for packet in packets:
+            frames += ETH_HEADER.pack(len(packet), self._ctr)
+            frames += packet
+            self._ctr = (self._ctr + 1) & 0xFFFF
+        await self._protocol.writable.wait()
+        self._transport.write(frames)
+
+    async def recv(self) -> bytes:
+        try:
+            packet = await asyncio.wait_for(self._protocol.packets.get(), self.timeout)
+        except asyncio.TimeoutError as exc:
+            raise XcpTimeoutError("timeout waiting for slave response") from exc
+        if packet is None:
+            self._protocol.packets.put_nowait(None)  # keep failing on later calls
+            raise XcpError("connection closed by slave")
+        return packet
+
+    async def close(self) -> None:
+        self._transport.close()
+
+
+class _UdpProtocol(asyncio.DatagramProtocol):
+    def __init__(self) -> None:
+        self.packets: "asyncio.Queue[bytes]" = asyncio.Queue()
+        self.stats = TransportStats()
+
+    def datagram_received(self, data: bytes, addr) -> None:
+        # One datagram may carry several XCP packets back to back.
+        view = memoryview(data)
+        offset = 0
+        while offset + ETH_HEADER.size <= len(data):
+            length, ctr = ETH_HEADER.unpack_from(data, offset)
+            start = offset + ETH_HEADER.size
+            if start + length > len(data):
+                break  # truncated frame: the CTR check reports the loss
+            self.stats.received(ctr, length)
+            self.packets.put_nowait(bytes(view[start:start + length]))
+            offset = start + length
+
+
+class AsyncXcpUdpTransport:
+    """asyncio XCP-on-UDP transport; requests are packed into few datagrams."""
+
+    MAX_DATAGRAM = 1472
+
+    def __init__(self, transport: asyncio.DatagramTransport, protocol: _UdpProtocol,
+                 timeout: float) -> None:
+        self._transport = transport
+        self._protocol = protocol
+        self.stats = protocol.stats
+        self.timeout = timeout
+        self._ctr = 0
+
+    @classmethod
+    async def open(cls, host: str, port: int, timeout: float = 2.0) -> "AsyncXcpUdpTransport":
+        loop = asyncio.get_running_loop()
+        transport, protocol = await loop.create_datagram_endpoint(
+            _UdpProtocol, remote_addr=(host, port))
+        return cls(transport, protocol, timeout)
+
+    async def send_many(self, packets: Iterable[bytes]) -> None:
+        datagram = bytearray()
+        for packet in packets:
+            if datagram and len(datagram) + ETH_HEADER.size + len(packet) > self.MAX_DATAGRAM:
+                self._transport.sendto(bytes(datagram))
+                datagram.clear()
+            datagram += ETH_HEADER.pack(len(packet), self._ctr)
+            datagram += packet
+            self._ctr = (self._ctr + 1) & 0xFFFF
+        if datagram:
+            self._transport.sendto(bytes(datagram))
+
+    async def recv(self) -> bytes:
+        try:
+            return await asyncio.wait_for(self._protocol.packets.get(), self.timeout)
+        except asyncio.TimeoutError as exc:
+            raise XcpTimeoutError("timeout waiting for slave response") from exc
+
+    async def close(self) -> None:
+        self._transport.close()
+
+
+async def open_async_transport(host: str, port: int = XCP_TCP_DEFAULT_PORT,
+                               protocol: str = "tcp", timeout: float = 2.0):
+    if protocol == "tcp":
+        return await AsyncXcpTcpTransport.open(host, port, timeout)
+    if protocol == "udp":
+        return await AsyncXcpUdpTransport.open(host, port, timeout)
+    raise ValueError(f"unknown XCP transport {protocol!r}")
+
+
+class AsyncXcpMaster:
+    """asyncio XCP master: session setup plus pipelined uploads."""
+
+    def __init__(self, transport) -> None:
+        self.transport = transport
+        self.info = SlaveInfo()
+        self.connected = False
+
+    async def __aenter__(self) -> "AsyncXcpMaster":
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.close()
+
+    async def close(self) -> None:
+        if self.connected:
+            try:
+                await self.command(Cmd.DISCONNECT)
+            except XcpError:
+                pass
+            self.connected = False
+        await self.transport.close()
+
+    def pack_u32(self, value: int) -> bytes:
+        return struct.pack(self.info.byte_order + "I", value & 0xFFFFFFFF)
+
+    def unpack_u32(self, data: bytes, offset: int = 0) -> int:
+        return struct.unpack_from(self.info.byte_order + "I", data, offset)[0]
+
+    async def recv_response(self, cmd: int) -> bytes:
+        while True:
+            packet = await self.transport.recv()
+            if packet and packet[0] not in (PID_EV, PID_SERV):
+                return XcpMaster.check_response(packet, cmd)
+
+    async def command(self, cmd: int, payload: bytes = b"") -> bytes:
+        await self.transport.send_many((bytes((cmd,)) + payload,))
+        return await self.recv_response(cmd)
+
+    async def connect(self, mode: int = 0) -> SlaveInfo:
+        self.info = SlaveInfo.from_connect(await self.command(Cmd.CONNECT, bytes((mode,))))
+        self.connected = True
+        if self.info.has_comm_mode_info:
+            self.info.update_comm_mode_info(await self.command(Cmd.GET_COMM_MODE_INFO))
+        return self.info
+
+    async def get_id(self, id_type: int = ID_ASCII) -> bytes:
+        res = await self.command(Cmd.GET_ID, bytes((id_type,)))
+        length = self.unpack_u32(res, 4)
+        if res[1] & GET_ID_IN_RESPONSE:
+            return bytes(res[8:8 + length])
+        out = bytearray(length)
+        await self.upload_into(None, memoryview(out), 1)
+        return bytes(out)
+
+    async def set_mta(self, address: int, extension: int = 0) -> None:
+        await self.command(Cmd.SET_MTA, bytes((0, 0, extension)) + self.pack_u32(address))
+
+    async def upload_into(self, address: Optional[int], dest: memoryview,
+                          window: int) -> None:
+        """Fill ``dest`` from ``address`` (or the current MTA if ``None``).
+
+        At most ``window`` UPLOADs (bounded by the slave queue) are in flight.
+        """
+        if address is not None:
+            await self.set_mta(address)
+        window = self.info.pipeline_window(window)
+        chunk = self.info.upload_chunk
+        pending: Deque[Tuple[int, int]] = deque()
+        issued = 0
+        while issued < len(dest) or pending:
+            batch: List[bytes] = []
+            while issued < len(dest) and len(pending) < window:
+                size = min(chunk, len(dest) - issued)
+                batch.append(bytes((Cmd.UPLOAD, size)))
+                pending.append((issued, size))
+                issued += size
+            if batch:
+                await self.transport.send_many(batch)
+            offset, size = pending.popleft()
+            received = 0
+            while received < size:
+                packet = await self.recv_response(Cmd.UPLOAD)
+                payload = len(packet) - 1
+                if received + payload > size:
+                    raise XcpError("UPLOAD response longer than requested")
+                dest[offset + received:offset + received + payload] = packet[1:]
+                received += payload
@@ -0,0 +1,422 @@
+"""Bulk Intel HEX / Motorola S-record parser shared by the calibration tools.
+
+The whole file (or, in streaming mode, one chunk of it) is decoded at
+once: markers and line breaks are stripped, all hex digits go through a
+single ``bytes.fromhex`` call, the byte stream is split into records at
+offsets derived from the ``:``/``S`` marker positions, and every record's
+length and checksum is validated in one vectorised NumPy pass.  Data records are
+then coalesced into contiguous runs and collected in a sparse
+``SegmentMap``.
+
+NumPy is optional; without it the same API falls back to line-by-line
+decoding.  ``iter_runs(path, chunk_size)`` keeps memory bounded by the
+chunk size for files that do not fit in RAM.
+
+Records after the end-of-file record (``:00000001FF``, or the S7/S8/S9
+termination record) are ignored; a non-empty input that ends without one
+is rejected as truncated.
+"""
+
+from __future__ import annotations
+
+import bisect
+import re
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional; the line-based path always works.
+    np = None
+
+DEFAULT_CHUNK_SIZE = 16 * 1024 * 1024
+
+HEX_SUFFIXES = {".hex", ".ihex", ".ihx"}
+SREC_SUFFIXES = {".srec", ".s19", ".s28", ".s37", ".mot", ".s"}
+
+IHEX_DATA, IHEX_EOF, IHEX_EXT_SEGMENT, IHEX_EXT_LINEAR = 0x00, 0x01, 0x02, 0x04
+SREC_ADDRESS_BYTES = {1: 2, 2: 3, 3: 4}  # data records S1/S2/S3
+SREC_TERMINATION = (7, 8, 9)             # S7/S8/S9 end the file
+
+Run = Tuple[int, bytes]
+
+
+class HexParseError(ValueError):
+    """Raised for malformed records; the message names file and line."""
+
+
+# -- sparse segment map --------------------------------------------------------
+
+
+class SegmentMap:
+    """Sorted, non-overlapping ``address -> bytes`` runs; adjacent runs merge."""
+
+    def __init__(self, runs: Iterable[Run] = (), name: str = "") -> None:
+        self.name = name
+        self._starts: List[int] = []
+        self._data: List[bytearray] = []
+        for address, data in runs:
+            self.add(address, data)
+
+    def __len__(self) -> int:
+        return len(self._starts)
+
+    def __iter__(self) -> Iterator[Run]:
+        return iter(self.segments)
+
+    @property
+    def segments(self) -> List[Run]:
+        return [(start, bytes(data)) for start, data in zip(self._starts, self._data)]
+
+    @property
+    def size(self) -> int:
+        return sum(len(data) for data in self._data)
+
+    def _end(self, index: int) -> int:
+        return self._starts[index] + len(self._data[index])
+
+    def add(self, address: int, data) -> None:
+        if not len(data):
+            return
+        end = address + len(data)
+        index = bisect.bisect_right(self._starts, address)
+        prefix = f"{self.name}: " if self.name else ""
+        if index and address < self._end(index - 1):
+            raise HexParseError(f"{prefix}overlapping data at 0x{address:08X}")
+        if index < len(self._starts) and end > self._starts[index]:
+            raise HexParseError(f"{prefix}overlapping data at 0x{self._starts[index]:08X}")
+        if index and address == self._end(index - 1):
+            self._data[index - 1] += data
+            if index < len(self._starts) and end == self._starts[index]:
+                self._data[index - 1] += self._data.pop(index)
+                del self._starts[index]
+        elif index < len(self._starts) and end == self._starts[index]:
+            self._data[index][0:0] = data
+            self._starts[index] = address
+        else:
+            self._starts.insert(index, address)
+            self._data.insert(index, bytearray(data))
+
+    def find(self, address: int) -> Optional[Run]:
+        index = bisect.bisect_right(self._starts, address) - 1
+        if index >= 0 and address < self._end(index):
+            return self._starts[index], bytes(self._data[index])
+        return None
+
+
+@dataclass
+class _State:
+    """Parser state carried across streaming chunks."""
+
+    path: str
+    upper: int = 0  # Intel HEX extended address
+    eof: bool = False
+    line: int = 1  # line number at the start of the current chunk
+
+
+def detect_format(path: Path, head: bytes) -> str:
+    """``hex`` or ``srec`` from the first bytes, then the extension."""
+    head = head.lstrip()
+    suffix = Path(path).suffix.lower()
+    if head[:1] == b":" or (not head and suffix in HEX_SUFFIXES):
+        return "hex"
+    if head[:1] == b"S" or (not head and suffix in SREC_SUFFIXES):
+        return "srec"
+    if suffix in HEX_SUFFIXES:
+        return "hex"
+    if suffix in SREC_SUFFIXES:
+        return "srec"
+    raise HexParseError(f"{path}: neither Intel HEX nor S-record")
+
+
+# -- vectorised decoding -------------------------------------------------------
+
+_WHITESPACE = b" \t\r\n\v\f"
+_SREC_MARKER = re.compile(rb"S[0-9]")
+
+if np is not None:
+    _NIBBLE = np.full(256, 0xFF, np.uint8)
+    for _i, _c in enumerate(b"0123456789abcdef"):
+        _NIBBLE[_c] = _NIBBLE[ord(chr(_c).upper())] = _i
+    _BLANK = np.zeros(256, bool)
+    _BLANK[list(_WHITESPACE)] = True
+
+
+def _fail(state: _State, arr, pos: int, what: str):
+    line = state.line + int(np.count_nonzero(arr[:pos] == 0x0A))
+    raise HexParseError(f"{state.path}:{line}: {what}")
+
+
+def _no_records(arr, state: _State) -> List[Run]:
+    """A chunk without record markers must be blank."""
+    text = ~_BLANK[arr]
+    if text.any():
+        _fail(state, arr, int(np.argmax(text)), "not a record")
+    return []
+
+
+def _locate_bad_digit(arr, starts, marker_len: int, state: _State):
+    """Slow path: find the character that made ``bytes.fromhex`` fail."""
+    other = (_NIBBLE[arr] == 0xFF) & ~_BLANK[arr]
+    for i in range(marker_len):
+        other[starts + i] = False
+    if other.any():
+        _fail(state, arr, int(np.argmax(other)), "unexpected character")
+    _fail(state, arr, len(arr), "invalid hex digits")
+
+
+def _decode(chunk: bytes, arr, starts, marker_len: int, state: _State):
+    """Decode every record's hex digits into one byte stream.
+
+    Markers and whitespace are stripped in C (``translate``/``re``) and
+    the rest goes through ``bytes.fromhex`` in one call; record
+    boundaries in the decoded stream follow from the marker positions and
+    the number of stripped characters before each.  Returns
+    ``(stream, first_byte, length)`` with one entry per record.
+    """
+    if marker_len == 2:
+        compact = _SREC_MARKER.sub(b"", chunk).translate(None, _WHITESPACE)
+    else:
+        compact = chunk.translate(None, b":" + _WHITESPACE)
+    try:
+        stream = np.frombuffer(bytes.fromhex(compact.decode("ascii")), np.uint8)
+    except (ValueError, UnicodeDecodeError):
+        _locate_bad_digit(arr, starts, marker_len, state)
+    # Only whitespace sorts below "0" once fromhex has accepted the rest.
+    stripped = np.searchsorted(np.flatnonzero(arr < 0x30), starts)
+    digits_before = starts - stripped - marker_len * np.arange(len(starts))
+    if digits_before[0]:
+        _fail(state, arr, 0, "data before the first record")
+    odd = np.flatnonzero(digits_before & 1)
+    if len(odd):
+        _fail(state, arr, int(starts[odd[0] - 1]), "odd number of hex digits")
+    first = digits_before >> 1
+    length = np.diff(first, append=len(stream))
+    return stream, first, length
+
+
+def _payload_runs(stream, address, count, first) -> List[Run]:
+    """Cut the data records' payload bytes into address-contiguous runs."""
+    if not len(address):
+        return []
+    marks = np.zeros(len(stream) + 1, np.int8)
+    marks[first] = 1
+    marks[first + count] -= 1
+    payload = stream[np.cumsum(marks[:-1], dtype=np.int8).astype(bool)]
+    offsets = np.cumsum(count) - count
+    breaks = np.flatnonzero(address[1:] != address[:-1] + count[:-1]) + 1
+    bounds = np.concatenate(([0], breaks, [len(address)]))
+    runs = []
+    for lo, hi in zip(bounds[:-1], bounds[1:]):
+        start = int(offsets[lo])
+        end = int(offsets[hi - 1] + count[hi - 1])
+        runs.append((int(address[lo]), payload[start:end].tobytes()))
+    return runs
+
+
+def _ihex_runs(chunk: bytes, arr, state: _State) -> List[Run]:
+    starts = np.flatnonzero(arr == ord(":"))
+    if not len(starts):
+        return _no_records(arr, state)
+    stream, first, length = _decode(chunk, arr, starts, 1, state)
+    short = length < 5
+    if short.any():
+        _fail(state, arr, int(starts[np.argmax(short)]), "record too short")
+    count = stream[first].astype(np.int64)
+    bad = length != count + 5
+    if bad.any():
+        _fail(state, arr, int(starts[np.argmax(bad)]), "bad record length")
+    bad = np.add.reduceat(stream, first, dtype=np.uint8) != 0
+    if bad.any():
+        _fail(state, arr, int(starts[np.argmax(bad)]), "checksum mismatch")
+
+    rtype = stream[first + 3]
+    eof = np.flatnonzero(rtype == IHEX_EOF)
+    if len(eof):
+        keep = int(eof[0])
+        first, count, rtype = first[:keep], count[:keep], rtype[:keep]
+        state.eof = True
+    offset = (stream[first + 1].astype(np.int64) << 8) | stream[first + 2]
+
+    ext = np.flatnonzero((rtype == IHEX_EXT_SEGMENT) | (rtype == IHEX_EXT_LINEAR))
+    if len(ext):
+        if (count[ext] != 2).any():
+            bad_rec = int(ext[np.argmax(count[ext] != 2)])
+            _fail(state, arr, int(starts[bad_rec]), "bad extended address record")
+        value = (stream[first[ext] + 4].astype(np.int64) << 8) | stream[first[ext] + 5]
+        value = np.where(rtype[ext] == IHEX_EXT_LINEAR, value << 16, value << 4)
+        which = np.searchsorted(ext, np.arange(len(rtype)), side="right") - 1
+        upper = np.where(which >= 0, value[np.maximum(which, 0)], state.upper)
+        state.upper = int(value[-1])
+    else:
+        upper = np.full(len(rtype), state.upper, np.int64)
+
+    data = (rtype == IHEX_DATA) & (count > 0)
+    return _payload_runs(stream, upper[data] + offset[data], count[data], first[data] + 4)
+
+
+def _srec_runs(chunk: bytes, arr, state: _State) -> List[Run]:
+    starts = np.flatnonzero(arr == ord("S"))
+    if not len(starts):
+        return _no_records(arr, state)
+    if starts[-1] + 1 >= len(arr):
+        _fail(state, arr, int(starts[-1]), "truncated record")
+    stream, first, length = _decode(chunk, arr, starts, 2, state)
+    kind = arr[starts + 1].astype(np.int64) - ord("0")
+    short = (length < 3) | (kind < 0) | (kind > 9)
+    if short.any():
+        _fail(state, arr, int(starts[np.argmax(short)]), "malformed record")
+    count = stream[first].astype(np.int64)
+    bad = length != count + 1
+    if bad.any():
+        _fail(state, arr, int(starts[np.argmax(bad)]), "bad record length")
+    bad = np.add.reduceat(stream, first, dtype=np.uint8) != 0xFF
+    if bad.any():
+        _fail(state, arr, int(starts[np.argmax(bad)]), "checksum mismatch")
+
+    end = np.flatnonzero(np.isin(kind, SREC_TERMINATION))
+    if len(end):
+        keep = int(end[0])
+        first, count, kind = first[:keep], count[:keep], kind[:keep]
+        state.eof = True
+    width = np.zeros(len(kind), np.int64)
+    for record_type, nbytes in SREC_ADDRESS_BYTES.items():
+        width[kind == record_type] = nbytes
+    data = width > 0
+    first, count, width = first[data], count[data], width[data]
+    address = np.zeros(len(first), np.int64)
+    for i in range(4):
+        use = width > i
+        address[use] = (address[use] << 8) | stream[first[use] + 1 + i]
+    size = count - width - 1
+    keep = size > 0
+    return _payload_runs(stream, address[keep], size[keep], (first + 1 + width)[keep])
+
+
+# -- line-based fallback -------------------------------------------------------
+
+
+def _lines_runs(text: bytes, fmt: str, state: _State) -> List[Run]:
+    runs: List[Run] = []
+    for lineno, raw in enumerate(text.splitlines(), state.line):
+        line = raw.strip()
+        if not line or state.eof:
+            continue
+        marker = 1 if fmt == "hex" else 2
+        if line[:1] != (b":" if fmt == "hex" else b"S") or len(line) <= marker:
+            raise HexParseError(f"{state.path}:{lineno}: not a record")
+        try:
+            record = bytes.fromhex(line[marker:].decode("ascii"))
+        except (ValueError, UnicodeDecodeError):
+            raise HexParseError(f"{state.path}:{lineno}: invalid hex digits")
+        if fmt == "hex":
+            if len(record) < 5 or len(record) != record[0] + 5:
+                raise HexParseError(f"{state.path}:{lineno}: bad record length")
+            if sum(record) & 0xFF:
+                raise HexParseError(f"{state.path}:{lineno}: checksum mismatch")
+            rtype, offset = record[3], (record[1] << 8) | record[2]
+            if rtype == IHEX_DATA and record[0]:
+                runs.append((state.upper + offset, record[4:-1]))
+            elif rtype == IHEX_EOF:
+                state.eof = True
+            elif rtype in (IHEX_EXT_SEGMENT, IHEX_EXT_LINEAR):
+                shift = 16 if rtype == IHEX_EXT_LINEAR else 4
+                state.upper = int.from_bytes(record[4:6], "big") << shift
+        else:
+            if not record or len(record) != record[0] + 1:
+                raise HexParseError(f"{state.path}:{lineno}: bad record length")
+            if (sum(record) & 0xFF) != 0xFF:
+                raise HexParseError(f"{state.path}:{lineno}: checksum mismatch")
+            kind = line[1] - ord("0")
+            width = SREC_ADDRESS_BYTES.get(kind)
+            if kind in SREC_TERMINATION:
+                state.eof = True
+            elif width and len(record) > width + 2:
+                runs.append((int.from_bytes(record[1:1 + width], "big"),
+                             record[1 + width:-1]))
+    return runs
+
+
+def _chunk_runs(chunk, fmt: str, state: _State, vectorized: bool) -> List[Run]:
+    if state.eof:
+        return []
+    if vectorized and np is not None:
+        chunk = bytes(chunk)
+        arr = np.frombuffer(chunk, np.uint8)
+        parse = _ihex_runs if fmt == "hex" else _srec_runs
+        runs = parse(chunk, arr, state)
+    else:
+        runs = _lines_runs(bytes(chunk), fmt, state)
+    return runs
+
+
+def _check_eof(fmt: str, state: _State) -> None:
+    if not state.eof:
+        record = ":00000001FF" if fmt == "hex" else "S7/S8/S9"
+        raise HexParseError(f"{state.path}: no {record} end record (truncated file?)")
+
+
+# -- public API ----------------------------------------------------------------
+
+
+def parse_bytes(data, fmt: str, path: str = "<data>",
+                vectorized: bool = True) -> SegmentMap:
+    """Parse an in-memory HEX (``fmt="hex"``) or S-record (``"srec"``) image."""
+    state = _State(str(path))
+    runs = _chunk_runs(data, fmt, state, vectorized)
+    if len(data):
+        _check_eof(fmt, state)
+    return SegmentMap(runs, str(path))
+
+
+def parse_file(path: Path, vectorized: bool = True) -> SegmentMap:
+    """Parse a whole file in one bulk read and one decoding pass."""
+    path = Path(path)
+    data = path.read_bytes()
+    if not data:
+        return SegmentMap()
+    return parse_bytes(data, detect_format(path, data[:64]), path, vectorized)
+
+
+def iter_runs(path: Path, chunk_size: int = DEFAULT_CHUNK_SIZE,
+              vectorized: bool = True) -> Iterator[Run]:
+    """Stream contiguous ``(address, data)`` runs chunk by chunk.
+
+    Chunks are cut after the last complete line, so peak memory is a small
+    multiple of ``chunk_size`` regardless of file size.  Runs from
+    different chunks may be adjacent; ``SegmentMap`` merges them.
+    """
+    path = Path(path)
+    state = _State(str(path))
+    fmt = None
+    carry = b""
+    with open(path, "rb") as fh:
+        while not state.eof:
+            block = fh.read(chunk_size)
+            if not block:
+                chunk, carry = carry, b""
+            else:
+                buf = carry + block
+                cut = buf.rfind(b"\n") + 1
+                if cut == 0:
+                    carry = buf
+                    continue
+                chunk, carry = buf[:cut], buf[cut:]
+            if fmt is None:
+                fmt = detect_format(path, chunk[:64])
+            if chunk:
+                yield from _chunk_runs(chunk, fmt, state, vectorized)
+                state.line += chunk.count(b"\n")
+            if not block:
+                break
+    if fmt is not None:
+        _check_eof(fmt, state)
+
+
+def load(path: Path, stream: bool = False,
+         chunk_size: int = DEFAULT_CHUNK_SIZE) -> SegmentMap:
+    """Parse ``path`` into a ``SegmentMap``, in one pass or streamed."""
+    if stream:
+        return SegmentMap(iter_runs(path, chunk_size), str(path))
+    return parse_file(path)
@@ -0,0 +1,421 @@
+#!/usr/bin/env python3
+"""Local UDS ECU stand-in behind a DoIP gateway for exercising the UDS tooling.
+
+``SimulatedEcu`` answers the UDS services the host tools use
+(DiagnosticSessionControl, ECUReset, TesterPresent, Read/WriteDataByIdentifier,
+ReadMemoryByAddress, RequestDownload/TransferData/RequestTransferExit) from a
+byte array and a DID table; ``memory_dids`` map DIDs onto the byte array
+the way Dcm maps calibration parameters.  ``serve_isotp`` answers on an
+ISO-TP connection, and ``DoipServerSim`` puts any number of them
+behind one DoIP entity on asyncio: UDP vehicle identification, routing
+activation, diagnostic message ACKs and per-ECU processing with a
+configurable service time, so ``uds_xcp_adapter.py`` can be run and
+benchmarked without a vehicle.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import socket
+import sys
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+from uds_xcp_adapter import (
+    DOIP_PORT,
+    ROUTING_SUCCESS,
+    DoipError,
+    IsoTpConnection,
+    IsoTpTimeoutError,
+    PayloadType,
+    doip_frame,
+    split_doip,
+)
+
+NRC_SERVICE_NOT_SUPPORTED = 0x11
+NRC_SUBFUNCTION_NOT_SUPPORTED = 0x12
+NRC_INCORRECT_LENGTH = 0x13
+NRC_RESPONSE_TOO_LONG = 0x14
+NRC_CONDITIONS_NOT_CORRECT = 0x22
+NRC_REQUEST_SEQUENCE_ERROR = 0x24
+NRC_REQUEST_OUT_OF_RANGE = 0x31
+NRC_WRONG_BLOCK_SEQUENCE = 0x73
+
+DEFAULT_MAX_BLOCK_LENGTH = 0x1002  # maxNumberOfBlockLength granted by 0x34
+DEFAULT_MAX_RESPONSE = 0xFFFF
+
+
+@dataclass
+class SimulatedEcu:
+    """UDS service handler over a flat memory image and a DID table."""
+
+    logical_address: int
+    memory: bytearray
+    base: int = 0
+    dids: Dict[int, bytes] = field(default_factory=dict)
+    memory_dids: Dict[int, Tuple[int, int]] = field(default_factory=dict)  # DID: (address, size)
+    service_time: float = 0.0       # processing time per request
+    max_block_length: int = DEFAULT_MAX_BLOCK_LENGTH
+    max_response: int = DEFAULT_MAX_RESPONSE
+    s3_timeout: float = 0.0         # back to the default session after this idle time (0: never)
+    session: int = 0x01
+    resets: int = 0
+    requests: int = 0
+    session_timeouts: int = 0
+    _last_request: float = field(default=0.0, repr=False)
+    _download: Optional[Tuple[int, int, int]] = field(default=None, repr=False)
+
+    @staticmethod
+    def _nrc(sid: int, code: int) -> bytes:
+        return bytes((0x7F, sid, code))
+
+    def _range(self, request: bytes, at: int) -> Optional[Tuple[int, int, int]]:
+        """Decode addressAndLengthFormatIdentifier + address + size at ``at``."""
+        if len(request) <= at:
+            return None
+        alfid = request[at]
+        size_len, addr_len = alfid >> 4, alfid & 0x0F
+        end = at + 1 + addr_len + size_len
+        if not addr_len or not size_len or len(request) != end:
+            return None
+        address = int.from_bytes(request[at + 1:at + 1 + addr_len], "big")
+        size = int.from_bytes(request[at + 1 + addr_len:end], "big")
+        return address, size, end
+
+    def _in_memory(self, address: int, size: int) -> bool:
+        return self.base <= address and address + size <= self.base + len(self.memory)
+
+    def read_did(self, did: int) -> Optional[bytes]:
+        if did in self.memory_dids:
+            address, size = self.memory_dids[did]
+            offset = address - self.base
+            return bytes(self.memory[offset:offset + size])
+        return self.dids.get(did)
+
+    def _write_did(self, did: int, data: bytes) -> bool:
+        if did in self.memory_dids:
+            address, size = self.memory_dids[did]
+            if len(data) != size:
+                return False
+            offset = address - self.base
+            self.memory[offset:offset + size] = data
+            return True
+        self.dids[did] = data
+        return True
+
+    def handle(self, request: bytes) -> Optional[bytes]:
+        """The response to ``request``, or None when it is suppressed."""
+        self.requests += 1
+        now = time.monotonic()
+        if self.s3_timeout and self.session != 0x01 \
+                and now - self._last_request > self.s3_timeout:
+            self.session, self._download = 0x01, None
+            self.session_timeouts += 1
+        self._last_request = now
+        if not request:
+            return None
+        sid = request[0]
+        if sid == 0x3E:
+            if len(request) != 2 or request[1] & 0x7F:
+                return self._nrc(sid, NRC_INCORRECT_LENGTH)
+            return None if request[1] & 0x80 else b"\x7E\x00"
+        if sid == 0x10:
+            if len(request) != 2:
+                return self._nrc(sid, NRC_INCORRECT_LENGTH)
+            sub = request[1] & 0x7F
+            if sub not in (0x01, 0x02, 0x03):
+                return self._nrc(sid, NRC_SUBFUNCTION_NOT_SUPPORTED)
+            self.session = sub
+            # P2server 50 ms, P2*server 5000 ms (10 ms units)
+            return None if request[1] & 0x80 else bytes((0x50, sub, 0x00, 0x32, 0x01, 0xF4))
+        if sid == 0x11:
+            if len(request) != 2:
+                return self._nrc(sid, NRC_INCORRECT_LENGTH)
+            self.session, self._download = 0x01, None
+            self.resets += 1
+            return None if request[1] & 0x80 else bytes((0x51, request[1] & 0x7F))
+        if sid == 0x22:
+            if len(request) < 3 or len(request) % 2 != 1:
+                return self._nrc(sid, NRC_INCORRECT_LENGTH)
+            out = bytearray(b"\x62")
+            for pos in range(1, len(request), 2):
+                data = self.read_did(int.from_bytes(request[pos:pos + 2], "big"))
+                if data is not None:
+                    out += request[pos:pos + 2] + data
+            if len(out) == 1:
+                # unsupported DIDs are left out; rejected only if none is supported
+                return self._nrc(sid, NRC_REQUEST_OUT_OF_RANGE)
+            if len(out) > self.max_response:
+                return self._nrc(sid, NRC_RESPONSE_TOO_LONG)
+            return bytes(out)
+        if sid == 0x2E:
+            if len(request) < 4:
+                return self._nrc(sid, NRC_INCORRECT_LENGTH)
+            did = int.from_bytes(request[1:3], "big")
+            if did not in self.dids and did not in self.memory_dids:
+                return self._nrc(sid, NRC_REQUEST_OUT_OF_RANGE)
+            if not self._write_did(did, bytes(request[3:])):
+                return self._nrc(sid, NRC_INCORRECT_LENGTH)
+            return b"\x6E" + request[1:3]
+        if sid == 0x23:
+            decoded = self._range(request, 1)
+            if decoded is None:
+                return self._nrc(sid, NRC_INCORRECT_LENGTH)
+            address, size, _ = decoded
+            if not self._in_memory(address, size):
+                return self._nrc(sid, NRC_REQUEST_OUT_OF_RANGE)
+            if size + 1 > self.max_response:
+                return self._nrc(sid, NRC_RESPONSE_TOO_LONG)
+            offset = address - self.base
+            return b"\x63" + self.memory[offset:offset + size]
+        if sid == 0x34:
+            decoded = self._range(request, 2)
+            if decoded is None:
+                return self._nrc(sid, NRC_INCORRECT_LENGTH)
+            address, size, _ = decoded
+            if not self._in_memory(address, size):
+                return self._nrc(sid, NRC_REQUEST_OUT_OF_RANGE)
+            if self.session == 0x01:
+                return self._nrc(sid, NRC_CONDITIONS_NOT_CORRECT)
+            self._download = (address - self.base, size, 1)
+            return b"\x74\x20" + self.max_block_length.to_bytes(2, "big")
+        if sid == 0x36:
+            if self._download is None:
+                return self._nrc(sid, NRC_REQUEST_SEQUENCE_ERROR)
+            if len(request) < 2:
+                return self._nrc(sid, NRC_INCORRECT_LENGTH)
+            offset, remaining, counter = self._download
+            if request[1] != counter & 0xFF:
+                return self._nrc(sid, NRC_WRONG_BLOCK_SEQUENCE)
+            data = request[2:]
+            if len(request) > self.max_block_length or len(data) > remaining:
+                return self._nrc(sid, NRC_REQUEST_OUT_OF_RANGE)
+            self.memory[offset:offset + len(data)] = data
+            self._download = (offset + len(data), remaining - len(data), counter + 1)
+            return bytes((0x76, request[1]))
+        if sid == 0x37:
+            if self._download is None:
+                return self._nrc(sid, NRC_REQUEST_SEQUENCE_ERROR)
+            self._download = None
+            return b"\x77"
+        return self._nrc(sid, NRC_SERVICE_NOT_SUPPORTED)
+
+
+def serve_isotp(connection: IsoTpConnection, ecu: SimulatedEcu,
+                stop: threading.Event) -> None:
+    """Answer ``ecu``'s requests on ``connection`` until ``stop`` is set."""
+    while not stop.is_set():
+        try:
+            request = connection.recv(timeout=0.1)
+        except IsoTpTimeoutError:
+            continue
+        if ecu.service_time:
+            time.sleep(ecu.service_time)
+        response = ecu.handle(request)
+        if response is not None:
+            connection.send(response)
+
+
+class _EcuQueue:
+    """Serialises one ECU's requests and models its service time."""
+
+    def __init__(self, ecu: SimulatedEcu) -> None:
+        self.ecu = ecu
+        self.free = 0.0
+
+
+class _DoipServerProtocol(asyncio.Protocol):
+    def __init__(self, server: "DoipServerSim") -> None:
+        self.server = server
+        self.buf = bytearray()
+        self.tester: Optional[int] = None
+        self.transport: Optional[asyncio.Transport] = None
+        self._out: List[bytes] = []
+
+    def connection_made(self, transport) -> None:
+        self.transport = transport
+        transport.get_extra_info("socket").setsockopt(
+            socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def _send(self, payload_type: int, payload: bytes) -> None:
+        if not self._out:
+            self.server.loop.call_soon(self._flush)
+        self._out.append(doip_frame(payload_type, payload))
+
+    def _flush(self) -> None:
+        if self._out and self.transport is not None and not self.transport.is_closing():
+            self.transport.write(b"".join(self._out))
+        self._out = []
+
+    def data_received(self, data: bytes) -> None:
+        self.buf += data
+        try:
+            messages, used = split_doip(self.buf)
+        except DoipError:
+            self._send(PayloadType.GENERIC_NACK, b"\x00")  # incorrect pattern format
+            self._flush()
+            self.transport.close()
+            return
+        del self.buf[:used]
+        for payload_type, payload in messages:
+            self._handle(payload_type, payload)
+
+    def _handle(self, payload_type: int, payload: bytes) -> None:
+        server = self.server
+        if payload_type == PayloadType.ROUTING_ACTIVATION_REQUEST:
+            self.tester = int.from_bytes(payload[:2], "big")
+            self._send(PayloadType.ROUTING_ACTIVATION_RESPONSE,
+                       payload[:2] + server.entity_address.to_bytes(2, "big")
+                       + bytes((ROUTING_SUCCESS, 0, 0, 0, 0)))
+        elif payload_type == PayloadType.DIAGNOSTIC_MESSAGE:
+            source, target = payload[:2], int.from_bytes(payload[2:4], "big")
+            queue = server.ecus.get(target)
+            header = payload[2:4] + source
+            if self.tester is None or int.from_bytes(source, "big") != self.tester:
+                self._send(PayloadType.DIAGNOSTIC_NACK, header + b"\x02")  # invalid SA
+            elif queue is None:
+                self._send(PayloadType.DIAGNOSTIC_NACK, header + b"\x03")  # unknown TA
+            else:
+                self._send(PayloadType.DIAGNOSTIC_ACK, header + b"\x00")
+                response = queue.ecu.handle(payload[4:])
+                if response is not None:
+                    self._respond(queue, header + response)
+        elif payload_type == PayloadType.ALIVE_CHECK_RESPONSE:
+            pass
+        elif payload_type == PayloadType.ENTITY_STATUS_REQUEST:
+            self._send(PayloadType.ENTITY_STATUS_RESPONSE, b"\x00\xFF\x01")
+        else:
+            self._send(PayloadType.GENERIC_NACK, b"\x01")  # unknown payload type
+
+    def _respond(self, queue: _EcuQueue, payload: bytes) -> None:
+        service_time = queue.ecu.service_time
+        if not service_time:
+            self._send(PayloadType.DIAGNOSTIC_MESSAGE, payload)
+            return
+        now = time.perf_counter()
+        queue.free = max(now, queue.free) + service_time
+        self.server.loop.call_later(queue.free - now, self._send,
+                                    PayloadType.DIAGNOSTIC_MESSAGE, payload)
+
+    def connection_lost(self, exc: Optional[Exception]) -> None:
+        self.transport = None
+
+
+class _DoipUdpProtocol(asyncio.DatagramProtocol):
+    def __init__(self, server: "DoipServerSim") -> None:
+        self.server = server
+
+    def connection_made(self, transport) -> None:
+        self.transport = transport
+
+    def datagram_received(self, data: bytes, addr) -> None:
+        try:
+            messages, _ = split_doip(bytearray(data))
+        except DoipError:
+            return
+        for payload_type, payload in messages:
+            if payload_type == PayloadType.VEHICLE_ID_REQUEST or (
+                    payload_type == PayloadType.VEHICLE_ID_REQUEST_VIN
+                    and payload.decode("ascii", "replace") == self.server.vin):
+                self.transport.sendto(self.server.announcement(), addr)
+
+
+class DoipServerSim:
+    """DoIP entity stand-in on its own event loop; ``start()`` serves from a thread."""
+
+    def __init__(self, ecus: List[SimulatedEcu], host: str = "127.0.0.1", port: int = 0,
+                 vin: str = "WVCUSIM0000000001", entity_address: Optional[int] = None,
+                 udp: bool = True) -> None:
+        if not ecus:
+            raise ValueError("at least one ECU is needed")
+        self.ecus = {ecu.logical_address: _EcuQueue(ecu) for ecu in ecus}
+        self.vin = vin
+        self.entity_address = ecus[0].logical_address if entity_address is None \
+            else entity_address
+        self.loop = asyncio.new_event_loop()
+        self._thread: Optional[threading.Thread] = None
+        self._server = self.loop.run_until_complete(
+            self.loop.create_server(lambda: _DoipServerProtocol(self), host, port,
+                                    reuse_address=True))
+        self._udp = None
+        if udp:
+            self._udp, _ = self.loop.run_until_complete(self.loop.create_datagram_endpoint(
+                lambda: _DoipUdpProtocol(self), local_addr=(host, self.port)))
+
+    def announcement(self) -> bytes:
+        payload = (self.vin.encode("ascii")[:17].ljust(17, b"\x00")
+                   + self.entity_address.to_bytes(2, "big")
+                   + b"\x02\x00\x00\x00\x00\x01" + b"\x00" * 6 + b"\x00")
+        return doip_frame(PayloadType.VEHICLE_ANNOUNCEMENT, payload)
+
+    def __enter__(self) -> "DoipServerSim":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.server_close()
+
+    @property
+    def port(self) -> int:
+        return self._server.sockets[0].getsockname()[1]
+
+    def serve_forever(self) -> None:
+        self.loop.run_forever()
+
+    def start(self) -> threading.Thread:
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self._thread
+
+    def shutdown(self) -> None:
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def server_close(self) -> None:
+        if self.loop.is_closed():
+            return
+        if self.loop.is_running():
+            self.shutdown()
+        self._server.close()
+        if self._udp is not None:
+            self._udp.close()
+        self.loop.run_until_complete(asyncio.sleep(0))
+        self.loop.close()
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DOIP_PORT)
+    parser.add_argument("--ecus", type=int, default=1, help="ECUs behind the gateway")
+    parser.add_argument("--address", type=lambda v: int(v, 0), default=0x1001,
+                        help="logical address of the first ECU; the others follow")
+    parser.add_argument("--base", type=lambda v: int(v, 0), default=0x00400000)
+    parser.add_argument("--size", type=lambda v: int(v, 0), default=0x40000)
+    parser.add_argument("--service-ms", type=float, default=0.0,
+                        help="processing time per UDS request")
+    parser.add_argument("--s3", type=float, default=0.0,
+                        help="S3server timeout in seconds (0: sessions never time out)")
+    parser.add_argument("--vin", default="WVCUSIM0000000001")
+    args = parser.parse_args(argv)
+
+    ecus = [SimulatedEcu(args.address + i, bytearray(bytes(j & 0xFF for j in range(args.size))),
+                         args.base, {0xF190: args.vin.encode("ascii")},
+                         service_time=args.service_ms / 1000.0, s3_timeout=args.s3)
+            for i in range(args.ecus)]
+    with DoipServerSim(ecus, args.host, args.port, args.vin) as server:
+        print(f"DoIP entity 0x{server.entity_address:04X} listening on "
+              f"{args.host}:{server.port} ({len(ecus)} ECU(s))", file=sys.stderr)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,1136 @@
+#!/usr/bin/env python3
+"""CAN / ISO-TP and DoIP transports for the S32K3xx VCU UDS tooling.
+
+Implements ISO 15765-2 (ISO-TP) on the host side the way the ECU's CanTp
+(``src/bsw/com/can_tp.c``) speaks it: single, first, consecutive and flow
+control frames, classic CAN (8-byte) and CAN-FD (up to 64-byte) frames,
+the CAN-FD single-frame escape and 32-bit first-frame lengths for messages
+beyond 4095 bytes.
+
+``IsoTpConnection`` honours the block size and STmin the receiver grants in
+each flow control frame.  All consecutive frames of a message are built
+once up front and a whole block goes to the bus in one ``send_many`` call
+when STmin is zero; a non-zero STmin is kept with a sleep-then-spin timer
+instead of per-frame sleeps rounded up by the OS.  Received frames are
+drained from the channel in batches and copied into one preallocated
+message buffer.
+
+Channels: ``VirtualCanBus`` is an in-process bus stand-in for benches and
+tests; ``SocketCanChannel`` talks to a Linux SocketCAN interface (``can0``,
+``vcan0``) through the standard library.
+
+DoIP (ISO 13400-2, ``src/bsw/diag/doip.c`` on the ECU) carries the same
+UDS traffic over Ethernet: ``discover_vehicles`` sends the UDP vehicle
+identification request, ``DoipConnection`` opens one TCP connection per
+DoIP entity and activates routing, and ``DoipSession`` runs UDS requests
+to one logical address behind it.  Any number of sessions share one
+connection on one asyncio loop; everything they send within one loop
+iteration leaves in a single TCP write.
+
+``UdsClient`` is the service layer over either transport (``DoipSession``
+or ``IsoTpUdsTransport``).  ``read_dids`` packs as many DIDs into each
+ReadDataByIdentifier as the request/response limits allow and serves DIDs
+declared static (VIN, software version, calibration ID) from a per-session
+cache that ECUReset, RequestDownload/TransferExit and the programming
+session clear.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import socket
+import struct
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from enum import IntEnum
+from typing import Deque, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+CanFrame = Tuple[int, bytes]
+
+PCI_SF, PCI_FF, PCI_CF, PCI_FC = 0x0, 0x1, 0x2, 0x3
+FC_CTS, FC_WAIT, FC_OVFLW = 0x0, 0x1, 0x2
+
+CAN_DL = (0, 1, 2, 3, 4, 5, 6, 7, 8, 12, 16, 20, 24, 32, 48, 64)
+CLASSIC_DL = 8
+FD_DL = 64
+FF_DL_12BIT_MAX = 0xFFF
+DEFAULT_PADDING = 0xCC
+DEFAULT_TIMEOUT = 1.0         # N_Bs / N_Cr
+DEFAULT_MAX_WAIT_FRAMES = 10  # N_WFTmax
+SPIN_THRESHOLD = 0.002        # STmin waits shorter than this spin instead of sleeping
+
+
+class IsoTpError(Exception):
+    """Raised for protocol violations and aborted transfers."""
+
+
+class IsoTpTimeoutError(IsoTpError):
+    """Raised when N_Bs, N_Cr or the caller's receive timeout expires."""
+
+
+def decode_stmin(value: int) -> float:
+    """STmin byte to seconds; reserved values mean the 127 ms maximum."""
+    if value <= 0x7F:
+        return value / 1000.0
+    if 0xF1 <= value <= 0xF9:
+        return (value - 0xF0) / 10000.0
+    return 0.127
+
+
+def encode_stmin(seconds: float) -> int:
+    """Seconds to the smallest STmin byte that is at least as long."""
+    if seconds <= 0:
+        return 0
+    if seconds <= 0.0009:
+        return 0xF0 + max(1, -(-round(seconds * 1e6) // 100))
+    return min(0x7F, -(-round(seconds * 1e6) // 1000))
+
+
+def can_dl(length: int) -> int:
+    """Smallest valid CAN(-FD) data length holding ``length`` bytes."""
+    for dl in CAN_DL:
+        if dl >= length:
+            return dl
+    raise IsoTpError(f"{length} bytes do not fit a CAN-FD frame")
+
+
+def wait_until(deadline: float) -> None:
+    """Sleep, then yield-spin, until ``perf_counter()`` reaches ``deadline``."""
+    while True:
+        remaining = deadline - time.perf_counter()
+        if remaining <= 0:
+            return
+        time.sleep(remaining - SPIN_THRESHOLD / 2 if remaining > SPIN_THRESHOLD else 0)
+
+
+# -- CAN channels --------------------------------------------------------------
+
+
+class CanChannel:
+    """A CAN endpoint: ``send_many`` frames, ``recv_many`` what has arrived."""
+
+    fd = False
+
+    def send(self, can_id: int, data: bytes) -> None:
+        self.send_many(((can_id, data),))
+
+    def send_many(self, frames: Sequence[CanFrame]) -> None:
+        raise NotImplementedError
+
+    def recv_many(self, timeout: Optional[float]) -> List[CanFrame]:
+        """Every frame received so far, waiting up to ``timeout`` for the first."""
+        raise NotImplementedError
+
+    def close(self) -> None:
+        pass
+
+
+class VirtualCanBus:
+    """In-process CAN bus stand-in: every frame reaches every other channel.
+
+    With ``bitrate`` set, senders block for the time their frames occupy
+    the bus (``data_bitrate`` for the CAN-FD data phase; bit stuffing is
+    not modelled).
+    """
+
+    def __init__(self, fd: bool = True, bitrate: Optional[float] = None,
+                 data_bitrate: Optional[float] = None) -> None:
+        self.fd = fd
+        self.bitrate = bitrate
+        self.data_bitrate = data_bitrate or bitrate
+        self.channels: List["VirtualCanChannel"] = []
+        self.frames = 0
+        self._busy_until = 0.0
+        self._lock = threading.Lock()
+
+    def frame_time(self, length: int) -> float:
+        """Seconds a frame with ``length`` data bytes occupies the bus."""
+        if not self.bitrate:
+            return 0.0
+        if length <= CLASSIC_DL and not self.fd:
+            return (47 + 8 * length) / self.bitrate
+        # arbitration, control and ACK at the nominal rate; data and CRC fast
+        return 30 / self.bitrate + (8 * length + 37) / self.data_bitrate
+
+    def occupy(self, frames: Sequence[CanFrame]) -> None:
+        """Block until ``frames`` have been on the bus, after any frames before them."""
+        if not self.bitrate:
+            return
+        duration = sum(self.frame_time(len(data)) for _, data in frames)
+        with self._lock:
+            self._busy_until = max(time.perf_counter(), self._busy_until) + duration
+            done = self._busy_until
+        wait_until(done)
+
+    def channel(self, rx_ids: Optional[Iterable[int]] = None) -> "VirtualCanChannel":
+        """A new endpoint receiving ``rx_ids`` (every ID if None)."""
+        channel = VirtualCanChannel(self, rx_ids)
+        self.channels.append(channel)
+        return channel
+
+
+class VirtualCanChannel(CanChannel):
+    def __init__(self, bus: VirtualCanBus, rx_ids: Optional[Iterable[int]]) -> None:
+        self.bus = bus
+        self.fd = bus.fd
+        self.rx_ids = None if rx_ids is None else frozenset(rx_ids)
+        self._queue: Deque[CanFrame] = deque()
+        self._cond = threading.Condition()
+
+    def send_many(self, frames: Sequence[CanFrame]) -> None:
+        limit = FD_DL if self.fd else CLASSIC_DL
+        for _, data in frames:
+            if len(data) > limit or len(data) not in CAN_DL:
+                raise IsoTpError(f"invalid CAN frame length {len(data)}")
+        self.bus.occupy(frames)
+        self.bus.frames += len(frames)
+        for peer in self.bus.channels:
+            if peer is not self:
+                peer._deliver(frames)
+
+    def _deliver(self, frames: Sequence[CanFrame]) -> None:
+        if self.rx_ids is not None:
+            frames = [f for f in frames if f[0] in self.rx_ids]
+            if not frames:
+                return
+        with self._cond:
+            self._queue.extend(frames)
+            self._cond.notify()
+
+    def recv_many(self, timeout: Optional[float]) -> List[CanFrame]:
+        with self._cond:
+            if not self._queue:
+                self._cond.wait(timeout)
+            frames = list(self._queue)
+            self._queue.clear()
+        return frames
+
+    def close(self) -> None:
+        if self in self.bus.channels:
+            self.bus.channels.remove(self)
+
+
+class SocketCanChannel(CanChannel):
+    """Linux SocketCAN (``CAN_RAW``) endpoint, optionally CAN-FD."""
+
+    _CLASSIC = struct.Struct("=IB3x8s")
+    _FD = struct.Struct("=IBB2x64s")
+    RECV_BATCH = 256
+
+    def __init__(self, interface: str, fd: bool = False,
+                 rx_ids: Optional[Iterable[int]] = None) -> None:
+        self.fd = fd
+        self._sock = socket.socket(socket.AF_CAN, socket.SOCK_RAW, socket.CAN_RAW)
+        if fd:
+            self._sock.setsockopt(socket.SOL_CAN_RAW, socket.CAN_RAW_FD_FRAMES, 1)
+        if rx_ids is not None:
+            filters = b"".join(
+                struct.pack("=II", *self._filter(can_id)) for can_id in rx_ids)
+            self._sock.setsockopt(socket.SOL_CAN_RAW, socket.CAN_RAW_FILTER, filters)
+        self._sock.bind((interface,))
+
+    @staticmethod
+    def _filter(can_id: int) -> Tuple[int, int]:
+        if can_id > 0x7FF:
+            return can_id | socket.CAN_EFF_FLAG, socket.CAN_EFF_MASK | socket.CAN_EFF_FLAG
+        return can_id, socket.CAN_SFF_MASK | socket.CAN_EFF_FLAG
+
+    def send_many(self, frames: Sequence[CanFrame]) -> None:
+        for can_id, data in frames:
+            if can_id > 0x7FF:
+                can_id |= socket.CAN_EFF_FLAG
+            if self.fd and len(data) > CLASSIC_DL:
+                self._sock.send(self._FD.pack(can_id, len(data), 0, data))
+            else:
+                self._sock.send(self._CLASSIC.pack(can_id, len(data), data))
+
+    def _decode(self, raw: bytes) -> CanFrame:
+        can_id, length = struct.unpack_from("=IB", raw)
+        if can_id & socket.CAN_EFF_FLAG:
+            can_id &= socket.CAN_EFF_MASK
+        else:
+            can_id &= socket.CAN_SFF_MASK
+        return can_id, raw[8:8 + length]
+
+    def recv_many(self, timeout: Optional[float]) -> List[CanFrame]:
+        self._sock.settimeout(timeout)
+        try:
+            frames = [self._decode(self._sock.recv(self._FD.size))]
+        except socket.timeout:
+            return []
+        self._sock.setblocking(False)
+        try:
+            while len(frames) < self.RECV_BATCH:
+                frames.append(self._decode(self._sock.recv(self._FD.size)))
+        except BlockingIOError:
+            pass
+        return frames
+
+    def close(self) -> None:
+        self._sock.close()
+
+
+# -- ISO-TP --------------------------------------------------------------------
+
+
+@dataclass
+class IsoTpConfig:
+    tx_id: int
+    rx_id: int
+    tx_dl: int = CLASSIC_DL       # 8 for classic CAN, up to 64 for CAN-FD
+    block_size: int = 0           # BS granted to the sender when we receive (0 = all)
+    st_min: float = 0.0           # STmin granted to the sender when we receive
+    padding: Optional[int] = DEFAULT_PADDING  # None: send classic frames unpadded
+    timeout: float = DEFAULT_TIMEOUT
+    max_wait_frames: int = DEFAULT_MAX_WAIT_FRAMES
+
+    def __post_init__(self) -> None:
+        if self.tx_dl not in CAN_DL or self.tx_dl < CLASSIC_DL:
+            raise ValueError(f"invalid TX_DL {self.tx_dl}")
+        if not 0 <= self.block_size <= 0xFF:
+            raise ValueError("block size must be 0..255")
+
+
+@dataclass(frozen=True)
+class IsoTpMessage:
+    """A message already cut into frames by ``IsoTpConnection.segment``."""
+
+    payload: bytes
+    first: bytes
+    consecutive: List[bytes]
+
+
+@dataclass
+class IsoTpStats:
+    messages_sent: int = 0
+    messages_received: int = 0
+    frames_sent: int = 0
+    frames_received: int = 0
+    flow_controls: int = 0        # FC frames received while sending
+    fc_waits: int = 0
+
+
+class IsoTpConnection:
+    """One ISO-TP channel (normal addressing) over a ``CanChannel``.
+
+    ``send``/``recv`` are half-duplex and not thread-safe; use one
+    connection per tester/ECU pair.
+    """
+
+    def __init__(self, channel: CanChannel, config: IsoTpConfig) -> None:
+        if config.tx_dl > CLASSIC_DL and not channel.fd:
+            raise ValueError("CAN-FD TX_DL on a classic CAN channel")
+        self.channel = channel
+        self.config = config
+        self.stats = IsoTpStats()
+        self._rx: Deque[CanFrame] = deque()
+        pad = DEFAULT_PADDING if config.padding is None else config.padding
+        self._pad_byte = bytes((pad,))
+
+    # -- framing -------------------------------------------------------------
+
+    def _pad(self, frame: bytes) -> bytes:
+        size = len(frame)
+        if size <= CLASSIC_DL:
+            target = CLASSIC_DL if self.config.padding is not None else size
+        else:
+            target = can_dl(size)
+        return frame + self._pad_byte * (target - size) if target > size else frame
+
+    def _frames(self, payload: bytes) -> Tuple[bytes, List[bytes]]:
+        """The single or first frame, and every consecutive frame after it."""
+        dl = self.config.tx_dl
+        length = len(payload)
+        if length <= 7:
+            return self._pad(bytes((length,)) + payload), []
+        if length <= dl - 2:
+            return self._pad(bytes((0, length)) + payload), []
+        if length <= FF_DL_12BIT_MAX:
+            header = bytes((0x10 | length >> 8, length & 0xFF))
+        else:
+            header = b"\x10\x00" + length.to_bytes(4, "big")
+        first = dl - len(header)
+        step = dl - 1
+        view = memoryview(payload)
+        consecutive = [bytes((0x20 | (sn & 0x0F),)) + view[offset:offset + step]
+                       for sn, offset in enumerate(range(first, length, step), 1)]
+        if consecutive:
+            consecutive[-1] = self._pad(consecutive[-1])
+        return header + view[:first], consecutive
+
+    def _flow_control(self, status: int) -> None:
+        cfg = self.config
+        frame = bytes((0x30 | status, cfg.block_size, encode_stmin(cfg.st_min)))
+        self.channel.send(cfg.tx_id, self._pad(frame))
+        self.stats.frames_sent += 1
+
+    # -- receive helpers -----------------------------------------------------
+
+    def _next_frame(self, deadline: float) -> bytes:
+        rx_id = self.config.rx_id
+        while True:
+            while self._rx:
+                can_id, data = self._rx.popleft()
+                if can_id == rx_id and data:
+                    self.stats.frames_received += 1
+                    return data
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise IsoTpTimeoutError("timed out waiting for a CAN frame")
+            self._rx.extend(self.channel.recv_many(remaining))
+
+    def _wait_flow_control(self) -> Tuple[int, float]:
+        """Block size and STmin from the next CTS flow control frame."""
+        waits = 0
+        while True:
+            data = self._next_frame(time.monotonic() + self.config.timeout)
+            if data[0] >> 4 != PCI_FC:
+                continue  # stray frame of another transfer: ignore, as the ECU does
+            self.stats.flow_controls += 1
+            status = data[0] & 0x0F
+            if status == FC_CTS:
+                return data[1], decode_stmin(data[2])
+            if status == FC_WAIT:
+                waits += 1
+                self.stats.fc_waits += 1
+                if waits > self.config.max_wait_frames:
+                    raise IsoTpError("receiver sent more than N_WFTmax wait frames")
+                continue
+            if status == FC_OVFLW:
+                raise IsoTpError("receiver reported buffer overflow")
+            raise IsoTpError(f"invalid flow status 0x{status:X}")
+
+    # -- API -------------------------------------------------------------------
+
+    def segment(self, payload: bytes) -> IsoTpMessage:
+        """Frame ``payload`` ahead of time, e.g. while the previous exchange runs."""
+        payload = bytes(payload)
+        return IsoTpMessage(payload, *self._frames(payload))
+
+    def send(self, payload) -> None:
+        """Send one message (bytes or an ``IsoTpMessage``), segmented as the
+        receiver's flow control allows."""
+        message = payload if isinstance(payload, IsoTpMessage) else self.segment(payload)
+        first, consecutive = message.first, message.consecutive
+        tx_id = self.config.tx_id
+        self.channel.send(tx_id, first)
+        self.stats.frames_sent += 1
+        index = 0
+        while index < len(consecutive):
+            block_size, st_min = self._wait_flow_control()
+            block = consecutive[index:index + block_size] if block_size \
+                else consecutive[index:]
+            if st_min == 0:
+                self.channel.send_many([(tx_id, frame) for frame in block])
+            else:
+                due = time.perf_counter()
+                for frame in block:
+                    wait_until(due)
+                    self.channel.send(tx_id, frame)
+                    due = time.perf_counter() + st_min
+            self.stats.frames_sent += len(block)
+            index += len(block)
+        self.stats.messages_sent += 1
+
+    def recv(self, timeout: Optional[float] = None) -> bytes:
+        """Receive one message; ``timeout`` bounds the wait for its first frame."""
+        cfg = self.config
+        deadline = time.monotonic() + (cfg.timeout if timeout is None else timeout)
+        while True:
+            data = self._next_frame(deadline)
+            pci = data[0] >> 4
+            if pci == PCI_SF:
+                length = data[0] & 0x0F
+                start = 1
+                if length == 0 and len(data) > CLASSIC_DL:
+                    length, start = data[1], 2
+                if not length or start + length > len(data):
+                    raise IsoTpError("invalid single frame length")
+                self.stats.messages_received += 1
+                return bytes(data[start:start + length])
+            if pci == PCI_FF:
+                # A first frame always fills the sender's TX_DL.
+                if len(data) < CLASSIC_DL:
+                    raise IsoTpError(f"first frame of {len(data)} bytes")
+                length = (data[0] & 0x0F) << 8 | data[1]
+                start = 2
+                if length == 0:
+                    length, start = int.from_bytes(data[2:6], "big"), 6
+                single = CLASSIC_DL - 1 if len(data) == CLASSIC_DL else len(data) - 2
+                if length > single and (start == 2 or length > 0xFFF):
+                    break
+                # FF_DL that fits a single frame (or a needless escape): ignored
+                # like CF/FC below, as ISO 15765-2 requires.
+                continue
+            # CF/FC outside a transfer: ignore, as ISO 15765-2 requires
+
+        message = bytearray(length)
+        view = memoryview(message)
+        received = len(data) - start
+        view[:received] = data[start:]
+        sn = 1
+        block = 0
+        self._flow_control(FC_CTS)
+        while received < length:
+            data = self._next_frame(time.monotonic() + cfg.timeout)
+            pci = data[0] >> 4
+            if pci != PCI_CF:
+                if pci in (PCI_SF, PCI_FF):
+                    raise IsoTpError("new message started before the last one finished")
+                continue
+            if data[0] & 0x0F != sn & 0x0F:
+                raise IsoTpError(f"wrong sequence number {data[0] & 0x0F}, "
+                                 f"expected {sn & 0x0F}")
+            count = min(len(data) - 1, length - received)
+            view[received:received + count] = data[1:1 + count]
+            received += count
+            sn += 1
+            block += 1
+            if cfg.block_size and block == cfg.block_size and received < length:
+                block = 0
+                self._flow_control(FC_CTS)
+        self.stats.messages_received += 1
+        return bytes(message)
+
+    def request(self, payload, timeout: Optional[float] = None) -> bytes:
+        self.send(payload)
+        return self.recv(timeout)
+
+    def close(self) -> None:
+        self.channel.close()
+
+
+# -- DoIP (ISO 13400-2) --------------------------------------------------------
+
+DOIP_PORT = 13400
+DOIP_VERSION = 0x02
+DOIP_HEADER = struct.Struct(">BBHI")
+DOIP_MAX_PAYLOAD = 16 * 1024 * 1024
+DEFAULT_TESTER_ADDRESS = 0x0E00
+ROUTING_SUCCESS = 0x10
+NRC_RESPONSE_PENDING = 0x78
+DEFAULT_PENDING_TIMEOUT = 5.0  # P2*server
+
+
+class PayloadType(IntEnum):
+    GENERIC_NACK = 0x0000
+    VEHICLE_ID_REQUEST = 0x0001
+    VEHICLE_ID_REQUEST_EID = 0x0002
+    VEHICLE_ID_REQUEST_VIN = 0x0003
+    VEHICLE_ANNOUNCEMENT = 0x0004
+    ROUTING_ACTIVATION_REQUEST = 0x0005
+    ROUTING_ACTIVATION_RESPONSE = 0x0006
+    ALIVE_CHECK_REQUEST = 0x0007
+    ALIVE_CHECK_RESPONSE = 0x0008
+    ENTITY_STATUS_REQUEST = 0x4001
+    ENTITY_STATUS_RESPONSE = 0x4002
+    DIAGNOSTIC_MESSAGE = 0x8001
+    DIAGNOSTIC_ACK = 0x8002
+    DIAGNOSTIC_NACK = 0x8003
+
+
+class DoipError(Exception):
+    """Raised for NACKs, refused routing activation and broken connections."""
+
+    def __init__(self, message: str, code: Optional[int] = None) -> None:
+        super().__init__(message)
+        self.code = code
+
+
+class DoipTimeoutError(DoipError):
+    """Raised when an ACK or a response does not arrive in time."""
+
+
+def doip_frame(payload_type: int, payload: bytes = b"") -> bytes:
+    return DOIP_HEADER.pack(DOIP_VERSION, DOIP_VERSION ^ 0xFF, payload_type,
+                            len(payload)) + payload
+
+
+def split_doip(buf: bytearray) -> Tuple[List[Tuple[int, bytes]], int]:
+    """Complete ``(payload type, payload)`` messages in ``buf`` and bytes used."""
+    messages = []
+    offset = 0
+    while len(buf) - offset >= DOIP_HEADER.size:
+        version, inverse, payload_type, length = DOIP_HEADER.unpack_from(buf, offset)
+        if version ^ inverse != 0xFF:
+            raise DoipError("invalid DoIP protocol version header")
+        if length > DOIP_MAX_PAYLOAD:
+            raise DoipError(f"DoIP payload of {length} bytes exceeds limit")
+        end = offset + DOIP_HEADER.size + length
+        if len(buf) < end:
+            break
+        messages.append((payload_type, bytes(buf[offset + DOIP_HEADER.size:end])))
+        offset = end
+    return messages, offset
+
+
+@dataclass
+class VehicleAnnouncement:
+    vin: str
+    logical_address: int
+    eid: bytes
+    gid: bytes
+    further_action: int
+    host: str
+
+    @classmethod
+    def from_payload(cls, payload: bytes, host: str) -> "VehicleAnnouncement":
+        if len(payload) < 32:
+            raise DoipError("short vehicle announcement")
+        return cls(payload[:17].decode("ascii", "replace"),
+                   int.from_bytes(payload[17:19], "big"), payload[19:25],
+                   payload[25:31], payload[31], host)
+
+
+class _DiscoveryProtocol(asyncio.DatagramProtocol):
+    def __init__(self) -> None:
+        self.vehicles: Dict[Tuple[str, int], VehicleAnnouncement] = {}
+
+    def datagram_received(self, data: bytes, addr) -> None:
+        try:
+            messages, _ = split_doip(bytearray(data))
+            for payload_type, payload in messages:
+                if payload_type == PayloadType.VEHICLE_ANNOUNCEMENT:
+                    vehicle = VehicleAnnouncement.from_payload(payload, addr[0])
+                    self.vehicles[(vehicle.host, vehicle.logical_address)] = vehicle
+        except DoipError:
+            pass  # not DoIP, or a malformed answer: keep listening
+
+
+async def discover_vehicles(address: str = "255.255.255.255", port: int = DOIP_PORT,
+                            timeout: float = 0.5,
+                            vin: Optional[str] = None) -> List[VehicleAnnouncement]:
+    """Send a vehicle identification request and collect the answers."""
+    loop = asyncio.get_running_loop()
+    transport, protocol = await loop.create_datagram_endpoint(
+        _DiscoveryProtocol, local_addr=("0.0.0.0", 0), allow_broadcast=True)
+    try:
+        if vin is None:
+            request = doip_frame(PayloadType.VEHICLE_ID_REQUEST)
+        else:
+            request = doip_frame(PayloadType.VEHICLE_ID_REQUEST_VIN, vin.encode("ascii"))
+        transport.sendto(request, (address, port))
+        await asyncio.sleep(timeout)
+    finally:
+        transport.close()
+    return list(protocol.vehicles.values())
+
+
+@dataclass
+class DoipStats:
+    messages_sent: int = 0
+    messages_received: int = 0
+    writes: int = 0               # TCP writes; below messages_sent when batched
+
+
+class _DoipProtocol(asyncio.Protocol):
+    def __init__(self) -> None:
+        self.connection: Optional["DoipConnection"] = None
+        self.transport: Optional[asyncio.Transport] = None
+        self.buf = bytearray()
+        self.writable = asyncio.Event()
+        self.writable.set()
+
+    def connection_made(self, transport) -> None:
+        self.transport = transport
+        sock = transport.get_extra_info("socket")
+        if sock is not None:
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def data_received(self, data: bytes) -> None:
+        self.buf += data
+        try:
+            messages, used = split_doip(self.buf)
+        except DoipError as exc:
+            self.connection._fail(exc)
+            self.transport.close()
+            return
+        del self.buf[:used]
+        for payload_type, payload in messages:
+            self.connection._dispatch(payload_type, payload)
+
+    def pause_writing(self) -> None:
+        self.writable.clear()
+
+    def resume_writing(self) -> None:
+        self.writable.set()
+
+    def connection_lost(self, exc: Optional[Exception]) -> None:
+        self.writable.set()
+        if self.connection is not None:
+            self.connection._fail(DoipError(f"connection lost: {exc or 'closed by peer'}"))
+
+
+class DoipConnection:
+    """TCP connection to one DoIP entity, shared by many ``DoipSession``s."""
+
+    def __init__(self, transport: asyncio.Transport, protocol: _DoipProtocol,
+                 tester_address: int = DEFAULT_TESTER_ADDRESS, timeout: float = 2.0) -> None:
+        self.transport = transport
+        self.protocol = protocol
+        protocol.connection = self
+        self.tester_address = tester_address
+        self.timeout = timeout
+        self.entity_address: Optional[int] = None
+        self.stats = DoipStats()
+        self.sessions: Dict[int, DoipSession] = {}
+        self._out: List[bytes] = []
+        self._activation: Optional[asyncio.Future] = None
+        self._error: Optional[DoipError] = None
+
+    @classmethod
+    async def open(cls, host: str, port: int = DOIP_PORT,
+                   tester_address: int = DEFAULT_TESTER_ADDRESS, activation_type: int = 0,
+                   timeout: float = 2.0) -> "DoipConnection":
+        loop = asyncio.get_running_loop()
+        transport, protocol = await asyncio.wait_for(
+            loop.create_connection(_DoipProtocol, host, port), timeout)
+        connection = cls(transport, protocol, tester_address, timeout)
+        try:
+            await connection.activate_routing(activation_type)
+        except BaseException:
+            await connection.close()
+            raise
+        return connection
+
+    async def __aenter__(self) -> "DoipConnection":
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.close()
+
+    # -- transmit ----------------------------------------------------------
+
+    def _send(self, payload_type: int, payload: bytes) -> None:
+        """Queue one message; all queued messages go out in one write."""
+        if self._error is not None:
+            raise self._error
+        if not self._out:
+            asyncio.get_running_loop().call_soon(self._flush)
+        self._out.append(doip_frame(payload_type, payload))
+        self.stats.messages_sent += 1
+
+    def _flush(self) -> None:
+        if self._out and not self.transport.is_closing():
+            self.transport.write(b"".join(self._out))
+            self.stats.writes += 1
+        self._out = []
+
+    async def drain(self) -> None:
+        """Wait while the transport's write buffer is above its high-water mark."""
+        await self.protocol.writable.wait()
+
+    # -- receive -----------------------------------------------------------
+
+    def _dispatch(self, payload_type: int, payload: bytes) -> None:
+        self.stats.messages_received += 1
+        if payload_type == PayloadType.DIAGNOSTIC_MESSAGE and len(payload) >= 4:
+            session = self.sessions.get(int.from_bytes(payload[:2], "big"))
+            if session is not None:
+                session._responses.put_nowait(payload[4:])
+        elif payload_type in (PayloadType.DIAGNOSTIC_ACK, PayloadType.DIAGNOSTIC_NACK) \
+                and len(payload) >= 5:
+            session = self.sessions.get(int.from_bytes(payload[:2], "big"))
+            if session is not None:
+                session._acked(payload_type == PayloadType.DIAGNOSTIC_ACK, payload[4])
+        elif payload_type == PayloadType.ALIVE_CHECK_REQUEST:
+            self._send(PayloadType.ALIVE_CHECK_RESPONSE, self.tester_address.to_bytes(2, "big"))
+        elif payload_type == PayloadType.ROUTING_ACTIVATION_RESPONSE:
+            if self._activation is not None and not self._activation.done():
+                self._activation.set_result(payload)
+        elif payload_type == PayloadType.GENERIC_NACK:
+            code = payload[0] if payload else None
+            self._fail(DoipError(f"generic DoIP NACK 0x{code or 0:02X}", code))
+
+    def _fail(self, error: DoipError) -> None:
+        if self._error is None:
+            self._error = error
+        if self._activation is not None and not self._activation.done():
+            self._activation.set_exception(error)
+        for session in self.sessions.values():
+            session._failed(error)
+
+    # -- API -----------------------------------------------------------------
+
+    async def activate_routing(self, activation_type: int = 0) -> int:
+        """Routing activation; returns the DoIP entity's logical address."""
+        self._activation = asyncio.get_running_loop().create_future()
+        self._send(PayloadType.ROUTING_ACTIVATION_REQUEST,
+                   self.tester_address.to_bytes(2, "big") + bytes((activation_type, 0, 0, 0, 0)))
+        try:
+            payload = await asyncio.wait_for(self._activation, self.timeout)
+        except asyncio.TimeoutError:
+            raise DoipTimeoutError("no routing activation response") from None
+        if len(payload) < 5:
+            raise DoipError("short routing activation response")
+        if payload[4] != ROUTING_SUCCESS:
+            raise DoipError(f"routing activation refused (0x{payload[4]:02X})", payload[4])
+        self.entity_address = int.from_bytes(payload[2:4], "big")
+        return self.entity_address
+
+    def session(self, target_address: int) -> "DoipSession":
+        session = self.sessions.get(target_address)
+        if session is None:
+            session = self.sessions[target_address] = DoipSession(self, target_address)
+        return session
+
+    async def close(self) -> None:
+        self._flush()
+        self.transport.close()
+        self._fail(DoipError("connection closed"))
+
+
+class DoipSession:
+    """UDS request/response with one logical address behind a ``DoipConnection``.
+
+    Requests to one address run one at a time, as UDS requires; requests
+    to different addresses run concurrently on the shared connection.
+    """
+
+    def __init__(self, connection: DoipConnection, target_address: int) -> None:
+        self.connection = connection
+        self.target_address = target_address
+        self._header = connection.tester_address.to_bytes(2, "big") \
+            + target_address.to_bytes(2, "big")
+        self._lock = asyncio.Lock()
+        self._ack: Optional[asyncio.Future] = None
+        self._responses: "asyncio.Queue[bytes]" = asyncio.Queue()
+
+    def _acked(self, positive: bool, code: int) -> None:
+        if self._ack is None or self._ack.done():
+            return
+        if positive:
+            self._ack.set_result(code)
+        else:
+            self._ack.set_exception(DoipError(
+                f"diagnostic message to 0x{self.target_address:04X} NACKed (0x{code:02X})", code))
+
+    def _failed(self, error: DoipError) -> None:
+        if self._ack is not None and not self._ack.done():
+            self._ack.set_exception(error)
+        self._responses.put_nowait(b"")  # wakes a waiting request; b"" means failed
+
+    async def send(self, payload: bytes, timeout: Optional[float] = None) -> None:
+        """Send one diagnostic message and wait for its DoIP ACK only."""
+        async with self._lock:
+            await self._send(payload, timeout)
+
+    async def _send(self, payload: bytes, timeout: Optional[float]) -> None:
+        conn = self.connection
+        while not self._responses.empty():
+            self._responses.get_nowait()  # late answer to a request that timed out
+        await conn.drain()
+        conn._send(PayloadType.DIAGNOSTIC_MESSAGE, self._header + payload)
+        # the ACK is dispatched from a later loop callback, never before this
+        self._ack = asyncio.get_running_loop().create_future()
+        try:
+            await asyncio.wait_for(self._ack, conn.timeout if timeout is None else timeout)
+        except asyncio.TimeoutError:
+            raise DoipTimeoutError(f"no DoIP ACK from 0x{self.target_address:04X}") from None
+
+    async def request(self, payload: bytes, timeout: Optional[float] = None,
+                      pending_timeout: float = DEFAULT_PENDING_TIMEOUT) -> bytes:
+        """Send a UDS request and return its final response.
+
+        ``0x7F <SID> 0x78`` (response pending) extends the wait to
+        ``pending_timeout`` and is not returned.
+        """
+        wait = self.connection.timeout if timeout is None else timeout
+        async with self._lock:
+            await self._send(payload, timeout)
+            while True:
+                try:
+                    response = await asyncio.wait_for(self._responses.get(), wait)
+                except asyncio.TimeoutError:
+                    raise DoipTimeoutError(
+                        f"no response from 0x{self.target_address:04X}") from None
+                if not response:
+                    raise self.connection._error or DoipError("connection closed")
+                if len(response) >= 3 and response[0] == 0x7F and response[1] == payload[0] \
+                        and response[2] == NRC_RESPONSE_PENDING:
+                    wait = pending_timeout
+                    continue
+                return response
+
+
+# -- UDS service layer ---------------------------------------------------------
+
+NRC_NAMES = {
+    0x10: "generalReject",
+    0x11: "serviceNotSupported",
+    0x12: "subFunctionNotSupported",
+    0x13: "incorrectMessageLengthOrInvalidFormat",
+    0x14: "responseTooLong",
+    0x21: "busyRepeatRequest",
+    0x22: "conditionsNotCorrect",
+    0x24: "requestSequenceError",
+    0x31: "requestOutOfRange",
+    0x33: "securityAccessDenied",
+    0x70: "uploadDownloadNotAccepted",
+    0x71: "transferDataSuspended",
+    0x72: "generalProgrammingFailure",
+    0x73: "wrongBlockSequenceCounter",
+    0x7E: "subFunctionNotSupportedInActiveSession",
+    0x7F: "serviceNotSupportedInActiveSession",
+}
+# NRCs after which a multi-DID request is split to find the offending DID
+_SPLIT_NRCS = {0x13, 0x14, 0x31}
+DEFAULT_MAX_MESSAGE = FF_DL_12BIT_MAX
+DEFAULT_MAX_DIDS = 32
+
+
+class UdsError(Exception):
+    """Raised for negative and malformed UDS responses."""
+
+    def __init__(self, message: str, sid: Optional[int] = None,
+                 nrc: Optional[int] = None) -> None:
+        super().__init__(message)
+        self.sid = sid
+        self.nrc = nrc
+
+
+class IsoTpUdsTransport:
+    """``request``/``send`` coroutines over a blocking ``IsoTpConnection``.
+
+    The exchange runs in a worker thread so ISO-TP and DoIP sessions can
+    share one event loop.
+    """
+
+    def __init__(self, connection: IsoTpConnection,
+                 pending_timeout: float = DEFAULT_PENDING_TIMEOUT) -> None:
+        self.connection = connection
+        self.pending_timeout = pending_timeout
+        self._lock = asyncio.Lock()
+
+    def prepare(self, payload: bytes) -> IsoTpMessage:
+        return self.connection.segment(payload)
+
+    def _request(self, message: IsoTpMessage, timeout: Optional[float]) -> bytes:
+        self.connection.send(message)
+        sid = message.payload[0]
+        while True:
+            response = self.connection.recv(timeout)
+            if len(response) >= 3 and response[0] == 0x7F and response[1] == sid \
+                    and response[2] == NRC_RESPONSE_PENDING:
+                timeout = self.pending_timeout
+                continue
+            return response
+
+    async def request(self, payload, timeout: Optional[float] = None) -> bytes:
+        """``payload`` is bytes or a message from ``prepare``."""
+        if not isinstance(payload, IsoTpMessage):
+            payload = self.prepare(payload)
+        async with self._lock:
+            return await asyncio.to_thread(self._request, payload, timeout)
+
+    async def send(self, payload, timeout: Optional[float] = None) -> None:
+        async with self._lock:
+            await asyncio.to_thread(self.connection.send, payload)
+
+
+@dataclass
+class DidStats:
+    requests: int = 0             # 0x22 requests sent
+    dids_read: int = 0            # DIDs fetched from the ECU
+    cache_hits: int = 0           # static DIDs served from the cache
+    splits: int = 0               # batches split after a negative response
+    fallbacks: int = 0            # batches re-read one DID at a time (sizes relearned)
+    resized: int = 0              # known DID sizes corrected by a single-DID read
+    invalidations: int = 0
+
+
+class UdsClient:
+    """UDS services for one ECU over a DoIP or ISO-TP transport.
+
+    ``did_sizes`` gives the data length of fixed-size DIDs; only those can
+    share a request, because a multi-DID response carries no lengths.  DIDs
+    of unknown size are read on their own and their size is learned.  A
+    batch whose response does not parse with the known sizes is re-read one
+    DID at a time, and any size those reads contradict, declared or learned,
+    is corrected (``stats.resized``); a full ``invalidate()`` goes back to
+    the declared sizes.  DIDs the ECU leaves out of a multi-DID response
+    are read on their own as well.  ``max_request``/``max_response`` are
+    the message lengths the ECU accepts and sends (the CanTp/DoIP buffer
+    sizes); ``max_dids`` caps the DIDs per request as the ECU's Dcm
+    configuration does.
+
+    ``last_activity`` (``time.monotonic()``) is when the ECU last received
+    a request, i.e. when its S3 timer restarted; ``in_flight`` counts
+    requests awaiting their response.
+    """
+
+    def __init__(self, transport, did_sizes: Optional[Dict[int, int]] = None,
+                 static_dids: Iterable[int] = (), max_request: int = DEFAULT_MAX_MESSAGE,
+                 max_response: int = DEFAULT_MAX_MESSAGE,
+                 max_dids: int = DEFAULT_MAX_DIDS) -> None:
+        self.transport = transport
+        self.did_sizes: Dict[int, int] = dict(did_sizes or {})
+        self._declared_sizes = dict(self.did_sizes)
+        self.static_dids: Set[int] = set(static_dids)
+        self.max_request = max_request
+        self.max_response = max_response
+        self.max_dids = max_dids
+        self.stats = DidStats()
+        self.last_activity = time.monotonic()
+        self.in_flight = 0
+        self._static_cache: Dict[int, bytes] = {}
+
+    # -- requests ----------------------------------------------------------
+
+    def prepare(self, payload: bytes):
+        """Pre-segment ``payload`` if the transport supports it (ISO-TP)."""
+        prepare = getattr(self.transport, "prepare", None)
+        return prepare(payload) if prepare is not None else payload
+
+    async def request(self, payload, timeout: Optional[float] = None) -> bytes:
+        """Send ``payload`` (bytes or from ``prepare``), return the positive response.
+
+        Raises ``UdsError`` for a negative response or a mismatched SID.
+        """
+        self.in_flight += 1
+        try:
+            response = await self.transport.request(payload, timeout)
+        finally:
+            self.in_flight -= 1
+        self.last_activity = time.monotonic()
+        if isinstance(payload, IsoTpMessage):
+            payload = payload.payload
+        sid = payload[0]
+        if not response:
+            raise UdsError(f"empty response to 0x{sid:02X}", sid)
+        if response[0] == 0x7F:
+            nrc = response[2] if len(response) > 2 else None
+            name = NRC_NAMES.get(nrc, f"0x{nrc or 0:02X}")
+            raise UdsError(f"service 0x{sid:02X} rejected: {name}", sid, nrc)
+        if response[0] != sid + 0x40:
+            raise UdsError(f"unexpected response 0x{response[0]:02X} to 0x{sid:02X}", sid)
+        self._observe(payload)
+        return response
+
+    async def send(self, payload: bytes, timeout: Optional[float] = None) -> None:
+        """Send a request whose positive response is suppressed."""
+        sent = time.monotonic()
+        await self.transport.send(payload, timeout)
+        self.last_activity = sent
+        self._observe(payload.payload if isinstance(payload, IsoTpMessage) else payload)
+
+    def _observe(self, payload: bytes) -> None:
+        """Drop cached static DIDs that the request may have changed."""
+        sid = payload[0]
+        if sid in (0x11, 0x34, 0x37) or (sid == 0x10 and len(payload) > 1
+                                          and payload[1] & 0x7F == 0x02):
+            self.invalidate()
+        elif sid == 0x2E and len(payload) >= 3:
+            self.invalidate([int.from_bytes(payload[1:3], "big")])
+
+    def invalidate(self, dids: Optional[Iterable[int]] = None) -> None:
+        """Forget cached static DIDs (all of them, and learned DID sizes, by default)."""
+        if dids is None:
+            if self._static_cache:
+                self.stats.invalidations += 1
+            self._static_cache.clear()
+            self.did_sizes.clear()
+            self.did_sizes.update(self._declared_sizes)
+        else:
+            for did in dids:
+                self._static_cache.pop(did, None)
+
+    # -- ReadDataByIdentifier ----------------------------------------------
+
+    def plan(self, dids: Sequence[int]) -> List[List[int]]:
+        """Group ``dids`` into 0x22 requests within the configured limits."""
+        batches: List[List[int]] = []
+        batch: List[int] = []
+        response = 1
+        for did in dids:
+            size = self.did_sizes.get(did)
+            if size is None:
+                batches.append([did])
+                continue
+            if batch and (len(batch) == self.max_dids
+                          or 1 + 2 * (len(batch) + 1) > self.max_request
+                          or response + 2 + size > self.max_response):
+                batches.append(batch)
+                batch, response = [], 1
+            batch.append(did)
+            response += 2 + size
+        if batch:
+            batches.append(batch)
+        return batches
+
+    async def read_dids(self, dids: Iterable[int]) -> Dict[int, bytes]:
+        """Read ``dids`` in as few requests as possible; returns ``{did: data}``."""
+        wanted = list(dict.fromkeys(dids))
+        results: Dict[int, bytes] = {}
+        missing = []
+        for did in wanted:
+            if did in self._static_cache:
+                results[did] = self._static_cache[did]
+                self.stats.cache_hits += 1
+            else:
+                missing.append(did)
+        for batch in self.plan(missing):
+            results.update(await self._read_batch(batch))
+        for did in missing:
+            if did in self.static_dids:
+                self._static_cache[did] = results[did]
+        return {did: results[did] for did in wanted}
+
+    async def read_did(self, did: int) -> bytes:
+        return (await self.read_dids((did,)))[did]
+
+    async def _read_batch(self, batch: List[int]) -> Dict[int, bytes]:
+        self.stats.requests += 1
+        try:
+            response = await self.request(
+                b"\x22" + b"".join(did.to_bytes(2, "big") for did in batch))
+        except UdsError as exc:
+            if len(batch) == 1 or exc.nrc not in _SPLIT_NRCS:
+                raise
+            self.stats.splits += 1
+            half = len(batch) // 2
+            results = await self._read_batch(batch[:half])
+            results.update(await self._read_batch(batch[half:]))
+            return results
+        if len(batch) == 1:
+            did = batch[0]
+            if response[1:3] != did.to_bytes(2, "big"):
+                raise UdsError(f"response echoes DID 0x{response[1:3].hex()}, "
+                               f"expected 0x{did:04X}", 0x22)
+            size = len(response) - 3
+            if self.did_sizes.get(did, size) != size:
+                self.stats.resized += 1
+            self.did_sizes[did] = size
+            self.stats.dids_read += 1
+            return {did: bytes(response[3:])}
+        results = self._parse_batch(batch, response)
+        if results is None:
+            # A size changed (e.g. new software) or the ECU left DIDs out:
+            # read each DID alone, which relearns sizes or names the rejected DID.
+            self.stats.fallbacks += 1
+            results = {}
+            for did in batch:
+                results.update(await self._read_batch([did]))
+            return results
+        self.stats.dids_read += len(results)
+        return results
+
+    def _parse_batch(self, batch: List[int], response: bytes) -> Optional[Dict[int, bytes]]:
+        """Split a multi-DID response by the known sizes; None if it does not parse.
+
+        Every DID must be echoed in request order and the sizes must add up
+        to the response length exactly.  With a DID left out, a wrong size
+        could still land on a later echo, so omissions do not parse either.
+        """
+        results = {}
+        pos = 1
+        for did in batch:
+            end = pos + 2 + self.did_sizes.get(did, 0)
+            if (did not in self.did_sizes or end > len(response)
+                    or response[pos:pos + 2] != did.to_bytes(2, "big")):
+                return None
+            results[did] = bytes(response[pos + 2:end])
+            pos = end
+        return results if pos == len(response) else None
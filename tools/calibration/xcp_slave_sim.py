@@ -0,0 +1,960 @@
+#!/usr/bin/env python3
+"""Local XCP-on-TCP/UDP slave stand-in for exercising the host calibration tools.
+
+Serves a simulated memory map over the same framing the VCU's XCP slave
+uses so that ``xcp_memory_dump.py`` and friends can be run and benchmarked
+without hardware.  Only the commands those tools rely on are implemented:
+UPLOAD, DOWNLOAD, PROGRAM, BUILD_CHECKSUM and dynamic DAQ.
+
+The memory is either a synthetic pattern or the MEMORY regions of a linker
+script (``--layout config/baremetal/memory_layout_S32K344.ld``) overlaid
+with calibration images (``--image calibration/data/S32K344/*.hex``).
+``--latency-ms`` and ``--bandwidth`` model the ECU's turnaround and link.
+
+The default server runs on asyncio: each received batch of commands is
+answered with one write (TCP) or as few datagrams as fit (UDP), so a
+single process can serve many masters as the load target of the
+performance benches.  ``--threaded`` selects the older thread-per-
+connection server.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import bisect
+import socket
+import socketserver
+import struct
+import sys
+import threading
+import time
+import zlib
+from collections import deque
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, Deque, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+from ethernet_xcp_adapter import (
+    COMM_OPT_INTERLEAVED_MODE,
+    COMM_OPTIONAL,
+    COMM_OPT_MASTER_BLOCK_MODE,
+    COMM_SLAVE_BLOCK_MODE,
+    DAQ_LIST_SELECT,
+    DAQ_LIST_START,
+    DAQ_LIST_STOP,
+    DAQ_MODE_TIMESTAMP,
+    DAQ_PROP_TIMESTAMP_SUPPORTED,
+    ETH_HEADER,
+    GET_ID_IN_RESPONSE,
+    ID_ASCII,
+    ID_ECU_SERIAL,
+    SYNCH_START_SELECTED,
+    SYNCH_STOP_ALL,
+    SYNCH_STOP_SELECTED,
+    PID_ERR,
+    PID_RES,
+    PID_SERV,
+    XCP_TCP_DEFAULT_PORT,
+    ChecksumType,
+    Cmd,
+    ErrCode,
+)
+from hex_parser import HexParseError, load as load_hex
+
+_XCP_TOOL = Path(__file__).resolve().parents[2] / "calibration" / "tools" / "xcp_tool"
+
+MAX_CHECKSUM_BLOCK = 0x100000
+MAX_DAQ_BURST = 1000
+DAQ_PROPERTIES = 0x01 | DAQ_PROP_TIMESTAMP_SUPPORTED  # dynamic config, timestamps
+TIMESTAMP_MODE = 0x34  # 4-byte timestamp, 1 us unit
+# epoll sleeps in whole milliseconds, so output held back only by the
+# bandwidth model is written up to one tick early; the link model keeps its
+# own clock, so the average rate is unaffected.  Turnaround latency is never
+# shortened (and rounds up to the tick on the asyncio server).
+PACING_SLACK = 0.001
+
+
+class SimulatedMemory:
+    """Sparse byte-addressable memory made of independent segments."""
+
+    def __init__(self) -> None:
+        self.segments: List[Tuple[int, bytearray]] = []
+        self._starts: List[int] = []
+
+    def add_segment(self, base: int, data: bytes) -> None:
+        self.segments.append((base, bytearray(data)))
+        self.segments.sort(key=lambda seg: seg[0])
+        self._starts = [start for start, _ in self.segments]
+
+    def view(self, address: int, size: int) -> Optional[memoryview]:
+        index = bisect.bisect_right(self._starts, address) - 1
+        if index >= 0:
+            base, data = self.segments[index]
+            if address + size <= base + len(data):
+                offset = address - base
+                return memoryview(data)[offset:offset + size]
+        return None
+
+    def store(self, address: int, data: bytes) -> None:
+        """Write ``data`` over existing segments, adding segments for the gaps."""
+        pos = 0
+        while pos < len(data):
+            at = address + pos
+            index = bisect.bisect_right(self._starts, at) - 1
+            if index >= 0 and at < self._starts[index] + len(self.segments[index][1]):
+                base, seg = self.segments[index]
+                count = min(len(data) - pos, base + len(seg) - at)
+                seg[at - base:at - base + count] = data[pos:pos + count]
+            else:
+                following = self._starts[index + 1] if index + 1 < len(self._starts) \
+                    else at + len(data)
+                count = min(len(data) - pos, following - at)
+                self.add_segment(at, data[pos:pos + count])
+            pos += count
+
+    @classmethod
+    def from_files(cls, layout: Optional[Path] = None, images: Sequence[Path] = (),
+                   regions: Sequence[str] = (), max_region: int = 64 << 20,
+                   fill: int = 0xFF) -> "SimulatedMemory":
+        """Linker-script MEMORY regions (erased flash) overlaid with hex images.
+
+        ``regions`` limits the layout to the named regions; regions larger
+        than ``max_region`` (peripheral windows, external memory) are skipped.
+        """
+        memory = cls()
+        if layout is not None:
+            if str(_XCP_TOOL) not in sys.path:
+                sys.path.insert(0, str(_XCP_TOOL))
+            from xcp_transfer_plan import parse_linker_script
+
+            for region in parse_linker_script(Path(layout).read_text()):
+                if regions and region.name not in regions:
+                    continue
+                if region.readable and 0 < region.length <= max_region:
+                    memory.add_segment(region.origin, bytes((fill,)) * region.length)
+        for image in images:
+            for address, data in load_hex(image):
+                memory.store(address, data)
+        return memory
+
+    @property
+    def size(self) -> int:
+        return sum(len(data) for _, data in self.segments)
+
+
+@dataclass
+class SlaveConfig:
+    max_cto: int = 255
+    max_dto: int = 1500
+    slave_block_mode: bool = True
+    queue_size: int = 32
+    latency: float = 0.0
+    bandwidth: float = 0.0  # bytes/s slave -> master; 0 = unlimited
+    daq_period: float = 0.001
+    master_block_mode: bool = True
+    max_bs_pgm: int = 32
+    min_st_pgm: int = 0
+    # Sector erase runs in the background; PROGRAM into a sector still being
+    # erased waits for it, like the flash controller's busy flag.
+    sector_size: int = 0x2000
+    sector_erase_time: float = 0.0
+    memory: SimulatedMemory = field(default_factory=SimulatedMemory)
+    identification: Dict[int, bytes] = field(default_factory=lambda: {
+        ID_ASCII: b"VCU_S32K3_SIM 1.0.0",
+        ID_ECU_SERIAL: b"SIM-000001",
+    })
+
+
+class _Link:
+    """Turnaround latency plus a serialising link of ``bandwidth`` bytes/s.
+
+    ``due`` returns when a transmission of ``size`` bytes, queued at ``now``,
+    has fully arrived; transmissions queue behind each other on the link.
+    """
+
+    def __init__(self, config: SlaveConfig) -> None:
+        self.config = config
+        self.free = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def modelled(self) -> bool:
+        return bool(self.config.latency or self.config.bandwidth)
+
+    def due(self, now: float, size: int, reply: bool = True) -> float:
+        with self._lock:
+            start = max(now + (self.config.latency if reply else 0.0), self.free)
+            if self.config.bandwidth:
+                start += size / self.config.bandwidth
+            self.free = start
+            return start
+
+
+class _XcpSession:
+    """Per-connection command processor."""
+
+    def __init__(self, config: SlaveConfig) -> None:
+        self.config = config
+        self.mta = 0
+        self.connected = False
+        self.programming = False
+        self.block_remaining = 0
+        self.download_remaining = 0
+        self.link = _Link(config)
+        self.erasing: List[Tuple[int, int, float]] = []
+        self.ctr = 0
+        self._lock = threading.Lock()
+        self.send: Callable[..., None] = lambda frames, reply=False: None
+        # DAQ state: list -> ODT -> [(address, size)]
+        self.daq: List[List[List[Tuple[int, int]]]] = []
+        self.daq_ptr = (0, 0, 0)
+        self.daq_mode: Dict[int, int] = {}
+        self.selected: Set[int] = set()
+        self.running: Set[int] = set()
+        self._daq_thread: Optional[threading.Thread] = None
+        self._daq_stop = threading.Event()
+
+    def _frame(self, packet: bytes) -> bytes:
+        with self._lock:
+            header = ETH_HEADER.pack(len(packet), self.ctr)
+            self.ctr = (self.ctr + 1) & 0xFFFF
+        return header + packet
+
+    def close(self) -> None:
+        self._stop_daq()
+
+    def pace(self, size: int, reply: bool = True) -> None:
+        """Block until ``size`` bytes sent now would have crossed the link."""
+        if self.link.modelled:
+            now = time.perf_counter()
+            time.sleep(max(0.0, self.link.due(now, size, reply) - now))
+
+    # -- DAQ streaming ---------------------------------------------------
+
+    def _first_pid(self, daq: int) -> int:
+        """Absolute ODT numbering: a list's PIDs follow all earlier lists' ODTs."""
+        return sum(len(odts) for odts in self.daq[:daq])
+
+    def _daq_frames(self, daq: int, timestamp: int) -> List[bytes]:
+        frames = []
+        memory = self.config.memory
+        first_pid = self._first_pid(daq)
+        for odt_index, odt in enumerate(self.daq[daq]):
+            payload = bytearray((first_pid + odt_index,))
+            if odt_index == 0 and self.daq_mode.get(daq, 0) & DAQ_MODE_TIMESTAMP:
+                payload += struct.pack("<I", timestamp)
+            for address, size in odt:
+                view = memory.view(address, size)
+                payload += view if view is not None else bytes(size)
+            frames.append(self._frame(bytes(payload)))
+        return frames
+
+    def _daq_loop(self) -> None:
+        period = self.config.daq_period
+        t0 = next_cycle = time.perf_counter()
+        while not self._daq_stop.is_set():
+            frames: List[bytes] = []
+            # Emit every cycle that fell due since the last wake-up, so the
+            # average rate holds even when sleep() overshoots.
+            bursts = 0
+            while next_cycle <= time.perf_counter() and bursts < MAX_DAQ_BURST:
+                timestamp = int((next_cycle - t0) * 1e6) & 0xFFFFFFFF
+                for daq in sorted(self.running):
+                    frames.extend(self._daq_frames(daq, timestamp))
+                next_cycle += period
+                bursts += 1
+            if frames:
+                try:
+                    self.send(frames)
+                except OSError:
+                    return
+            self._daq_stop.wait(max(0.0, next_cycle - time.perf_counter()))
+
+    def _start_daq(self) -> None:
+        if self._daq_thread is None or not self._daq_thread.is_alive():
+            self._daq_stop.clear()
+            self._daq_thread = threading.Thread(target=self._daq_loop, daemon=True)
+            self._daq_thread.start()
+
+    def _stop_daq(self) -> None:
+        self._daq_stop.set()
+        if self._daq_thread is not None and self._daq_thread is not threading.current_thread():
+            self._daq_thread.join()
+        self._daq_thread = None
+
+    def _handle_daq(self, cmd: int, packet: bytes) -> Optional[List[bytes]]:
+        if cmd == Cmd.GET_DAQ_PROCESSOR_INFO:
+            return self._res(struct.pack("<BHHBB", DAQ_PROPERTIES, 0xFFFF, 1, 0, 0))
+        if cmd == Cmd.GET_DAQ_RESOLUTION_INFO:
+            return self._res(struct.pack("<BBBBBH", 1, 0xFF, 1, 0xFF, TIMESTAMP_MODE, 1))
+        if cmd == Cmd.FREE_DAQ:
+            self._stop_daq()
+            self.daq, self.daq_mode = [], {}
+            self.selected, self.running = set(), set()
+            return self._res()
+        if cmd == Cmd.ALLOC_DAQ:
+            self.daq = [[] for _ in range(struct.unpack_from("<H", packet, 2)[0])]
+            return self._res()
+        if cmd == Cmd.ALLOC_ODT:
+            daq = struct.unpack_from("<H", packet, 2)[0]
+            if daq >= len(self.daq):
+                return self._err(ErrCode.OUT_OF_RANGE)
+            others = sum(len(odts) for i, odts in enumerate(self.daq) if i != daq)
+            if others + packet[4] > PID_SERV:
+                return self._err(ErrCode.MEMORY_OVERFLOW)  # PIDs would reach PID_SERV
+            self.daq[daq] = [[] for _ in range(packet[4])]
+            return self._res()
+        if cmd == Cmd.ALLOC_ODT_ENTRY:
+            daq, odt, count = struct.unpack_from("<HBB", packet, 2)
+            if daq >= len(self.daq) or odt >= len(self.daq[daq]):
+                return self._err(ErrCode.OUT_OF_RANGE)
+            self.daq[daq][odt] = [(0, 0)] * count
+            return self._res()
+        if cmd == Cmd.SET_DAQ_PTR:
+            daq, odt, entry = struct.unpack_from("<HBB", packet, 2)
+            if (daq >= len(self.daq) or odt >= len(self.daq[daq])
+                    or entry >= len(self.daq[daq][odt])):
+                return self._err(ErrCode.OUT_OF_RANGE)
+            self.daq_ptr = (daq, odt, entry)
+            return self._res()
+        if cmd == Cmd.WRITE_DAQ:
+            daq, odt, entry = self.daq_ptr
+            if entry >= len(self.daq[daq][odt]) if daq < len(self.daq) else True:
+                return self._err(ErrCode.DAQ_CONFIG)
+            self.daq[daq][odt][entry] = (struct.unpack_from("<I", packet, 4)[0], packet[2])
+            self.daq_ptr = (daq, odt, entry + 1)
+            return self._res()
+        if cmd == Cmd.SET_DAQ_LIST_MODE:
+            daq = struct.unpack_from("<H", packet, 2)[0]
+            if daq >= len(self.daq):
+                return self._err(ErrCode.OUT_OF_RANGE)
+            self.daq_mode[daq] = packet[1]
+            return self._res()
+        if cmd == Cmd.START_STOP_DAQ_LIST:
+            mode, daq = packet[1], struct.unpack_from("<H", packet, 2)[0]
+            if daq >= len(self.daq):
+                return self._err(ErrCode.OUT_OF_RANGE)
+            if mode == DAQ_LIST_SELECT:
+                self.selected.add(daq)
+            elif mode == DAQ_LIST_START:
+                self.running.add(daq)
+                self._start_daq()
+            elif mode == DAQ_LIST_STOP:
+                self.running.discard(daq)
+            return self._res(bytes((self._first_pid(daq),)))
+        if cmd == Cmd.START_STOP_SYNCH:
+            mode = packet[1]
+            if mode == SYNCH_START_SELECTED:
+                self.running |= self.selected
+                self.selected = set()
+                self._start_daq()
+            elif mode == SYNCH_STOP_SELECTED:
+                self.running -= self.selected
+                self.selected = set()
+            elif mode == SYNCH_STOP_ALL:
+                self.running = set()
+                self._stop_daq()
+            return self._res()
+        return None
+
+    def _err(self, code: int) -> List[bytes]:
+        return [self._frame(bytes((PID_ERR, code)))]
+
+    def _res(self, payload: bytes = b"") -> List[bytes]:
+        return [self._frame(bytes((PID_RES,)) + payload)]
+
+    def _read(self, address: int, size: int) -> List[bytes]:
+        view = self.config.memory.view(address, size)
+        if view is None:
+            return self._err(ErrCode.ACCESS_DENIED)
+        chunk = self.config.max_cto - 1
+        return [self._frame(bytes((PID_RES,)) + view[i:i + chunk])
+                for i in range(0, size, chunk)]
+
+    def _wait_erased(self, address: int, size: int) -> None:
+        now = time.perf_counter()
+        pending = []
+        for start, end, ready in self.erasing:
+            if ready <= now:
+                continue
+            if start < address + size and address < end:
+                time.sleep(ready - now)
+                now = time.perf_counter()
+            else:
+                pending.append((start, end, ready))
+        self.erasing = pending
+
+    def _write(self, data: bytes) -> Optional[List[bytes]]:
+        """Write at the MTA; returns an ERR frame list on failure."""
+        if not data:
+            return None
+        self._wait_erased(self.mta, len(data))
+        view = self.config.memory.view(self.mta, len(data))
+        if view is None:
+            return self._err(ErrCode.ACCESS_DENIED)
+        view[:] = data
+        self.mta += len(data)
+        return None
+
+    def handle(self, packet: bytes) -> List[bytes]:
+        cmd = packet[0]
+        cfg = self.config
+        if cmd == Cmd.CONNECT:
+            self.connected = True
+            basic = COMM_OPTIONAL | (COMM_SLAVE_BLOCK_MODE if cfg.slave_block_mode else 0)
+            return self._res(struct.pack("<BBBHBB", 0x15, basic, cfg.max_cto,
+                                         cfg.max_dto, 1, 1))
+        if not self.connected:
+            return self._err(ErrCode.ACCESS_DENIED)
+        if cmd == Cmd.DISCONNECT:
+            self.connected = False
+            return self._res()
+        if cmd == Cmd.GET_STATUS:
+            return self._res(bytes((0, 0, 0, 0, 0, 0)))
+        if cmd == Cmd.SYNCH:
+            return self._err(ErrCode.CMD_SYNCH)
+        if cmd == Cmd.GET_COMM_MODE_INFO:
+            optional = COMM_OPT_INTERLEAVED_MODE if cfg.queue_size else 0
+            return self._res(bytes((0, optional, 0, 0, 0, cfg.queue_size, 0x10)))
+        if cmd == Cmd.GET_ID:
+            ident = cfg.identification.get(packet[1], b"")
+            if len(ident) > cfg.max_cto - 8:
+                return self._err(ErrCode.OUT_OF_RANGE)
+            return self._res(struct.pack("<BxxI", GET_ID_IN_RESPONSE, len(ident)) + ident)
+        if cmd == Cmd.BUILD_CHECKSUM:
+            size = struct.unpack_from("<I", packet, 4)[0]
+            if size > MAX_CHECKSUM_BLOCK:
+                return self._err(ErrCode.OUT_OF_RANGE)
+            self._wait_erased(self.mta, size)
+            view = cfg.memory.view(self.mta, size)
+            if view is None:
+                return self._err(ErrCode.ACCESS_DENIED)
+            self.mta += size
+            return self._res(struct.pack("<BxxI", ChecksumType.CRC_32, zlib.crc32(view)))
+        if cmd == Cmd.PROGRAM_START:
+            self.programming = True
+            comm_mode_pgm = ((COMM_OPT_MASTER_BLOCK_MODE if cfg.master_block_mode else 0)
+                             | (COMM_OPT_INTERLEAVED_MODE if cfg.queue_size else 0))
+            return self._res(bytes((0, comm_mode_pgm, cfg.max_cto, cfg.max_bs_pgm,
+                                    cfg.min_st_pgm, cfg.queue_size)))
+        if cmd in (Cmd.PROGRAM_CLEAR, Cmd.PROGRAM, Cmd.PROGRAM_NEXT, Cmd.PROGRAM_MAX,
+                   Cmd.PROGRAM_RESET) and not self.programming:
+            return self._err(ErrCode.SEQUENCE)
+        if cmd == Cmd.PROGRAM_CLEAR:
+            size = struct.unpack_from("<I", packet, 4)[0]
+            self._wait_erased(self.mta, size)
+            view = cfg.memory.view(self.mta, size)
+            if view is None:
+                return self._err(ErrCode.ACCESS_DENIED)
+            view[:] = b"\xff" * size
+            if cfg.sector_erase_time:
+                sectors = -(-size // cfg.sector_size)
+                self.erasing.append((self.mta, self.mta + size, time.perf_counter()
+                                     + sectors * cfg.sector_erase_time))
+            return self._res()
+        if cmd == Cmd.PROGRAM:
+            size = packet[1]
+            chunk = cfg.max_cto - 2
+            in_block = cfg.master_block_mode and chunk < size <= cfg.max_bs_pgm * chunk
+            if (size > chunk and not in_block) or len(packet) < 2 + min(size, chunk):
+                return self._err(ErrCode.OUT_OF_RANGE)
+            error = self._write(packet[2:2 + min(size, chunk)])
+            if error:
+                return error
+            if in_block:
+                # First packet of a master block: answer after the last one.
+                self.block_remaining = size - chunk
+                return []
+            return self._res()
+        if cmd == Cmd.PROGRAM_NEXT:
+            size = packet[1]
+            if not self.block_remaining or size != self.block_remaining:
+                self.block_remaining = 0
+                return self._err(ErrCode.SEQUENCE)
+            data = packet[2:2 + min(size, cfg.max_cto - 2)]
+            error = self._write(data)
+            if error:
+                self.block_remaining = 0
+                return error
+            self.block_remaining -= len(data)
+            return [] if self.block_remaining else self._res()
+        if cmd == Cmd.PROGRAM_MAX:
+            error = self._write(packet[1:cfg.max_cto])
+            return error or self._res()
+        if cmd == Cmd.PROGRAM_RESET:
+            self.programming = False
+            self.connected = False
+            return self._res()
+        if cmd == Cmd.DOWNLOAD:
+            size = packet[1]
+            chunk = cfg.max_cto - 2
+            in_block = cfg.master_block_mode and chunk < size <= cfg.max_bs_pgm * chunk
+            if (size > chunk and not in_block) or len(packet) < 2 + min(size, chunk):
+                return self._err(ErrCode.OUT_OF_RANGE)
+            error = self._write(packet[2:2 + min(size, chunk)])
+            if error:
+                return error
+            if in_block:
+                self.download_remaining = size - chunk
+                return []
+            return self._res()
+        if cmd == Cmd.DOWNLOAD_NEXT:
+            size = packet[1]
+            if not self.download_remaining or size != self.download_remaining:
+                self.download_remaining = 0
+                return self._err(ErrCode.SEQUENCE)
+            data = packet[2:2 + min(size, cfg.max_cto - 2)]
+            error = self._write(data)
+            if error:
+                self.download_remaining = 0
+                return error
+            self.download_remaining -= len(data)
+            return [] if self.download_remaining else self._res()
+        if cmd == Cmd.DOWNLOAD_MAX:
+            return self._write(packet[1:cfg.max_cto]) or self._res()
+        if cmd == Cmd.SET_MTA:
+            self.mta = struct.unpack_from("<I", packet, 4)[0]
+            return self._res()
+        if cmd == Cmd.UPLOAD:
+            size = packet[1]
+            if size > cfg.max_cto - 1 and not cfg.slave_block_mode:
+                return self._err(ErrCode.OUT_OF_RANGE)
+            frames = self._read(self.mta, size)
+            if frames[0][ETH_HEADER.size] == PID_RES:
+                self.mta += size
+            return frames
+        if cmd == Cmd.SHORT_UPLOAD:
+            size = packet[1]
+            if size > cfg.max_cto - 1:
+                return self._err(ErrCode.OUT_OF_RANGE)
+            address = struct.unpack_from("<I", packet, 4)[0]
+            frames = self._read(address, size)
+            if frames[0][ETH_HEADER.size] == PID_RES:
+                self.mta = address + size
+            return frames
+        daq_reply = self._handle_daq(cmd, packet)
+        if daq_reply is not None:
+            return daq_reply
+        return self._err(ErrCode.CMD_UNKNOWN)
+
+
+class _TcpHandler(socketserver.BaseRequestHandler):
+    def handle(self) -> None:
+        sock: socket.socket = self.request
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        session = _XcpSession(self.server.config)  # type: ignore[attr-defined]
+        send_lock = threading.Lock()
+
+        def send(frames: List[bytes], reply: bool = False) -> None:
+            with send_lock:
+                session.pace(sum(map(len, frames)), reply)
+                sock.sendall(b"".join(frames))
+
+        session.send = send
+        try:
+            self._serve(sock, session)
+        finally:
+            session.close()
+
+    def _serve(self, sock: socket.socket, session: _XcpSession) -> None:
+        buf = bytearray()
+        while True:
+            try:
+                data = sock.recv(65536)
+            except OSError:
+                return
+            if not data:
+                return
+            buf += data
+            packets, used = _split_packets(buf)
+            del buf[:used]
+            replies: List[bytes] = []
+            for packet in packets:
+                replies.extend(session.handle(packet))
+            if replies:
+                session.send(replies, reply=True)
+
+
+def _split_packets(buf: bytes) -> Tuple[List[bytes], int]:
+    """Split complete XCP-on-Ethernet frames; returns packets and bytes used."""
+    packets = []
+    offset = 0
+    while len(buf) - offset >= ETH_HEADER.size:
+        length, _ctr = ETH_HEADER.unpack_from(buf, offset)
+        end = offset + ETH_HEADER.size + length
+        if len(buf) < end:
+            break
+        packets.append(bytes(buf[offset + ETH_HEADER.size:end]))
+        offset = end
+    return packets, offset
+
+
+MAX_DATAGRAM = 1472
+
+
+def _datagrams(frames: Iterable[bytes]) -> Iterable[bytes]:
+    """Pack frames into as few datagrams of at most ``MAX_DATAGRAM`` as fit."""
+    datagram = bytearray()
+    for frame in frames:
+        if datagram and len(datagram) + len(frame) > MAX_DATAGRAM:
+            yield bytes(datagram)
+            datagram.clear()
+        datagram += frame
+    if datagram:
+        yield bytes(datagram)
+
+
+class _UdpHandler(socketserver.BaseRequestHandler):
+    MAX_DATAGRAM = MAX_DATAGRAM
+
+    def handle(self) -> None:
+        data, sock = self.request
+        server = self.server
+        session = server.sessions.get(self.client_address)  # type: ignore[attr-defined]
+        if session is None:
+            session = _XcpSession(server.config)  # type: ignore[attr-defined]
+            address = self.client_address
+
+            def send(frames: List[bytes], reply: bool = False) -> None:
+                session.pace(sum(map(len, frames)), reply)
+                self.send_datagrams(sock, address, frames)
+
+            session.send = send
+            server.sessions[address] = session  # type: ignore[attr-defined]
+        packets, _ = _split_packets(data)
+        replies: List[bytes] = []
+        for packet in packets:
+            replies.extend(session.handle(packet))
+        if replies:
+            session.send(replies, reply=True)
+
+    @classmethod
+    def send_datagrams(cls, sock: socket.socket, address, frames: List[bytes]) -> None:
+        for datagram in _datagrams(frames):
+            sock.sendto(datagram, address)
+
+
+class XcpSlaveServer(socketserver.ThreadingTCPServer):
+    """Threaded XCP-on-TCP slave; one session per accepted connection."""
+
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self, config: SlaveConfig, host: str = "127.0.0.1",
+                 port: int = 0) -> None:
+        self.config = config
+        super().__init__((host, port), _TcpHandler)
+
+    @property
+    def port(self) -> int:
+        return self.server_address[1]
+
+    def start(self) -> threading.Thread:
+        thread = threading.Thread(target=self.serve_forever, daemon=True)
+        thread.start()
+        return thread
+
+
+class XcpUdpSlaveServer(socketserver.UDPServer):
+    """XCP-on-UDP slave; one session per client address.
+
+    Datagrams are handled sequentially so responses keep request order.
+    """
+
+    allow_reuse_address = True
+
+    def __init__(self, config: SlaveConfig, host: str = "127.0.0.1",
+                 port: int = 0) -> None:
+        self.config = config
+        self.sessions: Dict[Tuple[str, int], _XcpSession] = {}
+        super().__init__((host, port), _UdpHandler)
+
+    @property
+    def port(self) -> int:
+        return self.server_address[1]
+
+    def start(self) -> threading.Thread:
+        thread = threading.Thread(target=self.serve_forever, daemon=True)
+        thread.start()
+        return thread
+
+
+# -- asyncio servers -----------------------------------------------------------
+
+
+class _AsyncSender:
+    """Ordered output of one session on the event loop.
+
+    Without a link model replies are written at once.  Otherwise every batch
+    is queued with the time it is due and a single timer releases whatever
+    has fallen due in one write, so pacing can never reorder responses.
+    """
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, link: _Link,
+                 write: Callable[[List[bytes]], None]) -> None:
+        self.loop = loop
+        self.link = link
+        self.write = write
+        self.pending: Deque[Tuple[float, float, List[bytes]]] = deque()  # due, earliest
+        self.timer: Optional[asyncio.TimerHandle] = None
+
+    def send(self, frames: List[bytes], reply: bool = False) -> None:
+        if not self.link.modelled:
+            self.write(frames)
+            return
+        now = time.perf_counter()
+        due = self.link.due(now, sum(map(len, frames)), reply)
+        earliest = now + (self.link.config.latency if reply else 0.0)
+        if not self.pending and earliest <= now and due <= now + PACING_SLACK:
+            self.write(frames)
+            return
+        self.pending.append((due, earliest, frames))
+        if self.timer is None:
+            self._arm()
+
+    def send_threadsafe(self, frames: List[bytes], reply: bool = False) -> None:
+        try:
+            self.loop.call_soon_threadsafe(self.send, frames, reply)
+        except RuntimeError:  # loop closed under a DAQ thread
+            raise ConnectionError("slave server closed") from None
+
+    def _arm(self) -> None:
+        due, earliest, _ = self.pending[0]
+        delay = max(earliest, due - PACING_SLACK) - time.perf_counter()
+        self.timer = self.loop.call_later(max(0.0, delay), self._flush)
+
+    def _flush(self) -> None:
+        self.timer = None
+        now = time.perf_counter()
+        batch: List[bytes] = []
+        while self.pending and self.pending[0][1] <= now \
+                and self.pending[0][0] <= now + PACING_SLACK:
+            batch.extend(self.pending.popleft()[2])
+        if batch:
+            self.write(batch)
+        if self.pending:
+            self._arm()
+
+    def close(self) -> None:
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        self.pending.clear()
+
+
+class _AsyncTcpProtocol(asyncio.Protocol):
+    def __init__(self, server: "AsyncXcpSlaveServer") -> None:
+        self.server = server
+        self.buf = bytearray()
+        self.transport: Optional[asyncio.Transport] = None
+
+    def connection_made(self, transport) -> None:
+        self.transport = transport
+        sock = transport.get_extra_info("socket")
+        if sock is not None:
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.session = _XcpSession(self.server.config)
+        self.sender = _AsyncSender(self.server.loop, self.session.link, self._write)
+        self.session.send = self.sender.send_threadsafe  # DAQ thread
+        self.server.connections.add(self)
+
+    def _write(self, frames: List[bytes]) -> None:
+        if self.transport is not None and not self.transport.is_closing():
+            self.transport.write(b"".join(frames))
+
+    def data_received(self, data: bytes) -> None:
+        self.buf += data
+        packets, used = _split_packets(self.buf)
+        del self.buf[:used]
+        replies: List[bytes] = []
+        for packet in packets:
+            replies.extend(self.session.handle(packet))
+        if replies:
+            self.sender.send(replies, reply=True)
+
+    def connection_lost(self, exc: Optional[Exception]) -> None:
+        self.transport = None
+        self.sender.close()
+        self.session.close()
+        self.server.connections.discard(self)
+
+
+class _AsyncUdpProtocol(asyncio.DatagramProtocol):
+    def __init__(self, server: "AsyncXcpSlaveServer") -> None:
+        self.server = server
+        self.transport: Optional[asyncio.DatagramTransport] = None
+        self.sessions: Dict[Tuple[str, int], Tuple[_XcpSession, _AsyncSender]] = {}
+
+    def connection_made(self, transport) -> None:
+        self.transport = transport
+
+    def _session(self, address) -> Tuple[_XcpSession, _AsyncSender]:
+        entry = self.sessions.get(address)
+        if entry is None:
+            session = _XcpSession(self.server.config)
+
+            def write(frames: List[bytes]) -> None:
+                if self.transport is not None:
+                    for datagram in _datagrams(frames):
+                        self.transport.sendto(datagram, address)
+
+            sender = _AsyncSender(self.server.loop, session.link, write)
+            session.send = sender.send_threadsafe
+            entry = self.sessions[address] = (session, sender)
+        return entry
+
+    def datagram_received(self, data: bytes, addr) -> None:
+        session, sender = self._session(addr)
+        packets, _ = _split_packets(data)
+        replies: List[bytes] = []
+        for packet in packets:
+            replies.extend(session.handle(packet))
+        if replies:
+            sender.send(replies, reply=True)
+
+    def connection_lost(self, exc: Optional[Exception]) -> None:
+        self.transport = None
+        for session, sender in self.sessions.values():
+            sender.close()
+            session.close()
+        self.sessions.clear()
+
+
+class AsyncXcpSlaveServer:
+    """XCP-on-TCP (or UDP) slave on one asyncio event loop.
+
+    Same surface as ``XcpSlaveServer``: ``port``, ``start()`` (serve from a
+    background thread), ``serve_forever()``, ``shutdown()`` and
+    ``server_close()``.  Replies to each received batch go out in one write
+    (TCP) or packed datagrams (UDP).  PROGRAM into a sector still being
+    erased blocks the loop, so keep ``sector_erase_time`` at zero when the
+    server is the load target of several masters.
+    """
+
+    def __init__(self, config: SlaveConfig, host: str = "127.0.0.1", port: int = 0,
+                 udp: bool = False) -> None:
+        self.config = config
+        self.udp = udp
+        self.loop = asyncio.new_event_loop()
+        self.connections: Set[_AsyncTcpProtocol] = set()
+        self._thread: Optional[threading.Thread] = None
+        self._server = self.loop.run_until_complete(self._open(host, port))
+
+    async def _open(self, host: str, port: int):
+        if self.udp:
+            transport, _ = await self.loop.create_datagram_endpoint(
+                lambda: _AsyncUdpProtocol(self), local_addr=(host, port))
+            return transport
+        return await self.loop.create_server(lambda: _AsyncTcpProtocol(self), host, port,
+                                             reuse_address=True)
+
+    def __enter__(self) -> "AsyncXcpSlaveServer":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.server_close()
+
+    @property
+    def port(self) -> int:
+        if self.udp:
+            return self._server.get_extra_info("sockname")[1]
+        return self._server.sockets[0].getsockname()[1]
+
+    def serve_forever(self) -> None:
+        self.loop.run_forever()
+
+    def start(self) -> threading.Thread:
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self._thread
+
+    def shutdown(self) -> None:
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def server_close(self) -> None:
+        if self.loop.is_closed():
+            return
+        if self.loop.is_running():
+            self.shutdown()
+        self._server.close()
+        for protocol in list(self.connections):
+            if protocol.transport is not None:
+                protocol.transport.close()
+        self.loop.run_until_complete(asyncio.sleep(0))  # deliver connection_lost
+        self.loop.close()
+
+
+def _rate(text: str) -> float:
+    """Parse a byte rate such as ``2000000``, ``500K`` or ``12.5M`` (bytes/s)."""
+    text = text.strip()
+    scale = {"K": 1e3, "M": 1e6, "G": 1e9}.get(text[-1:].upper(), 1.0)
+    try:
+        return float(text[:-1] if scale != 1.0 else text) * scale
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid rate {text!r}")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=XCP_TCP_DEFAULT_PORT)
+    parser.add_argument("--udp", action="store_true", help="serve XCP-on-UDP")
+    parser.add_argument("--threaded", action="store_true",
+                        help="thread-per-connection server instead of asyncio")
+    parser.add_argument("--base", type=lambda v: int(v, 0), default=0x20400000)
+    parser.add_argument("--size", type=lambda v: int(v, 0), default=0x40000)
+    parser.add_argument("--layout", type=Path,
+                        help="linker script whose MEMORY regions form the memory map")
+    parser.add_argument("--region", action="append", default=[], metavar="NAME",
+                        help="only use this MEMORY region of --layout (repeatable)")
+    parser.add_argument("--image", type=Path, action="append", default=[],
+                        help="Intel HEX / S-record image loaded into memory (repeatable)")
+    parser.add_argument("--max-cto", type=int, default=255)
+    parser.add_argument("--queue-size", type=int, default=32)
+    parser.add_argument("--no-block-mode", action="store_true")
+    parser.add_argument("--latency-ms", type=float, default=0.0,
+                        help="artificial turnaround delay per received batch")
+    parser.add_argument("--bandwidth", type=_rate, default=0.0,
+                        help="slave -> master link rate in bytes/s (K/M/G suffixes)")
+    parser.add_argument("--sector-erase-ms", type=float, default=0.0,
+                        help="background erase time per flash sector")
+    args = parser.parse_args(argv)
+
+    if args.layout or args.image:
+        try:
+            memory = SimulatedMemory.from_files(args.layout, args.image, args.region)
+        except (OSError, HexParseError, ValueError) as exc:
+            print(f"error: {exc}", file=sys.stderr)
+            return 2
+        if not memory.segments:
+            print("error: the layout and images define no memory", file=sys.stderr)
+            return 2
+    else:
+        memory = SimulatedMemory()
+        memory.add_segment(args.base, bytes(i & 0xFF for i in range(args.size)))
+    config = SlaveConfig(max_cto=args.max_cto, queue_size=args.queue_size,
+                         slave_block_mode=not args.no_block_mode,
+                         latency=args.latency_ms / 1000.0, bandwidth=args.bandwidth,
+                         sector_erase_time=args.sector_erase_ms / 1000.0, memory=memory)
+    if args.threaded:
+        server = (XcpUdpSlaveServer if args.udp else XcpSlaveServer)(
+            config, args.host, args.port)
+    else:
+        server = AsyncXcpSlaveServer(config, args.host, args.port, udp=args.udp)
+    with server:
+        print(f"XCP slave listening on {args.host}:{server.port} "
+              f"({'UDP' if args.udp else 'TCP'}, {len(memory.segments)} segment(s), "
+              f"{memory.size} bytes)", file=sys.stderr)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())